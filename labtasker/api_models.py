@@ -1,3 +1,4 @@
+import re
 from datetime import datetime
 from typing import Any, Dict, List, Literal, Optional, Tuple, Union
 
@@ -5,7 +6,7 @@
 from pydantic import BaseModel, ConfigDict, Field, SecretStr, field_validator
 
 from labtasker import __version__
-from labtasker.constants import Priority
+from labtasker.constants import DOT_SEPARATED_KEY_PATTERN, Priority
 from labtasker.utils import validate_dict_keys
 
 
@@ -71,6 +72,71 @@ class HealthCheckResponse(BaseResponseModel):
     database: str
 
 
+class QueryCacheMetrics(BaseResponseModel):
+    enabled: bool
+    hits: int
+    misses: int
+    coalesced: int  # identical concurrent queries served by a single database query
+    evictions: int
+    invalidations: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
+    hit_rate: float
+
+
+class HeartbeatBufferMetrics(BaseResponseModel):
+    received: int  # heartbeats received
+    written: int  # heartbeats written to the database
+    flushes: int  # bulk writes
+    pending: int
+
+
+class LoadMetrics(BaseResponseModel):
+    request_rate: float  # requests per second
+    latency_ms: float
+    heartbeat_interval: float  # recommended to tasks without a heartbeat timeout
+
+
+class AdmissionMetrics(BaseResponseModel):
+    in_flight: int  # requests being handled
+    admitted: Dict[str, int]  # per priority class
+    rejected: Dict[str, int]  # per priority class, with 429
+
+
+class FetchDispatcherMetrics(BaseResponseModel):
+    requests: int
+    batches: int
+    avg_batch_size: float
+
+
+class ReadyQueueMetrics(BaseResponseModel):
+    enabled: bool
+    pops: int  # candidates picked in memory
+    loads: int  # chunks loaded from the database
+    pushes: int  # tasks that entered pending
+    invalidations: int
+    evictions: int  # heaps dropped after expiry or over ready_queue_max_heaps
+    heaps: int
+    entries: int
+
+
+class AffinityMetrics(BaseResponseModel):
+    requests: int  # tasks fetched by requests with an affinity
+    hits: int  # ... that match the affinity
+    hit_rate: float
+
+
+class ServerMetricsResponse(BaseResponseModel):
+    query_cache: QueryCacheMetrics
+    heartbeat_buffer: HeartbeatBufferMetrics
+    fetch_dispatcher: FetchDispatcherMetrics
+    ready_queue: ReadyQueueMetrics
+    affinity: AffinityMetrics
+    load: LoadMetrics
+    admission: AdmissionMetrics
+
+
 class QueueCreateRequest(BaseRequestModel, MetadataKeyValidateMixin):
     queue_name: str = Field(
         ..., pattern=r"^[a-zA-Z0-9_-]+$", min_length=1, max_length=100
@@ -97,6 +163,7 @@ class QueueGetResponse(BaseResponseModel, MetadataKeyValidateMixin):
     created_at: datetime
     last_modified: datetime
     metadata: Dict[str, Any]
+    task_layout: str = "shared"
 
 
 class TaskSubmitRequest(
@@ -117,6 +184,8 @@ class TaskSubmitRequest(
     task_timeout: Optional[int] = None
     max_retries: int = 3
     priority: int = Priority.MEDIUM
+    # resource requests, e.g. {"cpus": 4, "mem_gb": 64}
+    resources: Optional[Dict[str, float]] = None
 
 
 class TaskFetchRequest(BaseRequestModel):
@@ -126,6 +195,11 @@ class TaskFetchRequest(BaseRequestModel):
     start_heartbeat: bool = True
     required_fields: Optional[List[str]] = None
     extra_filter: Optional[Dict[str, Any]] = None
+    # values the worker has warm, by task field path, e.g. {"args.dataset": ["imagenet"]}
+    affinity: Optional[Dict[str, List[Any]]] = None
+    # free resources of the worker, e.g. {"cpus": 8, "mem_gb": 32}
+    capacity: Optional[Dict[str, float]] = None
+    fit: str = Field("best", pattern=r"^(best|first)$")
 
 
 class Task(
@@ -152,6 +226,10 @@ class Task(
     cmd: Union[str, List[str]]
     summary: Dict
     worker_id: Optional[str]
+    sweep_id: Optional[str] = None  # set if the task is materialized from a sweep
+    sweep_index: Optional[int] = None
+    sched_rank: Optional[float] = None  # rank of the queue scheduling policy
+    resources: Optional[Dict[str, float]] = None  # resource requests
 
 
 class TaskUpdateRequest(
@@ -192,6 +270,7 @@ class TaskUpdateRequest(
     max_retries: Optional[int] = None
     retries: Optional[int] = None
     priority: Optional[int] = None
+    resources: Optional[Dict[str, float]] = None
     metadata: Optional[Dict] = None
     args: Optional[Dict] = None
     cmd: Optional[Union[str, List[str]]] = None
@@ -240,6 +319,9 @@ def validate_sort(cls, value):
 class TaskLsResponse(BaseResponseModel):
     found: bool = False
     content: List[Task] = Field(default_factory=list)
+    # sweep points that are not materialized yet, for listings that include pending tasks
+    virtual_pending: int = 0
+    active_sweeps: int = 0
 
 
 class TaskSubmitResponse(BaseResponseModel):
@@ -252,6 +334,229 @@ class TaskStatusUpdateRequest(BaseRequestModel):
     summary: Optional[Dict[str, Any]] = None
 
 
+class HeartbeatRequest(BaseRequestModel):
+    # latest progress of the task (e.g. epoch, loss), set as its `summary.progress`
+    progress: Optional[Dict[str, Any]] = None
+
+
+class HeartbeatResponse(BaseResponseModel):
+    next_interval: float  # in seconds, until the next heartbeat of the task
+
+
+class SweepCreateRequest(
+    BaseRequestModel,
+    ArgsKeyValidateMixin,
+    MetadataKeyValidateMixin,
+):
+    """Parameter sweep submission request.
+
+    A sweep is a lazy task template: concrete tasks are materialized from
+    `args` and one point of the `axes` when workers fetch them.
+    """
+
+    task_name: Optional[str] = Field(
+        None, pattern=r"^[a-zA-Z0-9_-]+$", min_length=1, max_length=100
+    )
+    args: Optional[Dict[str, Any]] = None  # base args shared by every point
+    # axis name (dot-separated args key) -> candidate values
+    axes: Dict[str, List[Any]]
+    mode: str = Field("grid", pattern=r"^(grid|zip|random)$")
+    num_samples: Optional[int] = Field(None, gt=0)  # required by random mode
+    seed: int = 0
+    metadata: Optional[Dict[str, Any]] = None
+    cmd: Optional[Union[str, List[str]]] = None
+    heartbeat_timeout: Optional[float] = None
+    task_timeout: Optional[int] = None
+    max_retries: int = 3
+    priority: int = Priority.MEDIUM
+    resources: Optional[Dict[str, float]] = None  # resource requests of every point
+
+    @field_validator("axes")
+    def validate_axes(cls, v):
+        if not v:
+            raise ValueError("At least one axis must be specified.")
+        for name, values in v.items():
+            if not re.match(DOT_SEPARATED_KEY_PATTERN, name):
+                raise ValueError(
+                    f"Axis name '{name}' is not valid. Axis names must be valid dot-separated strings."
+                )
+            if not isinstance(values, list) or len(values) == 0:
+                raise ValueError(f"Axis '{name}' must be a non-empty list of values.")
+        return v
+
+
+class SweepCreateResponse(BaseResponseModel):
+    sweep_id: str
+    total: int
+
+
+class SweepAxis(BaseApiModel):
+    name: str
+    values: List[Any]
+
+
+class Sweep(BaseApiModel, ArgsKeyValidateMixin, MetadataKeyValidateMixin):
+    sweep_id: str = Field(alias="_id")
+    queue_id: str
+    task_name: Optional[str]
+    args: Dict
+    axes: List[SweepAxis]
+    mode: str
+    num_samples: Optional[int]
+    seed: int
+    cursor: int  # index of the next point to be materialized
+    total: int
+    metadata: Dict
+    cmd: Union[str, List[str]]
+    heartbeat_timeout: Optional[float]
+    task_timeout: Optional[int]
+    max_retries: int
+    priority: int
+    resources: Optional[Dict[str, float]] = None
+    created_at: datetime
+    last_modified: datetime
+
+
+class SweepLsResponse(BaseResponseModel):
+    found: bool = False
+    content: List[Sweep] = Field(default_factory=list)
+
+
+class TaskChangesResponse(BaseResponseModel):
+    queue_id: str
+    revision: str  # change token to pass as `since` in the next request
+    changed: List[Task] = Field(default_factory=list)
+    deleted: List[str] = Field(default_factory=list)  # ids of deleted tasks
+    has_more: bool = False
+    tombstone_ttl: float  # deletes older than this (in seconds) are no longer reported
+
+
+class TaskExplainRequest(TaskLsRequest):
+    required_fields: Optional[List[str]] = None
+
+
+class QueryExplainResponse(BaseResponseModel):
+    collection: str
+    query_shape: Dict[str, Any]
+    plan_summary: str
+    winning_plan: Optional[Dict[str, Any]] = None
+    docs_examined: Optional[int] = None
+    keys_examined: Optional[int] = None
+    n_returned: Optional[int] = None
+    execution_time_ms: Optional[float] = None
+
+
+class QueueStatsResponse(BaseResponseModel):
+    task_counts: Dict[str, int] = Field(default_factory=dict)  # status -> count
+    virtual_pending: int = 0  # sweep points that are not materialized yet
+    active_sweeps: int = 0
+
+
+class QueueIndexCreateRequest(BaseRequestModel):
+    # dot-separated paths under `args.`, `metadata.` or `resources.`, e.g. "args.dataset"
+    paths: List[str] = Field(..., min_length=1)
+
+    @field_validator("paths")
+    def validate_paths(cls, v):
+        for path in v:
+            if not re.match(DOT_SEPARATED_KEY_PATTERN, path) or not path.startswith(
+                ("args.", "metadata.", "resources.")
+            ):
+                raise ValueError(
+                    f"Index path '{path}' is not valid. Only dot-separated paths under 'args.', 'metadata.' or 'resources.' can be indexed."
+                )
+        return v
+
+
+class QueueIndex(BaseApiModel):
+    path: str
+    name: str
+    size: Optional[int] = None  # index size in bytes, None if not available
+
+
+class QueueIndexLsResponse(BaseResponseModel):
+    found: bool = False
+    content: List[QueueIndex] = Field(default_factory=list)
+
+
+class QueueLimitSetRequest(BaseRequestModel):
+    # "task_name" or a dot-separated path under `metadata.`, e.g. "metadata.license"
+    key: str
+    # value of the limited group. None: the limit applies to each value of the key separately
+    value: Optional[Any] = None
+    limit: Optional[int] = Field(
+        None, ge=1
+    )  # maximum running tasks, None removes the limit
+
+
+class QueueLimit(BaseApiModel):
+    key: str
+    value: Optional[Any] = None
+    limit: int
+
+
+class QueueLimitUsage(BaseApiModel):
+    key: str
+    value: Any
+    running: int
+
+
+class QueueLimitLsResponse(BaseResponseModel):
+    found: bool = False
+    content: List[QueueLimit] = Field(default_factory=list)
+    running: List[QueueLimitUsage] = Field(default_factory=list)
+
+
+class QueueLayoutUpdateRequest(BaseRequestModel):
+    # "shared": the tasks collection shared by all queues, "partitioned": a collection per queue
+    layout: str = Field(..., pattern=r"^(shared|partitioned)$")
+
+
+class QueueLayoutUpdateResponse(BaseResponseModel):
+    task_layout: str
+    moved: int  # number of tasks moved to the collection of the layout
+
+
+class JobProgress(BaseApiModel):
+    done: int = 0  # number of processed documents
+    stage: Optional[str] = (
+        None  # e.g. the collection being emptied by a delete_queue job
+    )
+
+
+class Job(BaseApiModel):
+    """A background job, e.g. the deletion of a big queue."""
+
+    job_id: str = Field(alias="_id")
+    kind: str = Field(..., pattern=r"^(delete_queue|update_tasks)$")
+    queue_id: str
+    status: str = Field(..., pattern=r"^(pending|running|success|failed)$")
+    progress: JobProgress
+    error: Optional[str] = None
+    created_at: datetime
+    last_modified: datetime
+    finished_at: Optional[datetime] = None
+
+
+class JobSubmitResponse(BaseResponseModel):
+    job_id: str
+
+
+class TaskUpdateJobRequest(BaseRequestModel):
+    """Update all the tasks matching the filter in a background job."""
+
+    task_id: Optional[str] = None
+    task_name: Optional[str] = None
+    status: Optional[str] = Field(
+        None, pattern=r"^(pending|running|success|failed|cancelled)$"
+    )
+    extra_filter: Optional[Dict[str, Any]] = None
+    # Same as the fields of TaskUpdateRequest (without task_id)
+    replace_fields: List[str] = Field(default_factory=list)
+    update: Dict[str, Any] = Field(default_factory=dict)
+    reset_pending: bool = False
+
+
 class WorkerCreateRequest(BaseRequestModel, MetadataKeyValidateMixin):
     worker_name: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
@@ -266,6 +571,10 @@ class WorkerStatusUpdateRequest(BaseRequestModel):
     status: str = Field(..., pattern=r"^(active|suspended|crashed)$")
 
 
+class WorkerLeaseRenewRequest(BaseRequestModel):
+    lease_timeout: float = Field(..., gt=0)  # in seconds
+
+
 class WorkerLsRequest(BaseRequestModel):
     offset: int = Field(0, ge=0)
     limit: int = Field(100, gt=0, le=1000)
@@ -309,6 +618,9 @@ class Worker(BaseApiModel, MetadataKeyValidateMixin):
     max_retries: int
     created_at: datetime
     last_modified: datetime
+    # A lease held by the worker covers all its running tasks (in place of task heartbeats)
+    lease_timeout: Optional[float] = None
+    lease_expires: Optional[datetime] = None
 
 
 class WorkerLsResponse(BaseResponseModel):
@@ -333,6 +645,29 @@ def to_request_dict(self):
         return result
 
 
+class BatchOperation(BaseApiModel):
+    # name of the operation, e.g. "submit_task" (see the batch endpoint for the supported ones)
+    op: str
+    # fields of the request of the operation, along with the ids in its path (e.g. task_id)
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchRequest(BaseRequestModel):
+    operations: List[BatchOperation] = Field(..., max_length=1000)
+    # all or nothing: run the operations in one transaction, aborted by the first failed one
+    atomic: bool = False
+
+
+class BatchOperationResult(BaseApiModel):
+    status_code: int
+    result: Optional[Any] = None  # response body of the operation
+    detail: Optional[Any] = None  # error detail of a failed operation
+
+
+class BatchResponse(BaseResponseModel):
+    results: List[BatchOperationResult] = Field(default_factory=list)
+
+
 class BaseEventModel(BaseApiModel):
     """Base model for all events"""
 
@@ -354,7 +689,16 @@ class StateTransitionEvent(BaseEventModel):
     entity_data: Dict[str, Any]
 
 
-EventModelTypes = Union[BaseEventModel, StateTransitionEvent]
+class TaskProgressEvent(BaseEventModel):
+    """Model for task progress events, sent along with task heartbeats"""
+
+    type: Literal["task_progress"] = "task_progress"  # type: ignore[assignment]
+
+    task_id: str
+    progress: Dict[str, Any]
+
+
+EventModelTypes = Union[BaseEventModel, StateTransitionEvent, TaskProgressEvent]
 
 
 class EventSubscriptionResponse(BaseApiModel):
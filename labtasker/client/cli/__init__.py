@@ -1,8 +1,10 @@
 import labtasker.client.cli.config
 import labtasker.client.cli.event as event
 import labtasker.client.cli.init
+import labtasker.client.cli.job as job
 import labtasker.client.cli.loop
 import labtasker.client.cli.queue as queue
+import labtasker.client.cli.sweep as sweep
 import labtasker.client.cli.task as task
 import labtasker.client.cli.worker as worker
 from labtasker.client.cli.cli import app
@@ -14,7 +16,9 @@
 app.add_typer(queue.app, name="queue", help=queue.__doc__)
 app.add_typer(task.app, name="task", help=task.__doc__)
 app.add_typer(worker.app, name="worker", help=worker.__doc__)
+app.add_typer(sweep.app, name="sweep", help=sweep.__doc__)
 app.add_typer(event.app, name="event", help=event.__doc__)
+app.add_typer(job.app, name="job", help=job.__doc__)
 
 if get_labtasker_client_config_path().exists():
     load_plugins(group="labtasker.client.cli", config=get_client_config().cli_plugins)
@@ -12,7 +12,7 @@
 from rich.table import Table
 from rich.text import Text
 
-from labtasker.api_models import EventResponse, StateTransitionEvent
+from labtasker.api_models import EventResponse, StateTransitionEvent, TaskProgressEvent
 from labtasker.client.core.cli_utils import cli_utils_decorator
 from labtasker.client.core.events import connect_events
 from labtasker.client.core.logging import set_verbose, stdout_console, verbose_print
@@ -172,6 +172,21 @@ def compact_state_transition(
     ]
 
 
+@compact_event_renderer("task_progress")
+def compact_task_progress(
+    event_resp: EventResponse,
+) -> List[Union[str, "Text", Tuple[str, StyleType]],]:
+    """Compact renderer for task progress events."""
+    progress_event: TaskProgressEvent = event_resp.event
+    progress = ", ".join(f"{k}={v}" for k, v in progress_event.progress.items())
+
+    return [
+        Text(f"[{'task':10}]"),
+        Text(f"[{progress_event.task_id:10}]"),
+        Text(f"[{progress}]", style=STATE_COLORS["running"]),
+    ]
+
+
 @app.command()
 @cli_utils_decorator
 def listen(
@@ -206,6 +221,7 @@ def listen(
     events as they occur, such as:
     - Task state changes (pending → running → success/failed)
     - Worker state changes (active → suspended → crashed)
+    - Task progress reported with `labtasker.report_progress()`
 
     Use Ctrl+C to stop listening.
     """
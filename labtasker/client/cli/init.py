@@ -12,11 +12,16 @@
 import tomlkit
 import typer
 from noneprompt import CancelledError, Choice, ConfirmPrompt, InputPrompt, ListPrompt
-from pydantic import HttpUrl, SecretStr
+from pydantic import SecretStr
 from starlette.status import HTTP_409_CONFLICT
 
 from labtasker.client.cli.cli import app
-from labtasker.client.core.api import create_queue, get_queue, health_check
+from labtasker.client.core.api import (
+    create_queue,
+    get_queue,
+    health_check,
+    httpx_client_args,
+)
 from labtasker.client.core.config import (
     ClientConfig,
     EndpointConfig,
@@ -70,13 +75,16 @@ def inner(*args, **kwargs):
     return inner
 
 
+def _validate_endpoint_url(value: str) -> str:
+    """Validate a server URL (HTTP(S) or unix://) and return it normalized."""
+    return str(EndpointConfig(api_base_url=value).api_base_url)
+
+
 @_input_loop
 def setup_endpoint_url() -> Tuple[str, bool]:
     def validator(value: str) -> bool:
         try:
-            EndpointConfig.__pydantic_validator__.validate_assignment(
-                EndpointConfig.model_construct(), "api_base_url", value
-            )
+            _validate_endpoint_url(value)
             return True
         except pydantic.ValidationError:
             return False
@@ -87,11 +95,11 @@ def validator(value: str) -> bool:
         default_text="http://localhost:9321",
         validator=validator,
     ).prompt()
-    url = str(HttpUrl(url))
+    url = _validate_endpoint_url(url)
 
     # 2. validate connection
     try:
-        resp = health_check(client=httpx.Client(base_url=url))
+        resp = health_check(client=httpx.Client(**httpx_client_args(url)))
         if resp.status == "healthy":
             return url, True
     except LabtaskerNetworkError:
@@ -175,7 +183,7 @@ def setup_queue(base_url, base_url_verified) -> Tuple[str, str]:
     # base url connection is available
     auth_headers = get_auth_headers(queue_name, SecretStr(password))
     client = httpx.Client(
-        base_url=base_url,
+        **httpx_client_args(base_url),
         headers={**auth_headers, "Content-Type": "application/json"},
     )
 
@@ -264,7 +272,7 @@ def init():
         with open(get_labtasker_client_config_path(), "r", encoding="utf-8") as f:
             config = ClientConfig.model_validate(tomlkit.load(f))
 
-        config.endpoint.api_base_url = HttpUrl(url)
+        config.endpoint.api_base_url = _validate_endpoint_url(url)
         config.queue.queue_name = queue_name
         config.queue.password = SecretStr(password)
         config.enable_traceback_filter = enable_traceback_filter
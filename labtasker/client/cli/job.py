@@ -0,0 +1,57 @@
+"""Follow background jobs of the current queue (e.g. `labtasker task update --async`)."""
+
+import time
+
+import typer
+from starlette.status import HTTP_404_NOT_FOUND
+
+from labtasker.client.core.api import get_job
+from labtasker.client.core.cli_utils import cli_utils_decorator
+from labtasker.client.core.exceptions import LabtaskerHTTPStatusError
+from labtasker.client.core.logging import stdout_console
+
+app = typer.Typer()
+
+
+@app.callback(invoke_without_command=True)
+def callback(
+    ctx: typer.Context,
+):
+    if not ctx.invoked_subcommand:
+        stdout_console.print(ctx.get_help())
+        raise typer.Exit()
+
+
+@app.command()
+@cli_utils_decorator
+def get(
+    job_id: str = typer.Argument(..., help="ID of the job."),
+    wait: bool = typer.Option(
+        False,
+        "--wait",
+        "-w",
+        help="Wait until the job has finished.",
+    ),
+    poll_interval: float = typer.Option(
+        2.0,
+        help="Interval (in seconds) between status checks when waiting.",
+    ),
+):
+    """
+    Get the status and progress of a background job.
+
+    Example:
+        labtasker job get 2c8f1a7e-6a34-4b6f-9d1e-3f7b0c5d9e21 --wait
+    """
+    try:
+        job = get_job(job_id=job_id)
+        while wait and job.status in ("pending", "running"):
+            time.sleep(poll_interval)
+            job = get_job(job_id=job_id)
+    except LabtaskerHTTPStatusError as e:
+        if e.response.status_code == HTTP_404_NOT_FOUND:
+            raise typer.BadParameter("Job not found")
+        raise e
+    stdout_console.print(job)
+    if job.status == "failed":
+        raise typer.Exit(1)
@@ -5,6 +5,7 @@
 import subprocess
 import sys
 from collections import defaultdict
+from functools import partial
 from pathlib import Path
 from typing import List, Optional
 
@@ -13,10 +14,13 @@
 from typing_extensions import Annotated
 
 from labtasker.client.cli.cli import app
+from labtasker.client.core.api import explain_tasks
 from labtasker.client.core.cli_utils import (
     cli_utils_decorator,
     eta_max_validation,
+    parse_dict,
     parse_filter,
+    print_query_explain,
 )
 from labtasker.client.core.cmd_parser import cmd_interpolate
 from labtasker.client.core.config import get_client_config
@@ -27,6 +31,7 @@
     logger,
     set_verbose,
     stderr_console,
+    stdout_console,
     verbose_print,
 )
 
@@ -161,11 +166,48 @@ def loop(
         None,
         help="Time in seconds before a task is considered stalled if no heartbeat is received.",
     ),
+    affinity: Optional[List[str]] = typer.Option(
+        None,
+        "--affinity",
+        help="Prefer tasks with the same value of this field as the recently run tasks, "
+        "e.g. `--affinity args.dataset` to reuse a loaded dataset. Specify multiple fields via repeating `--affinity`.",
+    ),
+    capacity: Optional[str] = typer.Option(
+        None,
+        "--capacity",
+        help="Only fetch tasks whose `resources` fit the capacity of this machine left by the other loops running on it. "
+        "Either 'auto' (detected cpus and mem_gb) or a Python dictionary (e.g., '{\"gpus\": 2}') merged over the detected capacity.",
+    ),
+    queues: Optional[List[str]] = typer.Option(
+        None,
+        "--queue",
+        help="Serve this queue, as NAME or NAME:WEIGHT (default weight 1). Specify multiple queues via repeating `--queue`, "
+        "e.g. `--queue a:3 --queue b:1`: tasks are claimed in weighted round-robin, moving on to the next queue when one is empty. "
+        "Credentials are taken from the `queue` or `[[queues]]` entries of the client config. Default to the queue of the client config.",
+    ),
+    worker_lease: bool = typer.Option(
+        False,
+        "--worker-lease",
+        help="Hold one lease for the worker, covering all its running tasks, instead of a heartbeat per task. "
+        "Tasks fail if the lease is not renewed within --heartbeat-timeout.",
+    ),
+    worker_channel: bool = typer.Option(
+        False,
+        "--worker-channel",
+        help="Send fetches, task updates, heartbeats and reports over one persistent WebSocket connection "
+        "instead of one HTTP request each. Falls back to HTTP if the server does not support it.",
+    ),
     use_pty: bool = typer.Option(
         os.name == "posix",  # enabled by default on POSIX systems
         callback=_check_pty_available,
         help="Use pseudo terminal on POSIX systems for better interactive program support.",
     ),
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        help="Show the required fields, the filter and the query plan used to fetch tasks, "
+        "without fetching or running any task.",
+    ),
     verbose: bool = typer.Option(  # noqa
         False,
         "--verbose",
@@ -211,6 +253,7 @@ def loop(
         )
 
     parsed_filter = parse_filter(extra_filter)
+    parsed_capacity = capacity if capacity == "auto" else parse_dict(capacity)
     verbose_print(f"Parsed filter: {json.dumps(parsed_filter, indent=4)}")
 
     if heartbeat_timeout is None:
@@ -225,6 +268,28 @@ def loop(
 
     required_fields = list(queried_keys)
 
+    if dry_run:
+        stdout_console.print(f"Command: {input_cmd}")
+        stdout_console.print(f"Required fields: {required_fields}")
+        stdout_console.print(f"Filter: {json.dumps(parsed_filter)}")
+        print_query_explain(
+            partial(
+                explain_tasks,
+                status="pending",
+                extra_filter=parsed_filter,
+                required_fields=required_fields,
+                sort=[
+                    ("priority", -1),
+                    ("sched_rank", 1),
+                    ("last_modified", 1),
+                    ("created_at", 1),
+                ],
+                limit=1,
+            ),
+            verbose=verbose,
+        )
+        raise typer.Exit()
+
     logger.info(f"Got command: {input_cmd}")
 
     @loop_run(
@@ -234,6 +299,11 @@ def loop(
         eta_max=eta_max,
         heartbeat_timeout=heartbeat_timeout,
         pass_args_dict=True,
+        affinity=affinity,
+        capacity=parsed_capacity,
+        queues=queues,
+        worker_lease=worker_lease,
+        worker_channel=worker_channel,
     )
     def run_cmd(args):
         interpolated_cmd, _ = cmd_interpolate(input_cmd, args)
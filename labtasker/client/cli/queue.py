@@ -1,15 +1,22 @@
 """Manage task queues (CRUD operations)"""
 
-from typing import Callable, Optional
+from typing import Callable, List, Optional
 
 import typer
-from starlette.status import HTTP_409_CONFLICT
+from starlette.status import HTTP_404_NOT_FOUND, HTTP_409_CONFLICT
 from typing_extensions import Annotated
 
 from labtasker.client.core.api import (
     create_queue,
+    create_queue_indexes,
     delete_queue,
+    drop_queue_index,
     get_queue,
+    ls_concurrency_limits,
+    ls_queue_indexes,
+    migrate_task_layout,
+    set_concurrency_limit,
+    submit_delete_queue_job,
     update_queue,
 )
 from labtasker.client.core.cli_utils import (
@@ -18,9 +25,22 @@
     parse_metadata,
 )
 from labtasker.client.core.config import get_client_config
+from labtasker.client.core.exceptions import LabtaskerHTTPStatusError
 from labtasker.client.core.logging import stderr_console, stdout_console
 
 app = typer.Typer()
+index_app = typer.Typer()
+app.add_typer(
+    index_app,
+    name="index",
+    help="Manage secondary indexes on task args/metadata paths of current queue.",
+)
+limit_app = typer.Typer()
+app.add_typer(
+    limit_app,
+    name="limit",
+    help="Manage concurrency limits of task groups (by task_name or a metadata field) of current queue.",
+)
 
 
 def handle_queue_create_conflict_err(func: Optional[Callable] = None, /):
@@ -230,12 +250,170 @@ def delete(
         "-y",
         help="Skip confirmation prompt.",
     ),
+    async_job: bool = typer.Option(
+        False,
+        "--async",
+        help="Delete the tasks in a background job on the server (requires --cascade). "
+        "Recommended for big queues.",
+    ),
 ):
     """Delete current queue."""
+    if async_job and not cascade:
+        raise typer.BadParameter("--async requires --cascade.")
     if not yes:
         typer.confirm(
             f"Are you sure you want to delete current queue '{get_queue().queue_name}' with cascade={cascade}?",
             abort=True,
         )
+    if async_job:
+        job_id = submit_delete_queue_job().job_id
+        stdout_console.print(
+            f"Queue deleted. Its tasks are deleted by background job {job_id}."
+        )
+        return
     delete_queue(cascade_delete=cascade)
     stdout_console.print("Queue deleted.")
+
+
+@app.command("migrate-layout")
+@cli_utils_decorator
+def migrate_layout(
+    layout: str = typer.Argument(
+        ...,
+        help="Storage layout of the tasks of the queue: `shared` (the tasks collection shared by all queues) "
+        "or `partitioned` (a tasks collection of the queue's own).",
+    ),
+):
+    """
+    Move the tasks of current queue to the tasks collection of another storage layout.
+
+    The queue stays online during the migration.
+
+    Example:
+        labtasker queue migrate-layout partitioned
+    """
+    if layout not in ("shared", "partitioned"):
+        raise typer.BadParameter("Layout must be one of: shared, partitioned")
+    resp = migrate_task_layout(layout=layout)
+    stdout_console.print(
+        f"Queue layout is now {resp.task_layout!r}. Moved {resp.moved} tasks."
+    )
+
+
+@index_app.callback(invoke_without_command=True)
+def index_callback(
+    ctx: typer.Context,
+):
+    if not ctx.invoked_subcommand:
+        stdout_console.print(ctx.get_help())
+        raise typer.Exit()
+
+
+@index_app.command("create")
+@cli_utils_decorator
+def index_create(
+    paths: List[str] = typer.Argument(
+        ...,
+        help="Dot-separated task field paths under `args.` or `metadata.` to index.",
+    ),
+):
+    """
+    Create secondary indexes to speed up fetching and listing tasks filtered by args/metadata fields.
+
+    Example:
+        labtasker queue index create args.dataset metadata.tag
+    """
+    resp = create_queue_indexes(paths=paths)
+    stdout_console.print(
+        f"Indexes of current queue: {[index.path for index in resp.content]}"
+    )
+
+
+@index_app.command("ls")
+@cli_utils_decorator
+def index_ls():
+    """List secondary indexes of current queue, with their sizes if available."""
+    resp = ls_queue_indexes()
+    for index in resp.content:
+        size = f"{index.size / 1024:.1f} KiB" if index.size is not None else "N/A"
+        stdout_console.print(f"{index.path}\tsize: {size}")
+
+
+@index_app.command("drop")
+@cli_utils_decorator
+def index_drop(
+    paths: List[str] = typer.Argument(..., help="Index paths to drop."),
+):
+    """Drop secondary indexes of current queue."""
+    try:
+        for path in paths:
+            drop_queue_index(path=path)
+            stdout_console.print(f"Index {path} dropped.")
+    except LabtaskerHTTPStatusError as e:
+        if e.response.status_code == HTTP_404_NOT_FOUND:
+            raise typer.BadParameter("Index not found")
+        else:
+            raise e
+
+
+@limit_app.callback(invoke_without_command=True)
+def limit_callback(
+    ctx: typer.Context,
+):
+    if not ctx.invoked_subcommand:
+        stdout_console.print(ctx.get_help())
+        raise typer.Exit()
+
+
+def _print_limits(resp):
+    for limit in resp.content:
+        value = "*" if limit.value is None else limit.value
+        stdout_console.print(f"{limit.key}={value}\tlimit: {limit.limit}")
+    for usage in resp.running:
+        stdout_console.print(f"{usage.key}={usage.value}\trunning: {usage.running}")
+
+
+@limit_app.command("set")
+@cli_utils_decorator
+def limit_set(
+    key: str = typer.Argument(
+        ...,
+        help="`task_name` or a dot-separated path under `metadata.` (e.g. metadata.license).",
+    ),
+    limit: int = typer.Argument(..., min=1, help="Maximum number of running tasks."),
+    value: Optional[str] = typer.Option(
+        None,
+        "--value",
+        help="Limit only the group with this value of the key. "
+        "By default, the limit applies to each value of the key separately.",
+    ),
+):
+    """
+    Limit the number of tasks of a group running at once, across all workers.
+
+    Examples:
+        labtasker queue limit set task_name 4 --value render    # at most 4 running `render` tasks
+        labtasker queue limit set metadata.license 2             # at most 2 running tasks per license
+    """
+    resp = set_concurrency_limit(key=key, limit=limit, value=value)
+    _print_limits(resp)
+
+
+@limit_app.command("ls")
+@cli_utils_decorator
+def limit_ls():
+    """List concurrency limits of current queue, with the number of running tasks."""
+    _print_limits(ls_concurrency_limits())
+
+
+@limit_app.command("rm")
+@cli_utils_decorator
+def limit_rm(
+    key: str = typer.Argument(..., help="Key of the limit to remove."),
+    value: Optional[str] = typer.Option(
+        None, "--value", help="Value of the limit to remove."
+    ),
+):
+    """Remove a concurrency limit of current queue."""
+    set_concurrency_limit(key=key, limit=None, value=value)
+    stdout_console.print("Limit removed.")
@@ -0,0 +1,227 @@
+"""Manage parameter sweeps (lazy task templates)."""
+
+import sys
+from typing import List, Optional
+
+import click
+import typer
+from starlette.status import HTTP_404_NOT_FOUND
+
+from labtasker.api_models import Sweep
+from labtasker.client.core.api import create_sweep, delete_sweep, get_queue, ls_sweeps
+from labtasker.client.core.cli_utils import (
+    LsFmtChoices,
+    cli_utils_decorator,
+    ls_format_iter,
+    pager_iterator,
+    parse_dict,
+    parse_metadata,
+)
+from labtasker.client.core.exceptions import LabtaskerHTTPStatusError
+from labtasker.client.core.logging import stdout_console
+from labtasker.constants import Priority
+
+app = typer.Typer()
+
+
+@app.callback(invoke_without_command=True)
+def callback(
+    ctx: typer.Context,
+):
+    if not ctx.invoked_subcommand:
+        stdout_console.print(ctx.get_help())
+        raise typer.Exit()
+
+
+@app.command()
+@cli_utils_decorator
+def create(
+    axes: str = typer.Option(
+        ...,
+        "--axes",
+        help='Axes as a Python dictionary of dot-separated arg names to value lists (e.g., \'{"lr": [0.1, 0.01], "model.depth": [2, 4]}\').',
+    ),
+    mode: str = typer.Option(
+        "grid",
+        help="How points are generated from the axes. One of `grid`, `zip`, `random`.",
+    ),
+    num_samples: Optional[int] = typer.Option(
+        None,
+        help="Number of points to sample. Required by `random` mode.",
+    ),
+    seed: int = typer.Option(
+        0,
+        help="Random seed used by `random` mode.",
+    ),
+    task_name: Optional[str] = typer.Option(
+        None,
+        "--task-name",
+        "--name",
+        help="Name of the tasks materialized from this sweep.",
+    ),
+    option_args: Optional[str] = typer.Option(
+        None,
+        "--args",
+        help='Base arguments shared by every point as a Python dictionary (e.g., \'{"dataset": "mnist"}\').',
+    ),
+    metadata: Optional[str] = typer.Option(
+        None,
+        help="Metadata of the materialized tasks as a Python dictionary.",
+    ),
+    cmd: Optional[str] = typer.Option(
+        None,
+        help="Command string to execute the materialized tasks.",
+    ),
+    heartbeat_timeout: Optional[float] = typer.Option(
+        60,
+        help="Time in seconds before a task is considered failed if no heartbeat is received.",
+    ),
+    task_timeout: Optional[int] = typer.Option(
+        None,
+        help="Maximum allowed execution time for each task in seconds.",
+    ),
+    max_retries: Optional[int] = typer.Option(
+        3,
+        help="Number of retry attempts if a task fails.",
+    ),
+    priority: Optional[int] = typer.Option(
+        Priority.MEDIUM,
+        help="Priority of the materialized tasks (higher numbers = higher priority).",
+    ),
+    resources: Optional[str] = typer.Option(
+        None,
+        help="Resource requests of the materialized tasks as a Python dictionary (e.g., '{\"cpus\": 4}').",
+    ),
+    quiet: bool = typer.Option(
+        False,
+        "--quiet",
+        "-q",
+        help="Output only the sweep ID, useful for scripting.",
+    ),
+):
+    """
+    Create a parameter sweep.
+
+    Points of the sweep are not stored as tasks up front. Each point is materialized
+    into a concrete task when a worker fetches it.
+
+    Examples:
+        labtasker sweep create --args '{"dataset": "mnist"}' --axes '{"lr": [0.1, 0.01], "seed": [0, 1, 2]}'
+        labtasker sweep create --mode random --num-samples 50 --axes '{"lr": [0.1, 0.01, 0.001]}'
+    """
+    axes_dict = parse_dict(axes)
+    if not axes_dict:
+        raise typer.BadParameter("At least one axis must be specified.")
+
+    resp = create_sweep(
+        axes=axes_dict,
+        mode=mode,
+        num_samples=num_samples,
+        seed=seed,
+        task_name=task_name,
+        args=parse_dict(option_args) if option_args else None,
+        metadata=parse_metadata(metadata) if metadata else None,
+        cmd=cmd,
+        heartbeat_timeout=heartbeat_timeout,
+        task_timeout=task_timeout,
+        max_retries=max_retries,
+        priority=priority,
+        resources=parse_dict(resources) if resources else None,
+    )
+
+    if quiet:
+        stdout_console.print(resp.sweep_id)
+    else:
+        stdout_console.print(
+            f"Sweep created with ID: {resp.sweep_id} ({resp.total} points)"
+        )
+
+
+@app.command()
+@cli_utils_decorator
+def ls(
+    quiet: bool = typer.Option(
+        False,
+        "--quiet",
+        "-q",
+        help="Only show sweep IDs, rather than full entry.",
+    ),
+    pager: bool = typer.Option(
+        True,
+        help="Enable pagination.",
+    ),
+    limit: int = typer.Option(
+        100,
+        help="Limit the number of sweeps returned.",
+    ),
+    offset: int = typer.Option(
+        0,
+        help="Initial offset for pagination.",
+    ),
+    fmt: LsFmtChoices = typer.Option(
+        "yaml",
+        help="Output format. One of `yaml`, `jsonl`.",
+    ),
+):
+    """
+    List sweeps of the queue.
+    """
+    if quiet:
+        pager = False
+
+    get_queue()  # validate auth and queue existence, prevent err swallowed by pager
+
+    page_iter = pager_iterator(
+        fetch_function=ls_sweeps,
+        offset=offset,
+        limit=limit,
+    )
+
+    if quiet:
+        for item in page_iter:
+            item: Sweep
+            stdout_console.print(item.sweep_id)
+        raise typer.Exit()  # exit directly without other printing
+
+    if pager:
+        click.echo_via_pager(
+            ls_format_iter[fmt](
+                page_iter,
+                use_rich=False,
+            )
+        )
+    else:
+        for item in ls_format_iter[fmt](
+            page_iter,
+            use_rich=True,
+        ):
+            stdout_console.print(item)
+
+
+@app.command()
+@cli_utils_decorator
+def delete(
+    sweep_ids: List[str] = typer.Argument(
+        ... if sys.stdin.isatty() else None, help="IDs of the sweep to delete."
+    ),
+    yes: bool = typer.Option(False, "--yes", "-y", help="Confirm the operation."),
+):
+    """
+    Delete a sweep. Tasks already materialized from it are kept.
+    """
+    if sweep_ids is None:  # read from stdin to support piping
+        sweep_ids = [line.strip() for line in sys.stdin.readlines() if line.strip()]
+    if not yes:
+        typer.confirm(
+            f"Are you sure you want to delete sweep '{sweep_ids}'?",
+            abort=True,
+        )
+    try:
+        for sweep_id in sweep_ids:
+            delete_sweep(sweep_id=sweep_id)
+            stdout_console.print(f"Sweep {sweep_id} deleted.")
+    except LabtaskerHTTPStatusError as e:
+        if e.response.status_code == HTTP_404_NOT_FOUND:
+            raise typer.BadParameter("Sweep not found")
+        else:
+            raise e
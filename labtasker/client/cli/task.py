@@ -19,16 +19,19 @@
 from starlette.status import HTTP_404_NOT_FOUND
 from typing_extensions import Annotated
 
-from labtasker.api_models import Task, TaskUpdateRequest
+from labtasker.api_models import Task, TaskLsResponse, TaskUpdateRequest
 from labtasker.client.core.api import (
     delete_task,
+    explain_tasks,
     get_queue,
     ls_tasks,
     submit_task,
+    submit_update_tasks_job,
     update_tasks,
 )
 from labtasker.client.core.cli_utils import (
     LsFmtChoices,
+    check_server_connection,
     cli_utils_decorator,
     confirm,
     ls_format_iter,
@@ -39,6 +42,7 @@
     parse_metadata,
     parse_sort,
     parse_updates,
+    print_query_explain,
 )
 from labtasker.client.core.exceptions import LabtaskerHTTPStatusError
 from labtasker.client.core.logging import (
@@ -47,6 +51,7 @@
     stdout_console,
     verbose_print,
 )
+from labtasker.client.core.task_cache import TaskCache
 from labtasker.constants import Priority
 
 app = typer.Typer()
@@ -169,6 +174,11 @@ def submit(
         Priority.MEDIUM,
         help="Task priority (higher numbers = higher priority). Default is medium priority.",
     ),
+    resources: Optional[str] = typer.Option(
+        None,
+        help='Resource requests of the task as a Python dictionary (e.g., \'{"cpus": 4, "mem_gb": 64}\'). '
+        "Only workers started with enough `--capacity` fetch the task.",
+    ),
 ):
     """
     Submit a new task to the queue for processing.
@@ -179,6 +189,7 @@ def submit(
     Examples:
         labtasker task submit --name "process-batch-5" -- --input data.csv --output results/
         labtasker task submit --name "train-model" --args '{"dataset": "mnist", "epochs": 10}'
+        labtasker task submit --resources '{"cpus": 4, "mem_gb": 64}' -- --input data.csv
     """
     if args and option_args:
         raise typer.BadParameter(
@@ -198,12 +209,13 @@ def submit(
         task_timeout=task_timeout,
         max_retries=max_retries,
         priority=priority,
+        resources=parse_dict(resources) if resources else None,
     )
     stdout_console.print(f"Task submitted with ID: {task_id}")
 
 
 @app.command()
-@cli_utils_decorator
+@cli_utils_decorator(enable_requires_server_connection=False)  # allows --offline
 def ls(
     task_id: Optional[str] = typer.Option(
         None,
@@ -260,6 +272,22 @@ def ls(
         "yaml",
         help="Output format. One of `yaml`, `jsonl`.",
     ),
+    explain: bool = typer.Option(
+        False,
+        "--explain",
+        help="Show the query plan of the filter on the server instead of listing tasks.",
+    ),
+    cached: bool = typer.Option(
+        False,
+        "--cached",
+        help="Sync the local task cache incrementally and query it, "
+        "instead of searching on the server.",
+    ),
+    offline: bool = typer.Option(
+        False,
+        "--offline",
+        help="Query the local task cache without contacting the server.",
+    ),
     verbose: bool = typer.Option(
         False,
         "--verbose",
@@ -281,6 +309,8 @@ def ls(
         labtasker task ls --name "training-job"          # Filter by task name
         labtasker task ls -f 'priority > 5'              # Filter by priority
         labtasker task ls -S 'created_at:desc'           # Sort by creation time
+        labtasker task ls -f 'args.lr > 0.1' --explain   # Show the query plan of a filter
+        labtasker task ls --cached -s running            # Query the synced local cache
     """
     if quiet:
         if verbose:
@@ -289,6 +319,11 @@ def ls(
             )
         pager = False
 
+    if explain and (cached or offline):
+        raise typer.BadParameter(
+            "--explain cannot be used together with --cached or --offline."
+        )
+
     if not sort:
         parsed_sort = [
             ("priority", -1),
@@ -298,22 +333,74 @@ def ls(
     else:
         parsed_sort = parse_sort(sort)
 
-    get_queue()  # validate auth and queue existence, prevent err swallowed by pager
+    if not offline:
+        check_server_connection()
+        get_queue()  # validate auth and queue existence, prevent err swallowed by pager
 
     extra_filter = parse_filter(extra_filter)
     verbose_print(f"Parsed filter: {json.dumps(extra_filter, indent=4)}")
-    page_iter = pager_iterator(
-        fetch_function=partial(
-            ls_tasks,
-            task_id=task_id,
-            task_name=task_name,
-            status=status,
-            extra_filter=extra_filter,
-            sort=parsed_sort,
-        ),
-        offset=offset,
-        limit=limit,
-    )
+
+    if explain:
+        print_query_explain(
+            partial(
+                explain_tasks,
+                task_id=task_id,
+                task_name=task_name,
+                status=status,
+                extra_filter=extra_filter,
+                sort=parsed_sort,
+                limit=limit,
+                offset=offset,
+            ),
+            verbose=verbose,
+        )
+        raise typer.Exit()
+
+    sweep_points: Dict[str, int] = {}  # reported along with the first page
+    if cached or offline:
+        task_cache = TaskCache()
+        if not offline:
+            n_changes = task_cache.sync()
+            verbose_print(f"Synced {n_changes} change(s) to the local task cache.")
+        elif task_cache.synced_at is None:
+            raise typer.BadParameter(
+                "The local task cache is empty. Run with --cached first to sync it."
+            )
+        else:
+            stderr_console.print(
+                f"[dim]Note: showing the local task cache synced at "
+                f"{task_cache.synced_at.astimezone().strftime('%Y-%m-%d %H:%M:%S')}.[/dim]"
+            )
+        page_iter = iter(
+            task_cache.query(
+                task_id=task_id,
+                task_name=task_name,
+                status=status,
+                extra_filter=extra_filter,
+                sort=parsed_sort,
+                limit=limit,
+                offset=offset,
+            )
+        )
+    else:
+
+        def fetch_page(limit: int, offset: int) -> TaskLsResponse:
+            response = ls_tasks(
+                task_id=task_id,
+                task_name=task_name,
+                status=status,
+                extra_filter=extra_filter,
+                sort=parsed_sort,
+                limit=limit,
+                offset=offset,
+            )
+            sweep_points.setdefault("virtual_pending", response.virtual_pending)
+            sweep_points.setdefault("active_sweeps", response.active_sweeps)
+            return response
+
+        page_iter = pager_iterator(
+            fetch_function=fetch_page, offset=offset, limit=limit
+        )
 
     if quiet:
         for item in page_iter:
@@ -334,6 +421,13 @@ def ls(
         ):
             stdout_console.print(item)
 
+    if sweep_points.get("virtual_pending"):
+        stderr_console.print(
+            f"[dim]Note: {sweep_points['virtual_pending']} more pending task(s) from "
+            f"{sweep_points['active_sweeps']} sweep(s) are not materialized yet. "
+            f"See `labtasker sweep ls`.[/dim]"
+        )
+
 
 @app.command()
 @cli_utils_decorator
@@ -391,6 +485,12 @@ def update(
         False,
         help="Reset pending tasks to pending after updating.",
     ),
+    async_job: bool = typer.Option(
+        False,
+        "--async",
+        help="Update all the matching tasks (regardless of --limit) in a background job on the server. "
+        "Requires the updates to be specified. Follow the job with `labtasker job get`.",
+    ),
     quiet: bool = typer.Option(
         False,
         "--quiet",
@@ -445,6 +545,33 @@ def update(
     if reset_pending:
         readonly_fields.update({"status", "retries"})
 
+    if async_job:
+        if not updates:
+            raise typer.BadParameter("You must specify the updates when using --async.")
+        replace_fields, update_dict = parse_updates(
+            updates, top_level_fields=list(TaskUpdateRequest.model_fields.keys())  # type: ignore
+        )
+        if not confirm(
+            "Update all the tasks matching the filter in a background job?",
+            quiet=quiet,
+            default=True,
+        ):
+            raise typer.Abort()
+        job_id = submit_update_tasks_job(
+            update=update_dict,
+            replace_fields=replace_fields,
+            task_id=task_id,
+            task_name=task_name,
+            status=status,
+            extra_filter=extra_filter,
+            reset_pending=reset_pending,
+        ).job_id
+        stdout_console.print(
+            f"Tasks are updated by background job {job_id}. "
+            f"Run `labtasker job get {job_id}` to follow it."
+        )
+        return
+
     old_tasks = ls_tasks(
         task_id=task_id,
         task_name=task_name,
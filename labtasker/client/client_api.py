@@ -1,15 +1,22 @@
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 from labtasker.client.core.api import *  # noqa: F403
-from labtasker.client.core.context import current_task_id, current_worker_id, task_info
+from labtasker.client.core.context import (
+    current_queue_name,
+    current_task_id,
+    current_worker_id,
+    task_info,
+)
 from labtasker.client.core.events import EventListener, connect_events
 from labtasker.client.core.exceptions import LabtaskerTypeError, LabtaskerValueError
 from labtasker.client.core.job_runner import (
     finish,
     loop_run,
+    report_progress,
     set_loop_internal_error_handler,
     set_prompt_on_task_failure,
 )
+from labtasker.client.core.queue_pool import QueuePool
 from labtasker.client.core.resolver import (
     Required,
     get_params_from_function,
@@ -22,13 +29,16 @@
     # python job runner api
     "loop",
     "finish",
+    "report_progress",
     "set_loop_internal_error_handler",
     "set_prompt_on_task_failure",
     "Required",
+    "QueuePool",
     # context api
     "task_info",
     "current_task_id",
     "current_worker_id",
+    "current_queue_name",
     # event api
     "connect_events",
     "EventListener",
@@ -46,9 +56,27 @@
     "get_queue",
     "health_check",
     "ls_tasks",
+    "explain_tasks",
+    "ls_task_changes",
     "ls_workers",
     "refresh_task_heartbeat",
+    "renew_worker_lease",
     "report_task_status",
+    "create_sweep",
+    "ls_sweeps",
+    "delete_sweep",
+    "get_queue_stats",
+    "create_queue_indexes",
+    "ls_queue_indexes",
+    "drop_queue_index",
+    "set_concurrency_limit",
+    "ls_concurrency_limits",
+    "migrate_task_layout",
+    "submit_delete_queue_job",
+    "submit_update_tasks_job",
+    "get_job",
+    "batch",
+    "worker_channel",
 ]
 
 
@@ -61,6 +89,10 @@ def loop(
     eta_max: Optional[str] = None,
     heartbeat_timeout: Optional[float] = None,
     pass_args_dict: bool = False,
+    affinity: Optional[List[str]] = None,
+    capacity: Optional[Union[str, Dict[str, float]]] = None,
+    queues: Optional[Sequence[Union[str, Tuple[str, int]]]] = None,
+    worker_lease: bool = False,
 ):
     """Continuously run the wrapped job function with fetched task arguments until no tasks available.
 
@@ -73,6 +105,17 @@ def loop(
         eta_max: Maximum ETA for task execution.
         heartbeat_timeout: Heartbeat timeout in seconds. Default to 3 times the send interval.
         pass_args_dict: If True, passes task_info().args as first argument
+        affinity: Dot-separated task field paths (e.g. ["args.dataset"]). Tasks with the same values
+            as the recently run tasks are preferred, to reuse what the worker has loaded.
+        capacity: Resource capacity of this machine, "auto" (detected cpus and mem_gb) or a dict
+            (e.g. {"gpus": 2}, merged over the detected capacity). Only tasks whose resource
+            requests fit the capacity left by the other loops running on this machine are fetched.
+        queues: Queues to serve from this process, as "NAME[:WEIGHT]" or (NAME, WEIGHT), e.g. ["a:3", "b:1"].
+            Tasks are claimed in weighted round-robin, moving on to the next queue when one is empty.
+            The credentials of each queue are taken from the `queue` or `queues` entries of the client
+            config. Default to the queue of the client config.
+        worker_lease: If True, the worker holds one lease covering all its running tasks, renewed
+            every `task.heartbeat_interval` seconds, instead of sending a heartbeat per task.
 
     Returns:
         The decorated function
@@ -124,6 +167,10 @@ def decorator(func):
             eta_max=eta_max,
             heartbeat_timeout=heartbeat_timeout,
             pass_args_dict=True,
+            affinity=affinity,
+            capacity=capacity,
+            queues=queues,
+            worker_lease=worker_lease,
         )(func)
 
     return decorator
@@ -1,16 +1,40 @@
-from functools import wraps
-from typing import Any, Dict, List, Optional, Tuple, Union
+import time
+from contextlib import contextmanager
+from functools import partialmethod, wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import httpx
 import stamina
+from pydantic import BaseModel
 from starlette.status import HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN, HTTP_409_CONFLICT
 
 from labtasker.api_models import (
+    BatchOperation,
+    BatchRequest,
+    BatchResponse,
+    EventResponse,
     HealthCheckResponse,
+    HeartbeatRequest,
+    HeartbeatResponse,
+    Job,
+    JobSubmitResponse,
+    QueryExplainResponse,
     QueueCreateRequest,
     QueueCreateResponse,
     QueueGetResponse,
+    QueueIndexCreateRequest,
+    QueueIndexLsResponse,
+    QueueLayoutUpdateRequest,
+    QueueLayoutUpdateResponse,
+    QueueLimitLsResponse,
+    QueueLimitSetRequest,
+    QueueStatsResponse,
     QueueUpdateRequest,
+    SweepCreateRequest,
+    SweepCreateResponse,
+    SweepLsResponse,
+    TaskChangesResponse,
+    TaskExplainRequest,
     TaskFetchRequest,
     TaskFetchResponse,
     TaskLsRequest,
@@ -18,28 +42,53 @@
     TaskStatusUpdateRequest,
     TaskSubmitRequest,
     TaskSubmitResponse,
+    TaskUpdateJobRequest,
     TaskUpdateRequest,
+    Worker,
     WorkerCreateRequest,
     WorkerCreateResponse,
+    WorkerLeaseRenewRequest,
     WorkerLsRequest,
     WorkerLsResponse,
     WorkerStatusUpdateRequest,
 )
-from labtasker.client.core.config import get_client_config
+from labtasker.client.core.channel import (
+    ChannelClosed,
+    WorkerChannel,
+    connect_worker_channel,
+)
+from labtasker.client.core.config import (
+    QueueConfig,
+    get_client_config,
+    get_queue_config,
+    unix_socket_path,
+)
+from labtasker.client.core.context import current_queue_name
 from labtasker.client.core.exceptions import (
     LabtaskerRuntimeError,
     LabtaskerValueError,
     WorkerSuspended,
 )
+from labtasker.client.core.logging import logger
 from labtasker.client.core.utils import (
     cast_http_error,
+    decode_response,
     display_server_notifications,
     raise_for_status,
+    retry_after,
 )
 from labtasker.constants import Priority
+from labtasker.content_encoding import GZIP
+from labtasker.content_encoding import compress as compress_body
+from labtasker.content_encoding import supported_encodings
+from labtasker.msgpack_codec import MSGPACK_MEDIA_TYPE, is_msgpack, packb
 from labtasker.security import SecretStr, get_auth_headers
 
 _httpx_client: Optional[httpx.Client] = None
+# clients of the queues other than the one of the client config, by queue name
+_queue_httpx_clients: Dict[str, httpx.Client] = {}
+# open worker channels, by the client whose worker operations they carry
+_worker_channels: Dict[httpx.Client, WorkerChannel] = {}
 
 __all__ = [
     "get_httpx_client",
@@ -52,19 +101,66 @@
     "fetch_task",
     "report_task_status",
     "refresh_task_heartbeat",
+    "renew_worker_lease",
     "create_worker",
     "ls_workers",
     "report_worker_status",
     "ls_tasks",
+    "explain_tasks",
+    "ls_task_changes",
     "update_tasks",
     "delete_task",
     "update_queue",
     "delete_worker",
+    "create_sweep",
+    "ls_sweeps",
+    "delete_sweep",
+    "get_queue_stats",
+    "create_queue_indexes",
+    "ls_queue_indexes",
+    "drop_queue_index",
+    "set_concurrency_limit",
+    "ls_concurrency_limits",
+    "migrate_task_layout",
+    "submit_delete_queue_job",
+    "submit_update_tasks_job",
+    "get_job",
+    "batch",
+    "worker_channel",
 ]
 
 
+# Base URL of the requests to a server over its Unix domain socket
+UDS_BASE_URL = "http://localhost"
+
+# Max number of attempts of a request rejected by a busy server (429 with Retry-After)
+SERVER_BUSY_ATTEMPTS = 10
+
+
+def _server_busy_retry(func):
+    """Retry a request rejected by a busy server after the delay it asks for. The rejected
+    request is not processed by the server, so that this is safe for any request."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, SERVER_BUSY_ATTEMPTS + 1):
+            try:
+                return func(*args, **kwargs)
+            except httpx.HTTPStatusError as e:
+                delay = retry_after(e)
+                if delay is None or attempt == SERVER_BUSY_ATTEMPTS:
+                    raise
+                logger.debug(
+                    f"Server busy. Retrying {func.__name__} in {delay:.1f} seconds..."
+                )
+                time.sleep(delay)
+
+    return wrapper
+
+
 def _network_err_retry(func):
     @wraps(func)
+    @_server_busy_retry
     def wrapper(*args, **kwargs):
         return stamina.retry(
             on=httpx.TransportError, attempts=5, wait_initial=0.5, wait_max=10.0
@@ -73,25 +169,108 @@ def wrapper(*args, **kwargs):
     return wrapper
 
 
+def _worker_request(
+    client: httpx.Client,
+    op: str,
+    op_params: Dict[str, Any],
+    method: str,
+    url: str,
+    json: Any = None,
+    params: Optional[Dict[str, Any]] = None,
+) -> httpx.Response:
+    """Send a worker operation over the worker channel of the client if one is open (see
+    `worker_channel`), else as the equivalent HTTP request."""
+    channel = _worker_channels.get(client)
+    if channel is not None:
+        request = client.build_request(method, url, params=params)
+        try:
+            return channel.request(op, op_params, request)
+        except ChannelClosed:
+            pass  # over HTTP instead
+    return client.request(method, url, json=json, params=params)
+
+
+class NegotiatingClient(httpx.Client):
+    """httpx client negotiating the MessagePack wire format (see labtasker.msgpack_codec)
+    and the compression of responses (see labtasker.content_encoding).
+
+    Responses are requested as MessagePack, falling back to JSON with servers without it.
+    Request bodies are sent as MessagePack once the server has replied with it.
+    """
+
+    # path of the Unix domain socket of the server, if connected through one
+    uds: Optional[str] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.headers["Accept"] = f"{MSGPACK_MEDIA_TYPE}, application/json"
+        self.headers["Accept-Encoding"] = ", ".join(supported_encodings())
+        self.server_msgpack = False
+
+    def build_request(self, method, url, *, json=None, headers=None, **kwargs):
+        if json is not None and self.server_msgpack:
+            headers = httpx.Headers(headers)
+            headers["Content-Type"] = MSGPACK_MEDIA_TYPE
+            kwargs["content"] = packb(json)
+            return super().build_request(method, url, headers=headers, **kwargs)
+        return super().build_request(method, url, json=json, headers=headers, **kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if not self.server_msgpack and is_msgpack(response.headers.get("content-type")):
+            self.server_msgpack = True
+        return response
+
+
 def get_httpx_client() -> httpx.Client:
-    """Lazily initialize httpx client."""
+    """Lazily initialize httpx client.
+
+    The client authenticates against the current queue (see `current_queue_name()`),
+    which defaults to the queue of the client config.
+    """
     global _httpx_client
+    queue_name = current_queue_name()
+    config = get_client_config()
+    if queue_name is not None and queue_name != config.queue.queue_name:
+        if queue_name not in _queue_httpx_clients:
+            _queue_httpx_clients[queue_name] = _new_httpx_client(
+                get_queue_config(queue_name)
+            )
+        return _queue_httpx_clients[queue_name]
     if _httpx_client is None:
-        config = get_client_config()
-        auth_headers = get_auth_headers(config.queue.queue_name, config.queue.password)
-        _httpx_client = httpx.Client(
-            base_url=str(config.endpoint.api_base_url),
-            headers={**auth_headers, "Content-Type": "application/json"},
-        )
+        _httpx_client = _new_httpx_client(config.queue)
     return _httpx_client
 
 
+def _new_httpx_client(queue: QueueConfig) -> httpx.Client:
+    auth_headers = get_auth_headers(queue.queue_name, queue.password)
+    base_url = get_client_config().endpoint.api_base_url
+    client = NegotiatingClient(
+        **httpx_client_args(base_url),
+        headers={**auth_headers, "Content-Type": "application/json"},
+    )
+    client.uds = unix_socket_path(base_url)
+    return client
+
+
+def httpx_client_args(base_url: Any) -> Dict[str, Any]:
+    """Arguments of an httpx client connecting to a server URL, either an HTTP(S) URL or the
+    `unix://` URL of the Unix domain socket of a server on the same machine."""
+    uds = unix_socket_path(base_url)
+    if uds is None:
+        return {"base_url": str(base_url)}
+    return {"base_url": UDS_BASE_URL, "transport": httpx.HTTPTransport(uds=uds)}
+
+
 def close_httpx_client():
-    """Close the httpx client."""
+    """Close the httpx clients."""
     global _httpx_client
     if _httpx_client is not None:
         _httpx_client.close()
         _httpx_client = None
+    for client in _queue_httpx_clients.values():
+        client.close()
+    _queue_httpx_clients.clear()
 
 
 @display_server_notifications
@@ -102,7 +281,7 @@ def health_check(client: Optional[httpx.Client] = None) -> HealthCheckResponse:
         client = get_httpx_client()
     response = client.get("/health/full")
     raise_for_status(response)
-    return HealthCheckResponse(**response.json())
+    return HealthCheckResponse(**decode_response(response))
 
 
 @display_server_notifications
@@ -123,18 +302,19 @@ def create_queue(
     ).to_request_dict()  # Convert to dict for JSON serialization
     response = client.post("/api/v1/queues", json=payload)
     raise_for_status(response)
-    return QueueCreateResponse(**response.json())
+    return QueueCreateResponse(**decode_response(response))
 
 
 @display_server_notifications
 @cast_http_error
+@_server_busy_retry
 def get_queue(client: Optional[httpx.Client] = None) -> QueueGetResponse:
     """Get queue information."""
     if client is None:
         client = get_httpx_client()
     response = client.get("/api/v1/queues/me")
     raise_for_status(response)
-    return QueueGetResponse(**response.json())
+    return QueueGetResponse(**decode_response(response))
 
 
 @cast_http_error
@@ -161,9 +341,14 @@ def submit_task(
     task_timeout: Optional[int] = None,
     max_retries: int = 3,
     priority: int = Priority.MEDIUM,
+    resources: Optional[Dict[str, float]] = None,
     client: Optional[httpx.Client] = None,
 ) -> TaskSubmitResponse:
-    """Submit a task to the queue."""
+    """Submit a task to the queue.
+
+    `resources` are the resource requests of the task (e.g. {"cpus": 4, "mem_gb": 64}).
+    The task is only handed out to workers with enough free capacity.
+    """
     if client is None:
         client = get_httpx_client()
 
@@ -179,10 +364,11 @@ def submit_task(
         task_timeout=task_timeout,
         max_retries=max_retries,
         priority=priority,
+        resources=resources,
     ).model_dump()  # Convert to dict for JSON serialization
     response = client.post("/api/v1/queues/me/tasks", json=payload)
     raise_for_status(response)
-    return TaskSubmitResponse(**response.json())
+    return TaskSubmitResponse(**decode_response(response))
 
 
 @display_server_notifications
@@ -194,9 +380,20 @@ def fetch_task(
     start_heartbeat: bool = True,
     required_fields: Optional[List[str]] = None,
     extra_filter: Optional[Dict[str, Any]] = None,
+    affinity: Optional[Dict[str, List[Any]]] = None,
+    capacity: Optional[Dict[str, float]] = None,
+    fit: str = "best",
     client: Optional[httpx.Client] = None,
 ) -> TaskFetchResponse:
-    """Fetch the next available task from the queue."""
+    """Fetch the next available task from the queue.
+
+    `affinity` maps task field paths to the values this worker has warm (e.g.
+    {"args.dataset": ["imagenet"]}). Matching tasks are preferred by the server.
+
+    `capacity` is the free capacity of this worker (e.g. {"cpus": 8, "mem_gb": 32}). Only
+    tasks whose resource requests fit are handed out, the tightest fit first (`fit="best"`)
+    or in queue order (`fit="first"`).
+    """
     if client is None:
         client = get_httpx_client()
 
@@ -212,14 +409,19 @@ def fetch_task(
         start_heartbeat=start_heartbeat,
         required_fields=required_fields,
         extra_filter=extra_filter,
+        affinity=affinity,
+        capacity=capacity,
+        fit=fit,
     ).model_dump()
-    response = client.post("/api/v1/queues/me/tasks/next", json=payload)
+    response = _worker_request(
+        client, "fetch_task", payload, "POST", "/api/v1/queues/me/tasks/next", payload
+    )
     if response.status_code == HTTP_403_FORBIDDEN:
         raise WorkerSuspended(
             "Current worker could be halted due to exceeding max failure counts."
         )
     raise_for_status(response)
-    return TaskFetchResponse(**response.json())
+    return TaskFetchResponse(**decode_response(response))
 
 
 @cast_http_error
@@ -253,7 +455,14 @@ def report_task_status(
         worker_id=worker_id,
         summary=summary,
     ).model_dump()
-    response = client.post(f"/api/v1/queues/me/tasks/{task_id}/status", json=payload)
+    response = _worker_request(
+        client,
+        "report_task_status",
+        {"task_id": task_id, **payload},
+        "POST",
+        f"/api/v1/queues/me/tasks/{task_id}/status",
+        payload,
+    )
     if response.status_code == HTTP_409_CONFLICT:
         raise LabtaskerRuntimeError(
             "Current task is assigned to a different worker.\n"
@@ -266,16 +475,43 @@ def report_task_status(
 @_network_err_retry
 def refresh_task_heartbeat(
     task_id: str,
+    progress: Optional[Dict[str, Any]] = None,
     client: Optional[httpx.Client] = None,
-) -> None:
-    """Refresh the heartbeat of a task."""
+) -> Optional[HeartbeatResponse]:
+    """Refresh the heartbeat of a task.
+
+    Args:
+        task_id:
+        progress: Latest progress of the task, set as its `summary.progress` with the heartbeat.
+        client:
+
+    Returns:
+        The interval recommended by the server until the next heartbeat, or None if the server
+        does not recommend one.
+    """
     if client is None:
         client = get_httpx_client()
-    response = client.post(f"/api/v1/queues/me/tasks/{task_id}/heartbeat")
+    payload = (
+        HeartbeatRequest(progress=progress).model_dump()
+        if progress is not None
+        else None
+    )
+    response = _worker_request(
+        client,
+        "refresh_task_heartbeat",
+        {"task_id": task_id, **(payload or {})},
+        "POST",
+        f"/api/v1/queues/me/tasks/{task_id}/heartbeat",
+        payload,
+    )
     raise_for_status(response)
+    if not response.content:  # servers before adaptive heartbeats reply 204
+        return None
+    return HeartbeatResponse(**decode_response(response))
 
 
 @cast_http_error
+@_server_busy_retry
 def create_worker(
     worker_name: Optional[str] = None,
     metadata: Optional[Dict[str, Any]] = None,
@@ -292,7 +528,7 @@ def create_worker(
     ).model_dump()
     response = client.post("/api/v1/queues/me/workers", json=payload)
     raise_for_status(response)
-    return WorkerCreateResponse(**response.json()).worker_id
+    return WorkerCreateResponse(**decode_response(response)).worker_id
 
 
 @display_server_notifications
@@ -321,7 +557,7 @@ def ls_workers(
     ).model_dump()
     response = client.post("/api/v1/queues/me/workers/search", json=payload)
     raise_for_status(response)
-    return WorkerLsResponse(**response.json())
+    return WorkerLsResponse(**decode_response(response))
 
 
 @cast_http_error
@@ -356,6 +592,33 @@ def report_worker_status(
     raise_for_status(response)
 
 
+@cast_http_error
+@_network_err_retry
+def renew_worker_lease(
+    worker_id: str,
+    lease_timeout: float,
+    client: Optional[httpx.Client] = None,
+) -> Worker:
+    """Renew (or take) the lease of a worker for `lease_timeout` seconds.
+
+    The lease covers all the running tasks of the worker: their heartbeats are not needed
+    while it is held, and they all fail when it lapses.
+    """
+    if client is None:
+        client = get_httpx_client()
+    payload = WorkerLeaseRenewRequest(lease_timeout=lease_timeout).model_dump()
+    response = _worker_request(
+        client,
+        "renew_worker_lease",
+        {"worker_id": worker_id, **payload},
+        "POST",
+        f"/api/v1/queues/me/workers/{worker_id}/lease",
+        payload,
+    )
+    raise_for_status(response)
+    return Worker(**decode_response(response))
+
+
 @display_server_notifications
 @cast_http_error
 def ls_tasks(
@@ -382,7 +645,53 @@ def ls_tasks(
     ).model_dump()
     response = client.post("/api/v1/queues/me/tasks/search", json=payload)
     raise_for_status(response)
-    return TaskLsResponse(**response.json())
+    return TaskLsResponse(**decode_response(response))
+
+
+@cast_http_error
+def ls_task_changes(
+    since: str = "0",
+    limit: int = 1000,
+    client: Optional[httpx.Client] = None,
+) -> TaskChangesResponse:
+    """List tasks modified or deleted after the change token `since`."""
+    if client is None:
+        client = get_httpx_client()
+    response = client.get(
+        "/api/v1/queues/me/tasks/changes", params={"since": since, "limit": limit}
+    )
+    raise_for_status(response)
+    return TaskChangesResponse(**decode_response(response))
+
+
+@cast_http_error
+def explain_tasks(
+    task_id: Optional[str] = None,
+    task_name: Optional[str] = None,
+    status: Optional[str] = None,
+    extra_filter: Optional[Dict[str, Any]] = None,
+    required_fields: Optional[List[str]] = None,
+    limit: int = 100,
+    offset: int = 0,
+    sort: Optional[List[Tuple[str, int]]] = None,
+    client: Optional[httpx.Client] = None,
+) -> QueryExplainResponse:
+    """Explain the query plan of a task search."""
+    if client is None:
+        client = get_httpx_client()
+    payload = TaskExplainRequest(
+        task_id=task_id,
+        task_name=task_name,
+        status=status,
+        extra_filter=extra_filter,
+        required_fields=required_fields,
+        limit=limit,
+        offset=offset,
+        sort=sort,
+    ).model_dump()
+    response = client.post("/api/v1/queues/me/tasks/explain", json=payload)
+    raise_for_status(response)
+    return QueryExplainResponse(**decode_response(response))
 
 
 @display_server_notifications
@@ -395,11 +704,17 @@ def update_tasks(
     if client is None:
         client = get_httpx_client()
     payload = [task.model_dump(exclude_unset=True) for task in task_updates]
-    response = client.put(
-        "/api/v1/queues/me/tasks", json=payload, params={"reset_pending": reset_pending}
+    response = _worker_request(
+        client,
+        "update_tasks",
+        {"task_updates": payload, "reset_pending": reset_pending},
+        "PUT",
+        "/api/v1/queues/me/tasks",
+        payload,
+        params={"reset_pending": reset_pending},
     )
     raise_for_status(response)
-    return TaskLsResponse(**response.json())
+    return TaskLsResponse(**decode_response(response))
 
 
 @cast_http_error
@@ -434,7 +749,7 @@ def update_queue(
 
     response = client.put("/api/v1/queues/me", json=update_request.to_request_dict())
     raise_for_status(response)
-    return QueueGetResponse(**response.json())
+    return QueueGetResponse(**decode_response(response))
 
 
 @cast_http_error
@@ -449,3 +764,408 @@ def delete_worker(
     params = {"cascade_update": cascade_update}
     response = client.delete(f"/api/v1/queues/me/workers/{worker_id}", params=params)
     raise_for_status(response)
+
+
+@display_server_notifications
+@cast_http_error
+def create_sweep(
+    axes: Dict[str, List[Any]],
+    mode: str = "grid",
+    num_samples: Optional[int] = None,
+    seed: int = 0,
+    task_name: Optional[str] = None,
+    args: Optional[Dict[str, Any]] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    cmd: Optional[Union[str, List[str]]] = None,
+    heartbeat_timeout: Optional[float] = None,
+    task_timeout: Optional[int] = None,
+    max_retries: int = 3,
+    priority: int = Priority.MEDIUM,
+    resources: Optional[Dict[str, float]] = None,
+    client: Optional[httpx.Client] = None,
+) -> SweepCreateResponse:
+    """Submit a lazy parameter sweep. Tasks are materialized when workers fetch them."""
+    if client is None:
+        client = get_httpx_client()
+
+    payload = SweepCreateRequest(
+        task_name=task_name,
+        args=args,
+        axes=axes,
+        mode=mode,
+        num_samples=num_samples,
+        seed=seed,
+        metadata=metadata,
+        cmd=cmd,
+        heartbeat_timeout=heartbeat_timeout,
+        task_timeout=task_timeout,
+        max_retries=max_retries,
+        priority=priority,
+        resources=resources,
+    ).model_dump()
+    response = client.post("/api/v1/queues/me/sweeps", json=payload)
+    raise_for_status(response)
+    return SweepCreateResponse(**decode_response(response))
+
+
+@display_server_notifications
+@cast_http_error
+def ls_sweeps(
+    limit: int = 100,
+    offset: int = 0,
+    client: Optional[httpx.Client] = None,
+) -> SweepLsResponse:
+    """List sweeps of the queue."""
+    if client is None:
+        client = get_httpx_client()
+    params = {"limit": limit, "offset": offset}
+    response = client.get("/api/v1/queues/me/sweeps", params=params)
+    raise_for_status(response)
+    return SweepLsResponse(**decode_response(response))
+
+
+@cast_http_error
+def delete_sweep(
+    sweep_id: str,
+    client: Optional[httpx.Client] = None,
+) -> None:
+    """Delete a sweep. Tasks already materialized from it are kept."""
+    if client is None:
+        client = get_httpx_client()
+    response = client.delete(f"/api/v1/queues/me/sweeps/{sweep_id}")
+    raise_for_status(response)
+
+
+@display_server_notifications
+@cast_http_error
+def get_queue_stats(client: Optional[httpx.Client] = None) -> QueueStatsResponse:
+    """Get task counts of the queue, including sweep points not materialized yet."""
+    if client is None:
+        client = get_httpx_client()
+    response = client.get("/api/v1/queues/me/stats")
+    raise_for_status(response)
+    return QueueStatsResponse(**decode_response(response))
+
+
+@display_server_notifications
+@cast_http_error
+def create_queue_indexes(
+    paths: List[str],
+    client: Optional[httpx.Client] = None,
+) -> QueueIndexLsResponse:
+    """Declare secondary indexes on task args/metadata paths (e.g. "args.dataset")."""
+    if client is None:
+        client = get_httpx_client()
+    payload = QueueIndexCreateRequest(paths=paths).model_dump()
+    response = client.post("/api/v1/queues/me/indexes", json=payload)
+    raise_for_status(response)
+    return QueueIndexLsResponse(**decode_response(response))
+
+
+@display_server_notifications
+@cast_http_error
+def ls_queue_indexes(client: Optional[httpx.Client] = None) -> QueueIndexLsResponse:
+    """List user-declared indexes of the queue."""
+    if client is None:
+        client = get_httpx_client()
+    response = client.get("/api/v1/queues/me/indexes")
+    raise_for_status(response)
+    return QueueIndexLsResponse(**decode_response(response))
+
+
+@cast_http_error
+def drop_queue_index(
+    path: str,
+    client: Optional[httpx.Client] = None,
+) -> None:
+    """Drop a user-declared index of the queue."""
+    if client is None:
+        client = get_httpx_client()
+    response = client.delete(f"/api/v1/queues/me/indexes/{path}")
+    raise_for_status(response)
+
+
+@display_server_notifications
+@cast_http_error
+def set_concurrency_limit(
+    key: str,
+    limit: Optional[int],
+    value: Any = None,
+    client: Optional[httpx.Client] = None,
+) -> QueueLimitLsResponse:
+    """Set the maximum number of running tasks of a group of the queue.
+
+    Tasks with the same value of `key` ("task_name" or a path under `metadata.`) form a group.
+    If `value` is None, the limit applies to each group of the key. A `limit` of None removes it.
+    """
+    if client is None:
+        client = get_httpx_client()
+    payload = QueueLimitSetRequest(key=key, value=value, limit=limit).model_dump()
+    response = client.put("/api/v1/queues/me/limits", json=payload)
+    raise_for_status(response)
+    return QueueLimitLsResponse(**decode_response(response))
+
+
+@display_server_notifications
+@cast_http_error
+def ls_concurrency_limits(
+    client: Optional[httpx.Client] = None,
+) -> QueueLimitLsResponse:
+    """List the concurrency limits of the queue and the running tasks of the limited groups."""
+    if client is None:
+        client = get_httpx_client()
+    response = client.get("/api/v1/queues/me/limits")
+    raise_for_status(response)
+    return QueueLimitLsResponse(**decode_response(response))
+
+
+@display_server_notifications
+@cast_http_error
+def migrate_task_layout(
+    layout: str,
+    client: Optional[httpx.Client] = None,
+) -> QueueLayoutUpdateResponse:
+    """Move the tasks of the queue to the tasks collection of a storage layout.
+
+    Args:
+        layout: "shared" (the tasks collection shared by all queues) or "partitioned"
+            (a tasks collection of the queue's own).
+    """
+    if client is None:
+        client = get_httpx_client()
+    payload = QueueLayoutUpdateRequest(layout=layout).model_dump()
+    response = client.put("/api/v1/queues/me/layout", json=payload)
+    raise_for_status(response)
+    return QueueLayoutUpdateResponse(**decode_response(response))
+
+
+@display_server_notifications
+@cast_http_error
+def submit_delete_queue_job(
+    client: Optional[httpx.Client] = None,
+) -> JobSubmitResponse:
+    """Delete the queue right away, and its tasks, workers and sweeps in a background job.
+
+    The job cannot be followed with `get_job`, since the credentials of the queue are gone.
+    """
+    if client is None:
+        client = get_httpx_client()
+    response = client.post("/api/v1/queues/me/jobs/delete_queue")
+    raise_for_status(response)
+    return JobSubmitResponse(**decode_response(response))
+
+
+@display_server_notifications
+@cast_http_error
+def submit_update_tasks_job(
+    update: Dict[str, Any],
+    replace_fields: Optional[List[str]] = None,
+    task_id: Optional[str] = None,
+    task_name: Optional[str] = None,
+    status: Optional[str] = None,
+    extra_filter: Optional[Dict[str, Any]] = None,
+    reset_pending: bool = False,
+    client: Optional[httpx.Client] = None,
+) -> JobSubmitResponse:
+    """Update all the tasks matching the filter in a background job, with no limit on the
+    number of tasks.
+
+    Args:
+        update: Fields of `TaskUpdateRequest`, e.g. {"args": {"lr": 0.1}, "priority": 20}.
+        replace_fields: Root fields of `update` that replace the fields of the tasks entirely.
+    """
+    if client is None:
+        client = get_httpx_client()
+    payload = TaskUpdateJobRequest(
+        task_id=task_id,
+        task_name=task_name,
+        status=status,
+        extra_filter=extra_filter,
+        replace_fields=replace_fields or [],
+        update=update,
+        reset_pending=reset_pending,
+    ).model_dump()
+    response = client.post("/api/v1/queues/me/jobs/update_tasks", json=payload)
+    raise_for_status(response)
+    return JobSubmitResponse(**decode_response(response))
+
+
+@cast_http_error
+def get_job(
+    job_id: str,
+    client: Optional[httpx.Client] = None,
+) -> Job:
+    """Get the status of a background job of the queue."""
+    if client is None:
+        client = get_httpx_client()
+    response = client.get(f"/api/v1/queues/me/jobs/{job_id}")
+    raise_for_status(response)
+    return Job(**decode_response(response))
+
+
+class BatchResult:
+    """Result of an operation of a batch, set once the batch is sent (see `batch`)."""
+
+    def __init__(self, op: str):
+        self.op = op
+        self.status_code: Optional[int] = None
+        self.result: Optional[Any] = None  # response body of the operation (JSON)
+        self.detail: Optional[Any] = None  # error detail of a failed operation
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code is not None and self.status_code < 400
+
+    def __repr__(self):
+        return (
+            f"BatchResult(op={self.op!r}, status_code={self.status_code}, "
+            f"result={self.result!r}, detail={self.detail!r})"
+        )
+
+
+class Batch:
+    """Operations collected by `batch`. Each method takes the same parameters as the API
+    function of the same name (without `client`) and returns the placeholder of its result.
+    """
+
+    def __init__(self):
+        self.operations: List[BatchOperation] = []
+        self.results: List[BatchResult] = []
+
+    def add(self, op: str, **params) -> BatchResult:
+        if "task_updates" in params:  # TaskUpdateRequest, as in `update_tasks`
+            params["task_updates"] = [
+                u.model_dump(exclude_unset=True) if isinstance(u, BaseModel) else u
+                for u in params["task_updates"]
+            ]
+        self.operations.append(BatchOperation(op=op, params=params))
+        result = BatchResult(op)
+        self.results.append(result)
+        return result
+
+    get_queue = partialmethod(add, "get_queue")
+    submit_task = partialmethod(add, "submit_task")
+    ls_tasks = partialmethod(add, "ls_tasks")
+    get_task = partialmethod(add, "get_task")
+    update_tasks = partialmethod(add, "update_tasks")
+    report_task_status = partialmethod(add, "report_task_status")
+    delete_task = partialmethod(add, "delete_task")
+    create_worker = partialmethod(add, "create_worker")
+    ls_workers = partialmethod(add, "ls_workers")
+    get_worker = partialmethod(add, "get_worker")
+    report_worker_status = partialmethod(add, "report_worker_status")
+    delete_worker = partialmethod(add, "delete_worker")
+
+
+@display_server_notifications
+@cast_http_error
+@_server_busy_retry
+def _send_batch(
+    operations: List[BatchOperation],
+    atomic: bool,
+    compress: bool,
+    client: httpx.Client,
+) -> BatchResponse:
+    request = client.build_request(
+        "POST",
+        "/api/v1/queues/me/batch",
+        json=BatchRequest(operations=operations, atomic=atomic).model_dump(),
+    )
+    if compress:
+        request = _compress_request(request, client)
+    response = client.send(request)
+    raise_for_status(response)
+    return BatchResponse(**decode_response(response))
+
+
+def _compress_request(request: httpx.Request, client: httpx.Client) -> httpx.Request:
+    """The request with its body compressed with gzip, which servers decompress (zstd may not
+    be supported by the server)."""
+    return client.build_request(
+        request.method,
+        request.url,
+        content=compress_body(request.content, GZIP),
+        headers={
+            "Content-Type": request.headers["Content-Type"],
+            "Content-Encoding": GZIP,
+        },
+    )
+
+
+@contextmanager
+def batch(
+    atomic: bool = False, compress: bool = False, client: Optional[httpx.Client] = None
+) -> Iterator[Batch]:
+    """Collect API calls and send them together in one request when the context exits.
+
+    Example:
+        with batch() as b:
+            submitted = b.submit_task(task_name="a", args={"x": 1})
+            b.report_task_status(task_id=other_id, status="success")
+        print(submitted.result["task_id"])
+
+    The operations run in order. A failed operation is reported in its result, unless the batch
+    is `atomic`: then the operations run in one transaction, none of them are applied if one
+    fails, and an error is raised. Nothing is sent if the context exits with an exception.
+
+    With `compress`, the request is sent compressed, e.g. to submit many tasks with large args
+    over a slow link. It requires a server decompressing request bodies.
+    """
+    if client is None:
+        client = get_httpx_client()
+    collected = Batch()
+    yield collected
+    if not collected.operations:
+        return
+
+    response = _send_batch(collected.operations, atomic, compress, client)
+    for placeholder, result in zip(collected.results, response.results):
+        placeholder.status_code = result.status_code
+        placeholder.result = result.result
+        placeholder.detail = result.detail
+
+
+@contextmanager
+def worker_channel(
+    events: bool = False,
+    on_event: Optional[Callable[[EventResponse], None]] = None,
+    client: Optional[httpx.Client] = None,
+) -> Iterator[Optional[WorkerChannel]]:
+    """Send the worker operations of the client (fetches, task updates, heartbeats, reports and
+    lease renewals) over one persistent WebSocket channel within the context, instead of one HTTP
+    request each (see labtasker.client.core.channel).
+
+    Args:
+        events: Whether the server pushes the events of the queue over the channel.
+        on_event: Called with each pushed event.
+        client:
+
+    Yields:
+        The channel, or None if it could not be opened. The operations are then sent over HTTP.
+    """
+    if client is None:
+        client = get_httpx_client()
+    headers = {}
+    if "authorization" in client.headers:
+        headers["Authorization"] = client.headers["authorization"]
+    channel = connect_worker_channel(
+        str(client.base_url),
+        headers,
+        events=events,
+        on_event=on_event,
+        uds=getattr(client, "uds", None),
+    )
+    if channel is None:
+        yield None
+        return
+
+    previous = _worker_channels.get(client)
+    _worker_channels[client] = channel
+    try:
+        yield channel
+    finally:
+        if previous is not None:
+            _worker_channels[client] = previous
+        else:
+            _worker_channels.pop(client, None)
+        channel.close()
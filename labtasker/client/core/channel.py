@@ -0,0 +1,182 @@
+"""Persistent WebSocket channel between a worker and the server.
+
+Within `worker_channel()` (see labtasker.client.core.api), the fetches, task updates, heartbeats,
+reports and lease renewals of the worker are sent over one WebSocket connection, authenticated
+once, instead of one HTTP request each. The operations are multiplexed: each message carries an
+id, echoed by its reply, so that e.g. heartbeats are not held up by a slow fetch.
+
+The server also pushes the events of the queue over the channel, if subscribed.
+
+If the channel cannot be opened (e.g. a server without channels, or the `websockets` package
+missing) or is closed, the operations fall back to HTTP.
+"""
+
+import itertools
+import json
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from labtasker.api_models import EventResponse
+from labtasker.client.core.logging import logger
+
+CHANNEL_PATH = "/api/v1/queues/me/channel"
+CALL_TIMEOUT = 60.0  # seconds to wait for the reply of an operation
+
+
+class ChannelClosed(Exception):
+    """The channel is closed. The operation was not sent."""
+
+
+def _open_connection(url: str, headers: Dict[str, str], uds: Optional[str] = None):
+    """Open a WebSocket connection with `send(str)`, `recv() -> str` and `close()`,
+    over the Unix domain socket `uds` if given."""
+    from websockets.sync.client import connect, unix_connect
+
+    if uds is not None:
+        return unix_connect(uds, url, additional_headers=headers, open_timeout=10)
+    return connect(url, additional_headers=headers, open_timeout=10)
+
+
+def connect_worker_channel(
+    base_url: str,
+    headers: Dict[str, str],
+    events: bool = False,
+    on_event: Optional[Callable[[EventResponse], None]] = None,
+    uds: Optional[str] = None,
+) -> Optional["WorkerChannel"]:
+    """Open a worker channel, over the Unix domain socket `uds` of the server if given.
+    Return None if it cannot be opened, to keep using HTTP."""
+    url = httpx.URL(base_url.rstrip("/") + CHANNEL_PATH)
+    url = url.copy_with(
+        scheme="wss" if url.scheme == "https" else "ws",
+        params={"events": events},
+    )
+    try:
+        connection = _open_connection(str(url), headers, uds=uds)
+    except ImportError:
+        logger.warning("Package `websockets` is not installed. Using HTTP instead.")
+        return None
+    except Exception as e:
+        logger.warning(f"Failed to open worker channel: {e}. Using HTTP instead.")
+        return None
+    return WorkerChannel(connection, on_event=on_event)
+
+
+class WorkerChannel:
+    def __init__(
+        self,
+        connection,
+        on_event: Optional[Callable[[EventResponse], None]] = None,
+    ):
+        """
+        Args:
+            connection: An open WebSocket connection with `send(str)`, `recv() -> str` and `close()`.
+            on_event: Called with each event pushed by the server (in the reader thread).
+        """
+        self._connection = connection
+        self._on_event = on_event
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._closed = False
+
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def request(
+        self, op: str, params: Dict[str, Any], request: httpx.Request
+    ) -> httpx.Response:
+        """Run an operation of the server (see its batch operations).
+
+        Args:
+            op: Name of the operation, e.g. "fetch_task".
+            params: Parameters of the operation.
+            request: The HTTP request the operation replaces, set on the response.
+
+        Returns:
+            The response the HTTP endpoint of the operation would reply.
+
+        Raises:
+            ChannelClosed: If the channel is closed, before the operation is sent.
+            httpx.TransportError: If the channel is closed (or timed out) before the reply.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise ChannelClosed()
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            try:
+                self._connection.send(
+                    json.dumps({"id": request_id, "op": op, "params": params})
+                )
+            except Exception as e:
+                del self._pending[request_id]
+                raise ChannelClosed() from e
+
+        try:
+            reply = future.result(timeout=CALL_TIMEOUT)
+        except FutureTimeoutError:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise httpx.ReadTimeout(
+                f"No reply to {op} over the worker channel", request=request
+            )
+        if reply is None:
+            raise httpx.NetworkError(
+                f"Worker channel closed before the reply to {op}", request=request
+            )
+
+        status_code = reply["status_code"]
+        headers = {}
+        if reply.get("retry_after") is not None:
+            headers["retry-after"] = str(reply["retry_after"])
+        if status_code == 204:
+            return httpx.Response(status_code, headers=headers, request=request)
+        body = reply["result"] if status_code < 400 else {"detail": reply["detail"]}
+        return httpx.Response(status_code, json=body, headers=headers, request=request)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        try:
+            self._connection.close()
+        except Exception as e:
+            logger.debug(f"Error closing worker channel: {e}")
+        self._reader.join(timeout=5)
+
+    def _read(self):
+        try:
+            while True:
+                message = json.loads(self._connection.recv())
+                if "id" in message:
+                    with self._lock:
+                        future = self._pending.pop(message["id"], None)
+                    if future is not None:
+                        future.set_result(message)
+                else:
+                    self._on_push(message)
+        except Exception as e:
+            if not self._closed:
+                logger.warning(f"Worker channel closed: {e}. Using HTTP instead.")
+        finally:
+            with self._lock:
+                self._closed = True
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_result(None)
+
+    def _on_push(self, message: Dict[str, Any]):
+        if message.get("push") == "event" and self._on_event is not None:
+            try:
+                self._on_event(EventResponse(**message["event"]))
+            except Exception as e:
+                logger.exception(f"Error handling pushed event: {e}")
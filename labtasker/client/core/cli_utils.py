@@ -21,17 +21,18 @@
 from rich.console import Console
 from rich.json import JSON
 from rich.syntax import Syntax
-from starlette.status import HTTP_401_UNAUTHORIZED
+from starlette.status import HTTP_401_UNAUTHORIZED, HTTP_501_NOT_IMPLEMENTED
 
 from labtasker.client.core.api import health_check
 from labtasker.client.core.config import requires_client_config
 from labtasker.client.core.exceptions import (
+    LabtaskerHTTPStatusError,
     LabtaskerNetworkError,
     LabtaskerTypeError,
     LabtaskerValueError,
     QueryTranspilerError,
 )
-from labtasker.client.core.logging import stderr_console
+from labtasker.client.core.logging import stderr_console, stdout_console
 from labtasker.client.core.query_transpiler import transpile_query
 from labtasker.utils import parse_timeout, unflatten_dict
 
@@ -376,6 +377,30 @@ def ls_yaml_format_iter(
             yield ansi_str
 
 
+def print_query_explain(explain_func: Callable[[], BaseModel], verbose: bool = False):
+    """Call an explain endpoint and print the query plan as yaml.
+    The winning plan tree is only printed in verbose mode."""
+    try:
+        explained = explain_func()
+    except LabtaskerHTTPStatusError as e:
+        if e.response.status_code == HTTP_501_NOT_IMPLEMENTED:
+            stderr_console.print(
+                "[bold orange1]Warning:[/bold orange1] Query explain is not supported "
+                "by the server database (e.g. embedded database)."
+            )
+            return
+        raise
+
+    exclude = None if verbose else {"winning_plan"}
+    yaml_str = yaml.dump(
+        explained.model_dump(exclude=exclude),
+        indent=2,
+        sort_keys=False,
+        allow_unicode=True,
+    )
+    stdout_console.print(Syntax(yaml_str, "yaml"))
+
+
 def pager_iterator(
     fetch_function: Callable,
     offset: int = 0,
@@ -403,19 +428,24 @@ def pager_iterator(
         offset += limit  # Increment offset for the next batch
 
 
+def check_server_connection():
+    """Abort if the server connection is not healthy."""
+    try:
+        status = health_check()
+        assert status.status == "healthy"
+    except (AssertionError, LabtaskerNetworkError) as e:
+        stderr_console.print(
+            "[bold red]Error:[/bold red] Server connection is not healthy. Please check your connection.\n"
+            f"Detail: {e}"
+        )
+        raise typer.Abort()
+
+
 def requires_server_connection(func: Optional[Callable] = None, /):
     def decorator(function: Callable):
         @wraps(function)
         def wrapped(*args, **kwargs):
-            try:
-                status = health_check()
-                assert status.status == "healthy"
-            except (AssertionError, LabtaskerNetworkError) as e:
-                stderr_console.print(
-                    "[bold red]Error:[/bold red] Server connection is not healthy. Please check your connection.\n"
-                    f"Detail: {e}"
-                )
-                raise typer.Abort()
+            check_server_connection()
             return function(*args, **kwargs)
 
         return wrapped
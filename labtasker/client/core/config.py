@@ -2,15 +2,17 @@
 from functools import wraps
 from pathlib import Path
 from shutil import copytree
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
+from urllib.parse import unquote
 
 import tomlkit
 import typer
 from packaging.utils import canonicalize_name
-from pydantic import Field, HttpUrl, SecretStr, model_validator
+from pydantic import AnyUrl, Field, HttpUrl, SecretStr, UrlConstraints, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing_extensions import Annotated
 
-from labtasker.client.core.exceptions import LabtaskerRuntimeError
+from labtasker.client.core.exceptions import LabtaskerRuntimeError, LabtaskerValueError
 from labtasker.client.core.logging import logger, stderr_console
 from labtasker.client.core.paths import (
     get_labtasker_client_config_path,
@@ -20,10 +22,23 @@
 from labtasker.filtering import register_sensitive_text
 from labtasker.security import get_auth_headers
 
+# Unix domain socket of a server on the same machine, e.g. unix:///tmp/labtasker.sock
+UnixSocketUrl = Annotated[
+    AnyUrl, UrlConstraints(allowed_schemes=["unix"], host_required=False)
+]
+
 
 class EndpointConfig(BaseSettings):
     # API settings
-    api_base_url: HttpUrl
+    api_base_url: Union[HttpUrl, UnixSocketUrl]
+
+
+def unix_socket_path(url: Union[str, AnyUrl]) -> Optional[str]:
+    """Path of the Unix domain socket of a `unix://` URL, or None for other URLs."""
+    url = str(url)
+    if not url.startswith("unix://"):
+        return None
+    return unquote(url[len("unix://") :])
 
 
 class QueueConfig(BaseSettings):
@@ -39,6 +54,11 @@ class QueueConfig(BaseSettings):
 
 class TaskConfig(BaseSettings):
     heartbeat_interval: float = 30.0  # seconds
+    # follow the heartbeat interval recommended by the server, within 3 heartbeats per timeout
+    adaptive_heartbeat: bool = True
+    # progress reported by `labtasker.report_progress()` is sent with the next heartbeat. If set,
+    # a heartbeat is sent right away instead, but no more than once per this many seconds.
+    progress_min_interval: Optional[float] = None
 
 
 class PluginConfig(BaseSettings):
@@ -77,6 +97,9 @@ class ClientConfig(BaseSettings):
 
     queue: QueueConfig
 
+    # additional queues a worker can serve from one process (`labtasker loop --queue`)
+    queues: List[QueueConfig] = Field(default_factory=list)
+
     task: TaskConfig = Field(default_factory=TaskConfig)
 
     cli_plugins: PluginConfig = Field(default_factory=PluginConfig)
@@ -136,12 +159,11 @@ def load_client_config(
         _config = ClientConfig.model_validate(tomlkit.load(f))
 
     # register sensitive text
-    register_sensitive_text(_config.queue.password.get_secret_value())  # type: ignore[union-attr]
-    register_sensitive_text(
-        get_auth_headers(_config.queue.queue_name, _config.queue.password)[  # type: ignore[union-attr]
-            "Authorization"
-        ]
-    )
+    for queue in [_config.queue, *_config.queues]:  # type: ignore[union-attr]
+        register_sensitive_text(queue.password.get_secret_value())
+        register_sensitive_text(
+            get_auth_headers(queue.queue_name, queue.password)["Authorization"]
+        )
 
 
 @requires_client_config
@@ -150,6 +172,24 @@ def get_client_config() -> ClientConfig:
     return _config  # type: ignore[return-value]
 
 
+def get_queue_config(queue_name: Optional[str] = None) -> QueueConfig:
+    """Get the credentials of a queue from the `queue` or `queues` entries of the client config.
+
+    Args:
+        queue_name: Name of the queue. Default to the queue of the `queue` entry.
+    """
+    config = get_client_config()
+    if queue_name is None:
+        return config.queue
+    for queue in [config.queue, *config.queues]:
+        if queue.queue_name == queue_name:
+            return queue
+    raise LabtaskerValueError(
+        f"Queue '{queue_name}' not found in client config. "
+        f"Add its credentials as a [[queues]] entry of {get_labtasker_client_config_path()}."
+    )
+
+
 def init_labtasker_root(labtasker_root: Optional[Path] = None, exist_ok: bool = False):
     if labtasker_root is None:
         labtasker_root = get_labtasker_root()
@@ -52,3 +52,14 @@ def set_current_task_id(task_id: str):
 def set_current_worker_id(worker_id: Optional[str]):
     os.environ["LABTASKER_WORKER_ID"] = worker_id if worker_id else ""
     _current_worker_id.set(worker_id)
+
+
+def current_queue_name() -> Optional[str]:
+    """Name of the queue the current task was fetched from, None for the queue of the client config.
+    Kept in the environment so that heartbeat threads and job subprocesses talk to the same queue.
+    """
+    return os.environ.get("LABTASKER_QUEUE_NAME") or None
+
+
+def set_current_queue_name(queue_name: Optional[str]):
+    os.environ["LABTASKER_QUEUE_NAME"] = queue_name if queue_name else ""
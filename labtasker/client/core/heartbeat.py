@@ -1,10 +1,13 @@
+import json
 import os
 import threading
 import time
 from contextvars import ContextVar
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 
-from labtasker.client.core.api import refresh_task_heartbeat
+import httpx
+
+from labtasker.client.core.api import refresh_task_heartbeat, renew_worker_lease
 from labtasker.client.core.config import get_client_config
 from labtasker.client.core.exceptions import LabtaskerRuntimeError
 from labtasker.client.core.logging import logger
@@ -13,14 +16,29 @@
 __all__ = [
     "start_heartbeat",
     "end_heartbeat",
+    "WorkerLease",
 ]
 
 
+MIN_HEARTBEAT_INTERVAL = (
+    1.0  # in seconds, floor of the intervals recommended by the server
+)
+BEATS_PER_TIMEOUT = 3  # min number of heartbeats sent within a heartbeat timeout
+
+# Latest progress reported by the job (possibly from a subprocess), sent with the next heartbeat
+PROGRESS_FILE_NAME = "progress.json"
+
+
 class Heartbeat:
 
-    def __init__(self, task_id, heartbeat_interval):
+    def __init__(self, task_id, heartbeat_interval, heartbeat_timeout=None):
         self.task_id = task_id
+        self.heartbeat_timeout = heartbeat_timeout
         self.heartbeat_interval = heartbeat_interval
+        if heartbeat_timeout:
+            self.heartbeat_interval = min(
+                heartbeat_interval, heartbeat_timeout / BEATS_PER_TIMEOUT
+            )
 
         self._thread = None
         self._stop_event = threading.Event()
@@ -28,6 +46,11 @@ def __init__(self, task_id, heartbeat_interval):
         # the heartbeat.lock file is useful for stopping heartbeat in the scheduler process from the actual job process
         self._lockfile = get_labtasker_log_dir() / "heartbeat.lock"
 
+        self._progress_file = get_labtasker_log_dir() / PROGRESS_FILE_NAME
+        self._progress_version: Optional[Tuple[int, int]] = None  # of the progress sent
+        self._progress_sent_at = float("-inf")
+        self.progress_min_interval = get_client_config().task.progress_min_interval
+
     def start(self):
         """Start the heartbeat thread."""
         self._thread = threading.Thread(target=self._heartbeat, daemon=True)
@@ -51,6 +74,9 @@ def delay(self, interval: float) -> bool:
             if self._stop_event.is_set() or not os.path.exists(self._lockfile):
                 return False
 
+            if self._progress_due():
+                break
+
             if remaining_time > 0.02:
                 time.sleep(
                     min(
@@ -63,11 +89,58 @@ def delay(self, interval: float) -> bool:
 
         return True
 
+    @staticmethod
+    def _bound(interval: float, heartbeat_timeout: Optional[float]) -> float:
+        """Keep an interval within [MIN_HEARTBEAT_INTERVAL, heartbeat_timeout / BEATS_PER_TIMEOUT]."""
+        interval = max(interval, MIN_HEARTBEAT_INTERVAL)
+        if heartbeat_timeout:
+            interval = min(interval, heartbeat_timeout / BEATS_PER_TIMEOUT)
+        return interval
+
+    def _progress_version_on_disk(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._progress_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns  # the file is replaced on each report
+
+    def _progress_due(self) -> bool:
+        """Whether a new progress should be sent right away, within the rate limit."""
+        if (
+            self.progress_min_interval is None
+            or time.monotonic() - self._progress_sent_at < self.progress_min_interval
+        ):
+            return False
+        version = self._progress_version_on_disk()
+        return version is not None and version != self._progress_version
+
+    def _read_progress(
+        self,
+    ) -> Tuple[Optional[Tuple[int, int]], Optional[Dict[str, Any]]]:
+        """The version and content of the progress reported since the last heartbeat, if any."""
+        version = self._progress_version_on_disk()
+        if version is None or version == self._progress_version:
+            return None, None
+        try:
+            with open(self._progress_file) as f:
+                return version, json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read progress of task {self.task_id}: {e}")
+            return None, None
+
     def _heartbeat(self):
-        """Refresh heartbeat periodically"""
+        """Refresh heartbeat periodically, at the interval recommended by the server."""
         while True:
             try:
-                refresh_task_heartbeat(task_id=self.task_id)
+                version, progress = self._read_progress()
+                resp = refresh_task_heartbeat(task_id=self.task_id, progress=progress)
+                if version is not None:
+                    self._progress_version = version
+                    self._progress_sent_at = time.monotonic()
+                if resp is not None and get_client_config().task.adaptive_heartbeat:
+                    self.heartbeat_interval = self._bound(
+                        resp.next_interval, self.heartbeat_timeout
+                    )
             except Exception as e:
                 logger.error(f"Heartbeat failed for task {self.task_id}: {e}")
 
@@ -92,7 +165,10 @@ def stop(self):
 
 
 def start_heartbeat(
-    task_id, heartbeat_interval: Optional[float] = None, raise_error=True
+    task_id,
+    heartbeat_interval: Optional[float] = None,
+    heartbeat_timeout: Optional[float] = None,
+    raise_error=True,
 ):
     logger.debug("Try starting heartbeat.")
     if _current_heartbeat.get() is not None:
@@ -104,6 +180,7 @@ def start_heartbeat(
         task_id=task_id,
         heartbeat_interval=heartbeat_interval
         or get_client_config().task.heartbeat_interval,
+        heartbeat_timeout=heartbeat_timeout,
     )
     heartbeat_manager.start()
     _current_heartbeat.set(heartbeat_manager)
@@ -120,3 +197,63 @@ def end_heartbeat(raise_error=True):
     heartbeat_manager.stop()
     _current_heartbeat.set(None)
     logger.debug("Heartbeat ended.")
+
+
+class WorkerLease:
+    """Keep the lease of a worker renewed in a background thread.
+
+    The lease covers all the running tasks of the worker, in place of a heartbeat per task.
+
+    Usage:
+        with WorkerLease(worker_id, lease_timeout=90, renew_interval=30):
+            ...  # run tasks
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        lease_timeout: float,
+        renew_interval: Optional[float] = None,
+        client: Optional[httpx.Client] = None,
+    ):
+        self.worker_id = worker_id
+        self.lease_timeout = lease_timeout
+        self.renew_interval = (
+            renew_interval or get_client_config().task.heartbeat_interval
+        )
+        self.client = client
+
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def renew(self):
+        renew_worker_lease(
+            worker_id=self.worker_id,
+            lease_timeout=self.lease_timeout,
+            client=self.client,
+        )
+
+    def _renew_loop(self):
+        while not self._stop_event.wait(self.renew_interval):
+            try:
+                self.renew()
+            except Exception as e:
+                logger.error(f"Lease renewal failed for worker {self.worker_id}: {e}")
+
+    def start(self):
+        """Take the lease and start renewing it."""
+        self.renew()
+        self._thread = threading.Thread(target=self._renew_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join(timeout=self.renew_interval * 10)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
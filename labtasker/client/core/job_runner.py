@@ -1,22 +1,26 @@
 import json
 import os
 import sys
+import threading
 import time
 import traceback
-from functools import wraps
-from typing import Any, Callable, Dict, List, Optional, Union
+from contextlib import ExitStack, nullcontext
+from functools import partial, wraps
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
 
 from starlette.status import HTTP_401_UNAUTHORIZED
 
 import labtasker
-from labtasker.api_models import TaskUpdateRequest
+from labtasker.api_models import Task, TaskUpdateRequest
 from labtasker.client.core.api import (
     create_worker,
     fetch_task,
+    get_httpx_client,
     get_queue,
     report_task_status,
     update_tasks,
 )
+from labtasker.client.core.api import worker_channel as open_worker_channel
 from labtasker.client.core.cli_utils import Choice, make_a_choice
 from labtasker.client.core.config import get_client_config
 from labtasker.client.core.context import (
@@ -34,14 +38,23 @@
     _LabtaskerJobFailed,
     _LabtaskerLoopExit,
 )
-from labtasker.client.core.heartbeat import end_heartbeat, start_heartbeat
+from labtasker.client.core.heartbeat import (
+    PROGRESS_FILE_NAME,
+    WorkerLease,
+    end_heartbeat,
+    start_heartbeat,
+)
 from labtasker.client.core.logging import log_to_file, logger, stderr_console
 from labtasker.client.core.paths import get_labtasker_log_dir, set_labtasker_log_dir
+from labtasker.client.core.queue_pool import QueuePool, QueueSpec
+from labtasker.client.core.resources import ResourceLedger, resolve_capacity
+from labtasker.client.core.utils import retry_after
 from labtasker.utils import parse_timeout
 
 __all__ = [
     "loop_run",
     "finish",
+    "report_progress",
     "set_loop_internal_error_handler",
     "set_prompt_on_task_failure",
 ]
@@ -98,11 +111,63 @@ def dump_status(status: str):
         )
 
 
+# Number of recent values of each affinity field advertised as warm
+AFFINITY_WARM_SIZE = 4
+
+# Seconds to wait before fetching again when no task fits the capacity left by the other loops
+RESOURCE_WAIT_INTERVAL = 10.0
+
+
+class _AffinityTracker:
+    """Values of the affinity fields in the tasks recently run by this worker
+    (e.g. the datasets it has loaded), advertised with each fetch."""
+
+    def __init__(self, fields: List[str], size: int = AFFINITY_WARM_SIZE):
+        self.size = size
+        self.warm: Dict[str, List[Any]] = {field: [] for field in fields}
+
+    def record(self, task: Task):
+        for field, values in self.warm.items():
+            root, *parts = field.split(".")
+            value = getattr(task, root, None)
+            for part in parts:
+                value = value.get(part) if isinstance(value, dict) else None
+            if value is None:
+                continue
+            if value in values:
+                values.remove(value)
+            values.insert(0, value)
+            del values[self.size :]
+
+    def affinity(self) -> Optional[Dict[str, List[Any]]]:
+        return {field: values for field, values in self.warm.items() if values} or None
+
+
 def dump_task_info():
     with open(get_labtasker_log_dir() / "task_info.json", "w") as f:
         f.write(task_info().model_dump_json(indent=4))
 
 
+def _check_queue_access():
+    """Check connection and authentication to the active queue."""
+    try:
+        get_queue()
+    except LabtaskerHTTPStatusError as e:
+        if e.response.status_code == HTTP_401_UNAUTHORIZED:
+            msg = (
+                f"Either invalid credentials or queue not created. "
+                f"Please check your configuration. Detail: {e}"
+            )
+            stderr_console.print(f"[bold red]Error:[/bold red] {msg}")
+            logger.critical(msg)
+        raise e
+
+
+def _fetch_task(**kwargs):
+    """Fetch a task from the active queue under its worker."""
+    return fetch_task(worker_id=current_worker_id(), start_heartbeat=True, **kwargs)
+
+
 def loop_run(
     required_fields: List[str],
     extra_filter: Optional[Dict[str, Any]] = None,
@@ -112,6 +177,11 @@ def loop_run(
     eta_max: Optional[str] = None,
     heartbeat_timeout: Optional[float] = None,
     pass_args_dict: bool = False,
+    affinity: Optional[List[str]] = None,
+    capacity: Optional[Union[str, Dict[str, float]]] = None,
+    queues: Optional[Sequence[QueueSpec]] = None,
+    worker_lease: bool = False,
+    worker_channel: bool = False,
 ):
     """Run the wrapped job function in loop.
 
@@ -124,6 +194,21 @@ def loop_run(
         eta_max: Maximum ETA for task execution.
         heartbeat_timeout: Heartbeat timeout in seconds. Default to 3 times the send interval.
         pass_args_dict: If True, passes task_info().args as first argument
+        affinity: Dot-separated task field paths (e.g. ["args.dataset"]). Tasks with the same values
+            as the recently run tasks are preferred, to reuse what the worker has loaded.
+        capacity: Resource capacity of this machine, "auto" (detected cpus and mem_gb) or a dict
+            (e.g. {"gpus": 2}, merged over the detected capacity). Only tasks whose resource
+            requests fit the capacity left by the other loops running on this machine are fetched.
+        queues: Queues to serve from this process, as "NAME[:WEIGHT]" or (NAME, WEIGHT), e.g. ["a:3", "b:1"].
+            Tasks are claimed in weighted round-robin, moving on to the next queue when one is empty.
+            The credentials of each queue are taken from the `queue` or `queues` entries of the client
+            config. A worker is created in each queue. Default to the queue of the client config.
+        worker_lease: If True, the worker holds one lease covering all its running tasks, renewed
+            every `task.heartbeat_interval` seconds, instead of sending a heartbeat per task. The
+            running tasks fail if the lease is not renewed within `heartbeat_timeout`.
+        worker_channel: If True, the fetches, task updates, heartbeats and reports of the loop are
+            sent over a persistent WebSocket connection to the server instead of one HTTP request
+            each. Falls back to HTTP if the server does not support it.
     """
     if not isinstance(required_fields, list):
         raise LabtaskerValueError(
@@ -141,27 +226,33 @@ def loop_run(
                 f"Invalid eta_max {eta_max}. ETA max must be a valid duration string (e.g. '1h', '1h30m', '50s')"
             )
 
+    pool = QueuePool(queues) if queues else None
+
     # Check connection and authentication
-    try:
-        get_queue()
-    except LabtaskerHTTPStatusError as e:
-        if e.response.status_code == HTTP_401_UNAUTHORIZED:
-            msg = (
-                f"Either invalid credentials or queue not created. "
-                f"Please check your configuration. Detail: {e}"
-            )
-            stderr_console.print(f"[bold red]Error:[/bold red] {msg}")
-            logger.critical(msg)
-        raise e
+    if pool:
+        for name in pool.names:
+            with pool.active(name):
+                _check_queue_access()
+    else:
+        _check_queue_access()
 
     # Create worker if not exists
-    if current_worker_id() is None:
+    if pool:
+        pool.create_workers(
+            worker_id=worker_id, create_worker_kwargs=create_worker_kwargs
+        )
+    elif current_worker_id() is None:
         new_worker_id = worker_id or create_worker(**(create_worker_kwargs or {}))
         set_current_worker_id(new_worker_id)
 
     if cmd is None:
         cmd = sys.argv
 
+    affinity_tracker = _AffinityTracker(affinity or [])
+
+    resolved_capacity = resolve_capacity(capacity)
+    ledger = ResourceLedger(resolved_capacity) if resolved_capacity else None
+
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -171,25 +262,69 @@ def wrapper(*args, **kwargs):
             3. Run task
             4. Submit result (finish).
             """
+            with ExitStack() as stack:
+                if pool:
+                    stack.enter_context(pool.active())
+                if worker_channel:
+                    for _, client in _worker_clients():
+                        stack.enter_context(open_worker_channel(client=client))
+                if worker_lease:
+                    for lease_worker_id, client in _worker_clients():
+                        stack.enter_context(
+                            WorkerLease(
+                                lease_worker_id,
+                                lease_timeout=heartbeat_timeout,
+                                client=client,
+                            )
+                        )
+                _run_loop(*args, **kwargs)
+
+        def _worker_clients():
+            """The worker of each served queue, with the client of its queue."""
+            if not pool:
+                return [(current_worker_id(), get_httpx_client())]
+            worker_clients = []
+            for name in pool.names:
+                with pool.active(name):
+                    worker_clients.append((current_worker_id(), get_httpx_client()))
+            return worker_clients
+
+        def _run_loop(*args, **kwargs):
             global _loop_internal_failure_count
             # Run task in a loop
             while True:
                 try:
-                    # Fetch task
-                    resp = fetch_task(
-                        worker_id=current_worker_id(),
-                        eta_max=eta_max,
-                        heartbeat_timeout=heartbeat_timeout,
-                        start_heartbeat=True,
-                        required_fields=required_fields,
-                        extra_filter=extra_filter,
-                    )
+                    # Fetch task. With a capacity, the local ledger stays locked until the
+                    # resources of the fetched task are recorded.
+                    with ledger.locked() if ledger else nullcontext() as free:
+                        _fetch = partial(
+                            _fetch_task,
+                            eta_max=eta_max,
+                            heartbeat_timeout=heartbeat_timeout,
+                            required_fields=required_fields,
+                            extra_filter=extra_filter,
+                            affinity=affinity_tracker.affinity(),
+                            capacity=free,
+                        )
+                        # with several queues, the queue of the fetched task is left active
+                        resp = pool.claim(_fetch) if pool else _fetch()
+                        if resp.found and ledger:
+                            ledger.allocate(resp.task.task_id, resp.task.resources)
+                    if not resp.found and ledger and free != ledger.capacity:
+                        # remaining tasks may fit once the other loops finish theirs
+                        logger.info(
+                            f"No task fits the free capacity {free}. Waiting for other loops..."
+                        )
+                        time.sleep(RESOURCE_WAIT_INTERVAL)
+                        continue
                     if not resp.found:  # task run complete
                         logger.info(
                             f"Tasks with required fields {required_fields} and extra filter {extra_filter} are all done."
                         )
                         break
 
+                    affinity_tracker.record(resp.task)
+
                     # update the "cmd" field of the current task, and get the updated task info
                     task = update_tasks(
                         [TaskUpdateRequest(task_id=resp.task.task_id, cmd=cmd)],  # noqa
@@ -215,7 +350,11 @@ def wrapper(*args, **kwargs):
                     dump_task_info()
 
                     with log_to_file(file_path=get_labtasker_log_dir() / "run.log"):
-                        start_heartbeat(task_id=current_task_id())
+                        if not worker_lease:
+                            start_heartbeat(
+                                task_id=current_task_id(),
+                                heartbeat_timeout=task.heartbeat_timeout,
+                            )
                         success_flag = False
                         try:
                             func_args = (task.args, *args) if pass_args_dict else args
@@ -337,7 +476,10 @@ def wrapper(*args, **kwargs):
                             if success_flag:
                                 # Default finish. Can be overridden by the user if called somewhere deep in the wrapped func().
                                 finish(status="success")
-                            end_heartbeat()
+                            if not worker_lease:
+                                end_heartbeat()
+                            if ledger:
+                                ledger.release()
                 except _LabtaskerLoopExit:
                     logger.info("Exiting task loop.")
                     break
@@ -345,6 +487,13 @@ def wrapper(*args, **kwargs):
                     logger.error("Worker suspended.")
                     break
                 except Exception as e:
+                    delay = retry_after(e)
+                    if delay is not None:  # not a failure, the server asks to slow down
+                        logger.warning(
+                            f"Server busy. Retrying in {delay:.1f} seconds..."
+                        )
+                        time.sleep(delay)
+                        continue
                     logger.exception("Error in task loop.")
                     _loop_internal_failure_count += 1
                     _loop_internal_error_handler(e, _loop_internal_failure_count)
@@ -354,6 +503,40 @@ def wrapper(*args, **kwargs):
     return decorator
 
 
+def report_progress(
+    progress: Dict[str, Any],
+    skip_if_no_labtasker: bool = True,
+):
+    """
+    Report the progress of the current task (e.g. epoch, loss). Only the latest progress is kept
+    locally, and sent to the server with the next heartbeat as the `summary.progress` of the task,
+    without a request of its own.
+    Args:
+        progress: A JSON serializable dict.
+        skip_if_no_labtasker: If current job is not run by labtasker loop, skip the report. Otherwise, raise an error.
+
+    Returns:
+
+    """
+    if os.environ.get("LABTASKER_TASK_ID", None) is None:
+        if skip_if_no_labtasker:
+            return
+        else:
+            raise LabtaskerRuntimeError(
+                "Current job is not run by labtasker loop. "
+                "You can either use @labtasker.loop() decorator or labtasker loop cli to run job."
+            )
+
+    # written aside and moved in place, so that the heartbeat never reads a partial file
+    progress_file_path = get_labtasker_log_dir() / PROGRESS_FILE_NAME
+    tmp_path = progress_file_path.with_name(
+        f"{PROGRESS_FILE_NAME}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    with open(tmp_path, "w") as f:
+        json.dump(progress, f)  # type: ignore
+    os.replace(tmp_path, progress_file_path)
+
+
 def finish(
     status: str,
     summary: Optional[Dict[str, Any]] = None,
@@ -0,0 +1,161 @@
+"""Serving several queues from one worker process.
+
+Tasks are claimed from the queues in weighted round-robin: with the weights {"a": 3, "b": 1}, 3
+tasks are claimed from `a` for each task claimed from `b` while both queues have tasks. When the
+queue in turn has no task, the next queue is tried right away, so that the worker only idles once
+all the queues are empty.
+
+Each queue authenticates with its own credentials (the `queue` and `queues` entries of the client
+config) and has its own worker. The queue of the claimed task stays active (see
+`current_queue_name()`) while the task runs, so that heartbeats and reports go to that queue.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from labtasker.api_models import TaskFetchResponse
+from labtasker.client.core.api import create_worker
+from labtasker.client.core.config import get_queue_config
+from labtasker.client.core.context import (
+    current_queue_name,
+    current_worker_id,
+    set_current_queue_name,
+    set_current_worker_id,
+)
+from labtasker.client.core.exceptions import LabtaskerValueError
+
+__all__ = [
+    "QueuePool",
+    "parse_queue_spec",
+]
+
+QueueSpec = Union[str, Tuple[str, int]]
+
+
+def parse_queue_spec(spec: QueueSpec) -> Tuple[str, int]:
+    """Parse a queue specification: "NAME", "NAME:WEIGHT" or (NAME, WEIGHT)."""
+    if isinstance(spec, str):
+        name, sep, weight = spec.partition(":")
+        if sep:
+            try:
+                return name, _check_weight(spec, int(weight))
+            except ValueError:
+                raise LabtaskerValueError(
+                    f"Invalid queue {spec!r}. Expected NAME or NAME:WEIGHT with an integer weight."
+                )
+        return name, 1
+    return spec[0], _check_weight(spec, spec[1])
+
+
+def _check_weight(spec: Any, weight: Any) -> int:
+    if isinstance(weight, bool) or not isinstance(weight, int) or weight < 1:
+        raise LabtaskerValueError(
+            f"Invalid weight of queue {spec!r}. Weights must be positive integers."
+        )
+    return weight
+
+
+def _weighted_schedule(weights: Dict[str, int]) -> List[str]:
+    """One round of smooth weighted round-robin, e.g. {"a": 3, "b": 1} -> ["a", "a", "b", "a"]."""
+    total = sum(weights.values())
+    current = dict.fromkeys(weights, 0)
+    schedule = []
+    for _ in range(total):
+        for name, weight in weights.items():
+            current[name] += weight
+        selected = max(current, key=current.get)  # type: ignore[arg-type]
+        current[selected] -= total
+        schedule.append(selected)
+    return schedule
+
+
+class QueuePool:
+    """Several queues served by one worker process.
+
+    Usage:
+        pool = QueuePool(["a:3", "b:1"])
+        pool.create_workers()
+        resp = pool.claim(lambda: fetch_task(worker_id=current_worker_id()))
+        ...  # run resp.task, the queue it was fetched from is active
+    """
+
+    def __init__(self, queues: Sequence[QueueSpec]):
+        self.weights: Dict[str, int] = {}
+        for spec in queues:
+            name, weight = parse_queue_spec(spec)
+            if name in self.weights:
+                raise LabtaskerValueError(
+                    f"Queue '{name}' is specified more than once."
+                )
+            get_queue_config(name)  # credentials must be configured
+            self.weights[name] = weight
+        if not self.weights:
+            raise LabtaskerValueError("At least one queue must be specified.")
+
+        self.worker_ids: Dict[str, Optional[str]] = dict.fromkeys(self.weights)
+        self._schedule = _weighted_schedule(self.weights)
+        self._turn = 0
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.weights)
+
+    def activate(self, name: str):
+        """Direct the API calls of this process (and of its job subprocesses) to queue `name`
+        under its worker."""
+        set_current_queue_name(name)
+        set_current_worker_id(self.worker_ids[name])
+
+    @contextmanager
+    def active(self, name: Optional[str] = None) -> Iterator[None]:
+        """Activate queue `name` (if given) and restore the previously active queue and worker on exit."""
+        previous = current_queue_name(), current_worker_id()
+        try:
+            if name is not None:
+                self.activate(name)
+            yield
+        finally:
+            set_current_queue_name(previous[0])
+            set_current_worker_id(previous[1])
+
+    def create_workers(
+        self,
+        worker_id: Optional[str] = None,
+        create_worker_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        """Create a worker in each queue, or use the existing `worker_id` if a single queue is served."""
+        if worker_id is not None and len(self.weights) > 1:
+            raise LabtaskerValueError(
+                "A worker ID belongs to a single queue and cannot be used with multiple queues."
+            )
+        for name in self.weights:
+            with self.active(name):
+                self.worker_ids[name] = worker_id or create_worker(
+                    **(create_worker_kwargs or {})
+                )
+
+    def claim(self, fetch: Callable[[], TaskFetchResponse]) -> TaskFetchResponse:
+        """Fetch a task from the queues in weighted round-robin order.
+
+        Args:
+            fetch: Fetches a task from the active queue.
+
+        Returns:
+            The first response with a task, with its queue left active, or the last empty response
+            if no queue has a task.
+        """
+        tried = set()
+        resp = None
+        for offset in range(len(self._schedule)):
+            name = self._schedule[(self._turn + offset) % len(self._schedule)]
+            if name in tried:
+                continue
+            tried.add(name)
+            self.activate(name)
+            resp = fetch()
+            if resp.found:
+                self._turn = (self._turn + offset + 1) % len(self._schedule)
+                return resp
+            if len(tried) == len(self.weights):
+                break
+        return resp  # type: ignore[return-value]
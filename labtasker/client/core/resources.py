@@ -0,0 +1,188 @@
+"""Local accounting of resources between concurrent `labtasker loop` runs on one machine.
+
+Each loop knows the capacity of the machine (e.g. {"cpus": 32, "mem_gb": 128}). The resources
+requested by the task a loop is running are recorded in a ledger file shared by the loops of the
+machine, so that a loop only asks the server for tasks fitting the capacity left by the others.
+The ledger is locked from the computation of the free capacity until the fetched task is recorded,
+so that two loops never claim the same free capacity.
+"""
+
+import json
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Mapping, Optional, Union
+
+from labtasker.client.core.exceptions import LabtaskerValueError
+from labtasker.client.core.paths import get_labtasker_root
+
+
+def detect_capacity() -> Dict[str, float]:
+    """Capacity of the machine: number of CPUs and physical memory in GB (if available)."""
+    capacity = {"cpus": float(os.cpu_count() or 1)}
+    try:
+        mem = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        capacity["mem_gb"] = round(mem / 1024**3, 1)
+    except (AttributeError, ValueError, OSError):  # e.g. Windows
+        pass
+    return capacity
+
+
+def resolve_capacity(
+    capacity: Optional[Union[str, Mapping[str, float]]],
+) -> Optional[Dict[str, float]]:
+    """Resolve a capacity specification.
+
+    Args:
+        capacity: None (no resource matching), "auto" (detected capacity), or a dict of
+            resource amounts, which take precedence over the detected ones.
+    """
+    if capacity is None:
+        return None
+    if capacity == "auto":
+        return detect_capacity()
+    if not isinstance(capacity, Mapping):
+        raise LabtaskerValueError(
+            f"Invalid capacity {capacity!r}. Capacity must be 'auto' or a dict of resource amounts."
+        )
+    for name, amount in capacity.items():
+        if (
+            isinstance(amount, bool)
+            or not isinstance(amount, (int, float))
+            or amount < 0
+        ):
+            raise LabtaskerValueError(
+                f"Invalid capacity of '{name}': {amount!r}. Amounts must be non-negative numbers."
+            )
+    return {**detect_capacity(), **capacity}
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Exclusive lock between processes, held on a lock file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+") as f:
+        # rather than os.name, which mypy does not narrow the platform on
+        if sys.platform == "win32":
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 seconds
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        import ctypes
+
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        handle = ctypes.windll.kernel32.OpenProcess(  # type: ignore[attr-defined]
+            PROCESS_QUERY_LIMITED_INFORMATION, False, pid
+        )
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)  # type: ignore[attr-defined]
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, owned by another user
+        return True
+    return True
+
+
+class ResourceLedger:
+    """Resources allocated to the tasks run by the loops of this machine, by loop process id.
+
+    Usage:
+        with ledger.locked() as free:
+            resp = fetch_task(capacity=free)
+            if resp.found:
+                ledger.allocate(resp.task.task_id, resp.task.resources)
+        ...  # run the task
+        ledger.release()
+    """
+
+    def __init__(self, capacity: Dict[str, float], path: Optional[Path] = None):
+        self.capacity = dict(capacity)
+        self.path = Path(path) if path else get_labtasker_root() / "resources.json"
+        self._lock_path = self.path.with_name(self.path.name + ".lock")
+        self._key = str(os.getpid())
+        self._entries: Optional[Dict[str, Any]] = None  # loaded while locked
+
+    @contextmanager
+    def locked(self) -> Iterator[Dict[str, float]]:
+        """Lock the ledger and yield the capacity left by the tasks of the other loops."""
+        with _file_lock(self._lock_path):
+            self._entries = self._load()
+            try:
+                yield self._free(self._entries)
+            finally:
+                entries, self._entries = self._entries, None
+                self._dump(entries)
+
+    def allocate(self, task_id: str, resources: Optional[Mapping[str, float]]):
+        """Record the resources of the task fetched by this loop. Must be called within `locked()`."""
+        if self._entries is None:
+            raise RuntimeError(
+                "ResourceLedger.allocate() must be called within locked()"
+            )
+        self._entries[self._key] = {
+            "task_id": task_id,
+            "resources": dict(resources or {}),
+        }
+
+    def release(self):
+        """Release the resources of the task of this loop."""
+        with _file_lock(self._lock_path):
+            entries = self._load()
+            if entries.pop(self._key, None) is not None:
+                self._dump(entries)
+
+    def _free(self, entries: Dict[str, Any]) -> Dict[str, float]:
+        free = dict(self.capacity)
+        for key, entry in entries.items():
+            if key == self._key:  # stale entry of this loop
+                continue
+            for name, amount in entry["resources"].items():
+                if name in free:
+                    free[name] = max(0.0, free[name] - amount)
+        return free
+
+    def _load(self) -> Dict[str, Any]:
+        """Load the entries of the loops that are still alive."""
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):  # missing or corrupted
+            return {}
+        return {
+            key: entry
+            for key, entry in entries.items()
+            if key == self._key or (key.isdigit() and _pid_alive(int(key)))
+        }
+
+    def _dump(self, entries: Dict[str, Any]):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(entries, f, indent=4)  # type: ignore
+        os.replace(tmp, self.path)
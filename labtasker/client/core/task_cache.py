@@ -0,0 +1,196 @@
+"""
+Local on-disk cache of the tasks of a queue, synced incrementally via the task change feed.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from mongomock.filtering import filter_applies
+
+from labtasker.api_models import Task
+from labtasker.client.core.api import ls_task_changes
+from labtasker.client.core.config import get_client_config
+from labtasker.client.core.logging import logger
+from labtasker.client.core.paths import get_labtasker_root
+from labtasker.utils import get_current_time
+
+__all__ = [
+    "TaskCache",
+    "get_task_cache_path",
+]
+
+_CACHE_FORMAT_VERSION = 3  # 2: string change tokens, 3: revisions from a counter
+
+
+def get_task_cache_path() -> Path:
+    return get_labtasker_root() / "cache" / "tasks.json"
+
+
+def _get_path(doc: Dict[str, Any], key: str) -> Any:
+    for k in key.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(k)  # type: ignore[assignment]
+    return doc
+
+
+def _sort_key(key: str):
+    def get(doc: Dict[str, Any]):
+        value = _get_path(doc, key)
+        return (False, 0) if value is None else (True, value)
+
+    return get
+
+
+class TaskCache:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or get_task_cache_path()
+
+        config = get_client_config()
+        self._owner = {
+            "api_base_url": str(config.endpoint.api_base_url),
+            "queue_name": config.queue.queue_name,
+        }
+
+        self.queue_id: Optional[str] = None
+        self.revision = "0"  # change token
+        self.synced_at: Optional[datetime] = None
+        self.tombstone_ttl: Optional[float] = None
+        self.tasks: Dict[str, Task] = {}
+
+        self.load()
+
+    def reset(self):
+        self.queue_id = None
+        self.revision = "0"
+        self.synced_at = None
+        self.tasks = {}
+
+    def load(self):
+        """Load the cache from disk. A cache of another server/queue is discarded."""
+        self.reset()
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (
+                data.get("version") != _CACHE_FORMAT_VERSION
+                or data.get("owner") != self._owner
+            ):
+                return
+            self.queue_id = data["queue_id"]
+            self.revision = data["revision"]
+            self.synced_at = (
+                datetime.fromisoformat(data["synced_at"]) if data["synced_at"] else None
+            )
+            self.tombstone_ttl = data.get("tombstone_ttl")
+            self.tasks = {
+                task_id: Task.model_validate(task)
+                for task_id, task in data["tasks"].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Discarding corrupted task cache {self.path}: {e}")
+            self.reset()
+
+    def save(self):
+        """Atomically write the cache to disk."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": _CACHE_FORMAT_VERSION,
+            "owner": self._owner,
+            "queue_id": self.queue_id,
+            "revision": self.revision,
+            "synced_at": self.synced_at.isoformat() if self.synced_at else None,
+            "tombstone_ttl": self.tombstone_ttl,
+            "tasks": {
+                task_id: task.model_dump(mode="json")
+                for task_id, task in self.tasks.items()
+            },
+        }
+        tmp_path = self.path.with_suffix(f".tmp{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def sync(self, client: Optional[httpx.Client] = None) -> int:
+        """Fetch the changes since the last sync from the server.
+
+        Returns:
+            The number of changes applied.
+        """
+        now = get_current_time()
+        if (
+            self.synced_at is not None
+            and self.tombstone_ttl is not None
+            and now - self.synced_at > timedelta(seconds=self.tombstone_ttl)
+        ):
+            # deletes since the last sync may have been forgotten by the server
+            self.reset()
+
+        n_changes = 0
+        while True:
+            changes = ls_task_changes(since=self.revision, client=client)
+            if self.queue_id is not None and changes.queue_id != self.queue_id:
+                # queue re-created, start over
+                self.reset()
+                n_changes = 0
+                continue
+
+            self.queue_id = changes.queue_id
+            self.tombstone_ttl = changes.tombstone_ttl
+            for task in changes.changed:
+                if self.tasks.get(task.task_id) != task:
+                    self.tasks[task.task_id] = task
+                    n_changes += 1
+            for task_id in changes.deleted:
+                if self.tasks.pop(task_id, None) is not None:
+                    n_changes += 1
+            advanced = changes.revision != self.revision
+            self.revision = changes.revision
+
+            if not changes.has_more or not advanced:
+                break
+
+        self.synced_at = now
+        self.save()
+        return n_changes
+
+    def query(
+        self,
+        task_id: Optional[str] = None,
+        task_name: Optional[str] = None,
+        status: Optional[str] = None,
+        extra_filter: Optional[Dict[str, Any]] = None,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Task]:
+        """Query the cached tasks like `ls_tasks`, using the same MongoDB filter syntax."""
+        query: Dict[str, Any] = dict(extra_filter or {})
+        if task_id:
+            query["_id"] = task_id
+        if task_name:
+            query["task_name"] = task_name
+        if status:
+            query["status"] = status
+
+        docs = []
+        for task in self.tasks.values():
+            doc = task.model_dump()
+            doc["_id"] = task.task_id  # alias used in filters
+            if filter_applies(query, doc):
+                docs.append(doc)
+
+        # stable sorts from the least significant key. None is the smallest value.
+        for key, direction in reversed(sort or [("last_modified", 1)]):
+            docs.sort(key=_sort_key(key), reverse=direction < 0)
+
+        docs = docs[offset:]
+        if limit is not None:
+            docs = docs[:limit]
+        return [self.tasks[d["task_id"]] for d in docs]
@@ -1,7 +1,9 @@
+import random
 from functools import wraps
-from typing import Callable, Optional
+from typing import Any, Callable, Optional
 
 import httpx
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS
 
 from labtasker.api_models import BaseResponseModel
 from labtasker.client.core.config import get_client_config
@@ -13,6 +15,7 @@
 )
 from labtasker.client.core.logging import stderr_console, stdout_console
 from labtasker.client.core.paths import get_labtasker_client_config_path
+from labtasker.msgpack_codec import is_msgpack, unpackb
 
 server_notification_prefix = {
     "info": "[bold dodger_blue1]INFO(notification):[/bold dodger_blue1] ",
@@ -112,3 +115,31 @@ def raise_for_status(r: httpx.Response) -> httpx.Response:
         raise httpx.HTTPStatusError(
             enhanced_message, request=e.request, response=e.response
         ) from None
+
+
+def decode_response(r: httpx.Response) -> Any:
+    """Decode the body of a response, JSON or MessagePack (see labtasker.msgpack_codec)."""
+    if is_msgpack(r.headers.get("content-type")):
+        return unpackb(r.content)
+    return r.json()
+
+
+def retry_after(e: BaseException, jitter: float = 1.0) -> Optional[float]:
+    """
+    Seconds to wait before retrying a request that a busy server rejected with 429, following its
+    Retry-After header. A random jitter of up to `jitter` times the delay is added, so that the
+    rejected clients do not come back all at once.
+
+    Returns:
+        The delay, or None if `e` is not such a rejection.
+    """
+    if (
+        not isinstance(e, httpx.HTTPStatusError)
+        or e.response.status_code != HTTP_429_TOO_MANY_REQUESTS
+    ):
+        return None
+    try:
+        delay = max(float(e.response.headers.get("retry-after", 1.0)), 0.0)
+    except ValueError:  # an HTTP date, not sent by labtasker servers
+        delay = 1.0
+    return delay * random.uniform(1.0, 1.0 + jitter)
@@ -9,3 +9,6 @@ class Priority(int, Enum):
 
 KEY_PATTERN = r"^[a-zA-Z0-9_-]+$"
 DOT_SEPARATED_KEY_PATTERN = r"^[a-zA-Z0-9_-]+(\.[a-zA-Z0-9_-]+)*$"
+
+# Change token of the task change feed: "<revision>" or "<revision>:<task id>"
+CHANGE_TOKEN_PATTERN = r"^\d+(:.+)?$"
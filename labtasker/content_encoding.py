@@ -0,0 +1,107 @@
+"""Compression of HTTP bodies (Content-Encoding), shared by the server and the client.
+
+gzip is always supported, zstd if the optional `zstandard` package is installed.
+"""
+
+import zlib
+from typing import Any, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None  # type: ignore[assignment]
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+DEFAULT_LEVELS = {GZIP: 6, ZSTD: 3}
+
+
+class BodyTooLarge(ValueError):
+    """A body decompresses to more than the max size."""
+
+
+def supported_encodings() -> List[str]:
+    """Supported encodings, preferred first."""
+    return [ZSTD, GZIP] if zstandard is not None else [GZIP]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The preferred supported encoding of an Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for coding in accept_encoding.split(","):
+        name, *params = coding.replace(" ", "").lower().split(";")
+        if "q=0" not in params and "q=0.0" not in params:
+            accepted.add(name)
+    for encoding in supported_encodings():
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    compressor = StreamCompressor(encoding, level)
+    return compressor.compress(data, flush=False) + compressor.finish()
+
+
+def decompress(data: bytes, encoding: str, max_size: Optional[int] = None) -> bytes:
+    """Decompress a body.
+
+    Raises:
+        BodyTooLarge: If the body decompresses to more than `max_size` bytes.
+        ValueError: If the encoding is not supported, or the body is invalid.
+    """
+    encoding = encoding.strip().lower()
+    if encoding == GZIP:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            result = decompressor.decompress(data, max_size or 0)
+        except zlib.error as e:
+            raise ValueError(f"Invalid gzip body: {e}") from e
+        if decompressor.unconsumed_tail:
+            raise BodyTooLarge(f"Body decompresses to more than {max_size} bytes")
+        if not decompressor.eof:
+            raise ValueError("Truncated gzip body")
+        return result
+    if encoding == ZSTD and zstandard is not None:
+        try:
+            reader = zstandard.ZstdDecompressor().stream_reader(data)
+            result = reader.read(max_size + 1 if max_size else -1)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Invalid zstd body: {e}") from e
+        if max_size and len(result) > max_size:
+            raise BodyTooLarge(f"Body decompresses to more than {max_size} bytes")
+        return result
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+class StreamCompressor:
+    """Compresses a body chunk by chunk, e.g. of a streamed response."""
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        if level is None:
+            level = DEFAULT_LEVELS[encoding]
+        self._compressor: Any
+        if encoding == GZIP:
+            self._compressor = zlib.compressobj(
+                level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+        elif encoding == ZSTD and zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    def compress(self, chunk: bytes, flush: bool = True) -> bytes:
+        """Compress a chunk. With `flush`, all of it can be decompressed from the output so far
+        (e.g. for an event to reach the client right away)."""
+        data = self._compressor.compress(chunk)
+        if flush:
+            data += self._compressor.flush(self._flush_mode)
+        return data
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
@@ -0,0 +1,63 @@
+"""MessagePack wire format of the API, negotiated by content type.
+
+A client sending `Accept: application/msgpack` gets its responses as MessagePack instead of JSON,
+and once the server has replied with MessagePack, the client sends its request bodies as
+`Content-Type: application/msgpack` too. Error responses stay JSON.
+
+Datetimes are packed as timestamps instead of ISO strings:
+    - aware datetimes as the MessagePack timestamp extension type (-1), decoded as UTC;
+    - naive datetimes (as used by the server) as the same timestamp bytes in extension
+      type 1, decoded back as naive datetimes, so that they round-trip as they are.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import msgpack
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+NAIVE_DATETIME_EXT_TYPE = 1
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, datetime):  # naive, aware ones are packed natively
+        timestamp = msgpack.Timestamp.from_datetime(obj.replace(tzinfo=timezone.utc))
+        return msgpack.ExtType(NAIVE_DATETIME_EXT_TYPE, timestamp.to_bytes())
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError(
+        f"Object of type {type(obj).__name__} is not MessagePack serializable"
+    )
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == NAIVE_DATETIME_EXT_TYPE:
+        return msgpack.Timestamp.from_bytes(data).to_datetime().replace(tzinfo=None)
+    return msgpack.ExtType(code, data)
+
+
+def packb(obj: Any) -> bytes:
+    return msgpack.packb(obj, datetime=True, default=_default)
+
+
+def unpackb(data: bytes) -> Any:
+    return msgpack.unpackb(data, timestamp=3, ext_hook=_ext_hook)
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    """Whether a Content-Type header is MessagePack."""
+    if not content_type:
+        return False
+    return content_type.split(";", 1)[0].strip().lower() == MSGPACK_MEDIA_TYPE
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """Whether an Accept header lists MessagePack."""
+    if not accept:
+        return False
+    for media_range in accept.split(","):
+        if is_msgpack(media_range):
+            params = media_range.replace(" ", "").lower().split(";")[1:]
+            return "q=0" not in params and "q=0.0" not in params
+    return False
@@ -0,0 +1,168 @@
+"""Admission control of HTTP requests.
+
+At most `admission_max_concurrency` requests are handled at once. A request over budget is
+rejected right away with 429 and a `Retry-After` header, instead of queueing up in the threadpool
+and slowing every request down. Clients retry after the given delay (with jitter).
+
+Requests are split into priority classes, each allowed a share of the budget:
+    - critical: heartbeats, status reports and worker leases, which keep running tasks alive.
+    - normal: fetches and the other writes.
+    - low: reads (gets, searches).
+A low priority request is only admitted while half of the budget is free, so that heartbeats and
+reports are still admitted when the server is busy serving fetches and searches.
+
+Endpoints run in the threadpool of anyio (40 threads by default), which is sized on startup to
+hold every admitted request (see `size_threadpool`).
+
+The operations sent over worker channels are admission controlled the same way, classified by
+their name.
+"""
+
+import json
+import math
+import threading
+from typing import Dict, Optional
+
+import anyio.to_thread
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS
+
+from labtasker.server.config import get_server_config
+
+PRIORITY_CRITICAL = "critical"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+
+# share of the concurrency budget a request of each class may use
+PRIORITY_SHARES = {
+    PRIORITY_CRITICAL: 1.0,
+    PRIORITY_NORMAL: 0.75,
+    PRIORITY_LOW: 0.5,
+}
+
+CRITICAL_ACTIONS = {"heartbeat", "status", "lease"}
+READ_ACTIONS = {"search", "explain"}
+
+# operations sent over worker channels (see the channel endpoint), by name
+CRITICAL_OPERATIONS = {
+    "refresh_task_heartbeat",
+    "report_task_status",
+    "report_worker_status",
+    "renew_worker_lease",
+}
+
+# not admission controlled: long-lived event streams, and monitoring of a busy server
+EXEMPT_PATHS = {"/api/v1/queues/me/events", "/api/v1/metrics"}
+
+
+def priority_class(method: str, path: str) -> Optional[str]:
+    """The priority class of a request, or None if it is not admission controlled."""
+    if not path.startswith("/api/") or path in EXEMPT_PATHS:
+        return None
+    action = path.rstrip("/").rsplit("/", 1)[-1]
+    if method == "POST" and action in CRITICAL_ACTIONS:
+        return PRIORITY_CRITICAL
+    if method == "GET" or action in READ_ACTIONS:
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+def operation_priority_class(op: str) -> str:
+    """The priority class of an operation sent over a worker channel."""
+    if op in CRITICAL_OPERATIONS:
+        return PRIORITY_CRITICAL
+    if op.startswith(("get_", "ls_")):
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+def retry_after_seconds() -> int:
+    """The delay a rejected client is asked to wait before retrying."""
+    return max(1, math.ceil(get_server_config().admission_retry_after))
+
+
+def size_threadpool():
+    """Grow the threadpool of the running event loop to `admission_max_concurrency` threads, so
+    that admitted requests do not queue up for a thread."""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(
+        limiter.total_tokens, get_server_config().admission_max_concurrency
+    )
+
+
+class AdmissionController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.admitted = dict.fromkeys(PRIORITY_SHARES, 0)
+        self.rejected = dict.fromkeys(PRIORITY_SHARES, 0)
+
+    def try_acquire(self, priority: str) -> bool:
+        max_concurrency = get_server_config().admission_max_concurrency
+        with self._lock:
+            if (
+                max_concurrency > 0
+                and self.in_flight >= PRIORITY_SHARES[priority] * max_concurrency
+            ):
+                self.rejected[priority] += 1
+                return False
+            self.in_flight += 1
+            self.admitted[priority] += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def metrics(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "admitted": dict(self.admitted),
+                "rejected": dict(self.rejected),
+            }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware rejecting the HTTP requests over the concurrency budget with 429."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        priority = (
+            priority_class(scope["method"], scope["path"])
+            if scope["type"] == "http"
+            else None
+        )
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not admission_controller.try_acquire(priority):
+            await _reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_controller.release()
+
+
+async def _reject(send):
+    retry_after = retry_after_seconds()
+    body = json.dumps({"detail": "Server busy. Retry later."}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": HTTP_429_TOO_MANY_REQUESTS,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+# Global admission controller
+admission_controller = AdmissionController()
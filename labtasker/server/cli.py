@@ -1,4 +1,6 @@
 import os
+import socket
+import stat
 from enum import Enum
 from pathlib import Path
 from typing import Optional
@@ -35,6 +37,20 @@ def serve(
         "0.0.0.0", envvar="API_HOST", help="IP address of the server."
     ),
     port: int = typer.Option(9321, envvar="API_PORT", help="Port to listen to."),
+    uds: Optional[Path] = typer.Option(
+        None,
+        envvar="API_UDS",
+        help="Listen to this Unix domain socket instead of host:port.",
+    ),
+    uds_mode: str = typer.Option(
+        "600", envvar="API_UDS_MODE", help="Octal permissions of the socket file."
+    ),
+    uds_trust: bool = typer.Option(
+        False,
+        envvar="API_UDS_TRUST",
+        help="Do not check the queue passwords of the requests over the socket, "
+        "relying on its permissions instead.",
+    ),
     db_mode: DbMode = typer.Option(
         "embedded", case_sensitive=False, envvar="DB_MODE", help="Database mode."
     ),
@@ -59,6 +75,10 @@ def serve(
 
     os.environ["API_HOST"] = host
     os.environ["API_PORT"] = str(port)
+    if uds is not None:
+        os.environ["API_UDS"] = str(uds)
+    os.environ["API_UDS_MODE"] = uds_mode
+    os.environ["API_UDS_TRUST"] = str(uds_trust).lower()
 
     init_server_config(env_file)
     config = get_server_config()
@@ -78,7 +98,48 @@ def serve(
     # import after set_db_service
     from labtasker.server.endpoints import app
 
-    uvicorn.run(app, host=config.api_host, port=config.api_port, log_config=log_config)
+    if config.api_uds is None:
+        uvicorn.run(
+            app, host=config.api_host, port=config.api_port, log_config=log_config
+        )
+        return
+
+    sock = _bind_unix_socket(config.api_uds, int(config.api_uds_mode, 8))
+    try:
+        uvicorn.run(app, fd=sock.fileno(), log_config=log_config)
+    finally:
+        sock.close()
+        os.unlink(config.api_uds)
+
+
+def _bind_unix_socket(path: str, mode: int) -> socket.socket:
+    """Bind a Unix domain socket, with the permissions `mode` from the start (uvicorn would
+    make the socket file world-writable). A stale socket file, left by a server that did not
+    shut down cleanly, is replaced."""
+    if os.path.lexists(path):
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise typer.BadParameter(f"{path} exists and is not a socket.")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)  # stale
+        else:
+            raise typer.BadParameter(f"A server is already listening to {path}.")
+        finally:
+            probe.close()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o777 & ~mode)  # no window with wider permissions
+    try:
+        sock.bind(path)
+    except OSError:
+        sock.close()
+        raise
+    finally:
+        os.umask(umask)
+    os.chmod(path, mode)
+    return sock
 
 
 def main():
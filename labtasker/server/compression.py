@@ -0,0 +1,198 @@
+"""Compression of request and response bodies (see labtasker.content_encoding).
+
+Responses of at least `compression_min_size` bytes are compressed with the preferred encoding the
+client accepts (Accept-Encoding). Streamed responses (e.g. event streams) are compressed chunk by
+chunk, each chunk flushed so that it reaches the client right away.
+
+Request bodies sent with a Content-Encoding (e.g. bulk submits) are decompressed before they are
+handled.
+"""
+
+import json
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+)
+
+from labtasker.content_encoding import (
+    ZSTD,
+    BodyTooLarge,
+    StreamCompressor,
+    compress,
+    decompress,
+    negotiate_encoding,
+    supported_encodings,
+)
+from labtasker.server.config import get_server_config
+
+
+def _compression_level(encoding: str) -> int:
+    config = get_server_config()
+    return (
+        config.compression_zstd_level if encoding == ZSTD else config.compression_level
+    )
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses and decompressing request bodies."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding")
+        if content_encoding and content_encoding.strip().lower() != "identity":
+            scope, receive = await self._decompress_request(
+                scope, receive, send, content_encoding
+            )
+            if scope is None:
+                return
+
+        min_size = get_server_config().compression_min_size
+        encoding = negotiate_encoding(headers.get("accept-encoding"))
+        if min_size < 0 or encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, min_size))
+
+    async def _decompress_request(self, scope, receive, send, content_encoding: str):
+        """Return the scope and receive of the decompressed request, or (None, None) once
+        an error response is sent."""
+        if content_encoding.strip().lower() not in supported_encodings():
+            await _error(
+                send,
+                HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                f"Unsupported content encoding: {content_encoding}",
+                accept_encoding=", ".join(supported_encodings()),
+            )
+            return None, None
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None, None
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+
+        max_size = get_server_config().max_decompressed_body_size
+        try:
+            body = decompress(b"".join(chunks), content_encoding, max_size=max_size)
+        except BodyTooLarge as e:
+            await _error(send, HTTP_413_REQUEST_ENTITY_TOO_LARGE, str(e))
+            return None, None
+        except ValueError as e:
+            await _error(send, HTTP_400_BAD_REQUEST, str(e))
+            return None, None
+
+        headers = MutableHeaders(scope={**scope, "headers": list(scope["headers"])})
+        del headers["content-encoding"]
+        headers["content-length"] = str(len(body))
+        sent = False
+
+        async def receive_decompressed():
+            nonlocal sent
+            if sent:
+                return await receive()  # e.g. http.disconnect
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return {**scope, "headers": headers.raw}, receive_decompressed
+
+
+class _CompressingSend:
+    """Wraps the send of a response, compressing its body if it is large enough or streamed."""
+
+    def __init__(self, send, encoding: str, min_size: int):
+        self._send = send
+        self._encoding = encoding
+        self._min_size = min_size
+        self._start: Optional[dict] = None
+        self._compressor: Optional[StreamCompressor] = None
+        self._passthrough = False
+
+    async def __call__(self, message):
+        if self._passthrough:
+            await self._send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if "content-encoding" in headers:  # already encoded
+                self._passthrough = True
+                await self._send(message)
+            else:
+                self._start = message  # sent with the first chunk of the body
+            return
+
+        if message["type"] != "http.response.body" or self._start is None:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._compressor is None:
+            if not more_body:  # the whole body at once
+                start, self._start = self._start, None
+                if len(body) < self._min_size:
+                    self._passthrough = True
+                    await self._send(start)
+                    await self._send(message)
+                    return
+                body = compress(
+                    body, self._encoding, _compression_level(self._encoding)
+                )
+                await self._send(self._encoded_start(start, content_length=len(body)))
+                await self._send({"type": "http.response.body", "body": body})
+                return
+
+            # streamed: compressed whatever its size, as it is unknown
+            self._compressor = StreamCompressor(
+                self._encoding, _compression_level(self._encoding)
+            )
+            await self._send(self._encoded_start(self._start))
+
+        if more_body:
+            data = self._compressor.compress(body)
+        else:
+            data = (
+                self._compressor.compress(body, flush=False) + self._compressor.finish()
+            )
+        await self._send(
+            {"type": "http.response.body", "body": data, "more_body": more_body}
+        )
+
+    def _encoded_start(self, start: dict, content_length: Optional[int] = None) -> dict:
+        headers = MutableHeaders(raw=list(start["headers"]))
+        headers["content-encoding"] = self._encoding
+        headers.add_vary_header("Accept-Encoding")
+        if content_length is None:
+            del headers["content-length"]
+        else:
+            headers["content-length"] = str(content_length)
+        return {**start, "headers": headers.raw}
+
+
+async def _error(send, status_code: int, detail: str, **extra_headers: str):
+    body = json.dumps({"detail": detail}).encode()
+    headers: List[Tuple[bytes, bytes]] = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    for name, value in extra_headers.items():
+        headers.append((name.replace("_", "-").encode(), value.encode()))
+    await send(
+        {"type": "http.response.start", "status": status_code, "headers": headers}
+    )
+    await send({"type": "http.response.body", "body": body})
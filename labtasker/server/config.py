@@ -1,7 +1,7 @@
 from pathlib import Path
 from typing import Optional, Union
 
-from pydantic import field_validator
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -16,13 +16,99 @@ class ServerConfig(BaseSettings):
     # API settings
     api_host: str = "0.0.0.0"
     api_port: int = 9321
+    # Serve on this Unix domain socket instead of TCP, for clients on the same machine
+    # (`api_base_url = "unix:///path/to/socket"`). The socket file gets the (octal) permissions
+    # `api_uds_mode`. With `api_uds_trust`, the passwords of the requests over the socket are
+    # not checked: whoever the permissions let connect may use any queue.
+    api_uds: Optional[str] = None
+    api_uds_mode: str = Field("600", pattern=r"^[0-7]{3,4}$")
+    api_uds_trust: bool = False
 
     # Other settings
     periodic_task_interval: float = 30.0
+    # Heartbeats are buffered in memory and flushed with one bulk write per interval (in seconds).
+    # Heartbeat timeouts are extended by this interval. 0 to write each heartbeat through.
+    heartbeat_flush_interval: float = 5.0
+    # Heartbeat responses recommend the interval (in seconds) until the next heartbeat. It grows
+    # from `heartbeat_interval` with the load (request rate over `heartbeat_load_target_rate` per
+    # second, or latency over `heartbeat_load_target_latency_ms`), within the min and max, and is
+    # capped so that at least three heartbeats are sent per heartbeat timeout of the task.
+    heartbeat_interval: float = 30.0
+    heartbeat_interval_min: float = 1.0
+    heartbeat_interval_max: float = 300.0
+    heartbeat_load_target_rate: float = Field(200.0, gt=0)
+    heartbeat_load_target_latency_ms: float = Field(50.0, gt=0)
+
+    # Concurrent fetch requests of a queue arriving within this window (in milliseconds)
+    # are served by one batched claim. 0 to disable batching.
+    fetch_batch_window_ms: float = 5.0
+    fetch_batch_max_size: int = 100
+
+    # Max number of pending task candidates kept in memory per (queue, fetch request shape).
+    # 0 to disable the in-memory ready-queue.
+    ready_queue_size: int = 256
+    # Candidates are reloaded after this time (in seconds), which bounds staleness
+    # when several server processes share a database.
+    ready_queue_ttl: float = 5.0
+    # Max number of (queue, fetch request shape) kept in memory, the least recently used are
+    # dropped first.
+    ready_queue_max_heaps: int = Field(1024, gt=0)
+
+    # A fetch advertising an affinity (e.g. the datasets a worker has loaded) is handed out a
+    # matching task of the same priority instead of the next task in order, unless the next task
+    # has been pending for longer than this (in seconds).
+    affinity_max_wait: float = 60.0
+
+    # At most this many API requests are handled at once (0 to disable). Requests over budget are
+    # rejected with 429 and a Retry-After of `admission_retry_after` seconds. Fetches and writes
+    # may use 75% of the budget and reads 50%, the rest is kept for heartbeats and reports.
+    admission_max_concurrency: int = Field(64, ge=0)
+    admission_retry_after: float = 1.0
+
+    # Responses of at least this many bytes are compressed (gzip, or zstd if the `zstandard`
+    # package is installed) when the client accepts it. Streamed responses are compressed
+    # whatever their size. Negative to disable.
+    compression_min_size: int = 1024
+    compression_level: int = Field(6, ge=1, le=9)  # gzip
+    compression_zstd_level: int = Field(3, ge=1, le=22)
+    # Compressed request bodies (e.g. bulk submits) decompressing to more than this many bytes
+    # are rejected with 413.
+    max_decompressed_body_size: int = Field(64 * 1024 * 1024, gt=0)
 
     event_buffer_size: int = 100
     sse_ping_interval: float = 15.0  # in seconds
 
+    max_queue_indexes: int = 8  # max number of user-declared indexes per queue
+
+    # Storage layout of the tasks of new queues: "shared" (one tasks collection for all queues)
+    # or "partitioned" (a tasks collection per queue). Existing queues are moved between layouts
+    # with `labtasker queue migrate-layout`.
+    task_layout: str = Field("shared", pattern=r"^(shared|partitioned)$")
+
+    # Background jobs (e.g. `labtasker queue delete --cascade --async`) run in chunks of this many
+    # documents, each chunk in its own transaction.
+    job_chunk_size: int = Field(500, gt=0)
+    job_poll_interval: float = (
+        1.0  # in seconds, how often idle servers look for jobs to run
+    )
+    # A job is taken over by another server process if its chunk is not done within this time
+    # (in seconds), e.g. after a crash.
+    job_lease: float = 120.0
+
+    # Operations slower than this are recorded in the slow operation log. Negative to disable.
+    slow_op_threshold_ms: float = 100.0
+    slow_op_log_size: int = 1000  # max number of entries kept in the slow operation log
+
+    # Memory budget (in MB) of the cache of task/worker search results, 0 (default) to disable.
+    # The cache is invalidated by the writes of its own server process only. With several server
+    # processes, the changes made by the others show up after query_cache_ttl.
+    query_cache_max_mb: float = 0.0
+    # in seconds, bounds the staleness of last_heartbeat and of changes made by other processes
+    query_cache_ttl: float = 10.0
+
+    # Tombstones of deleted tasks are kept this long (in seconds) for the task change feed
+    change_feed_tombstone_ttl: float = 7 * 24 * 3600
+
     model_config = SettingsConfigDict(
         # env_file=".env",
         env_file_encoding="utf-8",
@@ -0,0 +1,67 @@
+"""Negotiation of the wire format (JSON or MessagePack) of the API routes.
+
+See labtasker.msgpack_codec.
+"""
+
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from labtasker.msgpack_codec import (
+    MSGPACK_MEDIA_TYPE,
+    accepts_msgpack,
+    is_msgpack,
+    packb,
+    unpackb,
+)
+
+_respond_msgpack: ContextVar[bool] = ContextVar("respond_msgpack", default=False)
+
+
+class MsgPackRequest(Request):
+    """Request with a MessagePack body, parsed by FastAPI as a JSON one."""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = unpackb(await self.body())
+        return self._json
+
+
+class NegotiatedResponse(JSONResponse):
+    """JSON response, or MessagePack if the request accepts it."""
+
+    def render(self, content: Any) -> bytes:
+        if _respond_msgpack.get():
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return packb(content)
+        return super().render(content)
+
+
+class NegotiatedRoute(APIRoute):
+    """Route accepting MessagePack request bodies and responding with MessagePack on demand."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        original_route_handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if is_msgpack(request.headers.get("content-type")):
+                # FastAPI only parses JSON bodies, so present it as one to be decoded by `json()`
+                headers = [
+                    (key, value)
+                    for key, value in request.scope["headers"]
+                    if key != b"content-type"
+                ]
+                headers.append((b"content-type", b"application/json"))
+                request = MsgPackRequest(
+                    {**request.scope, "headers": headers}, request.receive
+                )
+            token = _respond_msgpack.set(accepts_msgpack(request.headers.get("accept")))
+            try:
+                return await original_route_handler(request)
+            finally:
+                _respond_msgpack.reset(token)
+
+        return route_handler
@@ -1,26 +1,63 @@
-from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+import json
+import re
+import threading
+from contextlib import nullcontext
+from datetime import timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from uuid import uuid4
 
 from fastapi import HTTPException
-from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
 from pymongo.collection import Collection, ReturnDocument
 from pymongo.database import Database
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, OperationFailure
 from starlette.status import (
     HTTP_400_BAD_REQUEST,
     HTTP_403_FORBIDDEN,
     HTTP_404_NOT_FOUND,
     HTTP_409_CONFLICT,
     HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_501_NOT_IMPLEMENTED,
 )
 
-from labtasker.constants import Priority
+from labtasker.constants import (
+    CHANGE_TOKEN_PATTERN,
+    DOT_SEPARATED_KEY_PATTERN,
+    KEY_PATTERN,
+    Priority,
+)
 from labtasker.security import hash_password
+from labtasker.server.config import get_server_config
 from labtasker.server.db_utils import (
+    ID_ALIASES,
+    LEGACY_CHANGE_FEED_INDEX,
+    LEGACY_TASK_QUEUE_STATUS_INDEXES,
+    TASK_DISPATCH_INDEX,
+    TASK_DISPATCH_INDEX_KEYS,
+    TASK_QUEUE_STATUS_INDEX,
+    TASK_QUEUE_STATUS_INDEX_KEYS,
     arg_match,
+    atomic_session,
+    build_query_pipeline,
+    choose_index_hint,
     keys_to_query_dict,
+    log_slow_op,
     merge_filter,
+    parse_explain,
     query_dict_to_mongo_filter,
+    query_shape,
     retry_on_transient,
     sanitize_dict,
     sanitize_query,
@@ -33,8 +70,19 @@
     TaskState,
     WorkerFSM,
     WorkerState,
+    collect_event_handles,
 )
+from labtasker.server.heartbeat_buffer import HeartbeatBuffer
 from labtasker.server.logging import logger
+from labtasker.server.query_cache import make_cache_key, query_cache
+from labtasker.server.ready_queue import cacheable, ready_queue
+from labtasker.server.scheduling import (
+    SCHEDULING_POLICY_KEY,
+    SchedStats,
+    SchedulingPolicy,
+    get_policy,
+)
+from labtasker.server.sweep import materialize_args, sweep_size
 from labtasker.utils import (
     add_key_prefix,
     get_current_time,
@@ -43,6 +91,34 @@
     unflatten_dict,
 )
 
+T = TypeVar("T")
+
+
+def _parse_change_token(token: str) -> Tuple[int, Optional[str]]:
+    """Parse a change token "<revision>" (all changes up to the revision are listed) or
+    "<revision>:<task id>" (the changes of the revision are listed up to the task)."""
+    if not re.match(CHANGE_TOKEN_PATTERN, token):
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"Invalid change token '{token}'",
+        )
+    revision, _, after_id = token.partition(":")
+    return int(revision), after_id or None
+
+
+def _after_token(revision: int, after_id: Optional[str], id_field: str):
+    """Filter of the changes after a change token."""
+    if after_id is not None:
+        return {
+            "$or": [
+                {"revision": {"$gt": revision}},
+                {"revision": revision, id_field: {"$gt": after_id}},
+            ]
+        }
+    if revision == 0:  # full listing, including the tasks of revision 0
+        return {}
+    return {"revision": {"$gt": revision}}
+
 
 class DBService:
 
@@ -54,8 +130,14 @@ def __init__(
     ):
         """
         Initialize database client. If client is provided, it will be used instead of connecting to MongoDB.
-        The instances of this class is stateless. The instance itself does not preserve any state across API calls.
+        The instances of this class is stateless. The instance itself does not preserve any state across API calls,
+        except for heartbeats buffered before they are flushed to the database.
         """
+        self._heartbeat_buffer = HeartbeatBuffer()
+        self._affinity_lock = threading.Lock()
+        self._affinity_requests = 0  # fetched tasks of requests with an affinity
+        self._affinity_hits = 0  # ... that match the affinity
+
         if client:
             self._client = client
             self._db = self._client[db_name]
@@ -80,8 +162,11 @@ def ping(self) -> bool:
     def is_empty(self):
         return (
             self._queues.count_documents({}) == 0
-            and self._tasks.count_documents({}) == 0
+            and all(
+                tasks.count_documents({}) == 0 for tasks in self._task_collections()
+            )
             and self._workers.count_documents({}) == 0
+            and self._sweeps.count_documents({}) == 0
         )
 
     def _setup_collections(self):
@@ -91,13 +176,60 @@ def _setup_collections(self):
         # _id is automatically indexed by MongoDB
         self._queues.create_index([("queue_name", ASCENDING)], unique=True)
 
-        # Tasks collection
+        # Tasks collection (shared by the queues of the shared layout)
         self._tasks: Collection = self._db.tasks
+        self._setup_task_indexes(self._tasks)
+        for legacy_index in LEGACY_TASK_QUEUE_STATUS_INDEXES:
+            if legacy_index in self._tasks.index_information():
+                self._tasks.drop_index(legacy_index)
+        # Tasks collections of the queues of the partitioned layout
+        for collection in self._task_collections()[1:]:
+            self._setup_task_indexes(collection)
+
+        # Tombstones of deleted tasks for the change feed
+        self._tombstones: Collection = self._db.tombstones
+        self._tombstones.create_index(
+            [("queue_id", ASCENDING), ("revision", ASCENDING), ("task_id", ASCENDING)]
+        )
+        if LEGACY_CHANGE_FEED_INDEX in self._tombstones.index_information():
+            self._tombstones.drop_index(LEGACY_CHANGE_FEED_INDEX)
+        tombstone_ttl = int(get_server_config().change_feed_tombstone_ttl)
+        try:
+            self._tombstones.create_index(
+                [("deleted_at", ASCENDING)],
+                name="tombstone_ttl",
+                expireAfterSeconds=tombstone_ttl,
+            )
+        except OperationFailure:  # ttl changed
+            self._tombstones.drop_index("tombstone_ttl")
+            self._tombstones.create_index(
+                [("deleted_at", ASCENDING)],
+                name="tombstone_ttl",
+                expireAfterSeconds=tombstone_ttl,
+            )
+
+        # Revision counters of the queues, one document per queue (see _next_revision)
+        self._revisions: Collection = self._db.revisions
+        self._revisions.create_index([("queue_id", ASCENDING)])
+
+        # Sweeps collection (lazy task templates)
+        self._sweeps: Collection = self._db.sweeps
         # _id is automatically indexed by MongoDB
-        self._tasks.create_index([("queue_id", ASCENDING)])  # Reference to queue._id
-        self._tasks.create_index([("status", ASCENDING)])
-        self._tasks.create_index([("priority", DESCENDING)])  # Higher priority first
-        self._tasks.create_index([("created_at", ASCENDING)])  # Older tasks first
+        self._sweeps.create_index(
+            [
+                ("queue_id", ASCENDING),
+                ("priority", DESCENDING),
+                ("created_at", ASCENDING),
+            ]
+        )
+
+        # Scheduling statistics (runtime history, fair share tags) of the queue policies
+        self._sched_stats: Collection = self._db.sched_stats
+        self._sched_stats.create_index([("queue_id", ASCENDING)])
+
+        # Running task counters of the concurrency limited groups of the queues
+        self._concurrency: Collection = self._db.concurrency
+        self._concurrency.create_index([("queue_id", ASCENDING)])
 
         # Workers collection
         self._workers: Collection = self._db.workers
@@ -106,9 +238,406 @@ def _setup_collections(self):
         self._workers.create_index(
             [("worker_name", ASCENDING)]
         )  # Optional index for searching
+        self._workers.create_index([("lease_expires", ASCENDING)])  # Worker leases
+
+        # Slow operation log (capped collection if supported by the backend)
+        if "slow_ops" not in self._db.list_collection_names():
+            try:
+                self._db.create_collection(
+                    "slow_ops",
+                    capped=True,
+                    size=SLOW_OP_LOG_MAX_BYTES,
+                    max=get_server_config().slow_op_log_size,
+                )
+            except (NotImplementedError, CollectionInvalid):
+                # e.g. embedded database. Fallback to a plain collection trimmed on insert.
+                pass
+        self._slow_ops: Collection = self._db.slow_ops
+        try:
+            self._slow_ops_capped = bool(self._slow_ops.options().get("capped"))
+        except TypeError:  # embedded database does not implement options()
+            self._slow_ops_capped = False
+
+        # Background jobs (see submit_job)
+        self._jobs: Collection = self._db.jobs
+        self._jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+
+        # User-declared queue indexes on task args/metadata paths
+        self._reconcile_queue_indexes()
+
+        self._backfill_revisions()
+
+    @staticmethod
+    def _setup_task_indexes(tasks: Collection):
+        """Create the indexes of a tasks collection. The partitioned collections have the same
+        indexes (and index names, used as hints) as the shared one."""
+        # _id is automatically indexed by MongoDB
+        tasks.create_index([("queue_id", ASCENDING)])  # Reference to queue._id
+        tasks.create_index([("status", ASCENDING)])
+        tasks.create_index([("priority", DESCENDING)])  # Higher priority first
+        tasks.create_index([("created_at", ASCENDING)])  # Older tasks first
+        # Serves fetching / listing tasks of a queue by status in priority order
+        tasks.create_index(TASK_QUEUE_STATUS_INDEX_KEYS, name=TASK_QUEUE_STATUS_INDEX)
+        # Serves the dispatch order of fetch_task (priority, then scheduling rank)
+        tasks.create_index(TASK_DISPATCH_INDEX_KEYS, name=TASK_DISPATCH_INDEX)
+        # Serves the change feed (tasks modified after a revision, paged by revision and id)
+        tasks.create_index(
+            [("queue_id", ASCENDING), ("revision", ASCENDING), ("_id", ASCENDING)]
+        )
+        if LEGACY_CHANGE_FEED_INDEX in tasks.index_information():
+            tasks.drop_index(LEGACY_CHANGE_FEED_INDEX)
+
+    def _task_collections(self) -> List[Collection]:
+        """The shared tasks collection, followed by the partitioned ones."""
+        return [self._tasks] + [
+            self._db[name]
+            for name in sorted(self._db.list_collection_names())
+            if name.startswith(TASK_PARTITION_PREFIX)
+        ]
+
+    def _task_collection(self, queue_id: str, layout: Optional[str]) -> Collection:
+        if layout == TASK_LAYOUT_PARTITIONED:
+            return self._db[_task_partition_name(queue_id)]
+        return self._tasks
+
+    def _create_task_partition(self, queue_id: str) -> Collection:
+        """Create the tasks collection of a queue of the partitioned layout, with its indexes."""
+        tasks = self._task_collection(queue_id, TASK_LAYOUT_PARTITIONED)
+        # Index builds are not run inside a transaction
+        self._setup_task_indexes(tasks)
+        return tasks
+
+    def _tasks_of(self, queue_id: str, session=None) -> Collection:
+        """Tasks collection of a queue according to its layout.
+
+        The layout is read from the queue document within the transaction of the caller rather
+        than cached, so that a migration by another server process is never missed.
+        """
+        queue = self._queues.find_one(
+            {"_id": queue_id}, {"task_layout": 1}, session=session
+        )
+        return self._task_collection(queue_id, (queue or {}).get("task_layout"))
+
+    def _queue_collection(
+        self, queue_id: str, collection_name: str, session=None
+    ) -> Collection:
+        """Collection of the documents of a queue (queues, tasks, workers)."""
+        if collection_name == "tasks":
+            return self._tasks_of(queue_id, session=session)
+        return self._db[collection_name]
+
+    def _backfill_revisions(self):
+        """Stamp revision 0 on the tasks written before the change feed existed, so that they are
+        paged by revision and id like the other tasks. The revision counters continue after the
+        revisions already stamped."""
+        for queue in self._queues.find({}, {"task_layout": 1}):
+            tasks = self._task_collection(queue["_id"], queue.get("task_layout"))
+            tasks.update_many(
+                {"queue_id": queue["_id"], "revision": None},
+                {"$set": {"revision": 0}},
+            )
+            latest = 0
+            for collection in (tasks, self._tombstones):
+                doc = collection.find_one(
+                    {"queue_id": queue["_id"]},
+                    {"revision": 1},
+                    sort=[("revision", DESCENDING)],
+                )
+                latest = max(latest, (doc or {}).get("revision") or 0)
+            self._revisions.update_one(
+                {"_id": queue["_id"], "queue_id": queue["_id"]},
+                {"$max": {"revision": latest}},
+                upsert=True,
+            )
+
+    def _reconcile_queue_indexes(self):
+        """Create missing / drop stale user-declared indexes according to the queue documents."""
+        expected = {}
+        for queue in self._queues.find(
+            {"indexes": {"$exists": True}}, {"indexes": 1, "task_layout": 1}
+        ):
+            tasks = self._task_collection(queue["_id"], queue.get("task_layout"))
+            for path in queue["indexes"]:
+                expected[(tasks.name, _queue_index_name(queue["_id"], path))] = (
+                    queue["_id"],
+                    path,
+                )
+
+        existing = {
+            (tasks.name, name)
+            for tasks in self._task_collections()
+            for name in tasks.index_information()
+            if name.startswith(QUEUE_INDEX_PREFIX)
+        }
+
+        for collection_name, name in existing - set(expected):
+            logger.info(f"Dropping stale queue index {name} of {collection_name}")
+            self._db[collection_name].drop_index(name)
+
+        for key in set(expected) - existing:
+            logger.info(f"Creating queue index {key[1]} of {key[0]}")
+            self._create_queue_index(*expected[key])
+
+    def _create_queue_index(
+        self, queue_id: str, path: str, tasks: Optional[Collection] = None
+    ):
+        # partial index: only entries of the owning queue are indexed
+        (tasks if tasks is not None else self._tasks_of(queue_id)).create_index(
+            [("queue_id", ASCENDING), (path, ASCENDING)],
+            name=_queue_index_name(queue_id, path),
+            partialFilterExpression={"queue_id": queue_id},
+        )
+
+    def _drop_queue_index(
+        self, queue_id: str, path: str, tasks: Optional[Collection] = None
+    ):
+        try:
+            (tasks if tasks is not None else self._tasks_of(queue_id)).drop_index(
+                _queue_index_name(queue_id, path)
+            )
+        except OperationFailure as e:  # index not found
+            logger.warning(f"Failed to drop queue index: {e}")
+
+    def _get_index_sizes(self) -> Dict[str, int]:
+        """Index sizes (in bytes) of the tasks collections. Empty if not supported by the backend."""
+        sizes: Dict[str, int] = {}
+        try:
+            for tasks in self._task_collections():
+                for stats in tasks.aggregate([{"$collStats": {"storageStats": {}}}]):
+                    for name, size in stats["storageStats"]["indexSizes"].items():
+                        sizes[name] = sizes.get(name, 0) + size  # summed over shards
+        except Exception as e:  # e.g. embedded database
+            logger.debug(f"Index sizes are not available: {e}")
+        return sizes
+
+    def _is_slow_op(self, elapsed_ms: float) -> bool:
+        threshold = get_server_config().slow_op_threshold_ms
+        return 0 <= threshold <= elapsed_ms
+
+    def _record_slow_op(
+        self,
+        op: str,
+        elapsed_ms: float,
+        collection: Optional[str],
+        queue_id: Optional[str],
+        query: Optional[Dict[str, Any]],
+    ):
+        """Record a slow operation to the slow operation log and the server log.
+        Only the shape of the filter is recorded, not the values.
+
+        The plan of the filter is explained with `queryPlanner` verbosity, which does not run the
+        (already slow) query again, so execution statistics (e.g. docs examined) are not recorded.
+        """
+        entry = {
+            "_id": str(uuid4()),
+            "op": op,
+            "collection": collection,
+            "queue_id": queue_id,
+            "duration_ms": round(elapsed_ms, 3),
+            "query_shape": query_shape(query) if query else None,
+            "plan_summary": None,
+            "docs_examined": None,
+            "keys_examined": None,
+            "timestamp": get_current_time(),
+        }
+
+        if query and queue_id and collection in ID_ALIASES:
+            try:
+                explained = self._explain(
+                    queue_id, collection, query, verbosity="queryPlanner"
+                )
+                entry.update(
+                    plan_summary=explained["plan_summary"],
+                    docs_examined=explained["docs_examined"],
+                    keys_examined=explained["keys_examined"],
+                )
+            except (
+                Exception
+            ) as e:  # e.g. explain not supported by the embedded database
+                logger.debug(f"Failed to explain slow operation {op}: {e}")
+
+        logger.warning(
+            f"Slow operation {op} on {collection} took {entry['duration_ms']} ms. "
+            f"query_shape={entry['query_shape']}, plan={entry['plan_summary']}, "
+            f"docs_examined={entry['docs_examined']}"
+        )
+
+        try:
+            self._slow_ops.insert_one(entry)
+            if not self._slow_ops_capped:
+                max_size = get_server_config().slow_op_log_size
+                excess = self._slow_ops.count_documents({}) - max_size
+                if excess > 0:
+                    oldest = self._slow_ops.find({}, {"_id": 1}).sort(
+                        "timestamp", ASCENDING
+                    )
+                    self._slow_ops.delete_many(
+                        {"_id": {"$in": [doc["_id"] for doc in oldest.limit(excess)]}}
+                    )
+        except Exception as e:
+            logger.warning(f"Failed to record slow operation: {e}")
+
+    def _explain(
+        self,
+        queue_id: str,
+        collection_name: str,
+        query: Dict[str, Any],
+        limit: int = 100,
+        offset: int = 0,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        verbosity: str = "executionStats",
+    ) -> Dict[str, Any]:
+        """Explain the query_collection plan of a query (with execution statistics, unless
+        `verbosity` is "queryPlanner", which does not run the query)."""
+        sort = sort or [("last_modified", ASCENDING)]
+        pipeline, hint = build_query_pipeline(
+            collection_name=collection_name,
+            query=sanitize_query(queue_id, query),
+            sort=sort,
+            limit=limit,
+            offset=offset,
+        )
+        cmd: Dict[str, Any] = {
+            "aggregate": self._queue_collection(queue_id, collection_name).name,
+            "pipeline": pipeline,
+            "cursor": {},
+        }
+        if hint:
+            cmd["hint"] = hint
+        try:
+            result = self._db.command("explain", cmd, verbosity=verbosity)
+        except (TypeError, NotImplementedError) as e:
+            raise HTTPException(
+                status_code=HTTP_501_NOT_IMPLEMENTED,
+                detail="Query explain is not supported by the database backend (e.g. embedded database).",
+            ) from e
+        except OperationFailure as e:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"Failed to explain query. Detail: {str(e)}",
+            ) from e
+
+        return {
+            "collection": collection_name,
+            "query_shape": query_shape(query),
+            **parse_explain(result),
+        }
+
+    @retry_on_transient
+    @validate_arg
+    def explain_query(
+        self,
+        queue_id: str,
+        collection_name: str,
+        query: Dict[str, Any],
+        limit: int = 100,
+        offset: int = 0,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        required_fields: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Explain how query_collection would execute a query.
+
+        Args:
+            required_fields (list, optional): If provided, the existence filter that fetch_task
+                derives from the required fields is merged into the query.
+
+        Returns:
+            A dict with the collection, the query shape, a plan summary (e.g. "IXSCAN(...) -> FETCH"),
+            the winning plan and execution statistics (docs/keys examined, n returned, execution time).
+        """
+        if collection_name not in ID_ALIASES:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail="Invalid collection name. Must be one of: queues, tasks, workers",
+            )
+        required_fields = [f for f in required_fields or [] if f != "*"]
+        if required_fields:
+            try:
+                query_dict = keys_to_query_dict(required_fields, mode="deepest")
+            except (TypeError, ValueError) as e:
+                raise HTTPException(
+                    status_code=HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid required fields. Detail: {str(e)}",
+                )
+            query = merge_filter(
+                query_dict_to_mongo_filter(query_dict, parent_key="args"),
+                query,
+                logical_op="and",
+            )
+        return self._explain(
+            queue_id=queue_id,
+            collection_name=collection_name,
+            query=query,
+            limit=limit,
+            offset=offset,
+            sort=sort,
+        )
+
+    def _next_revision(self, queue_id: str, session) -> int:
+        """A new revision of a queue, to stamp on the tasks written in the transaction of `session`.
+
+        The revision is incremented on the counter document of the queue within the transaction.
+        Concurrent transactions writing tasks of the queue conflict on it, and the later one is
+        retried once the earlier one committed. So revisions are committed in increasing order,
+        and the change feed never passes a revision that is yet to be committed.
+        """
+        counter = self._revisions.find_one_and_update(
+            {"_id": queue_id, "queue_id": queue_id},
+            {"$inc": {"revision": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        return counter["revision"]
+
+    def _session(self):
+        """A new session, or the session of the ongoing atomic run (see `run_atomic`)."""
+        session = atomic_session.get()
+        if session is not None:
+            return nullcontext(session)
+        return self._client.start_session()
+
+    def _transaction(self, session):
+        """Start a transaction, unless the session is already in the one of an atomic run."""
+        if session is atomic_session.get():
+            return nullcontext()
+        return session.start_transaction()
+
+    @retry_on_transient
+    def run_atomic(self, queue_id: str, func: Callable[[], T]) -> T:
+        """Run `func` with all the DBService calls it makes in one transaction, so that either
+        all or none of their writes are applied.
+
+        The state transition events of the calls are published once the transaction is
+        committed. The whole run is retried on transient errors.
+        """
+        if atomic_session.get() is not None:  # nested, part of the ongoing run
+            return func()
+
+        try:
+            with self._client.start_session() as session:
+                with session.start_transaction(), collect_event_handles() as handles:
+                    token = atomic_session.set(session)
+                    try:
+                        result = func()
+                    finally:
+                        atomic_session.reset(token)
+        finally:
+            # the caches may have been refilled while the transaction was running
+            query_cache.invalidate(queue_id)
+            ready_queue.invalidate(queue_id)
+
+        for event_handle in handles:
+            event_handle.commit()
+        return result
 
     def close(self):
         """Close the database client."""
+        try:
+            self.flush_heartbeats()
+        except Exception as e:
+            logger.warning(f"Failed to flush heartbeats on close: {e}")
         self._client.close()
 
     def erase(self):
@@ -117,8 +646,11 @@ def erase(self):
             collection = self._db[col_name]
             collection.drop()
 
+        query_cache.clear()
+        ready_queue.clear()
         self._setup_collections()
 
+    @log_slow_op(collection_arg="collection_name", filter_arg="query")
     @retry_on_transient
     @validate_arg
     def query_collection(
@@ -149,48 +681,46 @@ def query_collection(
         sort = sort or [
             ("last_modified", ASCENDING)
         ]  # Default sort by last_modified first
-        with self._client.start_session() as session:
-            with session.start_transaction():
-                if collection_name not in ["queues", "tasks", "workers"]:
-                    raise HTTPException(
-                        status_code=HTTP_400_BAD_REQUEST,
-                        detail="Invalid collection name. Must be one of: queues, tasks, workers",
-                    )
-
-                query = sanitize_query(queue_id, query)
-
-                pipeline: List[Mapping[str, Any]] = []
-
-                # Add ID field aliases based on collection type
-                id_field_mapping = {
-                    "tasks": "task_id",
-                    "workers": "worker_id",
-                    "queues": "queue_id",
-                }
-
-                collection_id_field = id_field_mapping.get(collection_name)
-                if collection_id_field:
-                    pipeline.append({"$addFields": {collection_id_field: "$_id"}})
+        if collection_name not in ["queues", "tasks", "workers"]:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail="Invalid collection name. Must be one of: queues, tasks, workers",
+            )
 
-                pipeline.extend(
-                    [
-                        {"$match": query},
-                        {"$project": {"password": 0}},
-                        {"$sort": {field: direction for field, direction in sort}},
-                        {"$skip": offset},
-                        {"$limit": limit},
-                    ]
-                )
+        def run_query():
+            with self._session() as session:
+                with self._transaction(session):
+                    pipeline, hint = build_query_pipeline(
+                        collection_name=collection_name,
+                        query=sanitize_query(queue_id, query),
+                        sort=sort,
+                        limit=limit,
+                        offset=offset,
+                        hide_id=hide_id,
+                    )
+                    return list(
+                        self._queue_collection(
+                            queue_id, collection_name, session=session
+                        ).aggregate(
+                            pipeline,
+                            session=session,
+                            **({"hint": hint} if hint else {}),
+                        )
+                    )
 
-                # Hide _id if requested
-                if hide_id:
-                    pipeline.append({"$project": {"_id": 0}})
+        if atomic_session.get() is not None:  # may see writes not committed yet
+            return run_query()
 
-                result = list(
-                    self._db[collection_name].aggregate(pipeline, session=session)
-                )
-                return result
+        # Identical searches are served from the query cache until the queue changes
+        return query_cache.get_or_compute(
+            queue_id,
+            make_cache_key(
+                self._db.name, collection_name, query, sort, limit, offset, hide_id
+            ),
+            run_query,
+        )
 
+    @log_slow_op(collection_arg="collection_name", filter_arg="query")
     @risky("Potential query injection")
     @retry_on_transient
     @validate_arg
@@ -202,8 +732,8 @@ def update_collection(
         update: Dict[str, Any],  # MongoDB update
     ) -> int:
         """Update a collection. Return modified count"""
-        with self._client.start_session() as session:
-            with session.start_transaction():
+        with self._session() as session:
+            with self._transaction(session):
                 if collection_name not in ["queues", "tasks", "workers"]:
                     raise HTTPException(
                         status_code=HTTP_400_BAD_REQUEST,
@@ -224,11 +754,64 @@ def update_collection(
                 else:
                     update["$set"] = {"last_modified": now}
 
-                result = self._db[collection_name].update_many(
-                    query, update, session=session
+                collection = self._queue_collection(
+                    queue_id, collection_name, session=session
                 )
-                return result.modified_count
+                holding_slots: List[Any] = []
+                if collection_name == "tasks":
+                    update["$set"]["revision"] = self._next_revision(
+                        queue_id, session=session
+                    )
+                    # a raw status update may take tasks holding concurrency slots out of RUNNING
+                    if any(
+                        isinstance(fields, dict) and "status" in fields
+                        for fields in update.values()
+                    ):
+                        holding_slots = [
+                            task["_id"]
+                            for task in collection.find(
+                                {
+                                    "$and": [
+                                        query,
+                                        {
+                                            "status": TaskState.RUNNING,
+                                            "concurrency_slots.0": {"$exists": True},
+                                        },
+                                    ]
+                                },
+                                {"_id": 1},
+                                session=session,
+                            )
+                        ]
+
+                result = collection.update_many(query, update, session=session)
+
+                # left RUNNING: free the concurrency slots of the tasks
+                if holding_slots:
+                    released = list(
+                        collection.find(
+                            {
+                                "_id": {"$in": holding_slots},
+                                "status": {"$ne": TaskState.RUNNING},
+                            },
+                            {"concurrency_slots": 1},
+                            session=session,
+                        )
+                    )
+                    for task in released:
+                        self._release_slots(task, session=session)
+                    if released:
+                        collection.update_many(
+                            {"_id": {"$in": [task["_id"] for task in released]}},
+                            {"$set": {"concurrency_slots": []}},
+                            session=session,
+                        )
 
+        query_cache.invalidate(queue_id)
+        ready_queue.invalidate(queue_id)
+        return result.modified_count
+
+    @log_slow_op(collection="queues")
     @retry_on_transient
     @validate_arg
     def create_queue(
@@ -242,26 +825,109 @@ def create_queue(
             raise HTTPException(
                 status_code=HTTP_400_BAD_REQUEST, detail="Queue name is required"
             )
-        with self._client.start_session() as session:
-            with session.start_transaction():
-                try:
-                    now = get_current_time()
-                    queue = {
-                        "_id": str(uuid4()),
-                        "queue_name": queue_name,
-                        "password": hash_password(password),
-                        "created_at": now,
-                        "last_modified": now,
-                        "metadata": unflatten_dict(metadata or {}),
-                    }
-                    result = self._queues.insert_one(queue, session=session)
-                    return str(result.inserted_id)
-                except DuplicateKeyError:
-                    raise HTTPException(
-                        status_code=HTTP_409_CONFLICT,
-                        detail=f"Queue '{queue_name}' already exists",
-                    )
+        _validate_scheduling_policy(unflatten_dict(metadata or {}))
+        layout = get_server_config().task_layout
+        queue_id = str(uuid4())
+        # The partition exists before the queue can be used
+        partition = (
+            self._create_task_partition(queue_id)
+            if layout == TASK_LAYOUT_PARTITIONED
+            else None
+        )
+        try:
+            with self._session() as session:
+                with self._transaction(session):
+                    try:
+                        now = get_current_time()
+                        queue = {
+                            "_id": queue_id,
+                            "queue_name": queue_name,
+                            "password": hash_password(password),
+                            "created_at": now,
+                            "last_modified": now,
+                            "metadata": unflatten_dict(metadata or {}),
+                            "task_layout": layout,
+                        }
+                        self._queues.insert_one(queue, session=session)
+                    except DuplicateKeyError:
+                        raise HTTPException(
+                            status_code=HTTP_409_CONFLICT,
+                            detail=f"Queue '{queue_name}' already exists",
+                        )
+        except BaseException:
+            if partition is not None:
+                partition.drop()
+            raise
+        return queue_id
 
+    @log_slow_op(collection="tasks")
+    @retry_on_transient
+    @validate_arg
+    def migrate_task_layout(self, queue_id: str, layout: str) -> int:
+        """Move the tasks of a queue to the tasks collection of another layout.
+
+        The tasks are moved and the layout of the queue is switched in one transaction, so the
+        queue stays online: every operation reads the layout of the queue within its own
+        transaction. Updates of the moved tasks conflict with the migration on the task documents,
+        and inserts on the revision counter of the queue, which every task write takes (see
+        `_next_revision`) and the migration advances too.
+
+        Returns:
+            The number of moved tasks.
+        """
+        if layout not in TASK_LAYOUTS:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"Invalid layout '{layout}'. Must be one of: {', '.join(TASK_LAYOUTS)}",
+            )
+        queue = self._queues.find_one({"_id": queue_id})
+        if not queue:
+            raise HTTPException(
+                status_code=HTTP_404_NOT_FOUND,
+                detail=f"Queue '{queue_id}' not found",
+            )
+        current = queue.get("task_layout", TASK_LAYOUT_SHARED)
+        if current == layout:
+            return 0
+        source = self._task_collection(queue_id, current)
+        target = self._task_collection(queue_id, layout)
+
+        # Index builds are not run inside the transaction
+        if layout == TASK_LAYOUT_PARTITIONED:
+            self._create_task_partition(queue_id)
+        for path in queue.get("indexes", []):
+            self._create_queue_index(queue_id, path, tasks=target)
+
+        with self._session() as session:
+            with self._transaction(session):
+                # a task inserted into the source concurrently conflicts with this write
+                self._next_revision(queue_id, session=session)
+                tasks = list(source.find({"queue_id": queue_id}, session=session))
+                if tasks:
+                    target.insert_many(tasks, session=session)
+                    source.delete_many({"queue_id": queue_id}, session=session)
+                self._queues.update_one(
+                    {"_id": queue_id},
+                    {
+                        "$set": {
+                            "task_layout": layout,
+                            "last_modified": get_current_time(),
+                        }
+                    },
+                    session=session,
+                )
+
+        if current == TASK_LAYOUT_PARTITIONED:
+            source.drop()
+        else:
+            for path in queue.get("indexes", []):
+                self._drop_queue_index(queue_id, path, tasks=source)
+
+        query_cache.invalidate(queue_id)
+        ready_queue.invalidate(queue_id)
+        return len(tasks)
+
+    @log_slow_op(collection="tasks")
     @retry_on_transient
     @validate_arg
     def create_task(
@@ -277,55 +943,636 @@ def create_task(
         ] = None,  # Maximum time in seconds for task execution
         max_retries: int = 3,  # Maximum number of retries
         priority: int = Priority.MEDIUM,
+        resources: Optional[Dict[str, float]] = None,  # e.g. {"cpus": 4, "mem_gb": 64}
     ) -> str:
         """Create a task related to a queue."""
         if not args and not cmd:
             raise HTTPException(
                 status_code=HTTP_400_BAD_REQUEST,
-                detail="Either args or cmd must be provided",
+                detail="Either args or cmd must be provided",
+            )
+        resources = _validate_resources(resources, usage="resources")
+        with self._session() as session:
+            with self._transaction(session):
+                task, event_handle = self._new_task_doc(
+                    session=session,
+                    queue_id=queue_id,
+                    task_name=task_name,
+                    args=args,
+                    metadata=metadata,
+                    cmd=cmd,
+                    heartbeat_timeout=heartbeat_timeout,
+                    task_timeout=task_timeout,
+                    max_retries=max_retries,
+                    priority=priority,
+                    resources=resources,
+                )
+                task["revision"] = self._next_revision(queue_id, session=session)
+                result = self._tasks_of(queue_id, session=session).insert_one(
+                    task, session=session
+                )
+
+        event_handle.update_fsm_event(task, commit=True)
+
+        return str(result.inserted_id)
+
+    def _new_task_doc(
+        self,
+        session,
+        queue_id: str,
+        task_name: Optional[str],
+        args: Optional[Dict[str, Any]],
+        metadata: Optional[Dict[str, Any]],
+        cmd: Optional[Union[str, List[str]]],
+        heartbeat_timeout: Optional[float],
+        task_timeout: Optional[int],
+        max_retries: int,
+        priority: int,
+        resources: Optional[Dict[str, float]] = None,
+        **extra_fields,
+    ) -> Tuple[Dict[str, Any], StateTransitionEventHandle]:
+        """Build a new pending task document and its creation event handle."""
+        now = get_current_time()
+
+        task_id = str(uuid4())
+
+        fsm = TaskFSM(
+            queue_id=queue_id,
+            entity_id=task_id,
+            current_state=TaskState.CREATED,
+            retries=0,
+            max_retries=max_retries,
+            metadata=None,
+        )
+        event_handle = fsm.create()
+
+        task = {
+            "_id": task_id,
+            "queue_id": queue_id,
+            "status": TaskState.PENDING,
+            "task_name": task_name,
+            "created_at": now,
+            "start_time": None,
+            "last_heartbeat": None,
+            "last_modified": now,
+            "heartbeat_timeout": heartbeat_timeout,
+            "task_timeout": task_timeout,
+            "max_retries": max_retries,
+            "retries": 0,
+            "priority": priority,
+            "resources": resources or {},
+            "metadata": unflatten_dict(metadata or {}),
+            "args": unflatten_dict(args or {}),
+            "cmd": cmd or "",
+            "summary": {},
+            "worker_id": None,
+            **extra_fields,
+        }
+        task["sched_rank"] = self._rank_task(task, session=session)
+        return task, event_handle
+
+    def _scheduling_policy(self, queue_id: str, session) -> SchedulingPolicy:
+        """The scheduling policy configured in the queue metadata."""
+        queue = self._queues.find_one(
+            {"_id": queue_id},
+            {f"metadata.{SCHEDULING_POLICY_KEY}": 1},
+            session=session,
+        )
+        try:
+            return get_policy((queue or {}).get("metadata"))
+        except ValueError as e:  # e.g. metadata modified behind the back of the API
+            logger.warning(f"Invalid scheduling policy of queue '{queue_id}': {e}")
+            return SchedulingPolicy()
+
+    def _rank_task(
+        self,
+        task: Mapping[str, Any],
+        session,
+        policy: Optional[SchedulingPolicy] = None,
+    ) -> Optional[float]:
+        """Scheduling rank of a task entering PENDING."""
+        if policy is None:
+            policy = self._scheduling_policy(task["queue_id"], session=session)
+        return policy.rank(
+            task, SchedStats(self._sched_stats, task["queue_id"], session=session)
+        )
+
+    @log_slow_op(collection="sweeps")
+    @retry_on_transient
+    @validate_arg
+    def create_sweep(
+        self,
+        queue_id: str,
+        axes: Dict[str, List[Any]],
+        mode: str = "grid",
+        num_samples: Optional[int] = None,
+        seed: int = 0,
+        task_name: Optional[str] = None,
+        args: Optional[Dict[str, Any]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        cmd: Optional[Union[str, List[str]]] = None,
+        heartbeat_timeout: Optional[float] = None,
+        task_timeout: Optional[int] = None,
+        max_retries: int = 3,
+        priority: int = Priority.MEDIUM,
+        resources: Optional[Dict[str, float]] = None,
+    ) -> Tuple[str, int]:
+        """Create a lazy parameter sweep. Returns (sweep_id, total number of points).
+
+        Points are only materialized into concrete tasks when they are fetched.
+        """
+        resources = _validate_resources(resources, usage="resources")
+        axes_list = list(axes.items())
+        try:
+            total = sweep_size(mode, axes_list, num_samples)
+            # validate that the axes can be merged into the base args
+            materialize_args(args or {}, mode, axes_list, 0, seed)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"Invalid sweep. Detail: {str(e)}",
+            )
+
+        with self._session() as session:
+            with self._transaction(session):
+                now = get_current_time()
+                sweep = {
+                    "_id": str(uuid4()),
+                    "queue_id": queue_id,
+                    "task_name": task_name,
+                    "args": unflatten_dict(args or {}),
+                    "axes": [
+                        {"name": name, "values": values} for name, values in axes_list
+                    ],
+                    "mode": mode,
+                    "num_samples": num_samples,
+                    "seed": seed,
+                    "cursor": 0,
+                    "remaining": total,
+                    "total": total,
+                    "metadata": unflatten_dict(metadata or {}),
+                    "cmd": cmd or "",
+                    "heartbeat_timeout": heartbeat_timeout,
+                    "task_timeout": task_timeout,
+                    "max_retries": max_retries,
+                    "priority": priority,
+                    "resources": resources,
+                    "created_at": now,
+                    "last_modified": now,
+                }
+                result = self._sweeps.insert_one(sweep, session=session)
+                return str(result.inserted_id), total
+
+    @log_slow_op(collection="sweeps")
+    @retry_on_transient
+    @validate_arg
+    def ls_sweeps(
+        self,
+        queue_id: str,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """List sweeps of a queue, highest priority first."""
+        with self._session() as session:
+            with self._transaction(session):
+                return list(
+                    self._sweeps.find({"queue_id": queue_id}, session=session)
+                    .sort([("priority", DESCENDING), ("created_at", ASCENDING)])
+                    .skip(offset)
+                    .limit(limit)
+                )
+
+    @log_slow_op(collection="sweeps")
+    @retry_on_transient
+    @validate_arg
+    def delete_sweep(self, queue_id: str, sweep_id: str) -> int:
+        """Delete a sweep. Already materialized tasks are kept."""
+        with self._session() as session:
+            with self._transaction(session):
+                return self._sweeps.delete_one(
+                    {"_id": sweep_id, "queue_id": queue_id}, session=session
+                ).deleted_count
+
+    @log_slow_op(collection="tasks")
+    @retry_on_transient
+    @validate_arg
+    def ls_task_changes(
+        self, queue_id: str, since: str = "0", limit: int = 1000
+    ) -> Dict[str, Any]:
+        """
+        List tasks modified and deleted after the change token `since`, in revision order.
+
+        Changes are paged by (revision, task id), so the changes of one revision (e.g. from one
+        update_collection call) may span several pages. Revisions are committed in increasing
+        order (see `_next_revision`), so no change is committed behind a returned token.
+
+        Args:
+            since: change token returned by the previous call. "0" lists all tasks.
+            limit: max number of changes returned.
+
+        Returns:
+            dict with `revision` (the next change token), `changed` (task documents),
+            `deleted` (ids of deleted tasks) and `has_more`.
+        """
+        revision, after_id = _parse_change_token(since)
+
+        page = []
+        with self._session() as session:
+            with self._transaction(session):
+                for collection, id_field, deleted in (
+                    (self._tasks_of(queue_id, session=session), "_id", False),
+                    (self._tombstones, "task_id", True),
+                ):
+                    cursor = (
+                        collection.find(
+                            {
+                                "queue_id": queue_id,
+                                **_after_token(revision, after_id, id_field),
+                            },
+                            session=session,
+                        )
+                        .sort([("revision", ASCENDING), (id_field, ASCENDING)])
+                        .limit(limit + 1)
+                    )
+                    page += [
+                        (doc.get("revision") or 0, doc[id_field], deleted, doc)
+                        for doc in cursor
+                    ]
+        page = sorted(page, key=lambda change: change[:2])
+
+        has_more = len(page) > limit
+        page = page[:limit]
+        token = f"{page[-1][0]}:{page[-1][1]}" if page else since
+
+        return {
+            "queue_id": queue_id,
+            "revision": token,
+            "changed": [doc for _, _, deleted, doc in page if not deleted],
+            "deleted": [doc["task_id"] for _, _, deleted, doc in page if deleted],
+            "has_more": has_more,
+        }
+
+    @log_slow_op(collection="tasks")
+    @retry_on_transient
+    @validate_arg
+    def get_queue_stats(self, queue_id: str) -> Dict[str, Any]:
+        """Task counts by status, plus sweep points that are not materialized yet."""
+        with self._session() as session:
+            with self._transaction(session):
+                task_counts = {
+                    doc["_id"]: doc["count"]
+                    for doc in self._tasks_of(queue_id, session=session).aggregate(
+                        [
+                            {"$match": {"queue_id": queue_id}},
+                            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+                        ],
+                        session=session,
+                    )
+                }
+                return {
+                    "task_counts": task_counts,
+                    **self._count_sweep_points(queue_id, session=session),
+                }
+
+    @log_slow_op(collection="sweeps")
+    @retry_on_transient
+    @validate_arg
+    def count_sweep_points(self, queue_id: str) -> Dict[str, int]:
+        """Sweep points that are not materialized yet, and the number of sweeps they are from."""
+        with self._session() as session:
+            with self._transaction(session):
+                return self._count_sweep_points(queue_id, session=session)
+
+    def _count_sweep_points(self, queue_id: str, session) -> Dict[str, int]:
+        virtual_pending = 0
+        active_sweeps = 0
+        for sweep in self._sweeps.find(
+            {"queue_id": queue_id, "remaining": {"$gt": 0}},
+            {"remaining": 1},
+            session=session,
+        ):
+            virtual_pending += sweep["remaining"]
+            active_sweeps += 1
+        return {"virtual_pending": virtual_pending, "active_sweeps": active_sweeps}
+
+    @log_slow_op(collection="tasks")
+    @retry_on_transient
+    @validate_arg
+    def create_queue_indexes(self, queue_id: str, paths: List[str]) -> List[str]:
+        """
+        Declare secondary indexes on task args/metadata/resources paths of a queue.
+
+        Args:
+            queue_id: The queue ID.
+            paths: Dot-separated paths under `args.`, `metadata.` or `resources.`.
+
+        Returns:
+            All index paths declared for the queue.
+        """
+        for path in paths:
+            _validate_field_path(
+                path, usage="index", prefixes=("args.", "metadata.", "resources.")
+            )
+
+        with self._session() as session:
+            with self._transaction(session):
+                queue = self._queues.find_one({"_id": queue_id}, session=session)
+                if not queue:
+                    raise HTTPException(
+                        status_code=HTTP_404_NOT_FOUND,
+                        detail=f"Queue '{queue_id}' not found",
+                    )
+                declared = queue.get("indexes", [])
+                new_paths = [p for p in dict.fromkeys(paths) if p not in declared]
+
+                max_indexes = get_server_config().max_queue_indexes
+                if len(declared) + len(new_paths) > max_indexes:
+                    raise HTTPException(
+                        status_code=HTTP_400_BAD_REQUEST,
+                        detail=f"Too many indexes. At most {max_indexes} indexes are allowed per queue, "
+                        f"{len(declared)} already declared.",
+                    )
+
+                declared = declared + new_paths
+                self._queues.update_one(
+                    {"_id": queue_id},
+                    {
+                        "$set": {
+                            "indexes": declared,
+                            "last_modified": get_current_time(),
+                        }
+                    },
+                    session=session,
+                )
+
+        # Index builds are not run inside the transaction
+        for path in new_paths:
+            self._create_queue_index(queue_id, path)
+
+        return declared
+
+    @log_slow_op(collection="tasks")
+    @retry_on_transient
+    @validate_arg
+    def ls_queue_indexes(self, queue_id: str) -> List[Dict[str, Any]]:
+        """List user-declared indexes of a queue, with index size in bytes if available."""
+        with self._session() as session:
+            with self._transaction(session):
+                queue = self._queues.find_one({"_id": queue_id}, session=session)
+                if not queue:
+                    raise HTTPException(
+                        status_code=HTTP_404_NOT_FOUND,
+                        detail=f"Queue '{queue_id}' not found",
+                    )
+
+        sizes = self._get_index_sizes()
+        result = []
+        for path in queue.get("indexes", []):
+            name = _queue_index_name(queue_id, path)
+            result.append({"path": path, "name": name, "size": sizes.get(name)})
+        return result
+
+    @log_slow_op(collection="tasks")
+    @retry_on_transient
+    @validate_arg
+    def drop_queue_indexes(self, queue_id: str, paths: List[str]) -> int:
+        """Drop user-declared indexes of a queue. Returns the number of dropped indexes."""
+        with self._session() as session:
+            with self._transaction(session):
+                queue = self._queues.find_one({"_id": queue_id}, session=session)
+                if not queue:
+                    raise HTTPException(
+                        status_code=HTTP_404_NOT_FOUND,
+                        detail=f"Queue '{queue_id}' not found",
+                    )
+                declared = queue.get("indexes", [])
+                to_drop = [p for p in declared if p in paths]
+                self._queues.update_one(
+                    {"_id": queue_id},
+                    {
+                        "$set": {
+                            "indexes": [p for p in declared if p not in paths],
+                            "last_modified": get_current_time(),
+                        }
+                    },
+                    session=session,
+                )
+
+        for path in to_drop:
+            self._drop_queue_index(queue_id, path)
+
+        return len(to_drop)
+
+    @log_slow_op(collection="queues")
+    @retry_on_transient
+    @validate_arg
+    def set_concurrency_limit(
+        self,
+        queue_id: str,
+        key: str,
+        limit: Optional[int],
+        value: Any = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Set the maximum number of running tasks of a group of a queue.
+
+        Args:
+            queue_id: The queue ID.
+            key: "task_name" or a dot-separated path under `metadata.`. Tasks with the same value
+                of the key form a group.
+            limit: Maximum number of running tasks of the group. None removes the limit.
+            value: The value of the key of the limited group. If None, the limit applies to each
+                value of the key separately (a limit set for a specific value takes precedence).
+
+        Returns:
+            All concurrency limits of the queue.
+        """
+        if key != "task_name":
+            _validate_field_path(key, usage="limit key", prefixes=("metadata.",))
+        if limit is not None and limit < 1:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"Invalid limit {limit}. Must be a positive integer.",
             )
-        with self._client.start_session() as session:
-            with session.start_transaction():
-                now = get_current_time()
-
-                task_id = str(uuid4())
 
-                fsm = TaskFSM(
-                    queue_id=queue_id,
-                    entity_id=task_id,
-                    current_state=TaskState.CREATED,
-                    retries=0,
-                    max_retries=max_retries,
-                    metadata=None,
+        with self._session() as session:
+            with self._transaction(session):
+                queue = self._queues.find_one({"_id": queue_id}, session=session)
+                if not queue:
+                    raise HTTPException(
+                        status_code=HTTP_404_NOT_FOUND,
+                        detail=f"Queue '{queue_id}' not found",
+                    )
+                limits = [
+                    entry
+                    for entry in queue.get("concurrency_limits", [])
+                    if (entry["key"], entry["value"]) != (key, value)
+                ]
+                if limit is not None:
+                    limits.append({"key": key, "value": value, "limit": limit})
+                self._queues.update_one(
+                    {"_id": queue_id},
+                    {
+                        "$set": {
+                            "concurrency_limits": limits,
+                            "last_modified": get_current_time(),
+                        }
+                    },
+                    session=session,
                 )
-                event_handle = fsm.create()
+                self._recount_slots(queue_id, key, limits, session=session)
+        return limits
 
-                task = {
-                    "_id": task_id,
-                    "queue_id": queue_id,
-                    "status": TaskState.PENDING,
-                    "task_name": task_name,
-                    "created_at": now,
-                    "start_time": None,
-                    "last_heartbeat": None,
-                    "last_modified": now,
-                    "heartbeat_timeout": heartbeat_timeout,
-                    "task_timeout": task_timeout,
-                    "max_retries": max_retries,
-                    "retries": 0,
-                    "priority": priority,
-                    "metadata": unflatten_dict(metadata or {}),
-                    "args": unflatten_dict(args or {}),
-                    "cmd": cmd or "",
-                    "summary": {},
-                    "worker_id": None,
+    @log_slow_op(collection="queues")
+    @retry_on_transient
+    @validate_arg
+    def ls_concurrency_limits(self, queue_id: str) -> Dict[str, Any]:
+        """List the concurrency limits of a queue and the running tasks of the limited groups.
+
+        Returns:
+            {"limits": [{"key", "value", "limit"}], "running": [{"key", "value", "running"}]}
+        """
+        with self._session() as session:
+            with self._transaction(session):
+                queue = self._queues.find_one({"_id": queue_id}, session=session)
+                if not queue:
+                    raise HTTPException(
+                        status_code=HTTP_404_NOT_FOUND,
+                        detail=f"Queue '{queue_id}' not found",
+                    )
+                counters = self._concurrency.find(
+                    {"queue_id": queue_id}, session=session
+                ).sort([("key", ASCENDING), ("_id", ASCENDING)])
+                return {
+                    "limits": queue.get("concurrency_limits", []),
+                    "running": [
+                        {k: counter[k] for k in ("key", "value", "running")}
+                        for counter in counters
+                    ],
                 }
-                result = self._tasks.insert_one(task, session=session)
 
-        event_handle.update_fsm_event(task, commit=True)
+    def _concurrency_limits(self, queue_id: str, session) -> List[Dict[str, Any]]:
+        queue = self._queues.find_one(
+            {"_id": queue_id}, {"concurrency_limits": 1}, session=session
+        )
+        return (queue or {}).get("concurrency_limits", [])
 
-        return str(result.inserted_id)
+    def _recount_slots(
+        self, queue_id: str, key: str, limits: List[Dict[str, Any]], session
+    ):
+        """Rebuild the counters of the groups of `key` from the running tasks, after its limits
+        changed."""
+        tasks = self._tasks_of(queue_id, session=session)
+        self._concurrency.delete_many(
+            {"queue_id": queue_id, "key": key}, session=session
+        )
+        prefix = _concurrency_slot_id(queue_id, key, None).rsplit("=", 1)[0] + "="
+        counters: Dict[str, Dict[str, Any]] = {}
+        running = tasks.find(
+            {"queue_id": queue_id, "status": TaskState.RUNNING},
+            {key: 1, "concurrency_slots": 1},
+            session=session,
+        )
+        for task in running:
+            value = _get_path(task, key)
+            slots = [
+                slot
+                for slot in task.get("concurrency_slots") or []
+                if not slot.startswith(prefix)
+            ]
+            if value is not None and _limit_of(limits, key, value) is not None:
+                slot = _concurrency_slot_id(queue_id, key, value)
+                slots.append(slot)
+                counter = counters.setdefault(
+                    slot,
+                    {
+                        "_id": slot,
+                        "queue_id": queue_id,
+                        "key": key,
+                        "value": value,
+                        "running": 0,
+                    },
+                )
+                counter["running"] += 1
+            if slots != (task.get("concurrency_slots") or []):
+                tasks.update_one(
+                    {"_id": task["_id"]},
+                    {"$set": {"concurrency_slots": slots}},
+                    session=session,
+                )
+        if counters:
+            self._concurrency.insert_many(list(counters.values()), session=session)
+
+    def _capped_groups(
+        self, queue_id: str, limits: List[Dict[str, Any]], session
+    ) -> List[Tuple[str, Any]]:
+        """(key, value) of the groups of a queue that reached their concurrency limit."""
+        capped = []
+        for counter in self._concurrency.find({"queue_id": queue_id}, session=session):
+            limit = _limit_of(limits, counter["key"], counter["value"])
+            if limit is not None and counter["running"] >= limit:
+                capped.append((counter["key"], counter["value"]))
+        return capped
+
+    def _acquire_slots(
+        self,
+        queue_id: str,
+        candidate: Mapping[str, Any],
+        limits: List[Dict[str, Any]],
+        session,
+    ) -> Tuple[Optional[List[str]], Optional[Tuple[str, Any]]]:
+        """Increment the running counters of the limited groups of a candidate.
+
+        Returns:
+            (slots, None) with the ids of the incremented counters, or (None, (key, value)) of
+            a group that reached its limit, in which case no counter is incremented.
+        """
+        keys = list(dict.fromkeys(entry["key"] for entry in limits))
+        task = candidate
+        if any(k.split(".")[0] not in candidate for k in keys):
+            # candidate from the ready-queue: sort fields only
+            task = (
+                self._tasks_of(queue_id, session=session).find_one(
+                    {"_id": candidate["_id"]}, {k: 1 for k in keys}, session=session
+                )
+                or {}
+            )
+        groups = []
+        for key in keys:
+            value = _get_path(task, key)
+            if value is None:
+                continue
+            limit = _limit_of(limits, key, value)
+            if limit is None:
+                continue
+            slot = _concurrency_slot_id(queue_id, key, value)
+            counter = self._concurrency.find_one({"_id": slot}, session=session)
+            if counter and counter["running"] >= limit:
+                return None, (key, value)
+            groups.append((slot, key, value))
+        for slot, key, value in groups:
+            self._concurrency.update_one(
+                {"_id": slot},
+                {
+                    "$inc": {"running": 1},
+                    "$setOnInsert": {"queue_id": queue_id, "key": key, "value": value},
+                },
+                upsert=True,
+                session=session,
+            )
+        return [slot for slot, _, _ in groups], None
+
+    def _release_slots(self, task: Mapping[str, Any], session):
+        """Decrement the running counters of the groups of a task leaving RUNNING.
+        The caller clears `concurrency_slots` of the task."""
+        for slot in task.get("concurrency_slots") or []:
+            self._concurrency.update_one(
+                {"_id": slot, "running": {"$gt": 0}},
+                {"$inc": {"running": -1}},
+                session=session,
+            )
 
+    @log_slow_op(collection="workers")
     @retry_on_transient
     @validate_arg
     def create_worker(
@@ -336,8 +1583,8 @@ def create_worker(
         max_retries: int = 3,
     ) -> str:
         """Create a worker."""
-        with self._client.start_session() as session:
-            with session.start_transaction():
+        with self._session() as session:
+            with self._transaction(session):
                 now = get_current_time()
 
                 worker_id = str(uuid4())
@@ -369,6 +1616,7 @@ def create_worker(
 
         return str(result.inserted_id)
 
+    @log_slow_op(collection="queues")
     @retry_on_transient
     @validate_arg
     def delete_queue(
@@ -386,26 +1634,57 @@ def delete_queue(
         Return:
             deleted_count: total affected entries
         """
-        with self._client.start_session() as session:
-            with session.start_transaction():
+        with self._session() as session:
+            with self._transaction(session):
                 deleted_count = 0
                 # Delete queue
-                deleted_count += self._queues.delete_one(
+                queue = self._queues.find_one_and_delete(
                     {"_id": queue_id}, session=session
-                ).deleted_count
+                )
+                if queue:
+                    deleted_count += 1
+                layout = (queue or {}).get("task_layout")
+                tasks = self._task_collection(queue_id, layout)
 
-                if cascade_delete:
+                if cascade_delete and layout != TASK_LAYOUT_PARTITIONED:
                     # Delete all tasks in the queue
-                    deleted_count += self._tasks.delete_many(
+                    deleted_count += tasks.delete_many(
                         {"queue_id": queue_id}, session=session
                     ).deleted_count
+                if cascade_delete:
                     # Delete all workers in the queue
                     deleted_count += self._workers.delete_many(
                         {"queue_id": queue_id}, session=session
                     ).deleted_count
+                    # Delete all sweeps in the queue
+                    deleted_count += self._sweeps.delete_many(
+                        {"queue_id": queue_id}, session=session
+                    ).deleted_count
+                    self._tombstones.delete_many(
+                        {"queue_id": queue_id}, session=session
+                    )
+                    self._revisions.delete_many({"queue_id": queue_id}, session=session)
+                    self._sched_stats.delete_many(
+                        {"queue_id": queue_id}, session=session
+                    )
+                    self._concurrency.delete_many(
+                        {"queue_id": queue_id}, session=session
+                    )
+
+        if cascade_delete and layout == TASK_LAYOUT_PARTITIONED:
+            # the tasks of a partitioned queue are deleted by dropping its collection
+            deleted_count += tasks.estimated_document_count()
+            tasks.drop()
+        else:
+            # Drop user-declared indexes (index operations are not transactional)
+            for path in (queue or {}).get("indexes", []):
+                self._drop_queue_index(queue_id, path, tasks=tasks)
 
-                return deleted_count
+        query_cache.invalidate(queue_id)
+        ready_queue.invalidate(queue_id)
+        return deleted_count
 
+    @log_slow_op(collection="tasks")
     @retry_on_transient
     @validate_arg
     def delete_task(
@@ -414,13 +1693,30 @@ def delete_task(
         task_id: str,
     ) -> int:
         """Delete a task."""
-        with self._client.start_session() as session:
-            with session.start_transaction():
+        with self._session() as session:
+            with self._transaction(session):
                 # Delete task
-                return self._tasks.delete_one(
+                deleted = self._tasks_of(queue_id, session=session).find_one_and_delete(
                     {"_id": task_id, "queue_id": queue_id}, session=session
-                ).deleted_count
+                )
+                deleted_count = 1 if deleted else 0
+                if deleted:
+                    self._release_slots(deleted, session=session)
+                    self._tombstones.insert_one(
+                        {
+                            "_id": str(uuid4()),
+                            "queue_id": queue_id,
+                            "task_id": task_id,
+                            "revision": self._next_revision(queue_id, session=session),
+                            "deleted_at": get_current_time(),
+                        },
+                        session=session,
+                    )
+
+        query_cache.invalidate(queue_id)
+        return deleted_count
 
+    @log_slow_op(collection="workers")
     @retry_on_transient
     @validate_arg
     def delete_worker(
@@ -440,8 +1736,8 @@ def delete_worker(
         Return:
             affected_count:
         """
-        with self._client.start_session() as session:
-            with session.start_transaction():
+        with self._session() as session:
+            with self._transaction(session):
                 affected_count = 0
                 # Delete worker
                 affected_count += self._workers.delete_one(
@@ -451,14 +1747,28 @@ def delete_worker(
                 now = get_current_time()
                 if cascade_update:
                     # Update all tasks associated with the worker
-                    affected_count += self._tasks.update_many(
-                        {"queue_id": queue_id, "worker_id": worker_id},
-                        {"$set": {"worker_id": None, "last_modified": now}},
-                        session=session,
-                    ).modified_count
+                    tasks = self._tasks_of(queue_id, session=session)
+                    if tasks.find_one(
+                        {"queue_id": queue_id, "worker_id": worker_id}, session=session
+                    ):
+                        revision = self._next_revision(queue_id, session=session)
+                        affected_count += tasks.update_many(
+                            {"queue_id": queue_id, "worker_id": worker_id},
+                            {
+                                "$set": {
+                                    "worker_id": None,
+                                    "last_modified": now,
+                                    "revision": revision,
+                                }
+                            },
+                            session=session,
+                        ).modified_count
 
-                return affected_count
+        query_cache.invalidate(queue_id)
+        ready_queue.invalidate(queue_id)
+        return affected_count
 
+    @log_slow_op(collection="queues")
     @retry_on_transient
     @validate_arg
     def update_queue(
@@ -469,8 +1779,8 @@ def update_queue(
         metadata_update: Optional[Dict[str, Any]] = None,
     ) -> int:
         """Update queue settings. Returns modified_count"""
-        with self._client.start_session() as session:
-            with session.start_transaction():
+        with self._session() as session:
+            with self._transaction(session):
                 # Make sure name does not already exist
                 if new_queue_name and self._get_queue_by_name(
                     new_queue_name, session=session, raise_exception=False
@@ -493,6 +1803,8 @@ def update_queue(
                     metadata_update = {"metadata": {}}
                 else:
                     metadata_update = sanitize_dict(metadata_update)
+                    if SCHEDULING_POLICY_KEY in metadata_update:
+                        _validate_scheduling_policy(metadata_update)
                     metadata_update = add_key_prefix(
                         metadata_update, prefix="metadata."
                     )
@@ -505,11 +1817,65 @@ def update_queue(
                         "last_modified": get_current_time(),
                     }
                 }
+                queue = self._queues.find_one(
+                    {"_id": queue_id}, {"metadata": 1}, session=session
+                )
+                if not queue:
+                    return 0
                 result = self._queues.update_one(
                     {"_id": queue_id}, update, session=session
                 )
-                return result.modified_count
 
+                # a new scheduling policy re-ranks the pending tasks
+                old_metadata = queue.get("metadata") or {}
+                new_metadata = (
+                    self._queues.find_one(
+                        {"_id": queue_id}, {"metadata": 1}, session=session
+                    )
+                    or {}
+                ).get("metadata") or {}
+                reranked = new_metadata.get(SCHEDULING_POLICY_KEY) != old_metadata.get(
+                    SCHEDULING_POLICY_KEY
+                )
+                if reranked:
+                    self._rerank_pending_tasks(
+                        queue_id,
+                        _validate_scheduling_policy(new_metadata),
+                        session=session,
+                    )
+
+        query_cache.invalidate(queue_id)
+        if reranked:
+            ready_queue.invalidate(queue_id)
+        return result.modified_count
+
+    def _rerank_pending_tasks(
+        self, queue_id: str, policy: SchedulingPolicy, session
+    ) -> int:
+        """Recompute the scheduling rank of all pending tasks of a queue, in submission order."""
+        stats = SchedStats(self._sched_stats, queue_id, session=session)
+        policy.reset(stats)
+        tasks = self._tasks_of(queue_id, session=session)
+        revision = self._next_revision(queue_id, session=session)
+        operations = [
+            UpdateOne(
+                {"_id": task["_id"]},
+                {
+                    "$set": {
+                        "sched_rank": policy.rank(task, stats),
+                        "revision": revision,
+                    }
+                },
+            )
+            for task in tasks.find(
+                {"queue_id": queue_id, "status": TaskState.PENDING}, session=session
+            ).sort([("created_at", ASCENDING), ("_id", ASCENDING)])
+        ]
+        if operations:
+            tasks.bulk_write(operations, ordered=False, session=session)
+        return len(operations)
+
+    @log_slow_op(collection="tasks", filter_arg="extra_filter")
     @retry_on_transient
     @validate_arg
     def fetch_task(
@@ -521,6 +1887,9 @@ def fetch_task(
         start_heartbeat: bool = True,
         required_fields: Optional[List[str]] = None,
         extra_filter: Optional[Dict[str, Any]] = None,
+        affinity: Optional[Dict[str, List[Any]]] = None,
+        capacity: Optional[Dict[str, float]] = None,
+        fit: str = "best",
     ) -> Optional[Mapping[str, Any]]:
         """
         Fetch next available task from queue.
@@ -538,10 +1907,415 @@ def fetch_task(
             start_heartbeat (bool): Whether to start heartbeat.
             required_fields (list, optional): Which fields are required. If None, no constraint is put on which fields should exist in args dict.
             extra_filter (Dict[str, Any], optional): Additional filter criteria for the task.
+            affinity (Dict[str, List[Any]], optional): Values the worker has warm, by task field path
+                (e.g. {"args.dataset": ["imagenet"]}). A matching task of the same priority is
+                preferred over the next task in order, unless the latter has been pending for
+                longer than `affinity_max_wait`.
+            capacity (Dict[str, float], optional): Free resources of the worker (e.g. {"cpus": 8, "mem_gb": 32}).
+                Only tasks whose resource requests fit are handed out. Resources the worker does not
+                report count as 0.
+            fit (str): How to pick among the tasks of the best priority that fit the capacity.
+                "best" hands out the task using the largest share of the capacity (among the next
+                BEST_FIT_WINDOW tasks in order), "first" the next task in order.
+        """
+        result = self._fetch_tasks(
+            queue_id,
+            [
+                dict(
+                    worker_id=worker_id,
+                    eta_max=eta_max,
+                    heartbeat_timeout=heartbeat_timeout,
+                    start_heartbeat=start_heartbeat,
+                    required_fields=required_fields,
+                    extra_filter=extra_filter,
+                    affinity=affinity,
+                    capacity=capacity,
+                    fit=fit,
+                )
+            ],
+        )[0]
+        if isinstance(result, HTTPException):
+            raise result
+        return result
+
+    @log_slow_op(collection="tasks")
+    @retry_on_transient
+    @validate_arg
+    def fetch_tasks_batch(
+        self,
+        queue_id: str,
+        requests: List[Dict[str, Any]],
+    ) -> List[Union[Mapping[str, Any], None, HTTPException]]:
+        """
+        Serve several fetch requests of a queue in one transaction.
+
+        Requests with the same (required_fields, extra_filter) share one candidate query.
+        Requests are served in order: an earlier request is handed out a better candidate
+        than a later request of the same shape. All claimed tasks are updated with one bulk write.
+
+        Args:
+            queue_id (str): The id of the queue to fetch the tasks from.
+            requests (list): Keyword arguments of `fetch_task` (except queue_id), one dict per request.
+
+        Returns:
+            One entry per request: the fetched task, None if no task matched, or the
+            HTTPException that the request would have raised in `fetch_task`.
+        """
+        return self._fetch_tasks(queue_id, requests)
+
+    def _fetch_tasks(
+        self,
+        queue_id: str,
+        requests: List[Dict[str, Any]],
+    ) -> List[Union[Mapping[str, Any], None, HTTPException]]:
+        results: List[Union[Mapping[str, Any], None, HTTPException]] = [None] * len(
+            requests
+        )
+        create_event_handles = []
+        fetch_event_handles = {}
+        handed_out: List[Tuple[Dict[str, Any], Dict[str, Any]]] = (
+            []
+        )  # (group, candidate)
+
+        try:
+            with self._session() as session:
+                with self._transaction(session):
+                    now = get_current_time()
+                    tasks = self._tasks_of(queue_id, session=session)
+                    groups: Dict[str, Dict[str, Any]] = {}
+                    unserved = []  # (request index, group, update)
+                    # request index -> affinity / capacity constraints of the request
+                    constraints: Dict[int, Dict[str, Any]] = {}
+                    for i, request in enumerate(requests):
+                        try:
+                            group, update, constraints[i] = self._prepare_fetch(
+                                queue_id,
+                                now=now,
+                                session=session,
+                                groups=groups,
+                                tasks=tasks,
+                                **request,
+                            )
+                        except HTTPException as e:
+                            results[i] = e
+                            continue
+                        unserved.append((i, group, update))
+
+                    # groups that reached their concurrency limit are excluded from the
+                    # candidate queries, shared by all requests of the batch
+                    limits = self._concurrency_limits(queue_id, session=session)
+                    capped = (
+                        self._capped_groups(queue_id, limits, session=session)
+                        if limits
+                        else []
+                    )
+                    for c in constraints.values():
+                        c["capped"] = capped
+
+                    seen_ids = set()  # candidates handed out (or capped) in this batch
+                    revision = None
+                    while unserved:
+                        claims = []  # (request index, group, candidate, update, slots)
+                        for i, group, update in unserved:
+                            while True:
+                                candidate = self._next_candidate(
+                                    queue_id,
+                                    group,
+                                    constraints[i],
+                                    exclude=seen_ids,
+                                    now=now,
+                                    session=session,
+                                    create_event_handles=create_event_handles,
+                                )
+                                slots = None
+                                if candidate and limits:
+                                    slots, capped_group = self._acquire_slots(
+                                        queue_id, candidate, limits, session=session
+                                    )
+                                    if capped_group is not None:
+                                        # skip the group from now on
+                                        capped.append(capped_group)
+                                        seen_ids.add(candidate["_id"])
+                                        group["push_back"](candidate)
+                                        continue
+                                break
+
+                            if candidate:
+                                seen_ids.add(candidate["_id"])
+                                handed_out.append((group, candidate))
+                                claims.append((i, group, candidate, update, slots))
+
+                        if not claims:
+                            break
+
+                        # one revision for the whole batch, it also marks the claimed tasks
+                        if revision is None:
+                            revision = self._next_revision(queue_id, session=session)
+                        operations = []
+                        for i, group, candidate, update, slots in claims:
+                            update["$set"]["revision"] = revision
+                            if slots:
+                                update = {
+                                    "$set": {
+                                        **update["$set"],
+                                        "concurrency_slots": slots,
+                                    }
+                                }
+                            operations.append(
+                                UpdateOne(
+                                    {**group["query"], "_id": candidate["_id"]}, update
+                                )
+                            )
+                        tasks.bulk_write(operations, session=session)
+
+                        claimed_tasks = {
+                            task["_id"]: task
+                            for task in tasks.aggregate(
+                                [
+                                    {
+                                        "$match": {
+                                            "_id": {
+                                                "$in": [c[2]["_id"] for c in claims]
+                                            },
+                                            "revision": revision,
+                                        }
+                                    },
+                                    {"$addFields": {"task_id": "$_id"}},
+                                ],
+                                session=session,
+                            )
+                        }
+
+                        unserved = []
+                        for i, group, candidate, update, slots in claims:
+                            task = claimed_tasks.get(candidate["_id"])
+                            if task is None:
+                                # stale candidate (no longer pending), try the next one
+                                self._release_slots(
+                                    {"concurrency_slots": slots}, session=session
+                                )
+                                unserved.append((i, group, update))
+                                continue
+                            results[i] = task
+                            # the conditional update guarantees the task was pending
+                            fetch_event_handles[i] = TaskFSM(
+                                queue_id=queue_id,
+                                entity_id=task["_id"],
+                                current_state=TaskState.PENDING,
+                                retries=task["retries"],
+                                max_retries=task["max_retries"],
+                            ).fetch()
+
+                    # let the scheduling policy account for the dispatched ranked tasks
+                    ranked = [
+                        task
+                        for task in results
+                        if isinstance(task, dict) and task.get("sched_rank") is not None
+                    ]
+                    if ranked:
+                        policy = self._scheduling_policy(queue_id, session=session)
+                        stats = SchedStats(self._sched_stats, queue_id, session=session)
+                        for task in ranked:
+                            policy.on_dispatch(task, stats)
+        except BaseException:
+            # nothing was claimed, candidates taken from the ready-queue are still valid
+            for group, candidate in handed_out:
+                group["push_back"](candidate)
+            raise
+
+        for create_event_handle in create_event_handles:
+            create_event_handle.commit()
+
+        for i, event_handle in fetch_event_handles.items():
+            event_handle.update_fsm_event(results[i], commit=True)  # type: ignore
+
+        fetched_with_affinity = [
+            i
+            for i in fetch_event_handles
+            if constraints[i].get("affinity_filter") is not None
+        ]
+        if fetched_with_affinity:
+            hits = sum(
+                _matches_affinity(results[i], requests[i]["affinity"])  # type: ignore
+                for i in fetched_with_affinity
+            )
+            with self._affinity_lock:
+                self._affinity_requests += len(fetched_with_affinity)
+                self._affinity_hits += hits
+
+        return results
+
+    def _next_candidate(
+        self,
+        queue_id: str,
+        group: Dict[str, Any],
+        constraints: Dict[str, Any],
+        exclude,
+        now,
+        session,
+        create_event_handles: List[StateTransitionEventHandle],
+    ) -> Optional[Dict[str, Any]]:
+        """Best remaining candidate of a request, skipping the tasks in `exclude`
+        (already handed out in this batch)."""
+        if constraints.get("capacity") is not None or constraints.get("capped"):
+            candidate = self._fit_candidate(
+                group, constraints, exclude=exclude, session=session
+            )
+        else:
+            candidate = group["next_candidate"](exclude)
+        if candidate and constraints.get("affinity_filter"):
+            candidate = self._prefer_affinity(
+                group, candidate, constraints, exclude=exclude, now=now, session=session
+            )
+
+        # Sweeps with strictly higher priority than the best concrete
+        # candidate get a point materialized into a concrete task.
+        materialized, create_event_handle = self._materialize_sweep_task(
+            queue_id=queue_id,
+            query=group["query"],
+            required_fields=group["required_fields"],
+            required_fields_no_more=group["required_fields_no_more"],
+            min_priority=candidate["priority"] if candidate else None,
+            capacity=constraints.get("capacity"),
+            capped=constraints.get("capped"),
+            tasks=group["tasks"],
+            session=session,
+        )
+        if create_event_handle:
+            create_event_handles.append(create_event_handle)
+        if materialized:
+            if candidate:
+                group["push_back"](candidate)
+            candidate = materialized
+        return candidate
+
+    def _prefer_affinity(
+        self,
+        group: Dict[str, Any],
+        candidate: Dict[str, Any],
+        constraints: Dict[str, Any],
+        exclude,
+        now,
+        session,
+    ) -> Dict[str, Any]:
+        """Swap the candidate for the best pending task of the same priority matching the affinity
+        of the request, unless the candidate has been pending for longer than `affinity_max_wait`.
+        """
+        waited = (now - candidate["last_modified"]).total_seconds()
+        if waited >= get_server_config().affinity_max_wait:
+            return candidate
+
+        query = {
+            "$and": [
+                group["query"],
+                constraints["affinity_filter"],
+                {"priority": candidate["priority"], "_id": {"$nin": list(exclude)}},
+            ]
+        }
+        for task in self._iter_fetchable(query, group, constraints, session=session):
+            if task["_id"] == candidate["_id"]:
+                return candidate
+            group["push_back"](candidate)
+            return task
+        return candidate
+
+    def _fit_candidate(
+        self,
+        group: Dict[str, Any],
+        constraints: Dict[str, Any],
+        exclude,
+        session,
+    ) -> Optional[Dict[str, Any]]:
+        """Best pending task of the group whose resource requests fit the capacity of the request
+        (if any), outside of the groups that reached their concurrency limit.
+
+        Bypasses the ready-queue: the capacity differs from one worker (and fetch) to another,
+        and the capped groups from one fetch to another.
+        """
+        capacity = constraints.get("capacity")
+        query = {"$and": [group["query"], {"_id": {"$nin": list(exclude)}}]}
+        best, best_score, scanned = None, 0.0, 0
+        for task in self._iter_fetchable(query, group, constraints, session=session):
+            score = _fit_score(task.get("resources"), capacity) if capacity else 0.0
+            if best is None:
+                best, best_score = task, score
+                if capacity is None or constraints["fit"] == "first":
+                    break
+            elif task["priority"] != best["priority"] or scanned >= BEST_FIT_WINDOW:
+                break
+            elif score > best_score:
+                best, best_score = task, score
+            scanned += 1
+        return best
+
+    def _iter_fetchable(
+        self,
+        query: Dict[str, Any],
+        group: Dict[str, Any],
+        constraints: Dict[str, Any],
+        session,
+    ) -> Iterator[Dict[str, Any]]:
+        """Pending tasks matching `query` in dispatch order, that satisfy the "no more" requirement
+        of the group, fit the capacity of the request (if any) and are not in a capped group.
+        """
+        capacity = constraints.get("capacity")
+        if capacity is not None:
+            query = {"$and": [query, _capacity_filter(capacity)]}
+        if constraints.get("capped"):
+            query = {
+                "$and": [
+                    query,
+                    {"$nor": [{key: value} for key, value in constraints["capped"]]},
+                ]
+            }
+        required_fields_no_more = group["required_fields_no_more"]
+        for task in group["tasks"].find(query, session=session).sort(DISPATCH_SORT):
+            if required_fields_no_more and not arg_match(
+                required_fields_no_more, task["args"]
+            ):
+                continue
+            if capacity is not None and not _fits(task.get("resources"), capacity):
+                continue
+            yield task
+
+    def affinity_metrics(self) -> Dict[str, Any]:
+        with self._affinity_lock:
+            requests, hits = self._affinity_requests, self._affinity_hits
+        return {
+            "requests": requests,
+            "hits": hits,
+            "hit_rate": hits / requests if requests else 0.0,
+        }
+
+    def _prepare_fetch(
+        self,
+        queue_id: str,
+        now,
+        session,
+        groups: Dict[str, Dict[str, Any]],
+        tasks: Collection,
+        worker_id: Optional[str] = None,
+        eta_max: Optional[str] = None,
+        heartbeat_timeout: Optional[float] = None,
+        start_heartbeat: bool = True,
+        required_fields: Optional[List[str]] = None,
+        extra_filter: Optional[Dict[str, Any]] = None,
+        affinity: Optional[Dict[str, List[Any]]] = None,
+        capacity: Optional[Dict[str, float]] = None,
+        fit: str = "best",
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+        """Validate a fetch request and find the candidate group of its shape.
+
+        Returns:
+            (group, update, constraints). `constraints` holds the affinity filter and the
+            capacity of the request, which are not part of the group query.
+            Groups are cached in `groups` by request shape.
+            A group holds the query and picks the candidates (from the ready-queue, or a lazy
+            database cursor if the ready-queue is disabled), shared by requests of the same shape.
         """
         task_timeout = parse_timeout(eta_max) if eta_max else None
 
-        required_fields = required_fields or []
+        required_fields = list(required_fields or [])
 
         allow_arbitrary_args = "*" in required_fields
         if allow_arbitrary_args:  # prevent "*" messing with constructed mongodb query
@@ -553,139 +2327,317 @@ def fetch_task(
                 detail="Eta max must be specified when start_heartbeat is False",
             )
 
-        fetched_task = None
-        with self._client.start_session() as session:
-            with session.start_transaction():
-                # Verify worker status if specified
-                if worker_id:
-                    worker = self._workers.find_one(
-                        {"_id": worker_id, "queue_id": queue_id}, session=session
-                    )
-                    if not worker:
-                        raise HTTPException(
-                            status_code=HTTP_404_NOT_FOUND,
-                            detail=f"Worker '{worker_id}' not found in queue '{queue_id}'",
-                        )
-                    worker_status = worker["status"]
-                    if worker_status != WorkerState.ACTIVE:
-                        raise HTTPException(
-                            status_code=HTTP_403_FORBIDDEN,
-                            detail=f"Worker '{worker_id}' is {worker_status} in queue '{queue_id}'",
-                        )
+        # Verify worker status if specified
+        if worker_id:
+            worker = self._workers.find_one(
+                {"_id": worker_id, "queue_id": queue_id}, session=session
+            )
+            if not worker:
+                raise HTTPException(
+                    status_code=HTTP_404_NOT_FOUND,
+                    detail=f"Worker '{worker_id}' not found in queue '{queue_id}'",
+                )
+            worker_status = worker["status"]
+            if worker_status != WorkerState.ACTIVE:
+                raise HTTPException(
+                    status_code=HTTP_403_FORBIDDEN,
+                    detail=f"Worker '{worker_id}' is {worker_status} in queue '{queue_id}'",
+                )
 
-                # Fetch task
-                now = get_current_time()
+        update = {
+            "$set": {
+                "status": TaskState.RUNNING,
+                "start_time": now,
+                "last_heartbeat": now if start_heartbeat else None,
+                "last_modified": now,
+                "worker_id": worker_id,
+            }
+        }
 
-                # "no less" of the "no more, no less" principle, user demanded fields must
-                # exist in task args
-                # even if allow_arbitrary_args==True, this principle should still be followed
-                # else it may lead to unexpected missing keys.
-                try:
-                    query_dict = keys_to_query_dict(required_fields, mode="deepest")
-                except (TypeError, ValueError) as e:
-                    raise HTTPException(
-                        status_code=HTTP_400_BAD_REQUEST,
-                        detail=f"Invalid required fields. Detail: {str(e)}",
-                    )
-                required_fields_filter = query_dict_to_mongo_filter(
-                    query_dict, parent_key="args"
-                )
+        if task_timeout:
+            update["$set"]["task_timeout"] = task_timeout
+
+        if heartbeat_timeout:
+            update["$set"]["heartbeat_timeout"] = heartbeat_timeout
 
-                combined_filter = merge_filter(
-                    required_fields_filter, extra_filter, logical_op="and"
+        constraints: Dict[str, Any] = {}
+        if affinity:
+            for path, values in affinity.items():
+                _validate_field_path(path, usage="affinity")
+            constraints["affinity_filter"] = {
+                "$or": [{path: {"$in": values}} for path, values in affinity.items()]
+            }
+        if capacity is not None:
+            if fit not in ("best", "first"):
+                raise HTTPException(
+                    status_code=HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid fit '{fit}'. Must be one of: best, first",
                 )
+            constraints["capacity"] = _validate_resources(capacity, usage="capacity")
+            constraints["fit"] = fit
 
-                sanitized_filter = sanitize_query(queue_id, combined_filter)
+        shape = make_cache_key(
+            sorted(required_fields), allow_arbitrary_args, extra_filter
+        )
+        if shape in groups:
+            return groups[shape], update, constraints
 
-                # Construct the query
-                query = {
-                    **sanitized_filter,
-                    "queue_id": queue_id,
-                    "status": TaskState.PENDING,
-                }
+        # "no less" of the "no more, no less" principle, user demanded fields must
+        # exist in task args
+        # even if allow_arbitrary_args==True, this principle should still be followed
+        # else it may lead to unexpected missing keys.
+        try:
+            query_dict = keys_to_query_dict(required_fields, mode="deepest")
+        except (TypeError, ValueError) as e:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"Invalid required fields. Detail: {str(e)}",
+            )
+        required_fields_filter = query_dict_to_mongo_filter(
+            query_dict, parent_key="args"
+        )
 
-                update = {
-                    "$set": {
-                        "status": TaskState.RUNNING,
-                        "start_time": now,
-                        "last_heartbeat": now if start_heartbeat else None,
-                        "last_modified": now,
-                        "worker_id": worker_id,
-                    }
-                }
+        combined_filter = merge_filter(
+            required_fields_filter, extra_filter, logical_op="and"
+        )
 
-                if task_timeout:
-                    update["$set"]["task_timeout"] = task_timeout
+        sanitized_filter = sanitize_query(queue_id, combined_filter)
 
-                if heartbeat_timeout:
-                    update["$set"]["heartbeat_timeout"] = heartbeat_timeout
+        # Construct the query
+        query = {
+            **sanitized_filter,
+            "queue_id": queue_id,
+            "status": TaskState.PENDING,
+        }
+
+        # "no more" of the "no more, no less" principle
+        # those specified in the task["args"] should be required
+        required_fields_no_more = keys_to_query_dict(required_fields, mode="topmost")
+        if allow_arbitrary_args:
+            required_fields_no_more = None
+
+        hint = choose_index_hint("tasks", query, DISPATCH_SORT)
+        hint_kwargs: Dict[str, Any] = {"hint": hint} if hint else {}
 
-                tasks = self._tasks.aggregate(
+        # other query shapes are not matched in memory against the tasks entering PENDING
+        if ready_queue.enabled and cacheable(query):
+
+            def load(after, limit):
+                match = query if after is None else {"$and": [query, _after(after)]}
+                projection = {k: 1 for k, _ in DISPATCH_SORT}
+                if required_fields_no_more:
+                    projection["args"] = 1
+                return tasks.aggregate(
                     [
-                        {"$match": query},
-                        {"$addFields": {"task_id": "$_id"}},
-                        # sort: highest priority, least recently modified, oldest created
-                        {
-                            "$sort": {
-                                "priority": DESCENDING,
-                                "last_modified": ASCENDING,
-                                "created_at": ASCENDING,
-                            }
-                        },
+                        {"$match": match},
+                        {"$sort": dict(DISPATCH_SORT)},
+                        {"$limit": limit},
+                        {"$project": projection},
                     ],
                     session=session,
+                    **hint_kwargs,
                 )
 
-                # "no more" of the "no more, no less" principle
-                # those specified in the task["args"] should be required
-                required_fields_no_more = keys_to_query_dict(
-                    required_fields, mode="topmost"
+            def next_candidate(exclude):
+                return ready_queue.pop(
+                    queue_id, shape, query, required_fields_no_more, load, exclude
                 )
-                for task in tasks:
+
+            def push_back(candidate):
+                if "sort_key" in candidate:  # not materialized from a sweep
+                    ready_queue.push_back(queue_id, shape, candidate)
+
+        else:
+            cursor = tasks.aggregate(
+                [
+                    {"$match": query},
+                    {"$sort": dict(DISPATCH_SORT)},
+                ],
+                session=session,
+                **hint_kwargs,
+            )
+
+            def iter_candidates():
+                for task in cursor:
                     if task:
-                        if (
-                            not allow_arbitrary_args
-                            and required_fields_no_more
-                            and not arg_match(required_fields_no_more, task["args"])
+                        if required_fields_no_more and not arg_match(
+                            required_fields_no_more, task["args"]
                         ):
                             continue  # Skip to the next task if it doesn't match
+                        yield task
 
-                        fsm = TaskFSM.from_db_entry(task)
-                        event_handle = fsm.fetch()
+            candidates = _Candidates(iter_candidates())
 
-                        fetched_task = self._tasks.find_one_and_update(
-                            {"_id": task["_id"]},
-                            update,
-                            session=session,
-                            return_document=ReturnDocument.AFTER,
-                        )
-                        break
+            def next_candidate(exclude):
+                for task in candidates:
+                    if task["_id"] not in exclude:
+                        return task
+                return None
+
+            push_back = candidates.push_back
+
+        group = groups[shape] = {
+            "tasks": tasks,
+            "query": query,
+            "required_fields": required_fields,
+            "required_fields_no_more": required_fields_no_more,
+            "next_candidate": next_candidate,
+            "push_back": push_back,
+        }
+        return group, update, constraints
+
+    def _materialize_sweep_task(
+        self,
+        queue_id: str,
+        query: Dict[str, Any],
+        required_fields: List[str],
+        required_fields_no_more: Optional[Dict[str, Any]],
+        min_priority: Optional[int],
+        session,
+        tasks: Collection,
+        capacity: Optional[Dict[str, float]] = None,
+        capped: Optional[List[Tuple[str, Any]]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[StateTransitionEventHandle]]:
+        """
+        Materialize the next point of the highest priority sweep compatible with the fetch request.
+
+        Returns:
+            (task, create_event_handle). Both are None if no sweep has a next point matching
+            `query`. Otherwise, the event handle should be committed after the transaction.
+        """
+        sweep_query: Dict[str, Any] = {"queue_id": queue_id, "remaining": {"$gt": 0}}
+        if min_priority is not None:
+            sweep_query["priority"] = {"$gt": min_priority}
+
+        sweeps = self._sweeps.find(sweep_query, session=session).sort(
+            [("priority", DESCENDING), ("created_at", ASCENDING)]
+        )
+        for sweep in sweeps:
+            if capacity is not None and not _fits(sweep.get("resources"), capacity):
+                continue
+            if capped and any(_get_path(sweep, key) == value for key, value in capped):
+                continue
+            index = sweep["cursor"]
+            args = materialize_args(
+                sweep["args"],
+                sweep["mode"],
+                [(axis["name"], axis["values"]) for axis in sweep["axes"]],
+                index,
+                sweep["seed"],
+            )
+            # check the "no more, no less" principle before materializing
+            if not all(_has_key_path(args, key) for key in required_fields):
+                continue
+            if required_fields_no_more and not arg_match(required_fields_no_more, args):
+                continue
+
+            task, event_handle = self._new_task_doc(
+                session=session,
+                queue_id=queue_id,
+                task_name=sweep["task_name"],
+                args=args,
+                metadata=sweep["metadata"],
+                cmd=sweep["cmd"],
+                heartbeat_timeout=sweep["heartbeat_timeout"],
+                task_timeout=sweep["task_timeout"],
+                max_retries=sweep["max_retries"],
+                priority=sweep["priority"],
+                resources=sweep.get("resources"),
+                sweep_id=sweep["_id"],
+                sweep_index=index,
+            )
+            task["revision"] = self._next_revision(queue_id, session=session)
+            tasks.insert_one(task, session=session)
+
+            # The fetch filter (e.g. the extra filter) is evaluated by the database against
+            # the task document. A point that does not match is not materialized.
+            stored = tasks.find_one({**query, "_id": task["_id"]}, session=session)
+            if stored is None:
+                tasks.delete_one({"_id": task["_id"]}, session=session)
+                continue
+
+            # advance the cursor, guarded against concurrent materialization
+            advanced = self._sweeps.find_one_and_update(
+                {"_id": sweep["_id"], "cursor": index},
+                {
+                    "$inc": {"cursor": 1, "remaining": -1},
+                    "$set": {"last_modified": get_current_time()},
+                },
+                session=session,
+            )
+            if not advanced:
+                tasks.delete_one({"_id": task["_id"]}, session=session)
+                continue
 
-        if fetched_task:
-            event_handle.update_fsm_event(fetched_task, commit=True)  # type: ignore
-            return fetched_task
+            event_handle.update_fsm_event(task, commit=False)
+            return stored, event_handle
 
-        return None  # Return None if no tasks matched
+        return None, None
 
+    @log_slow_op(collection="tasks")
     @retry_on_transient
     @validate_arg
     def refresh_task_heartbeat(
         self,
         queue_id: str,
         task_id: str,
-    ) -> bool:
-        """Update task heartbeat timestamp."""
-        with self._client.start_session() as session:
-            with session.start_transaction():
-                return (
-                    self._tasks.update_one(
+        progress: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Mapping[str, Any]]:
+        """Update task heartbeat timestamp, and set `summary.progress` in the same write if
+        `progress` is sent with the heartbeat.
+
+        If heartbeat_flush_interval > 0, the heartbeat is buffered in memory and written by
+        flush_heartbeats() later. Only existence of the task is checked here.
+
+        Returns:
+            The `_id` and `heartbeat_timeout` of the task, or None if the task is not found.
+        """
+        projection = {"_id": 1, "heartbeat_timeout": 1}
+        if get_server_config().heartbeat_flush_interval > 0:
+            task = self._tasks_of(queue_id).find_one(
+                {"_id": task_id, "queue_id": queue_id}, projection=projection
+            )
+            if task is not None:
+                self._heartbeat_buffer.record(
+                    queue_id, task_id, get_current_time(), progress
+                )
+            return task
+
+        now = get_current_time()
+        with self._session() as session:
+            with self._transaction(session):
+                tasks = self._tasks_of(queue_id, session=session)
+                # a revision is only taken for a new progress
+                progressed = False
+                if progress is not None and tasks.find_one(
+                    _progress_changed(queue_id, task_id, progress),
+                    {"_id": 1},
+                    session=session,
+                ):
+                    progressed = True
+                    tasks.update_one(
                         {"_id": task_id, "queue_id": queue_id},
-                        {"$set": {"last_heartbeat": get_current_time()}},
+                        {
+                            "$set": _progress_update(
+                                progress,
+                                now,
+                                self._next_revision(queue_id, session=session),
+                            )
+                        },
                         session=session,
-                    ).modified_count
-                    > 0
+                    )
+                task = tasks.find_one_and_update(
+                    {"_id": task_id, "queue_id": queue_id},
+                    {"$set": {"last_heartbeat": now}},
+                    projection=projection,
+                    session=session,
                 )
 
+        if progressed:
+            query_cache.invalidate(queue_id)
+        return task
+
+    @log_slow_op(collection="tasks")
     @retry_on_transient
     @validate_arg
     def worker_report_task_status(
@@ -713,9 +2665,9 @@ def worker_report_task_status(
         Returns:
 
         """
-        with self._client.start_session() as session:
-            with session.start_transaction():
-                task = self._tasks.find_one(
+        with self._session() as session:
+            with self._transaction(session):
+                task = self._tasks_of(queue_id, session=session).find_one(
                     {"_id": task_id, "queue_id": queue_id}, session=session
                 )
                 if not task:
@@ -740,11 +2692,13 @@ def worker_report_task_status(
                     session=session,
                 )
 
+        # entity data (the updated task / worker) is set by _report_task_status
         for event_handle in event_handles:
-            event_handle.update_fsm_event(task, commit=True)
+            event_handle.commit()
 
         return True
 
+    @log_slow_op(collection="tasks")
     @retry_on_transient
     @validate_arg
     def report_task_status(
@@ -755,9 +2709,9 @@ def report_task_status(
         summary_update: Optional[Dict[str, Any]] = None,
     ) -> bool:
         """Update task status. Used for reporting task execution results."""
-        with self._client.start_session() as session:
-            with session.start_transaction():
-                task = self._tasks.find_one(
+        with self._session() as session:
+            with self._transaction(session):
+                task = self._tasks_of(queue_id, session=session).find_one(
                     {"_id": task_id, "queue_id": queue_id}, session=session
                 )
                 if not task:
@@ -773,8 +2727,9 @@ def report_task_status(
                     session=session,
                 )
 
+        # entity data (the updated task / worker) is set by _report_task_status
         for event_handle in event_handles:
-            event_handle.update_fsm_event(task, commit=True)
+            event_handle.commit()
         return True
 
     def _report_task_status(
@@ -821,17 +2776,31 @@ def _report_task_status(
             summary_update = sanitize_dict(summary_update)
             summary_update = add_key_prefix(summary_update, prefix="summary.")
 
+        now = get_current_time()
         update = {
             "$set": {
                 **summary_update,
                 "status": fsm.state,
                 "retries": fsm.retries,
-                "last_modified": get_current_time(),
+                "last_modified": now,
                 "worker_id": None,
+                "revision": self._next_revision(queue_id, session=session),
             }
         }
 
-        updated_task = self._tasks.find_one_and_update(
+        if task.get("concurrency_slots"):
+            self._release_slots(task, session=session)
+            update["$set"]["concurrency_slots"] = []
+
+        if fsm.state == TaskState.PENDING:  # retried
+            update["$set"]["sched_rank"] = self._rank_task(task, session=session)
+        elif report_status == "success" and task.get("start_time"):
+            # runtime history of the queue, used by runtime-aware scheduling policies
+            SchedStats(self._sched_stats, queue_id, session=session).record_runtime(
+                task.get("task_name"), (now - task["start_time"]).total_seconds()
+            )
+
+        updated_task = self._tasks_of(queue_id, session=session).find_one_and_update(
             {"_id": task_id},
             update,
             session=session,
@@ -844,6 +2813,7 @@ def _report_task_status(
 
         return event_handles
 
+    @log_slow_op(collection="tasks")
     @retry_on_transient
     @validate_arg
     def update_task(
@@ -866,80 +2836,139 @@ def update_task(
         Banned Fields from Updating: [_id, queue_id, created_at, last_modified]
         Potentially Auto-Overwritten Fields: [status, retries]
         """
-        with self._client.start_session() as session:
-            with session.start_transaction():
-                task = self._tasks.find_one(
-                    {"_id": task_id, "queue_id": queue_id}, session=session
+        with self._session() as session:
+            with self._transaction(session):
+                result = self._update_task(
+                    queue_id=queue_id,
+                    task_id=task_id,
+                    task_setting_update=task_setting_update,
+                    reset_pending=reset_pending,
+                    tasks=self._tasks_of(queue_id, session=session),
+                    session=session,
                 )
-                if not task:
+                if result is None:
                     return False
+                updated_task, event_handle = result
 
-                # Update task settings
-                if task_setting_update:
-                    # disallow mongodb operators
-                    task_setting_update = sanitize_dict(task_setting_update)
-                    task_setting_update_keys = list(task_setting_update.keys())
-                    # ignore disallowed fields
-                    banned_fields = [
-                        "_id",
-                        "queue_id",
-                        "created_at",
-                        "last_modified",
-                    ]
-                    for k in task_setting_update_keys:
-                        if k.split(".")[0] in banned_fields:
-                            del task_setting_update[k]
-                else:
-                    task_setting_update = {}
-
-                task_setting_update["last_modified"] = get_current_time()
+        if event_handle:
+            event_handle.update_fsm_event(updated_task, commit=True)
+        else:  # settings updated without state transition
+            query_cache.invalidate(queue_id)
+            ready_queue.invalidate(queue_id)
 
-                fsm = TaskFSM.from_db_entry(task)
+        return True
 
-                if reset_pending:
-                    event_handle = fsm.reset()
-                    task_setting_update["status"] = fsm.state  # PENDING
-                    task_setting_update["retries"] = fsm.retries  # 0
-                    task_setting_update["worker_id"] = None  # reset worker_id
-                else:
-                    event_handle = None
+    def _update_task(
+        self,
+        queue_id: str,
+        task_id: str,
+        task_setting_update: Optional[Dict[str, Any]],
+        reset_pending: bool,
+        tasks: Collection,
+        session,
+    ) -> Optional[Tuple[Dict[str, Any], Optional[StateTransitionEventHandle]]]:
+        """Update a task within the transaction of `session`. See `update_task`.
 
-                update = {
-                    "$set": {
-                        **task_setting_update,
-                    }
-                }
+        Returns:
+            The updated task and the event handle of its state transition (if any) to be
+            committed after the transaction, or None if the task is not found.
+        """
+        task = tasks.find_one({"_id": task_id, "queue_id": queue_id}, session=session)
+        if not task:
+            return None
 
-                updated_task = self._tasks.find_one_and_update(
-                    {"_id": task_id, "queue_id": queue_id},
-                    update,
-                    session=session,
-                    return_document=ReturnDocument.AFTER,
+        # Update task settings
+        if task_setting_update:
+            # disallow mongodb operators
+            task_setting_update = sanitize_dict(task_setting_update)
+            task_setting_update_keys = list(task_setting_update.keys())
+            # ignore disallowed fields
+            banned_fields = [
+                "_id",
+                "queue_id",
+                "created_at",
+                "last_modified",
+                "revision",
+                "sched_rank",
+                "concurrency_slots",
+            ]
+            for k in task_setting_update_keys:
+                if k.split(".")[0] in banned_fields:
+                    del task_setting_update[k]
+            if "resources" in task_setting_update:
+                task_setting_update["resources"] = _validate_resources(
+                    task_setting_update["resources"], usage="resources"
                 )
+        else:
+            task_setting_update = {}
 
-                # if the FSM state is modified by user manually
-                if not reset_pending and updated_task["status"] != task["status"]:
-                    event_handle = fsm.transition_to(updated_task["status"])
+        task_setting_update["last_modified"] = get_current_time()
+        task_setting_update["revision"] = self._next_revision(queue_id, session=session)
 
-                # reset worker_id if the task is pending and worker_id is not None
-                if (
-                    updated_task["status"] == TaskState.PENDING
-                    and updated_task["worker_id"] is not None
-                ):
-                    self._tasks.update_one(
-                        {"_id": task_id, "queue_id": queue_id},
-                        {"$set": {"worker_id": None}},
-                        session=session,
-                    )
+        fsm = TaskFSM.from_db_entry(task)
 
-        if event_handle:
-            event_handle.update_fsm_event(updated_task, commit=True)
+        if reset_pending:
+            event_handle = fsm.reset()
+            task_setting_update["status"] = fsm.state  # PENDING
+            task_setting_update["retries"] = fsm.retries  # 0
+            task_setting_update["worker_id"] = None  # reset worker_id
+        else:
+            event_handle = None
 
-        return True
+        update = {
+            "$set": {
+                **task_setting_update,
+            }
+        }
+
+        updated_task = tasks.find_one_and_update(
+            {"_id": task_id, "queue_id": queue_id},
+            update,
+            session=session,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        # if the FSM state is modified by user manually
+        if not reset_pending and updated_task["status"] != task["status"]:
+            event_handle = fsm.transition_to(updated_task["status"])
+
+        # left RUNNING: free the concurrency slots of the task
+        if updated_task["status"] != TaskState.RUNNING and updated_task.get(
+            "concurrency_slots"
+        ):
+            self._release_slots(updated_task, session=session)
+            updated_task["concurrency_slots"] = []
+            tasks.update_one(
+                {"_id": task_id, "queue_id": queue_id},
+                {"$set": {"concurrency_slots": []}},
+                session=session,
+            )
+
+        # entered pending: ranked with the updated settings
+        if event_handle and updated_task["status"] == TaskState.PENDING:
+            updated_task["sched_rank"] = self._rank_task(updated_task, session=session)
+            tasks.update_one(
+                {"_id": task_id, "queue_id": queue_id},
+                {"$set": {"sched_rank": updated_task["sched_rank"]}},
+                session=session,
+            )
+
+        # reset worker_id if the task is pending and worker_id is not None
+        if (
+            updated_task["status"] == TaskState.PENDING
+            and updated_task["worker_id"] is not None
+        ):
+            tasks.update_one(
+                {"_id": task_id, "queue_id": queue_id},
+                {"$set": {"worker_id": None}},
+                session=session,
+            )
+
+        return updated_task, event_handle
 
     def get_task(self, queue_id: str, task_id: str) -> Optional[Mapping[str, Any]]:
         """Retrieve a task by ID."""
-        return self._tasks.find_one({"_id": task_id, "queue_id": queue_id})
+        return self._tasks_of(queue_id).find_one({"_id": task_id, "queue_id": queue_id})
 
     def _report_worker_status(
         self, queue_id: str, worker_id: str, report_status: str, session=None
@@ -993,6 +3022,7 @@ def _report_worker_status(
 
         return event_handle
 
+    @log_slow_op(collection="workers")
     @retry_on_transient
     @validate_arg
     def report_worker_status(
@@ -1002,8 +3032,8 @@ def report_worker_status(
         report_status: str,
     ) -> bool:
         """Update worker status."""
-        with self._client.start_session() as session:
-            with session.start_transaction():
+        with self._session() as session:
+            with self._transaction(session):
                 event_handle = self._report_worker_status(
                     queue_id=queue_id,
                     worker_id=worker_id,
@@ -1013,6 +3043,49 @@ def report_worker_status(
         event_handle.commit()
         return True
 
+    @log_slow_op(collection="workers")
+    @retry_on_transient
+    @validate_arg
+    def renew_worker_lease(
+        self,
+        queue_id: str,
+        worker_id: str,
+        lease_timeout: float,
+    ) -> Mapping[str, Any]:
+        """Renew the lease of a worker for `lease_timeout` seconds (taking one if it has none).
+
+        A lease covers all the running tasks of the worker, in place of the heartbeats of the
+        tasks: their heartbeat timeouts are not checked while the lease is held. When the lease
+        lapses, `handle_timeouts` fails all the running tasks of the worker at once.
+
+        Returns:
+            The updated worker.
+        """
+        if lease_timeout <= 0:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail="Lease timeout must be positive",
+            )
+        with self._session() as session:
+            with self._transaction(session):
+                now = get_current_time()
+                worker = self._workers.find_one_and_update(
+                    {"_id": worker_id, "queue_id": queue_id},
+                    {
+                        "$set": {
+                            "lease_timeout": lease_timeout,
+                            "lease_expires": now + timedelta(seconds=lease_timeout),
+                        }
+                    },
+                    session=session,
+                    return_document=ReturnDocument.AFTER,
+                )
+        if not worker:
+            raise HTTPException(
+                status_code=HTTP_404_NOT_FOUND, detail=f"Worker {worker_id} not found"
+            )
+        return worker
+
     def get_worker(self, queue_id: str, worker_id: str) -> Optional[Mapping[str, Any]]:
         """Retrieve a worker by ID."""
         return self._workers.find_one({"_id": worker_id, "queue_id": queue_id})
@@ -1043,6 +3116,7 @@ def _get_queue_by_name(
             return None
         return queue
 
+    @log_slow_op(collection="queues")
     @retry_on_transient
     @validate_arg
     def get_queue(
@@ -1051,8 +3125,8 @@ def get_queue(
         queue_name: Optional[str] = None,
     ) -> Optional[Mapping[str, Any]]:
         """Get queue by id or name. Name and id must match."""
-        with self._client.start_session() as session:
-            with session.start_transaction():
+        with self._session() as session:
+            with self._transaction(session):
                 if queue_id:
                     queue = self._queues.find_one({"_id": queue_id}, session=session)
                 else:
@@ -1076,55 +3150,183 @@ def get_queue(
 
                 return queue
 
+    @log_slow_op(collection="tasks")
+    @retry_on_transient
+    def flush_heartbeats(self) -> int:
+        """Write buffered heartbeats with a single bulk write. Returns the number of heartbeats written.
+
+        `$max` keeps last_heartbeat monotonic when several server processes flush the same task.
+        """
+        pending = self._heartbeat_buffer.drain()
+        if not pending:
+            return 0
+        try:
+            partitioned = {
+                queue["_id"]
+                for queue in self._queues.find(
+                    {
+                        "_id": {"$in": list({queue_id for queue_id, _ in pending})},
+                        "task_layout": TASK_LAYOUT_PARTITIONED,
+                    },
+                    {"_id": 1},
+                )
+            }
+            operations: Dict[str, List[UpdateOne]] = {}
+            # queue id -> (tasks collection, [(task id, timestamp, progress)])
+            progressed: Dict[str, Tuple[Collection, List[Tuple[str, Any, Any]]]] = {}
+            for (queue_id, task_id), (timestamp, progress) in pending.items():
+                tasks = self._task_collection(
+                    queue_id,
+                    TASK_LAYOUT_PARTITIONED if queue_id in partitioned else None,
+                )
+                operations.setdefault(tasks.name, []).append(
+                    UpdateOne(
+                        {"_id": task_id, "queue_id": queue_id},
+                        {"$max": {"last_heartbeat": timestamp}},
+                    )
+                )
+                if progress is not None:
+                    progressed.setdefault(queue_id, (tasks, []))[1].append(
+                        (task_id, timestamp, progress)
+                    )
+            # one bulk write per tasks collection
+            for name, ops in operations.items():
+                self._db[name].bulk_write(ops, ordered=False)
+            # progress updates are changes, stamped with a revision of their queue
+            for queue_id, (tasks, updates) in progressed.items():
+                with self._session() as session:
+                    with self._transaction(session):
+                        revision = self._next_revision(queue_id, session=session)
+                        tasks.bulk_write(
+                            [
+                                UpdateOne(
+                                    _progress_changed(queue_id, task_id, progress),
+                                    {
+                                        "$set": _progress_update(
+                                            progress, timestamp, revision
+                                        )
+                                    },
+                                )
+                                for task_id, timestamp, progress in updates
+                            ],
+                            ordered=False,
+                            session=session,
+                        )
+        except Exception:
+            self._heartbeat_buffer.restore(pending)
+            raise
+        self._heartbeat_buffer.mark_written(len(pending))
+        for queue_id in progressed:
+            query_cache.invalidate(queue_id)
+        return len(pending)
+
+    def heartbeat_metrics(self) -> Dict[str, int]:
+        return self._heartbeat_buffer.metrics()
+
+    def _leased_workers(self, worker_ids: Set[str], now, session) -> Set[str]:
+        """The workers among `worker_ids` holding a lease."""
+        if not worker_ids:
+            return set()
+        return {
+            worker["_id"]
+            for worker in self._workers.find(
+                {"_id": {"$in": list(worker_ids)}, "lease_expires": {"$gte": now}},
+                {"_id": 1},
+                session=session,
+            )
+        }
+
+    @log_slow_op(collection="tasks")
     @retry_on_transient
     def handle_timeouts(self) -> List[str]:
         """Check and handle task timeouts."""
+        # Heartbeats buffered by this process must be visible to the check below
+        self.flush_heartbeats()
+
         now = get_current_time()
+        # Heartbeats buffered by other server processes are written within one flush interval
+        heartbeat_grace = max(get_server_config().heartbeat_flush_interval, 0)
         transitioned_tasks = []
 
-        # Build query
-        query = {
+        # Heartbeat timeouts, except for the tasks of workers holding a lease (checked below)
+        heartbeat_query = {
             "status": TaskState.RUNNING,
-            "$or": [
-                # Heartbeat timeout
-                {
-                    "last_heartbeat": {"$ne": None},
-                    "heartbeat_timeout": {"$ne": None},
-                    "$expr": {
-                        "$gt": [
-                            {
-                                "$divide": [
-                                    {"$subtract": [now, "$last_heartbeat"]},
-                                    1000,
-                                ]
-                            },
-                            "$heartbeat_timeout",
-                        ]
-                    },
-                },
-                # Task execution timeout
-                {
-                    "task_timeout": {"$ne": None},
-                    "start_time": {"$ne": None},
-                    "$expr": {
-                        "$gt": [
-                            {"$divide": [{"$subtract": [now, "$start_time"]}, 1000]},
-                            "$task_timeout",
-                        ]
-                    },
-                },
-            ],
+            "last_heartbeat": {"$ne": None},
+            "heartbeat_timeout": {"$ne": None},
+            "$expr": {
+                "$gt": [
+                    {"$divide": [{"$subtract": [now, "$last_heartbeat"]}, 1000]},
+                    {"$add": ["$heartbeat_timeout", heartbeat_grace]},
+                ]
+            },
+        }
+        task_timeout_query = {
+            "task_timeout": {"$ne": None},
+            "start_time": {"$ne": None},
+            "$expr": {
+                "$gt": [
+                    {"$divide": [{"$subtract": [now, "$start_time"]}, 1000]},
+                    "$task_timeout",
+                ]
+            },
         }
 
         fsm_event_handles = []
-        with self._client.start_session() as session:
-            with session.start_transaction():
-                # Find tasks that might have timed out
-                tasks = self._tasks.find(query, session=session)
-
-                tasks = list(tasks)  # type: ignore
+        policies: Dict[str, SchedulingPolicy] = {}
+        with self._session() as session:
+            with self._transaction(session):
+                # Workers whose lease lapsed: all their running tasks time out. Read within the
+                # transaction, so that a concurrent renewal conflicts with the release below.
+                expired_workers = [
+                    worker["_id"]
+                    for worker in self._workers.find(
+                        {"lease_expires": {"$lt": now}}, {"_id": 1}, session=session
+                    )
+                ]
+
+                # Find tasks that might have timed out, in the shared and partitioned collections
+                timed_out = []
+                for tasks in self._task_collections():
+                    found = {
+                        task["_id"]: task
+                        for task in tasks.find(
+                            {
+                                "status": TaskState.RUNNING,
+                                "$or": [
+                                    {"worker_id": {"$in": expired_workers}},
+                                    task_timeout_query,
+                                ],
+                            },
+                            session=session,
+                        )
+                    }
+                    lapsed = [
+                        task
+                        for task in tasks.find(
+                            heartbeat_query, {"worker_id": 1}, session=session
+                        )
+                        if task["_id"] not in found
+                    ]
+                    leased = self._leased_workers(
+                        {t.get("worker_id") for t in lapsed} - {None},
+                        now=now,
+                        session=session,
+                    )
+                    unleased = [
+                        t["_id"] for t in lapsed if t.get("worker_id") not in leased
+                    ]
+                    if unleased:
+                        found.update(
+                            (task["_id"], task)
+                            for task in tasks.find(
+                                {"_id": {"$in": unleased}}, session=session
+                            )
+                        )
+                    timed_out.extend((tasks, task) for task in found.values())
 
-                for task in tasks:
+                # A worker whose lease lapsed fails once, however many tasks it was running
+                reported_workers = set()
+                for tasks, task in timed_out:
                     try:
                         # Create FSM with current state
                         fsm = TaskFSM.from_db_entry(task)
@@ -1133,7 +3335,12 @@ def handle_timeouts(self) -> List[str]:
                         event_handle = fsm.fail()
 
                         # Update worker status if worker is specified
-                        if task["worker_id"]:
+                        if (
+                            task["worker_id"]
+                            and task["worker_id"] not in reported_workers
+                        ):
+                            if task["worker_id"] in expired_workers:
+                                reported_workers.add(task["worker_id"])
                             worker_event_handle = self._report_worker_status(
                                 queue_id=task["queue_id"],
                                 worker_id=task["worker_id"],
@@ -1142,18 +3349,38 @@ def handle_timeouts(self) -> List[str]:
                             )
                             fsm_event_handles.append(worker_event_handle)
 
+                        update = {
+                            "status": fsm.state,
+                            "retries": fsm.retries,
+                            "last_modified": now,
+                            "worker_id": None,
+                            "summary.labtasker_error": (
+                                "Worker lease expired"
+                                if task["worker_id"] in expired_workers
+                                else "Either heartbeat or task execution timed out"
+                            ),
+                            "revision": self._next_revision(
+                                task["queue_id"], session=session
+                            ),
+                        }
+                        if task.get("concurrency_slots"):
+                            self._release_slots(task, session=session)
+                            update["concurrency_slots"] = []
+                        if fsm.state == TaskState.PENDING:  # retried
+                            if task["queue_id"] not in policies:
+                                policies[task["queue_id"]] = self._scheduling_policy(
+                                    task["queue_id"], session=session
+                                )
+                            update["sched_rank"] = self._rank_task(
+                                task,
+                                session=session,
+                                policy=policies[task["queue_id"]],
+                            )
+
                         # Update task in database
-                        updated_task = self._tasks.find_one_and_update(
+                        updated_task = tasks.find_one_and_update(
                             {"_id": task["_id"]},
-                            {
-                                "$set": {
-                                    "status": fsm.state,
-                                    "retries": fsm.retries,
-                                    "last_modified": now,
-                                    "worker_id": None,
-                                    "summary.labtasker_error": "Either heartbeat or task execution timed out",
-                                }
-                            },
+                            {"$set": update},
                             return_document=ReturnDocument.AFTER,
                             session=session,
                         )
@@ -1168,16 +3395,523 @@ def handle_timeouts(self) -> List[str]:
                             f"Error handling timeout for task {task['_id']}: {e}"
                         )
 
+                # A lapsed lease is released, so that it is only handled once
+                if expired_workers:
+                    self._workers.update_many(
+                        {
+                            "_id": {"$in": expired_workers},
+                            "lease_expires": {"$lt": now},
+                        },
+                        {"$set": {"lease_expires": None}},
+                        session=session,
+                    )
+
         # commit the event after the transaction is completed
         for event_handle in fsm_event_handles:
             event_handle.commit()
 
         return transitioned_tasks
 
+    @log_slow_op(collection="jobs")
+    @retry_on_transient
+    @validate_arg
+    def submit_job(
+        self,
+        queue_id: str,
+        kind: str,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Submit a background job on a queue. Return the job id.
+
+        Jobs run outside the request that submitted them (see `run_job_chunk`), in chunks of
+        `job_chunk_size` documents. Each chunk runs in its own transaction, which also records the
+        progress of the job, so that a job resumes where it stopped after a restart of the server.
+
+        Kinds:
+            delete_queue: Delete the queue with its tasks, workers and sweeps. The queue itself is
+                deleted right away, what belonged to it is deleted by the job.
+            update_tasks: Apply `update_task(task_setting_update=params["update"],
+                reset_pending=params["reset_pending"])` to each task matching params["query"].
+        """
+        params = params or {}
+        if kind not in JOB_KINDS:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"Invalid job kind '{kind}'. Must be one of: {', '.join(JOB_KINDS)}",
+            )
+        if kind == JOB_UPDATE_TASKS:
+            query, update = params.get("query") or {}, params.get("update") or {}
+            if not isinstance(query, dict) or not isinstance(update, dict):
+                raise HTTPException(
+                    status_code=HTTP_400_BAD_REQUEST,
+                    detail="The query and the update of the tasks must be dicts",
+                )
+            params = {
+                # stored as JSON, since field names of queries may start with "$"
+                "query": json.dumps(query),
+                "update": json.dumps(update),
+                "reset_pending": bool(params.get("reset_pending", False)),
+            }
+        else:
+            params = {}
+
+        now = get_current_time()
+        job: Dict[str, Any] = {
+            "_id": str(uuid4()),
+            "kind": kind,
+            "queue_id": queue_id,
+            "params": params,
+            "status": JOB_PENDING,
+            # done: number of processed documents, stage/cursor: where the job resumes
+            "progress": {"done": 0, "stage": None, "cursor": None},
+            "error": None,
+            "created_at": now,
+            "last_modified": now,
+            "finished_at": None,
+            "lease_expires": None,  # a job is run by one server process at a time
+        }
+        with self._session() as session:
+            with self._transaction(session):
+                if kind == JOB_DELETE_QUEUE:
+                    queue = self._queues.find_one_and_delete(
+                        {"_id": queue_id}, session=session
+                    )
+                    if not queue:
+                        raise HTTPException(
+                            status_code=HTTP_404_NOT_FOUND,
+                            detail=f"Queue '{queue_id}' not found",
+                        )
+                    params["task_layout"] = queue.get("task_layout", TASK_LAYOUT_SHARED)
+                    params["indexes"] = queue.get("indexes", [])
+                    job["progress"]["done"] = 1
+                    job["progress"]["stage"] = DELETE_QUEUE_STAGES[0]
+                self._jobs.insert_one(job, session=session)
+
+        if kind == JOB_DELETE_QUEUE:
+            query_cache.invalidate(queue_id)
+            ready_queue.invalidate(queue_id)
+        return job["_id"]
+
+    def get_job(
+        self, job_id: str, queue_id: Optional[str] = None
+    ) -> Optional[Mapping[str, Any]]:
+        """Retrieve a background job by ID, of the given queue if any."""
+        query = {"_id": job_id}
+        if queue_id is not None:
+            query["queue_id"] = queue_id
+        return self._jobs.find_one(query)
+
+    def run_job_chunk(self) -> bool:
+        """Run the next chunk of the oldest unfinished background job.
+
+        A job whose server process stopped in the middle of a chunk is taken over once the lease
+        of that process expires (`job_lease`). Chunks that were not committed are run again.
+
+        Returns:
+            False if there is no job to run.
+        """
+        now = get_current_time()
+        job = self._jobs.find_one_and_update(
+            {
+                "status": {"$in": [JOB_PENDING, JOB_RUNNING]},
+                "$or": [{"lease_expires": None}, {"lease_expires": {"$lt": now}}],
+            },
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "lease_expires": now
+                    + timedelta(seconds=get_server_config().job_lease),
+                }
+            },
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if not job:
+            return False
+
+        try:
+            self._run_job_chunk(job)
+        except _JobLeaseLost:
+            logger.info(f"Job {job['_id']} was taken over by another server process")
+        except Exception as e:
+            logger.info(f"Job {job['_id']} failed: {e}")
+            self._jobs.update_one(
+                {"_id": job["_id"], "lease_expires": job["lease_expires"]},
+                {
+                    "$set": {
+                        "status": JOB_FAILED,
+                        "error": str(e.detail if isinstance(e, HTTPException) else e),
+                        "finished_at": get_current_time(),
+                        "last_modified": get_current_time(),
+                        "lease_expires": None,
+                    }
+                },
+            )
+        return True
+
+    @log_slow_op(collection="jobs")
+    @retry_on_transient
+    def _run_job_chunk(self, job: Dict[str, Any]):
+        queue_id = job["queue_id"]
+        chunk_size = get_server_config().job_chunk_size
+        progress = dict(job["progress"])
+
+        if job["kind"] == JOB_DELETE_QUEUE and progress["stage"] == "storage":
+            # Collection and index drops are not run inside the transaction
+            params = job["params"]
+            if params["task_layout"] == TASK_LAYOUT_PARTITIONED:
+                tasks = self._task_collection(queue_id, TASK_LAYOUT_PARTITIONED)
+                progress["done"] += tasks.estimated_document_count()
+                tasks.drop()
+            else:
+                for path in params["indexes"]:
+                    self._drop_queue_index(queue_id, path, tasks=self._tasks)
+
+        updated = []
+        with self._session() as session:
+            with self._transaction(session):
+                if job["kind"] == JOB_DELETE_QUEUE:
+                    done = self._delete_queue_chunk(job, progress, chunk_size, session)
+                else:
+                    done, updated = self._update_tasks_chunk(
+                        job, progress, chunk_size, session
+                    )
+
+                now = get_current_time()
+                update: Dict[str, Any] = {
+                    "progress": progress,
+                    "last_modified": now,
+                    "lease_expires": None,
+                }
+                if done:
+                    update.update(status=JOB_SUCCESS, finished_at=now)
+                result = self._jobs.update_one(
+                    {"_id": job["_id"], "lease_expires": job["lease_expires"]},
+                    {"$set": update},
+                    session=session,
+                )
+                if result.matched_count == 0:
+                    raise _JobLeaseLost()  # aborts the transaction
+
+        for updated_task, event_handle in updated:
+            if event_handle:
+                event_handle.update_fsm_event(updated_task, commit=True)
+        query_cache.invalidate(queue_id)
+        ready_queue.invalidate(queue_id)
+
+    def _delete_queue_chunk(
+        self, job: Dict[str, Any], progress: Dict[str, Any], chunk_size: int, session
+    ) -> bool:
+        """Delete the next chunk of documents of a deleted queue. Return True when done."""
+        stage = progress["stage"]
+        if stage == "storage":
+            return True
+        queue_id = job["queue_id"]
+        if stage == "tasks":
+            collection = self._task_collection(queue_id, job["params"]["task_layout"])
+        else:
+            collection = self._db[stage]
+
+        ids = [
+            doc["_id"]
+            for doc in collection.find(
+                {"queue_id": queue_id}, {"_id": 1}, limit=chunk_size, session=session
+            )
+        ]
+        if ids:
+            progress["done"] += collection.delete_many(
+                {"_id": {"$in": ids}, "queue_id": queue_id}, session=session
+            ).deleted_count
+        if len(ids) < chunk_size:
+            progress["stage"] = DELETE_QUEUE_STAGES[
+                DELETE_QUEUE_STAGES.index(stage) + 1
+            ]
+        return False
+
+    def _update_tasks_chunk(
+        self, job: Dict[str, Any], progress: Dict[str, Any], chunk_size: int, session
+    ) -> Tuple[bool, List[Tuple[Dict[str, Any], Optional[StateTransitionEventHandle]]]]:
+        """Update the next chunk of matching tasks, in _id order. Return whether the job is done and
+        the updated tasks with their event handles."""
+        queue_id, params = job["queue_id"], job["params"]
+        query = sanitize_query(queue_id, json.loads(params["query"]))
+        if progress["cursor"] is not None:
+            query = {"$and": [query, {"_id": {"$gt": progress["cursor"]}}]}
+
+        tasks = self._tasks_of(queue_id, session=session)
+        ids = [
+            doc["_id"]
+            for doc in tasks.find(query, {"_id": 1}, session=session)
+            .sort("_id", ASCENDING)
+            .limit(chunk_size)
+        ]
+        updated = []
+        for task_id in ids:
+            result = self._update_task(
+                queue_id=queue_id,
+                task_id=task_id,
+                task_setting_update=json.loads(params["update"]),
+                reset_pending=params["reset_pending"],
+                tasks=tasks,
+                session=session,
+            )
+            if result is not None:
+                updated.append(result)
+
+        progress["done"] += len(updated)
+        if ids:
+            progress["cursor"] = ids[-1]
+        return len(ids) < chunk_size, updated
+
+
+class _JobLeaseLost(Exception):
+    """The job was taken over by another server process after its lease expired."""
+
 
 _db_service = None
 
 
+QUEUE_INDEX_PREFIX = "q_"
+
+# Layouts of the tasks of a queue: in the tasks collection shared by all queues, or in a
+# collection of its own (tasks_<queue_id>)
+TASK_LAYOUT_SHARED = "shared"
+TASK_LAYOUT_PARTITIONED = "partitioned"
+TASK_LAYOUTS = (TASK_LAYOUT_SHARED, TASK_LAYOUT_PARTITIONED)
+TASK_PARTITION_PREFIX = "tasks_"
+
+SLOW_OP_LOG_MAX_BYTES = 16 * 1024 * 1024
+
+# Background jobs (see DBService.submit_job)
+JOB_DELETE_QUEUE = "delete_queue"
+JOB_UPDATE_TASKS = "update_tasks"
+JOB_KINDS = (JOB_DELETE_QUEUE, JOB_UPDATE_TASKS)
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCESS = "success"
+JOB_FAILED = "failed"
+# Collections emptied in turn by a delete_queue job. "storage": the tasks collection of a
+# partitioned queue or the queue indexes are dropped.
+DELETE_QUEUE_STAGES = (
+    "tasks",
+    "workers",
+    "sweeps",
+    "tombstones",
+    "revisions",
+    "sched_stats",
+    "concurrency",
+    "storage",
+)
+
+
+def _queue_index_name(queue_id: str, path: str) -> str:
+    return f"{QUEUE_INDEX_PREFIX}{queue_id}_{path}"
+
+
+def _progress_changed(queue_id: str, task_id: str, progress: Dict[str, Any]):
+    """Filter of a task whose progress differs from `progress`."""
+    return {"_id": task_id, "queue_id": queue_id, "summary.progress": {"$ne": progress}}
+
+
+def _progress_update(progress: Dict[str, Any], now, revision: int) -> Dict[str, Any]:
+    """A new progress is a change of the task, listed by the change feed."""
+    return {"summary.progress": progress, "last_modified": now, "revision": revision}
+
+
+def _task_partition_name(queue_id: str) -> str:
+    return f"{TASK_PARTITION_PREFIX}{queue_id}"
+
+
+def _validate_field_path(
+    path: str, usage: str, prefixes: Tuple[str, ...] = ("args.", "metadata.")
+):
+    if not re.match(DOT_SEPARATED_KEY_PATTERN, path) or not path.startswith(prefixes):
+        allowed = " or ".join(f"'{p}'" for p in prefixes)
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {usage} path '{path}'. Only dot-separated paths under {allowed} are allowed.",
+        )
+
+
+# Number of tasks (of the best priority that fit) compared by a best-fit fetch
+BEST_FIT_WINDOW = 32
+
+
+def _validate_resources(
+    resources: Optional[Mapping[str, Any]], usage: str
+) -> Optional[Dict[str, float]]:
+    """Validate resource amounts (task requests or worker capacity), or raise 400."""
+    if resources is None:
+        return None
+    if not isinstance(resources, Mapping):
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {usage}. Must be a dict of resource name to amount.",
+        )
+    for name, amount in resources.items():
+        if (
+            not isinstance(name, str)
+            or not re.match(KEY_PATTERN, name)
+            or isinstance(amount, bool)
+            or not isinstance(amount, (int, float))
+            or amount < 0
+        ):
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail=f"Invalid {usage} '{name}': {amount!r}. Resource names must match {KEY_PATTERN} and amounts must be non-negative numbers.",
+            )
+    return dict(resources)
+
+
+def _capacity_filter(capacity: Dict[str, float]) -> Dict[str, Any]:
+    """Filter of tasks whose requests of the resources in `capacity` fit. A range filter on
+    `resources.<name>`, so it can be served by queue indexes on those paths."""
+    return {
+        f"resources.{name}": {"$not": {"$gt": amount}}
+        for name, amount in capacity.items()
+    }
+
+
+def _fits(
+    resources: Optional[Mapping[str, float]], capacity: Mapping[str, float]
+) -> bool:
+    """Whether all resource requests fit the capacity. Unreported resources count as 0."""
+    return all(
+        amount <= capacity.get(name, 0) for name, amount in (resources or {}).items()
+    )
+
+
+def _fit_score(
+    resources: Optional[Mapping[str, float]], capacity: Mapping[str, float]
+) -> float:
+    """Mean share of the capacity used by the resource requests. Higher is a tighter fit."""
+    shares = [
+        (resources or {}).get(name, 0) / amount
+        for name, amount in capacity.items()
+        if amount > 0
+    ]
+    return sum(shares) / len(shares) if shares else 0.0
+
+
+def _get_path(doc: Mapping[str, Any], path: str) -> Any:
+    """Value at a dot-separated path of a document, None if missing."""
+    value: Any = doc
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, Mapping) else None
+    return value
+
+
+def _matches_affinity(task: Mapping[str, Any], affinity: Dict[str, List[Any]]) -> bool:
+    for path, values in affinity.items():
+        value = _get_path(task, path)
+        if value is not None and value in values:
+            return True
+    return False
+
+
+def _concurrency_slot_id(queue_id: str, key: str, value: Any) -> str:
+    """Id of the running counter of the group of tasks with `value` at `key`."""
+    return f"{queue_id}:{key}={json.dumps(value, sort_keys=True, default=str)}"
+
+
+def _limit_of(limits: List[Dict[str, Any]], key: str, value: Any) -> Optional[int]:
+    """Concurrency limit of a group: the limit set for the value, else the one for every value."""
+    default = None
+    for entry in limits:
+        if entry["key"] != key:
+            continue
+        if entry["value"] is None:
+            default = entry["limit"]
+        elif entry["value"] == value:
+            return entry["limit"]
+    return default
+
+
+def _validate_scheduling_policy(metadata: Mapping[str, Any]) -> SchedulingPolicy:
+    """Build the scheduling policy configured in queue metadata, or raise 400."""
+    try:
+        return get_policy(metadata)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"Invalid scheduling policy. Detail: {str(e)}",
+        )
+
+
+def _has_key_path(d: Dict[str, Any], key: str) -> bool:
+    """Check if the dot-separated key path exists in a nested dict."""
+    for part in key.split("."):
+        if not isinstance(d, dict) or part not in d:
+            return False
+        d = d[part]
+    return True
+
+
+# sort: highest priority, lowest scheduling rank (see scheduling.py), least recently modified,
+# oldest created (_id breaks ties). Served by TASK_DISPATCH_INDEX.
+DISPATCH_SORT = [
+    ("priority", DESCENDING),
+    ("sched_rank", ASCENDING),
+    ("last_modified", ASCENDING),
+    ("created_at", ASCENDING),
+    ("_id", ASCENDING),
+]
+
+
+def _after(key: Tuple[Any, ...]) -> Dict[str, Any]:
+    """Filter of tasks after the sort key (see ready_queue.dispatch_sort_key) in dispatch order."""
+    neg_priority, rank_key, last_modified, created_at, task_id = key
+    priority = -neg_priority
+    # unranked (null) tasks come first in ascending order
+    rank = rank_key[1] if len(rank_key) > 1 else None
+    return {
+        "$or": [
+            {"priority": {"$lt": priority}},
+            {
+                "priority": priority,
+                "sched_rank": {"$ne": None} if rank is None else {"$gt": rank},
+            },
+            {
+                "priority": priority,
+                "sched_rank": rank,
+                "last_modified": {"$gt": last_modified},
+            },
+            {
+                "priority": priority,
+                "sched_rank": rank,
+                "last_modified": last_modified,
+                "created_at": {"$gt": created_at},
+            },
+            {
+                "priority": priority,
+                "sched_rank": rank,
+                "last_modified": last_modified,
+                "created_at": created_at,
+                "_id": {"$gt": task_id},
+            },
+        ]
+    }
+
+
+class _Candidates:
+    """Lazy iterator over fetch candidates. A candidate that was not handed out can be put back."""
+
+    def __init__(self, tasks: Iterator[Dict[str, Any]]):
+        self._tasks = tasks
+        self._put_back: List[Dict[str, Any]] = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Dict[str, Any]:
+        if self._put_back:
+            return self._put_back.pop()
+        return next(self._tasks)
+
+    def push_back(self, task: Dict[str, Any]):
+        self._put_back.append(task)
+
+
 def get_db() -> DBService:
     """Get database service instance."""
     if not _db_service:
@@ -1,11 +1,15 @@
+import inspect
 import re
+import time
+from contextvars import ContextVar
 from functools import wraps
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import pymongo.errors
 import stamina
 from fastapi import HTTPException
 from pydantic import ValidationError, validate_call
+from pymongo.client_session import ClientSession
 from stamina import Attempt
 from starlette.status import HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR
 
@@ -87,6 +91,314 @@ def sanitize_query(queue_id: str, query: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+# Collection-specific ID aliases (e.g. `task_id` for `_id` of tasks) exposed by query_collection
+ID_ALIASES = {
+    "tasks": "task_id",
+    "workers": "worker_id",
+    "queues": "queue_id",
+}
+
+# Name of the compound index that serves the "pending tasks of a queue by priority" shape.
+# Created in DBService._setup_collections.
+# _id makes the order total, so that candidates can be loaded in chunks after a sort key.
+TASK_QUEUE_STATUS_INDEX = "queue_id_status_priority_id"
+TASK_QUEUE_STATUS_INDEX_KEYS = [
+    ("queue_id", 1),
+    ("status", 1),
+    ("priority", -1),
+    ("last_modified", 1),
+    ("created_at", 1),
+    ("_id", 1),
+]
+# Superseded versions of TASK_QUEUE_STATUS_INDEX, dropped on startup
+LEGACY_TASK_QUEUE_STATUS_INDEXES = ["queue_id_status_priority"]
+
+# Index of the change feed before it was paged by (revision, id)
+LEGACY_CHANGE_FEED_INDEX = "queue_id_1_revision_1"
+
+# Serves the dispatch order of fetch_task: priority first, then the rank precomputed by the
+# scheduling policy of the queue (see labtasker.server.scheduling).
+TASK_DISPATCH_INDEX = "queue_id_status_priority_rank_id"
+TASK_DISPATCH_INDEX_KEYS = [
+    ("queue_id", 1),
+    ("status", 1),
+    ("priority", -1),
+    ("sched_rank", 1),
+    ("last_modified", 1),
+    ("created_at", 1),
+    ("_id", 1),
+]
+
+# Compound indexes on (queue_id, status, <sort>...), tried in order by choose_index_hint
+_TASK_STATUS_INDEXES = [
+    (TASK_QUEUE_STATUS_INDEX, TASK_QUEUE_STATUS_INDEX_KEYS),
+    (TASK_DISPATCH_INDEX, TASK_DISPATCH_INDEX_KEYS),
+]
+
+# Operators that may reference computed (aliased) fields, which prevents rewriting
+_COMPUTED_FIELD_OPERATORS = {"$expr", "$where", "$function"}
+
+
+def contains_operator(query: Any, operators) -> bool:
+    """Check whether any of the operators appear (as keys) anywhere in the query."""
+    if isinstance(query, dict):
+        return any(
+            k in operators or contains_operator(v, operators) for k, v in query.items()
+        )
+    if isinstance(query, (list, tuple)):
+        return any(contains_operator(q, operators) for q in query)
+    return False
+
+
+def rewrite_alias(query: Dict[str, Any], alias: str, field: str = "_id"):
+    """Recursively rename the `alias` field to `field` in a MongoDB filter.
+
+    Example:
+        {"$or": [{"task_id": "a"}, {"status": "failed"}]} -> {"$or": [{"_id": "a"}, {"status": "failed"}]}
+    """
+    result: Dict[str, Any] = {}
+    extra = []  # predicates that collide with an existing `field` predicate
+    for k, v in query.items():
+        if k in ("$and", "$or", "$nor"):
+            result[k] = [rewrite_alias(q, alias, field) for q in v]
+        elif k == alias:
+            if field in query:
+                extra.append({field: v})
+            else:
+                result[field] = v
+        else:
+            result[k] = v
+
+    if extra:
+        return {"$and": [result, *extra]}
+    return result
+
+
+def _conjunctive_predicates(query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Flatten a filter made only of (nested) $and of field predicates into {field: predicate}.
+    Returns None if the filter has any other shape."""
+    predicates: Dict[str, Any] = {}
+
+    def add(field, predicate) -> bool:
+        if field in predicates and predicates[field] != predicate:
+            return False  # multiple different predicates on the same field
+        predicates[field] = predicate
+        return True
+
+    for k, v in query.items():
+        if k == "$and":
+            for q in v:
+                sub = _conjunctive_predicates(q)
+                if sub is None or not all(add(f, p) for f, p in sub.items()):
+                    return None
+        elif k.startswith("$") or not add(k, v):
+            return None
+    return predicates
+
+
+def _is_equality(predicate: Any) -> bool:
+    if isinstance(predicate, dict):
+        return set(predicate) == {"$eq"}
+    return True
+
+
+def choose_index_hint(
+    collection_name: str,
+    query: Dict[str, Any],
+    sort: Optional[List[Tuple[str, int]]] = None,
+) -> Optional[str]:
+    """Return the name of an index for known query shapes, or None to let MongoDB choose.
+
+    Only the "tasks of a queue with a given status, sorted by priority" shape is hinted, i.e.
+    equality on exactly `queue_id` and `status`, sorted by a prefix (or the reverse of a prefix)
+    of (priority desc, last_modified asc, created_at asc), or of the dispatch order
+    (priority desc, sched_rank asc, last_modified asc, created_at asc).
+    """
+    if collection_name != "tasks":
+        return None
+
+    predicates = _conjunctive_predicates(query)
+    if predicates is None or set(predicates) != {"queue_id", "status"}:
+        return None
+    if not all(_is_equality(p) for p in predicates.values()):
+        return None
+
+    sort = list(sort or [])
+    reversed_sort = [(f, -d) for f, d in sort]
+    for index_name, index_keys in _TASK_STATUS_INDEXES:
+        index_sort = index_keys[2 : 2 + len(sort)]
+        if not sort or index_sort in (sort, reversed_sort):
+            return index_name
+    return None
+
+
+def build_query_pipeline(
+    collection_name: str,
+    query: Dict[str, Any],
+    sort: List[Tuple[str, int]],
+    limit: int,
+    offset: int,
+    hide_id: bool = True,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Plan an index-friendly aggregation pipeline for query_collection.
+
+    ID aliases (`task_id`, `worker_id`, `queue_id` for queues) are rewritten to `_id` so that
+    `$match` and `$sort` run first on stored documents and can use indexes.
+    The alias is added back at the end of the pipeline.
+    Queries that may reference computed fields (`$expr`, `$where`, `$function`) keep the
+    original plan, where the alias is added before matching.
+
+    Returns:
+        (pipeline, hint): hint is an index name or None.
+    """
+    alias = ID_ALIASES.get(collection_name)
+    sort_stage = {"$sort": {field: direction for field, direction in sort}}
+
+    if alias and contains_operator(query, _COMPUTED_FIELD_OPERATORS):
+        pipeline: List[Dict[str, Any]] = [
+            {"$addFields": {alias: "$_id"}},
+            {"$match": query},
+            {"$project": {"password": 0}},
+            sort_stage,
+            {"$skip": offset},
+            {"$limit": limit},
+        ]
+        hint = None
+    else:
+        if alias:
+            query = rewrite_alias(query, alias)
+            sort = [("_id" if field == alias else field, d) for field, d in sort]
+            sort_stage = {"$sort": {field: direction for field, direction in sort}}
+
+        pipeline = [
+            {"$match": query},
+            sort_stage,
+            {"$skip": offset},
+            {"$limit": limit},
+            {"$project": {"password": 0}},
+        ]
+        if alias:
+            pipeline.append({"$addFields": {alias: "$_id"}})
+        hint = choose_index_hint(collection_name, query, sort)
+
+    if hide_id:
+        pipeline.append({"$project": {"_id": 0}})
+
+    return pipeline, hint
+
+
+def query_shape(query: Any) -> Any:
+    """Strip values from a MongoDB filter, keeping field names and operators.
+
+    Example:
+        {"args.lr": {"$gt": 0.1}, "$or": [{"status": "failed"}]} -> {"args.lr": {"$gt": "?"}, "$or": [{"status": "?"}]}
+    """
+    if isinstance(query, dict):
+        shape = {}
+        for k, v in query.items():
+            if isinstance(v, dict) or k in ("$and", "$or", "$nor"):
+                shape[k] = query_shape(v)
+            else:
+                shape[k] = "?"
+        return shape
+    if isinstance(query, list):
+        return [query_shape(q) for q in query]
+    return "?"
+
+
+def _find_key(d: Any, key: str) -> Any:
+    """Depth-first search of the first value of `key` in nested dicts/lists."""
+    items: Iterable[Any]
+    if isinstance(d, dict):
+        if key in d:
+            return d[key]
+        items = d.values()
+    elif isinstance(d, list):
+        items = d
+    else:
+        return None
+    for v in items:
+        found = _find_key(v, key)
+        if found is not None:
+            return found
+    return None
+
+
+def summarize_plan(plan: Dict[str, Any]) -> str:
+    """Summarize a winning plan tree into a string like "IXSCAN(index_name) -> FETCH -> SORT"."""
+    plan = plan.get("queryPlan", plan)  # slot based execution engine
+    stage = plan.get("stage", "?")
+    if plan.get("indexName"):
+        stage = f"{stage}({plan['indexName']})"
+
+    if "inputStage" in plan:
+        children = [plan["inputStage"]]
+    else:
+        children = plan.get("inputStages", [])
+    if not children:
+        return stage
+
+    inner = [summarize_plan(c) for c in children]
+    inner_str = inner[0] if len(inner) == 1 else f"[{', '.join(inner)}]"
+    return f"{inner_str} -> {stage}"
+
+
+def parse_explain(explain_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract the winning plan and execution statistics from an explain result."""
+    winning_plan = _find_key(explain_result, "winningPlan") or {}
+    execution_stats = _find_key(explain_result, "executionStats") or {}
+    return {
+        "plan_summary": summarize_plan(winning_plan) if winning_plan else "",
+        "winning_plan": winning_plan,
+        "docs_examined": execution_stats.get("totalDocsExamined"),
+        "keys_examined": execution_stats.get("totalKeysExamined"),
+        "n_returned": execution_stats.get("nReturned"),
+        "execution_time_ms": execution_stats.get("executionTimeMillis"),
+    }
+
+
+def log_slow_op(
+    collection: Optional[str] = None,
+    collection_arg: Optional[str] = None,
+    filter_arg: Optional[str] = None,
+):
+    """Time a DBService operation and record it if it exceeds the slow operation threshold.
+
+    Args:
+        collection: The collection the operation mainly works on.
+        collection_arg: Name of the argument that specifies the collection (overrides `collection`).
+        filter_arg: Name of the argument that holds the user filter of the operation.
+    """
+
+    def decorator(func: Callable):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapped(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if self._is_slow_op(elapsed_ms):
+                    try:
+                        arguments = signature.bind(self, *args, **kwargs).arguments
+                    except TypeError:  # invalid call, nothing to record
+                        arguments = {}
+                    self._record_slow_op(
+                        op=func.__name__,
+                        elapsed_ms=elapsed_ms,
+                        collection=arguments.get(collection_arg, collection),
+                        queue_id=arguments.get("queue_id"),
+                        query=arguments.get(filter_arg) if filter_arg else None,
+                    )
+
+        return wrapped
+
+    return decorator
+
+
 def arg_match(required, provided):
     """
     Check if all provided arguments are used in the required, in a top-to-down matching manner (check if provided is "covered" by "required").
@@ -189,7 +501,15 @@ def sanitize_update(
     """Ban update on certain fields."""
 
     if banned_fields is None:
-        banned_fields = ["_id", "queue_id", "created_at", "last_modified"]
+        banned_fields = [
+            "_id",
+            "queue_id",
+            "created_at",
+            "last_modified",
+            "revision",
+            "sched_rank",
+            "concurrency_slots",
+        ]
 
     def _recr_sanitize(d: Dict[str, Any]) -> Dict[str, Any]:
         for k, v in d.items():
@@ -249,6 +569,12 @@ def is_transient_error(e: Exception) -> bool:
     return False
 
 
+# Session of the ongoing atomic run of DBService calls (see DBService.run_atomic)
+atomic_session: ContextVar[Optional[ClientSession]] = ContextVar(
+    "atomic_session", default=None
+)
+
+
 def retry_on_transient(
     func: Optional[Callable] = None,
     /,
@@ -267,6 +593,10 @@ def retry_on_transient(
     def decorator(func: Callable):
         @wraps(func)
         def wrapped(*args, **kwargs):
+            if atomic_session.get() is not None:
+                # a transient error aborts the whole transaction, retried by run_atomic
+                return func(*args, **kwargs)
+
             attempt = None
             try:
                 for attempt in stamina.retry_context(
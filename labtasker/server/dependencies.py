@@ -1,18 +1,30 @@
 """Shared dependencies."""
 
-from typing import Any, Mapping
+import base64
+import binascii
+from typing import Any, Mapping, Optional
 
-from fastapi import Depends, HTTPException, Security
+from fastapi import (
+    Depends,
+    HTTPException,
+    Request,
+    Security,
+    WebSocket,
+    WebSocketException,
+)
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from starlette.status import HTTP_401_UNAUTHORIZED
+from starlette.requests import HTTPConnection
+from starlette.status import HTTP_401_UNAUTHORIZED, WS_1008_POLICY_VIOLATION
 
 from labtasker.security import verify_password
+from labtasker.server.config import get_server_config
 from labtasker.server.database import DBService, get_db
 
 http_basic = HTTPBasic()
 
 
 async def get_verified_queue_dependency(
+    request: Request,
     credentials: HTTPBasicCredentials = Security(http_basic),
     db: DBService = Depends(get_db),
 ) -> Mapping[str, Any]:
@@ -20,20 +32,84 @@ async def get_verified_queue_dependency(
 
     Uses queue_name as username and password for authentication.
     """
+    queue = _verify_queue(credentials, db, check_password=not _uds_trusted(request))
+    if queue is None:
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return queue
+
+
+async def get_verified_queue_websocket_dependency(
+    websocket: WebSocket,
+    db: DBService = Depends(get_db),
+) -> Mapping[str, Any]:
+    """Verify queue authentication of a WebSocket handshake using HTTP Basic Auth.
+
+    Same as `get_verified_queue_dependency`, the connection is closed with a policy
+    violation if the credentials are invalid.
+    """
+    queue = _verify_queue(
+        _parse_basic_auth(websocket.headers.get("Authorization")),
+        db,
+        check_password=not _uds_trusted(websocket),
+    )
+    if queue is None:
+        raise WebSocketException(
+            code=WS_1008_POLICY_VIOLATION, reason="Invalid credentials"
+        )
+    return queue
+
+
+def _parse_basic_auth(authorization: Optional[str]) -> Optional[HTTPBasicCredentials]:
+    if not authorization:
+        return None
+    scheme, _, param = authorization.partition(" ")
+    if scheme.lower() != "basic":
+        return None
+    try:
+        username, separator, password = (
+            base64.b64decode(param).decode("utf-8").partition(":")
+        )
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+    if not separator:
+        return None
+    return HTTPBasicCredentials(username=username, password=password)
+
+
+def _uds_trusted(connection: HTTPConnection) -> bool:
+    """Whether a connection is trusted without password: with `api_uds_trust`, connections over
+    the Unix domain socket of the server, whose file permissions control the access to it.
+    Unlike TCP connections, they have no client address."""
+    config = get_server_config()
+    return (
+        config.api_uds_trust
+        and config.api_uds is not None
+        and connection.client is None
+    )
+
+
+def _verify_queue(
+    credentials: Optional[HTTPBasicCredentials],
+    db: DBService,
+    check_password: bool = True,
+) -> Optional[Mapping[str, Any]]:
+    """Return the queue of the credentials, or None if they are invalid."""
+    if credentials is None:
+        return None
     try:
         queue = db.get_queue(queue_id=credentials.username) or db.get_queue(
             queue_name=credentials.username
         )  # get queue by either id or name
-        if not verify_password(credentials.password, queue["password"]):
-            raise HTTPException(
-                status_code=HTTP_401_UNAUTHORIZED,
-                detail="Invalid credentials",
-                headers={"WWW-Authenticate": "Basic"},
-            )
+        if queue is None:
+            return None
+        if check_password and not verify_password(
+            credentials.password, queue["password"]
+        ):
+            return None
         return queue
     except Exception:
-        raise HTTPException(
-            status_code=HTTP_401_UNAUTHORIZED,
-            detail="Invalid credentials",
-            headers={"WWW-Authenticate": "Basic"},
-        )
+        return None
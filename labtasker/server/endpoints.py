@@ -1,44 +1,110 @@
 import asyncio
 import uuid
-from contextlib import asynccontextmanager
-from typing import Any, Dict, List
-
-from fastapi import Depends, FastAPI, HTTPException, Request
+from contextlib import ExitStack, asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import (
+    Depends,
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
 from sse_starlette.sse import EventSourceResponse
 from starlette.status import (
+    HTTP_200_OK,
     HTTP_201_CREATED,
+    HTTP_202_ACCEPTED,
     HTTP_204_NO_CONTENT,
     HTTP_400_BAD_REQUEST,
     HTTP_404_NOT_FOUND,
+    HTTP_429_TOO_MANY_REQUESTS,
     HTTP_500_INTERNAL_SERVER_ERROR,
 )
 
 from labtasker.api_models import (
+    AdmissionMetrics,
+    AffinityMetrics,
+    BatchOperation,
+    BatchOperationResult,
+    BatchRequest,
+    BatchResponse,
+    FetchDispatcherMetrics,
+    HeartbeatBufferMetrics,
+    HeartbeatRequest,
+    HeartbeatResponse,
+    Job,
+    JobSubmitResponse,
+    LoadMetrics,
+    QueryCacheMetrics,
+    QueryExplainResponse,
     QueueCreateRequest,
     QueueCreateResponse,
     QueueGetResponse,
+    QueueIndex,
+    QueueIndexCreateRequest,
+    QueueIndexLsResponse,
+    QueueLayoutUpdateRequest,
+    QueueLayoutUpdateResponse,
+    QueueLimitLsResponse,
+    QueueLimitSetRequest,
+    QueueStatsResponse,
     QueueUpdateRequest,
+    ReadyQueueMetrics,
+    ServerMetricsResponse,
+    Sweep,
+    SweepCreateRequest,
+    SweepCreateResponse,
+    SweepLsResponse,
     Task,
+    TaskChangesResponse,
+    TaskExplainRequest,
     TaskFetchRequest,
     TaskFetchResponse,
     TaskLsRequest,
     TaskLsResponse,
+    TaskProgressEvent,
     TaskStatusUpdateRequest,
     TaskSubmitRequest,
     TaskSubmitResponse,
+    TaskUpdateJobRequest,
     TaskUpdateRequest,
     Worker,
     WorkerCreateRequest,
     WorkerCreateResponse,
+    WorkerLeaseRenewRequest,
     WorkerLsRequest,
     WorkerLsResponse,
     WorkerStatusUpdateRequest,
 )
+from labtasker.constants import CHANGE_TOKEN_PATTERN
+from labtasker.server.admission import (
+    AdmissionMiddleware,
+    admission_controller,
+    operation_priority_class,
+    retry_after_seconds,
+    size_threadpool,
+)
+from labtasker.server.compression import CompressionMiddleware
 from labtasker.server.config import get_server_config
+from labtasker.server.content_negotiation import NegotiatedResponse, NegotiatedRoute
 from labtasker.server.database import DBService
-from labtasker.server.dependencies import get_db, get_verified_queue_dependency
+from labtasker.server.dependencies import (
+    get_db,
+    get_verified_queue_dependency,
+    get_verified_queue_websocket_dependency,
+)
 from labtasker.server.event_manager import event_manager
+from labtasker.server.fetch_dispatcher import fetch_dispatcher
+from labtasker.server.load_monitor import LoadMonitorMiddleware, load_monitor
 from labtasker.server.logging import logger
+from labtasker.server.query_cache import query_cache
+from labtasker.server.ready_queue import ready_queue
 from labtasker.utils import get_current_time, parse_obj_as, unflatten_dict
 
 
@@ -59,26 +125,70 @@ async def periodic_task(app: FastAPI, interval_seconds: float):
         await asyncio.sleep(interval_seconds)
 
 
+async def periodic_heartbeat_flush(interval_seconds: float):
+    """Write buffered heartbeats to the database at specified intervals."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            get_db().flush_heartbeats()
+        except Exception as e:
+            logger.info(f"Error flushing heartbeats: {e}")
+
+
+async def periodic_job_runner(interval_seconds: float):
+    """Run the background jobs chunk by chunk, in a worker thread to keep serving requests."""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            while await loop.run_in_executor(None, get_db().run_job_chunk):
+                pass
+        except Exception as e:
+            logger.info(f"Error running jobs: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan and background tasks."""
     # Setup
     config = get_server_config()
-    task = asyncio.create_task(periodic_task(app, config.periodic_task_interval))
+    size_threadpool()
+    tasks = [
+        asyncio.create_task(periodic_task(app, config.periodic_task_interval)),
+        asyncio.create_task(periodic_job_runner(config.job_poll_interval)),
+    ]
+    if config.heartbeat_flush_interval > 0:
+        tasks.append(
+            asyncio.create_task(
+                periodic_heartbeat_flush(config.heartbeat_flush_interval)
+            )
+        )
 
     app.state.prev_polling = get_current_time().timestamp()
 
     yield
 
     # Cleanup
-    task.cancel()
+    for task in tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
     try:
-        await task
-    except asyncio.CancelledError:
-        pass
+        get_db().flush_heartbeats()
+    except Exception as e:
+        logger.info(f"Error flushing heartbeats: {e}")
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=NegotiatedResponse)
+app.router.route_class = NegotiatedRoute  # JSON or MessagePack, see content_negotiation
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(
+    LoadMonitorMiddleware
+)  # outermost: requests rejected with 429 are load too
 
 
 # Debug only
@@ -114,6 +224,22 @@ def full_health_check(db: DBService = Depends(get_db)):
         return {"status": "unhealthy", "database": str(e)}
 
 
+@app.get("/api/v1/metrics", response_model=ServerMetricsResponse)
+def get_metrics(db: DBService = Depends(get_db)):
+    """Server metrics, e.g. query cache hit rate."""
+    return ServerMetricsResponse(
+        query_cache=parse_obj_as(QueryCacheMetrics, query_cache.metrics()),
+        heartbeat_buffer=parse_obj_as(HeartbeatBufferMetrics, db.heartbeat_metrics()),
+        fetch_dispatcher=parse_obj_as(
+            FetchDispatcherMetrics, fetch_dispatcher.metrics()
+        ),
+        ready_queue=parse_obj_as(ReadyQueueMetrics, ready_queue.metrics()),
+        affinity=parse_obj_as(AffinityMetrics, db.affinity_metrics()),
+        load=parse_obj_as(LoadMetrics, load_monitor.metrics()),
+        admission=parse_obj_as(AdmissionMetrics, admission_controller.metrics()),
+    )
+
+
 @app.get("/api/v1/polling")
 def get_polling():
     """Get the previous polling time"""
@@ -184,6 +310,155 @@ def delete_queue(
         )
 
 
+@app.post(
+    "/api/v1/queues/me/jobs/delete_queue",
+    status_code=HTTP_202_ACCEPTED,
+    response_model=JobSubmitResponse,
+)
+def submit_delete_queue_job(
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Delete the queue right away, and its tasks, workers and sweeps in a background job."""
+    job_id = db.submit_job(queue_id=queue["_id"], kind="delete_queue")
+    return JobSubmitResponse(job_id=job_id)
+
+
+@app.post(
+    "/api/v1/queues/me/jobs/update_tasks",
+    status_code=HTTP_202_ACCEPTED,
+    response_model=JobSubmitResponse,
+)
+def submit_update_tasks_job(
+    job_request: TaskUpdateJobRequest,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Update all the tasks matching the filter in a background job."""
+    try:
+        task_update = TaskUpdateRequest(
+            _id="", replace_fields=job_request.replace_fields, **job_request.update
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
+    query = _build_task_query(
+        TaskLsRequest(
+            **job_request.model_dump(
+                include={"task_id", "task_name", "status", "extra_filter"}
+            )
+        ),
+        queue["_id"],
+    )
+    job_id = db.submit_job(
+        queue_id=queue["_id"],
+        kind="update_tasks",
+        params={
+            "query": query,
+            "update": _task_update_dict(task_update),
+            "reset_pending": job_request.reset_pending,
+        },
+    )
+    return JobSubmitResponse(job_id=job_id)
+
+
+@app.get(
+    "/api/v1/queues/me/jobs/{job_id}",
+    response_model=Job,
+    response_model_by_alias=False,
+)
+def get_job(
+    job_id: str,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Get the status of a background job of the queue."""
+    job = db.get_job(job_id=job_id, queue_id=queue["_id"])
+    if not job:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Job not found")
+    return parse_obj_as(Job, job)
+
+
+@app.post("/api/v1/queues/me/indexes", status_code=HTTP_201_CREATED)
+def create_queue_indexes(
+    index_request: QueueIndexCreateRequest,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Declare secondary indexes on task args/metadata paths of the queue"""
+    db.create_queue_indexes(queue_id=queue["_id"], paths=index_request.paths)
+    return ls_queue_indexes(queue=queue, db=db)
+
+
+@app.get("/api/v1/queues/me/indexes", response_model=QueueIndexLsResponse)
+def ls_queue_indexes(
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """List user-declared indexes of the queue"""
+    indexes = db.ls_queue_indexes(queue_id=queue["_id"])
+    if not indexes:
+        return QueueIndexLsResponse(found=False)
+
+    return QueueIndexLsResponse(
+        found=True, content=parse_obj_as(List[QueueIndex], indexes)
+    )
+
+
+@app.put("/api/v1/queues/me/limits", response_model=QueueLimitLsResponse)
+def set_concurrency_limit(
+    limit_request: QueueLimitSetRequest,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Set (or remove) the maximum number of running tasks of a group of the queue"""
+    db.set_concurrency_limit(
+        queue_id=queue["_id"],
+        key=limit_request.key,
+        value=limit_request.value,
+        limit=limit_request.limit,
+    )
+    return ls_concurrency_limits(queue=queue, db=db)
+
+
+@app.get("/api/v1/queues/me/limits", response_model=QueueLimitLsResponse)
+def ls_concurrency_limits(
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """List the concurrency limits of the queue and the running tasks of the limited groups"""
+    result = db.ls_concurrency_limits(queue_id=queue["_id"])
+    return QueueLimitLsResponse(
+        found=bool(result["limits"]),
+        content=result["limits"],
+        running=result["running"],
+    )
+
+
+@app.put("/api/v1/queues/me/layout", response_model=QueueLayoutUpdateResponse)
+def migrate_task_layout(
+    layout_request: QueueLayoutUpdateRequest,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Move the tasks of the queue to the tasks collection of another storage layout"""
+    moved = db.migrate_task_layout(queue_id=queue["_id"], layout=layout_request.layout)
+    return QueueLayoutUpdateResponse(task_layout=layout_request.layout, moved=moved)
+
+
+@app.delete("/api/v1/queues/me/indexes/{path}", status_code=HTTP_204_NO_CONTENT)
+def drop_queue_index(
+    path: str,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Drop a user-declared index of the queue"""
+    if db.drop_queue_indexes(queue_id=queue["_id"], paths=[path]) == 0:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail="Index not found",
+        )
+
+
 @app.post("/api/v1/queues/me/tasks", status_code=HTTP_201_CREATED)
 def submit_task(
     task: TaskSubmitRequest,
@@ -201,10 +476,24 @@ def submit_task(
         task_timeout=task.task_timeout,
         max_retries=task.max_retries,
         priority=task.priority,
+        resources=task.resources,
     )
     return TaskSubmitResponse(task_id=task_id)
 
 
+def _build_task_query(task_request: TaskLsRequest, queue_id: str) -> Dict[str, Any]:
+    task_query = task_request.extra_filter or {}
+    task_query["queue_id"] = queue_id
+
+    if task_request.task_id:
+        task_query["_id"] = task_request.task_id
+    if task_request.task_name:
+        task_query["task_name"] = task_request.task_name
+    if task_request.status:
+        task_query["status"] = task_request.status
+    return task_query
+
+
 @app.post(
     "/api/v1/queues/me/tasks/search",
     response_model=TaskLsResponse,
@@ -216,29 +505,65 @@ def ls_tasks(
     db: DBService = Depends(get_db),
 ):
     """Get tasks matching the criteria"""
-    # Build task query
-    task_query = task_request.extra_filter or {}
-    task_query["queue_id"] = queue["_id"]
-
-    if task_request.task_id:
-        task_query["_id"] = task_request.task_id
-    if task_request.task_name:
-        task_query["task_name"] = task_request.task_name
-    if task_request.status:
-        task_query["status"] = task_request.status
-
     tasks = db.query_collection(
         queue_id=queue["_id"],
         collection_name="tasks",
-        query=task_query,
+        query=_build_task_query(task_request, queue["_id"]),
         limit=task_request.limit,
         offset=task_request.offset,
         sort=task_request.sort,
     )
+    sweep_points = (
+        db.count_sweep_points(queue_id=queue["_id"])
+        if task_request.status in (None, "pending")
+        else {}
+    )
     if not tasks:
-        return TaskLsResponse(found=False)
+        return TaskLsResponse(found=False, **sweep_points)
 
-    return TaskLsResponse(found=True, content=parse_obj_as(List[Task], tasks))
+    return TaskLsResponse(
+        found=True, content=parse_obj_as(List[Task], tasks), **sweep_points
+    )
+
+
+@app.get(
+    "/api/v1/queues/me/tasks/changes",
+    response_model=TaskChangesResponse,
+    response_model_by_alias=False,
+)
+def ls_task_changes(
+    since: str = Query("0", pattern=CHANGE_TOKEN_PATTERN),
+    limit: int = Query(1000, gt=0, le=10000),
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Get tasks modified or deleted after the change token `since`"""
+    changes = db.ls_task_changes(queue_id=queue["_id"], since=since, limit=limit)
+    return TaskChangesResponse(
+        **changes, tombstone_ttl=get_server_config().change_feed_tombstone_ttl
+    )
+
+
+@app.post(
+    "/api/v1/queues/me/tasks/explain",
+    response_model=QueryExplainResponse,
+)
+def explain_tasks(
+    task_request: TaskExplainRequest,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Explain the query plan of a task search (or a fetch, when required_fields is given)"""
+    result = db.explain_query(
+        queue_id=queue["_id"],
+        collection_name="tasks",
+        query=_build_task_query(task_request, queue["_id"]),
+        limit=task_request.limit,
+        offset=task_request.offset,
+        sort=task_request.sort,
+        required_fields=task_request.required_fields,
+    )
+    return QueryExplainResponse(**result)
 
 
 @app.post(
@@ -254,8 +579,10 @@ def fetch_task(
     """
     Get next available task from queue.
     Note: this is not an idempotent operation since the internal state changes according to FSM.
+    Concurrent requests are batched, see labtasker.server.fetch_dispatcher.
     """
-    task = db.fetch_task(
+    task = fetch_dispatcher.fetch(
+        db,
         queue_id=queue["_id"],
         worker_id=task_request.worker_id,
         eta_max=task_request.eta_max,
@@ -263,6 +590,9 @@ def fetch_task(
         start_heartbeat=task_request.start_heartbeat,
         required_fields=task_request.required_fields,
         extra_filter=task_request.extra_filter,
+        affinity=task_request.affinity,
+        capacity=task_request.capacity,
+        fit=task_request.fit,
     )
 
     if not task:
@@ -304,20 +634,37 @@ def report_task_status(
 
 
 @app.post(
-    "/api/v1/queues/me/tasks/{task_id}/heartbeat", status_code=HTTP_204_NO_CONTENT
+    "/api/v1/queues/me/tasks/{task_id}/heartbeat", response_model=HeartbeatResponse
 )
 def refresh_task_heartbeat(
     task_id: str,
+    heartbeat: Optional[HeartbeatRequest] = None,
     queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
     db: DBService = Depends(get_db),
 ):
-    """Update task heartbeat timestamp."""
-    done = db.refresh_task_heartbeat(
+    """Update task heartbeat timestamp and progress, and recommend when to send the next one."""
+    progress = heartbeat.progress if heartbeat else None
+    task = db.refresh_task_heartbeat(
         queue_id=queue["_id"],
         task_id=task_id,
+        progress=progress,
     )
-    if not done:
+    if not task:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Task not found.")
+    if progress is not None:
+        event_manager.publish_event(
+            queue["_id"],
+            TaskProgressEvent(
+                queue_id=queue["_id"],
+                timestamp=get_current_time(),
+                metadata={},
+                task_id=task_id,
+                progress=progress,
+            ),
+        )
+    return HeartbeatResponse(
+        next_interval=load_monitor.heartbeat_interval(task.get("heartbeat_timeout"))
+    )
 
 
 @app.get(
@@ -337,6 +684,38 @@ def get_task(
     return parse_obj_as(Task, task)
 
 
+def _task_update_dict(task_update: TaskUpdateRequest) -> Dict[str, Any]:
+    """The task settings update (see DBService.update_task) of a task update request."""
+    update = {}
+    replace_fields = task_update.replace_fields
+    # to convert it into a dict of {"field_a.sub_field_a": "value"}}
+    # e.g. {"args": {"arg1": 0}, "metadata": {"label": "test"}} ->
+    # {"args.arg1": 0, "metadata.label": "test"}
+    # we need to flatten by 1-level and add prefix
+    for key, value in task_update.model_dump(exclude_unset=True, by_alias=True).items():
+        if key == "replace_fields":
+            continue
+        if key in replace_fields:  # replace root field
+            if isinstance(value, dict):
+                # prevent {"args": {"foo.bar": 0}} case. (this can cause trouble for updating,
+                # because if {"foo.bar": 0} is assigned to args (i.e. ["args"]["foo.bar"]),
+                # updating args.foo.bar later would actually update the value of ["args"]["foo"]["bar"]
+                # rather than the existing db entry ["args"]["foo.bar"]
+                # therefore, only format like {"args": {"foo":{"bar": 0}}} should be allowed.
+                update[key] = unflatten_dict(value)
+            else:
+                update[key] = value
+        else:
+            if isinstance(value, dict):  # only update sub-fields
+                # in this case, {"args": {"foo.bar": 0}} is allowed
+                # since it will be transformed to {"args.foo.bar": 0} for updating
+                for sub_key, sub_value in value.items():
+                    update[f"{key}.{sub_key}"] = sub_value
+            else:  # for non-dict, just overwrite the field
+                update[key] = value
+    return update
+
+
 @app.put(
     "/api/v1/queues/me/tasks",
     response_model=TaskLsResponse,
@@ -360,35 +739,7 @@ def update_tasks(
 
     for task_update in task_updates:
         try:
-            update = {}
-            replace_fields = task_update.replace_fields
-            # to convert it into a dict of {"field_a.sub_field_a": "value"}}
-            # e.g. {"args": {"arg1": 0}, "metadata": {"label": "test"}} ->
-            # {"args.arg1": 0, "metadata.label": "test"}
-            # we need to flatten by 1-level and add prefix
-            for key, value in task_update.model_dump(
-                exclude_unset=True, by_alias=True
-            ).items():
-                if key == "replace_fields":
-                    continue
-                if key in replace_fields:  # replace root field
-                    if isinstance(value, dict):
-                        # prevent {"args": {"foo.bar": 0}} case. (this can cause trouble for updating,
-                        # because if {"foo.bar": 0} is assigned to args (i.e. ["args"]["foo.bar"]),
-                        # updating args.foo.bar later would actually update the value of ["args"]["foo"]["bar"]
-                        # rather than the existing db entry ["args"]["foo.bar"]
-                        # therefore, only format like {"args": {"foo":{"bar": 0}}} should be allowed.
-                        update[key] = unflatten_dict(value)
-                    else:
-                        update[key] = value
-                else:
-                    if isinstance(value, dict):  # only update sub-fields
-                        # in this case, {"args": {"foo.bar": 0}} is allowed
-                        # since it will be transformed to {"args.foo.bar": 0} for updating
-                        for sub_key, sub_value in value.items():
-                            update[f"{key}.{sub_key}"] = sub_value
-                    else:  # for non-dict, just overwrite the field
-                        update[key] = value
+            update = _task_update_dict(task_update)
 
             if not db.update_task(
                 queue_id=queue["_id"],
@@ -431,6 +782,75 @@ def delete_task(
         )
 
 
+@app.post("/api/v1/queues/me/sweeps", status_code=HTTP_201_CREATED)
+def create_sweep(
+    sweep: SweepCreateRequest,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Submit a lazy parameter sweep to the queue"""
+    sweep_id, total = db.create_sweep(
+        queue_id=queue["_id"],
+        axes=sweep.axes,
+        mode=sweep.mode,
+        num_samples=sweep.num_samples,
+        seed=sweep.seed,
+        task_name=sweep.task_name,
+        args=sweep.args,
+        metadata=sweep.metadata,
+        cmd=sweep.cmd,
+        heartbeat_timeout=sweep.heartbeat_timeout,
+        task_timeout=sweep.task_timeout,
+        max_retries=sweep.max_retries,
+        priority=sweep.priority,
+        resources=sweep.resources,
+    )
+    return SweepCreateResponse(sweep_id=sweep_id, total=total)
+
+
+@app.get(
+    "/api/v1/queues/me/sweeps",
+    response_model=SweepLsResponse,
+    response_model_by_alias=False,
+)
+def ls_sweeps(
+    limit: int = 100,
+    offset: int = 0,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """List sweeps of the queue"""
+    sweeps = db.ls_sweeps(queue_id=queue["_id"], limit=limit, offset=offset)
+    if not sweeps:
+        return SweepLsResponse(found=False)
+
+    return SweepLsResponse(found=True, content=parse_obj_as(List[Sweep], sweeps))
+
+
+@app.delete("/api/v1/queues/me/sweeps/{sweep_id}", status_code=HTTP_204_NO_CONTENT)
+def delete_sweep(
+    sweep_id: str,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Delete a sweep. Tasks already materialized from it are kept."""
+    deleted_count = db.delete_sweep(queue_id=queue["_id"], sweep_id=sweep_id)
+    if deleted_count == 0:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail="Sweep not found",
+        )
+
+
+@app.get("/api/v1/queues/me/stats", response_model=QueueStatsResponse)
+def get_queue_stats(
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Get task counts of the queue, including sweep points not materialized yet"""
+    return QueueStatsResponse(**db.get_queue_stats(queue_id=queue["_id"]))
+
+
 @app.post("/api/v1/queues/me/workers", status_code=HTTP_201_CREATED)
 def create_worker(
     worker: WorkerCreateRequest,
@@ -499,6 +919,26 @@ def report_worker_status(
         raise HTTPException(status_code=HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@app.post(
+    "/api/v1/queues/me/workers/{worker_id}/lease",
+    response_model=Worker,
+    response_model_by_alias=False,
+)
+def renew_worker_lease(
+    worker_id: str,
+    lease_request: WorkerLeaseRenewRequest,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Renew the lease covering all running tasks of a worker."""
+    worker = db.renew_worker_lease(
+        queue_id=queue["_id"],
+        worker_id=worker_id,
+        lease_timeout=lease_request.lease_timeout,
+    )
+    return parse_obj_as(Worker, worker)
+
+
 @app.delete("/api/v1/queues/me/workers/{worker_id}", status_code=HTTP_204_NO_CONTENT)
 def delete_worker(
     worker_id: str,
@@ -530,6 +970,283 @@ def get_worker(
     return worker
 
 
+def _pop_param(params: Dict[str, Any], name: str) -> Any:
+    """Pop a path parameter (e.g. task_id) of a batch operation."""
+    if name not in params:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST, detail=f"Missing parameter: {name}"
+        )
+    return params.pop(name)
+
+
+# Operations of batch requests, by name:
+# (handler(params, queue, db) calling the endpoint of the operation, status code on success)
+BATCH_OPERATIONS: Dict[str, Tuple[Callable[..., Any], int]] = {
+    "get_queue": (lambda p, queue, db: get_queue(queue), HTTP_200_OK),
+    "submit_task": (
+        lambda p, queue, db: submit_task(TaskSubmitRequest(**p), queue, db),
+        HTTP_201_CREATED,
+    ),
+    "ls_tasks": (
+        lambda p, queue, db: ls_tasks(TaskLsRequest(**p), queue, db),
+        HTTP_200_OK,
+    ),
+    "get_task": (
+        lambda p, queue, db: get_task(_pop_param(p, "task_id"), queue, db),
+        HTTP_200_OK,
+    ),
+    "update_tasks": (
+        lambda p, queue, db: update_tasks(
+            parse_obj_as(List[TaskUpdateRequest], _pop_param(p, "task_updates")),
+            parse_obj_as(bool, p.get("reset_pending", False)),  # as in the client API
+            queue,
+            db,
+        ),
+        HTTP_200_OK,
+    ),
+    "report_task_status": (
+        lambda p, queue, db: report_task_status(
+            _pop_param(p, "task_id"), TaskStatusUpdateRequest(**p), queue, db
+        ),
+        HTTP_200_OK,
+    ),
+    "delete_task": (
+        lambda p, queue, db: delete_task(_pop_param(p, "task_id"), queue, db),
+        HTTP_204_NO_CONTENT,
+    ),
+    "create_worker": (
+        lambda p, queue, db: create_worker(WorkerCreateRequest(**p), queue, db),
+        HTTP_201_CREATED,
+    ),
+    "ls_workers": (
+        lambda p, queue, db: ls_worker(WorkerLsRequest(**p), queue, db),
+        HTTP_200_OK,
+    ),
+    "get_worker": (
+        lambda p, queue, db: parse_obj_as(
+            Worker, get_worker(_pop_param(p, "worker_id"), queue, db)
+        ),
+        HTTP_200_OK,
+    ),
+    "report_worker_status": (
+        lambda p, queue, db: report_worker_status(
+            _pop_param(p, "worker_id"), WorkerStatusUpdateRequest(**p), queue, db
+        ),
+        HTTP_200_OK,
+    ),
+    "delete_worker": (
+        lambda p, queue, db: delete_worker(
+            _pop_param(p, "worker_id"),
+            queue,
+            parse_obj_as(bool, p.get("cascade_update", True)),
+            db,
+        ),
+        HTTP_204_NO_CONTENT,
+    ),
+}
+
+# Operations of worker channels: the batch operations, and the ones of the task loop
+CHANNEL_OPERATIONS = {
+    **BATCH_OPERATIONS,
+    "fetch_task": (
+        lambda p, queue, db: fetch_task(TaskFetchRequest(**p), queue, db),
+        HTTP_200_OK,
+    ),
+    "refresh_task_heartbeat": (
+        lambda p, queue, db: refresh_task_heartbeat(
+            _pop_param(p, "task_id"), HeartbeatRequest(**p), queue, db
+        ),
+        HTTP_200_OK,
+    ),
+    "renew_worker_lease": (
+        lambda p, queue, db: renew_worker_lease(
+            _pop_param(p, "worker_id"), WorkerLeaseRenewRequest(**p), queue, db
+        ),
+        HTTP_200_OK,
+    ),
+}
+
+
+def _run_batch_operation(
+    operation: BatchOperation,
+    queue: Dict[str, Any],
+    db: DBService,
+    operations=BATCH_OPERATIONS,
+) -> BatchOperationResult:
+    handler, status_code = operations[operation.op]
+    try:
+        result = handler(dict(operation.params), queue, db)
+    except ValidationError as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
+    return BatchOperationResult(
+        status_code=status_code, result=jsonable_encoder(result, by_alias=False)
+    )
+
+
+@app.post("/api/v1/queues/me/batch", response_model=BatchResponse)
+def run_batch(
+    batch: BatchRequest,
+    queue: Dict[str, Any] = Depends(get_verified_queue_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Run a list of operations in order, in one request.
+
+    The result (or error) of each operation is returned. An atomic batch runs in one
+    transaction: it fails with the error of the first failed operation, and none of its
+    operations are applied.
+    """
+    unknown = [op.op for op in batch.operations if op.op not in BATCH_OPERATIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"Unknown operations: {unknown}. "
+            f"Supported: {list(BATCH_OPERATIONS)}",
+        )
+
+    if batch.atomic:
+
+        def run_all():
+            results = []
+            for i, operation in enumerate(batch.operations):
+                try:
+                    results.append(_run_batch_operation(operation, queue, db))
+                except HTTPException as e:
+                    raise HTTPException(
+                        status_code=e.status_code,
+                        detail=f"Operation {i} ({operation.op}) failed: {e.detail}",
+                    )
+            return results
+
+        return BatchResponse(results=db.run_atomic(queue["_id"], run_all))
+
+    results = []
+    for operation in batch.operations:
+        try:
+            results.append(_run_batch_operation(operation, queue, db))
+        except HTTPException as e:
+            results.append(
+                BatchOperationResult(status_code=e.status_code, detail=e.detail)
+            )
+    return BatchResponse(results=results)
+
+
+def _release_admission(work: "asyncio.Future[Any]"):
+    admission_controller.release()
+    if not work.cancelled():
+        work.exception()  # retrieved, also when nobody awaits the operation anymore
+
+
+@app.websocket("/api/v1/queues/me/channel")
+async def worker_channel(
+    websocket: WebSocket,
+    events: bool = False,
+    queue: Dict[str, Any] = Depends(get_verified_queue_websocket_dependency),
+    db: DBService = Depends(get_db),
+):
+    """Persistent channel of a worker, authenticated once on connect
+    (see labtasker.client.core.channel).
+
+    The client sends operations as {"id", "op", "params"}, run concurrently and each replied
+    as {"id", "status_code", "result", "detail"}. If `events`, the server pushes the events of
+    the queue as {"push": "event", "event"}.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    async def send(message: Dict[str, Any]):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    async def run_operation(message: Dict[str, Any]):
+        request_id = message.get("id") if isinstance(message, dict) else None
+        try:
+            operation = BatchOperation.model_validate(message)
+            if operation.op not in CHANNEL_OPERATIONS:
+                raise HTTPException(
+                    status_code=HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown operation: {operation.op}",
+                )
+        except ValidationError as e:
+            await send(
+                {
+                    "id": request_id,
+                    "status_code": HTTP_400_BAD_REQUEST,
+                    "detail": str(e),
+                }
+            )
+            return
+        except HTTPException as e:
+            await send(
+                {"id": request_id, "status_code": e.status_code, "detail": e.detail}
+            )
+            return
+
+        priority = operation_priority_class(operation.op)
+        if not admission_controller.try_acquire(priority):
+            await send(
+                {
+                    "id": request_id,
+                    "status_code": HTTP_429_TOO_MANY_REQUESTS,
+                    "detail": "Server busy. Retry later.",
+                    "retry_after": retry_after_seconds(),
+                }
+            )
+            return
+        # the slot is released once the operation is done, even if the connection is closed
+        # (and this coroutine cancelled) before
+        work = asyncio.ensure_future(
+            run_in_threadpool(
+                _run_batch_operation, operation, queue, db, CHANNEL_OPERATIONS
+            )
+        )
+        work.add_done_callback(_release_admission)
+        try:
+            result = await asyncio.shield(work)
+        except HTTPException as e:
+            result = BatchOperationResult(status_code=e.status_code, detail=e.detail)
+        except Exception as e:
+            logger.exception(f"Error running {operation.op} of a worker channel")
+            result = BatchOperationResult(
+                status_code=HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+            )
+        await send({"id": request_id, **result.model_dump()})
+
+    async def push_events(client_buffer):
+        while True:
+            if client_buffer.empty():
+                # published from the threadpool, hence polled
+                await asyncio.sleep(0.1)
+                continue
+            queue_event = client_buffer.get_nowait()
+            await send(
+                {"push": "event", "event": jsonable_encoder(queue_event.response())}
+            )
+
+    running = set()
+    with ExitStack() as stack:
+        pusher = None
+        if events:
+            client_buffer = stack.enter_context(
+                event_manager.get_queue_event_manager(queue["_id"]).client_buffer(
+                    str(uuid.uuid4())
+                )
+            )
+            pusher = asyncio.create_task(push_events(client_buffer))
+        try:
+            while True:
+                message = await websocket.receive_json()
+                task = asyncio.create_task(run_operation(message))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if pusher is not None:
+                pusher.cancel()
+            for task in running:
+                task.cancel()
+
+
 @app.get("/api/v1/queues/me/events")
 async def subscribe_events(
     request: Request,
@@ -1,5 +1,6 @@
 import asyncio
-from typing import AsyncGenerator, Awaitable, Callable, Dict
+from contextlib import contextmanager
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Iterator
 
 from sse_starlette import ServerSentEvent
 
@@ -21,6 +22,11 @@ def __init__(self, sequence: int, event: BaseEventModel):
         self.event = event
         self.timestamp = get_current_time()
 
+    def response(self) -> EventResponse:
+        return EventResponse(
+            sequence=self.sequence, timestamp=self.timestamp, event=self.event
+        )
+
 
 class QueueEventManager:
     def __init__(self, queue_id: str):
@@ -53,14 +59,20 @@ def publish(self, event: BaseEventModel) -> None:
                         logger.error("Queue unexpectedly empty after full.")
                         break
 
+    @contextmanager
+    def client_buffer(self, client_id: str) -> Iterator["asyncio.Queue[QueueEvent]"]:
+        """Register the event buffer of a client, removed on exit."""
+        self.client_buffers[client_id] = asyncio.Queue(maxsize=self.max_buffer_size)
+        try:
+            yield self.client_buffers[client_id]
+        finally:
+            self.client_buffers.pop(client_id, None)
+
     async def subscribe(
         self, client_id: str, disconnect_handle: Callable[[], Awaitable[bool]]
     ) -> AsyncGenerator[ServerSentEvent, None]:
         """Subscribe to events"""
-        # Create buffer for this client
-        self.client_buffers[client_id] = asyncio.Queue(maxsize=self.max_buffer_size)
-
-        try:
+        with self.client_buffer(client_id) as client_buffer:
             # Send initial connection message
             connection_event = EventSubscriptionResponse(
                 status="connected", client_id=client_id
@@ -82,26 +94,16 @@ async def subscribe(
                     last_ping = current_time
 
                 # Check for events (non-blocking)
-                if not self.client_buffers[client_id].empty():
-                    queue_event = await self.client_buffers[client_id].get()
-                    event_response = EventResponse(
-                        sequence=queue_event.sequence,
-                        timestamp=queue_event.timestamp,
-                        event=queue_event.event,
-                    )
+                if not client_buffer.empty():
+                    queue_event = await client_buffer.get()
                     yield ServerSentEvent(
-                        data=event_response.model_dump_json(),
+                        data=queue_event.response().model_dump_json(),
                         event="event",
                     )
                 else:
                     # No events, sleep briefly to avoid CPU spinning
                     await asyncio.sleep(0.1)
 
-        finally:
-            # Cleanup client buffer
-            if client_id in self.client_buffers:
-                del self.client_buffers[client_id]
-
 
 class EventManager:
     def __init__(self):
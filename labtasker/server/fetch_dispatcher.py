@@ -0,0 +1,127 @@
+"""Batching of concurrent fetch requests.
+
+Fetch requests of a queue that arrive within `fetch_batch_window_ms` are served together by one
+DBService.fetch_tasks_batch() call, instead of racing each other for the same top-priority
+tasks in separate transactions.
+
+Fairness:
+    - Requests of a queue are dispatched in arrival order, at most `fetch_batch_max_size` per batch.
+    - Within a batch, an earlier request is handed out a better candidate than a later request
+      of the same (required_fields, extra_filter) shape.
+    - Batches of a queue run one at a time. The first request left over when a batch finishes
+      leads the next batch, so no request waits for more than the batches ahead of it.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Set
+
+from labtasker.server.config import get_server_config
+from labtasker.server.database import DBService
+
+
+@dataclass
+class _Waiter:
+    request: Dict[str, Any]
+    wake: threading.Event = field(default_factory=threading.Event)
+    lead: bool = False  # whether this request should run the next batch
+    done: bool = False
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class FetchDispatcher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, List[_Waiter]] = {}
+        # queues with a batch being collected or run
+        self._leading: Set[Hashable] = set()
+
+        self.requests = 0
+        self.batches = 0
+
+    def fetch(self, db: DBService, queue_id: str, **request) -> Any:
+        """Fetch a task like `DBService.fetch_task`, batched with concurrent requests of the same queue."""
+        window = get_server_config().fetch_batch_window_ms / 1000
+        if window <= 0:
+            return db.fetch_task(queue_id=queue_id, **request)
+
+        key = (id(db), queue_id)
+        waiter = _Waiter(request)
+        with self._lock:
+            self.requests += 1
+            self._pending.setdefault(key, []).append(waiter)
+            if key not in self._leading:
+                self._leading.add(key)
+                waiter.lead = True
+
+        collect = True  # only a fresh leader waits for requests to arrive
+        while not waiter.done:
+            if waiter.lead:
+                waiter.lead = False
+                if collect:
+                    time.sleep(window)
+                self._run_batch(db, queue_id, key)
+            else:
+                waiter.wake.wait()
+                waiter.wake.clear()
+                collect = False
+
+        if waiter.error is not None:
+            raise waiter.error
+        return waiter.result
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            }
+
+    def _run_batch(self, db: DBService, queue_id: str, key: Hashable):
+        max_size = max(get_server_config().fetch_batch_max_size, 1)
+        with self._lock:
+            pending = self._pending.pop(key)
+            batch, rest = pending[:max_size], pending[max_size:]
+            if rest:
+                self._pending[key] = rest
+            self.batches += 1
+
+        try:
+            results: List[Any] = db.fetch_tasks_batch(
+                queue_id=queue_id, requests=[w.request for w in batch]
+            )
+        except Exception as e:
+            # each waiter raises its own instance: raising sets the traceback of the instance
+            results = [_copy_error(e) for _ in batch]
+
+        for waiter, result in zip(batch, results):
+            if isinstance(result, BaseException):
+                waiter.error = result
+            else:
+                waiter.result = result
+            waiter.done = True
+            waiter.wake.set()
+
+        # hand over to the first request that arrived meanwhile
+        with self._lock:
+            waiting = self._pending.get(key)
+            if waiting:
+                waiting[0].lead = True
+                waiting[0].wake.set()
+            else:
+                self._leading.discard(key)
+
+
+def _copy_error(error: BaseException) -> BaseException:
+    """Copy of an exception, with the traceback of the original."""
+    copied = error.__class__.__new__(error.__class__)
+    copied.__dict__.update(error.__dict__)
+    copied.args = error.args
+    return copied.with_traceback(error.__traceback__)
+
+
+# Global fetch dispatcher
+fetch_dispatcher = FetchDispatcher()
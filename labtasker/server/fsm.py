@@ -1,13 +1,17 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, Mapping, Optional, Set
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Set
 
 from fastapi import HTTPException
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 
 from labtasker.api_models import StateTransitionEvent
 from labtasker.server.event_manager import event_manager
+from labtasker.server.query_cache import query_cache
+from labtasker.server.ready_queue import ready_queue
 from labtasker.utils import get_current_time
 
 
@@ -43,6 +47,11 @@ def update_fsm_event(
             self.commit()
 
     def commit(self):
+        collected = _collected_handles.get()
+        if collected is not None:
+            collected.append(self)
+            return
+
         event_data = StateTransitionEvent(
             entity_type=self.entity_type,
             queue_id=self.queue_id,
@@ -54,11 +63,41 @@ def commit(self):
             entity_data=self._entity_data,
         )
 
+        # Cached search results of the queue are stale after the transition
+        query_cache.invalidate(self.queue_id)
+
+        # Tasks entering PENDING become fetch candidates
+        if self.entity_type == EntityType.TASK and self.new_state == TaskState.PENDING:
+            if (
+                self._entity_data is not None
+                and self._entity_data.get("status") == TaskState.PENDING
+            ):
+                ready_queue.push(self._entity_data)
+            else:
+                ready_queue.invalidate(self.queue_id)
+
         # Use fully synchronous event publishing
         event_manager.publish_event(self.queue_id, event_data)
         self._entity_data = None
 
 
+_collected_handles: ContextVar[Optional[List[StateTransitionEventHandle]]] = ContextVar(
+    "collected_handles", default=None
+)
+
+
+@contextmanager
+def collect_event_handles() -> Iterator[List[StateTransitionEventHandle]]:
+    """Collect the handles committed within the context instead of committing them,
+    e.g. to commit them once the surrounding transaction is committed."""
+    handles: List[StateTransitionEventHandle] = []
+    token = _collected_handles.set(handles)
+    try:
+        yield handles
+    finally:
+        _collected_handles.reset(token)
+
+
 class State(str, Enum):
     def __str__(self):
         return self.value
@@ -0,0 +1,74 @@
+"""Write-behind buffer of task heartbeats.
+
+Only the latest heartbeat per task is kept in memory, along with the latest progress sent with
+the heartbeats of the task. The buffer is flushed to the database with a single bulk write per
+interval, and before each timeout check.
+"""
+
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+HeartbeatKey = Tuple[str, str]  # (queue_id, task_id)
+Heartbeat = Tuple[datetime, Optional[Dict[str, Any]]]  # (timestamp, progress)
+
+
+def _merge(prev: Optional[Heartbeat], new: Heartbeat) -> Heartbeat:
+    """The latest timestamp and the progress of the latest heartbeat that has one."""
+    if prev is None:
+        return new
+    if new[0] < prev[0]:
+        prev, new = new, prev
+    return new[0], new[1] if new[1] is not None else prev[1]
+
+
+class HeartbeatBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[HeartbeatKey, Heartbeat] = {}
+
+        self.received = 0  # heartbeats recorded
+        self.written = 0  # heartbeats written to the database
+        self.flushes = 0  # bulk writes
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def record(
+        self,
+        queue_id: str,
+        task_id: str,
+        timestamp: datetime,
+        progress: Optional[Dict[str, Any]] = None,
+    ):
+        with self._lock:
+            key = (queue_id, task_id)
+            self._pending[key] = _merge(self._pending.get(key), (timestamp, progress))
+            self.received += 1
+
+    def drain(self) -> Dict[HeartbeatKey, Heartbeat]:
+        """Take all pending heartbeats out of the buffer."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            return pending
+
+    def restore(self, pending: Dict[HeartbeatKey, Heartbeat]):
+        """Put back heartbeats that failed to be written."""
+        with self._lock:
+            for key, heartbeat in pending.items():
+                self._pending[key] = _merge(self._pending.get(key), heartbeat)
+
+    def mark_written(self, n: int):
+        with self._lock:
+            self.written += n
+            self.flushes += 1
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "received": self.received,
+                "written": self.written,
+                "flushes": self.flushes,
+                "pending": len(self._pending),
+            }
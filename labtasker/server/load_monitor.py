@@ -0,0 +1,106 @@
+"""Server load, measured as the request rate and latency over the last few seconds.
+
+The load is used to pace heartbeats: the interval recommended to a client grows with the load,
+so that an overloaded server is sent fewer heartbeats, and is capped by the heartbeat timeout of
+the task, so that at least three heartbeats are sent per timeout window.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from labtasker.server.config import get_server_config
+
+WINDOW_SECONDS = 10  # the load is averaged over this many one-second buckets
+BEATS_PER_TIMEOUT = 3  # min number of heartbeats sent within a heartbeat timeout
+
+
+class LoadMonitor:
+    def __init__(self, window: int = WINDOW_SECONDS):
+        self._lock = threading.Lock()
+        self._window = window
+        # per-second buckets of [second, requests, total latency], indexed by second % window
+        self._buckets: List[List[float]] = [[-1, 0, 0.0] for _ in range(window)]
+
+    def record(self, latency: float, now: Optional[float] = None):
+        """Record a request that took `latency` seconds."""
+        second = int(time.monotonic() if now is None else now)
+        with self._lock:
+            bucket = self._buckets[second % self._window]
+            if bucket[0] != second:
+                bucket[:] = [second, 0, 0.0]
+            bucket[1] += 1
+            bucket[2] += latency
+
+    def load(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Request rate (per second) and mean latency (in seconds) over the window."""
+        second = int(time.monotonic() if now is None else now)
+        requests, latency = 0, 0.0
+        with self._lock:
+            for bucket_second, n, total in self._buckets:
+                if second - self._window < bucket_second <= second:
+                    requests += int(n)
+                    latency += total
+        return {
+            "request_rate": requests / self._window,
+            "latency": latency / requests if requests else 0.0,
+        }
+
+    def heartbeat_interval(
+        self, heartbeat_timeout: Optional[float] = None, now: Optional[float] = None
+    ) -> float:
+        """The interval (in seconds) a client should wait before its next heartbeat."""
+        config = get_server_config()
+        load = self.load(now)
+        factor = max(
+            1.0,
+            load["request_rate"] / config.heartbeat_load_target_rate,
+            load["latency"] * 1000 / config.heartbeat_load_target_latency_ms,
+        )
+        interval = min(
+            config.heartbeat_interval * factor, config.heartbeat_interval_max
+        )
+        interval = max(interval, config.heartbeat_interval_min)
+        if heartbeat_timeout:
+            interval = min(interval, heartbeat_timeout / BEATS_PER_TIMEOUT)
+        return interval
+
+    def metrics(self) -> Dict[str, Any]:
+        load = self.load()
+        return {
+            "request_rate": load["request_rate"],
+            "latency_ms": load["latency"] * 1000,
+            "heartbeat_interval": self.heartbeat_interval(),
+        }
+
+
+class LoadMonitorMiddleware:
+    """ASGI middleware recording the latency of each HTTP request, up to its response headers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        recorded = False
+
+        async def send_wrapper(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                load_monitor.record(time.perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not recorded:
+                load_monitor.record(time.perf_counter() - start)
+
+
+# Global load monitor
+load_monitor = LoadMonitor()
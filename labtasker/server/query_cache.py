@@ -0,0 +1,192 @@
+"""Per-queue cache of query_collection results.
+
+Entries are invalidated per queue when the queue's data changes (FSM event commit,
+update_collection, etc.). A generation counter per queue guards against storing results
+computed concurrently with an invalidation, and against joining such computations.
+"""
+
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import bson
+
+from labtasker.server.config import get_server_config
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Normalize query parameters (filter, sort, limit, offset, ...) into a cache key.
+    Dict key order is ignored, list order (e.g. sort) is kept."""
+    return json.dumps(parts, sort_keys=True, default=str)
+
+
+def _estimate_size(result: List[Dict[str, Any]]) -> int:
+    try:
+        return sum(len(bson.encode(doc)) for doc in result)
+    except Exception:  # not bson encodable (e.g. keys that are not str)
+        return len(json.dumps(result, default=str))
+
+
+@dataclass
+class _Entry:
+    queue_id: str
+    result: List[Dict[str, Any]]
+    size: int
+    expires_at: float
+
+
+@dataclass
+class _Flight:
+    """An in-flight computation that identical concurrent queries wait for."""
+
+    generation: Tuple[int, int]
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Optional[List[Dict[str, Any]]] = None
+    error: Optional[BaseException] = None
+
+
+class QueryCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Hashable], _Entry]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, Hashable], _Flight] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0  # bumped by clear()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = (
+            0  # requests served by waiting for an identical in-flight query
+        )
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def max_bytes(self) -> int:
+        return int(get_server_config().query_cache_max_mb * 1024 * 1024)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get_or_compute(
+        self,
+        queue_id: str,
+        key: Hashable,
+        compute: Callable[[], List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """Return the cached result of a query, or compute it.
+        Concurrent identical queries are deduplicated so that only one of them hits the database.
+        """
+        if not self.enabled:
+            return compute()
+
+        cache_key = (queue_id, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                if entry.expires_at > time.monotonic():
+                    self._entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return copy.deepcopy(entry.result)
+                self._remove(cache_key)
+
+            generation = self._generation(queue_id)
+            flight = self._in_flight.get(cache_key)
+            # a flight started before an invalidation may miss the invalidating write
+            if flight is not None and flight.generation == generation:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._in_flight[cache_key] = _Flight(generation=generation)
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)  # type: ignore[arg-type]
+
+        try:
+            result = compute()
+            flight.result = copy.deepcopy(result)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if (
+                    self._in_flight.get(cache_key) is flight
+                ):  # not replaced by a newer one
+                    del self._in_flight[cache_key]
+                # only store if the queue was not invalidated while computing
+                if flight.error is None and self._generation(queue_id) == generation:
+                    self._store(cache_key, flight.result)  # type: ignore[arg-type]
+            flight.done.set()
+        return result
+
+    def invalidate(self, queue_id: str):
+        """Drop all cached results of a queue."""
+        with self._lock:
+            self._generations[queue_id] = self._generations.get(queue_id, 0) + 1
+            self.invalidations += 1
+            for cache_key in [k for k in self._entries if k[0] == queue_id]:
+                self._remove(cache_key)
+
+    def clear(self):
+        """Drop all cached results."""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._size = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+    def _generation(self, queue_id: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(queue_id, 0)
+
+    def _store(self, cache_key: Tuple[str, Hashable], result: List[Dict[str, Any]]):
+        size = _estimate_size(result)
+        max_bytes = self.max_bytes
+        if size > max_bytes:
+            return  # would evict everything else, not worth it
+        if cache_key in self._entries:
+            self._remove(cache_key)
+        self._entries[cache_key] = _Entry(
+            queue_id=cache_key[0],
+            result=result,
+            size=size,
+            expires_at=time.monotonic() + get_server_config().query_cache_ttl,
+        )
+        self._size += size
+        while self._size > max_bytes:  # evict least recently used
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, cache_key: Tuple[str, Hashable]):
+        entry = self._entries.pop(cache_key)
+        self._size -= entry.size
+
+
+# Global query cache
+query_cache = QueryCache()
@@ -0,0 +1,380 @@
+"""In-memory ready-queue of pending task heads.
+
+For each (queue, fetch request shape), a heap holds the ids of the best pending candidates in
+dispatch order, so that picking a candidate costs O(log n) in memory instead of a database query.
+
+- The heap is loaded from the database in chunks, continuing after the last loaded sort key.
+- Tasks entering PENDING through an FSM transition (submit, reset, retry, timeout requeue) are
+  pushed into the heaps of their queue by the committed event handle.
+- Writes that may change the dispatch order without an FSM transition (update_collection,
+  settings update, ...) invalidate the heaps of the queue.
+- Heaps expire after `ready_queue_ttl`, which bounds the staleness caused by other server processes.
+- Expired heaps are dropped on push and invalidation. At most `ready_queue_max_heaps` heaps are
+  kept, the least recently used ones are dropped first.
+
+Candidates may still be stale (e.g. claimed by another server process). The claim is a conditional
+update against the database, so a stale candidate is simply skipped.
+
+Pushed tasks are matched against the query of a heap in memory (see `filter_matches`), which only
+evaluates a few query shapes the way MongoDB does: conjunctions of equalities to scalars and of
+`$exists`. Fetch requests of other shapes are not served by the ready-queue (see `cacheable`).
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from labtasker.server.config import get_server_config
+from labtasker.server.db_utils import arg_match
+
+SortKey = Tuple[Any, ...]
+
+
+def dispatch_sort_key(task: Mapping[str, Any]) -> SortKey:
+    """Sort key of the dispatch order: highest priority, lowest scheduling rank,
+    least recently modified, oldest created.
+
+    Tasks without a rank come first, like null values in a MongoDB ascending sort.
+    """
+    rank = task.get("sched_rank")
+    return (
+        -task["priority"],
+        (0,) if rank is None else (1, rank),
+        task["last_modified"],
+        task["created_at"],
+        task["_id"],
+    )
+
+
+_MISSING = object()
+
+
+class UnsupportedFilter(Exception):
+    """The filter, or the document it is applied to, is not evaluated in memory."""
+
+
+def _is_scalar(value: Any) -> bool:
+    if isinstance(value, float):
+        return value == value  # NaN equals NaN in MongoDB
+    return value is None or isinstance(value, (str, bool, int))
+
+
+def _check_condition(condition: Any):
+    if isinstance(condition, dict):
+        if len(condition) != 1:
+            raise UnsupportedFilter(condition)
+        ((op, value),) = condition.items()
+        if op == "$exists" and isinstance(value, bool):
+            return
+        if op == "$eq" and _is_scalar(value):
+            return
+        raise UnsupportedFilter(condition)
+    if not _is_scalar(condition):
+        raise UnsupportedFilter(condition)
+
+
+def _check_filter(query: Mapping[str, Any]):
+    for key, condition in query.items():
+        if key == "$and" and isinstance(condition, list) and condition:
+            for clause in condition:
+                if not isinstance(clause, dict):
+                    raise UnsupportedFilter(clause)
+                _check_filter(clause)
+        elif key.startswith("$") or not key:
+            raise UnsupportedFilter(key)
+        else:
+            _check_condition(condition)
+
+
+def cacheable(query: Mapping[str, Any]) -> bool:
+    """Whether `filter_matches` evaluates the query (see the module docstring)."""
+    try:
+        _check_filter(query)
+    except UnsupportedFilter:
+        return False
+    return True
+
+
+def _resolve(doc: Mapping[str, Any], path: str) -> Any:
+    value: Any = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            raise UnsupportedFilter(path)  # traverses an array or a scalar
+        if part not in value:
+            return _MISSING
+        value = value[part]
+    if isinstance(value, list):
+        raise UnsupportedFilter(path)  # matches any element
+    return value
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if expected is None:
+        return value is None or value is _MISSING
+    if value is None or value is _MISSING or isinstance(value, dict):
+        return False
+    if not isinstance(value, (str, bool, int, float)):
+        raise UnsupportedFilter(value)
+    if isinstance(expected, bool) != isinstance(value, bool) and not (
+        isinstance(expected, str) or isinstance(value, str)
+    ):
+        # booleans are not numbers in MongoDB, but are in the embedded database
+        raise UnsupportedFilter(value)
+    if isinstance(expected, (bool, str)) or isinstance(value, (bool, str)):
+        return type(value) is type(expected) and value == expected
+    return value == expected  # numbers of any type compare by value
+
+
+def _matches(query: Mapping[str, Any], doc: Mapping[str, Any]) -> bool:
+    for key, condition in query.items():
+        if key == "$and":
+            matched = all(_matches(clause, doc) for clause in condition)
+        elif isinstance(condition, dict):
+            ((op, expected),) = condition.items()
+            value = _resolve(doc, key)
+            if op == "$exists":
+                matched = (value is not _MISSING) == expected
+            else:
+                matched = _equals(value, expected)
+        else:
+            matched = _equals(_resolve(doc, key), condition)
+        if not matched:
+            return False
+    return True
+
+
+def filter_matches(query: Mapping[str, Any], doc: Mapping[str, Any]) -> bool:
+    """Whether a document matches a query, as MongoDB would evaluate it.
+
+    Raises:
+        UnsupportedFilter: The query is not `cacheable`, or a field it reads holds an array
+            (or a value of another type than the scalars of the query).
+    """
+    _check_filter(query)
+    return _matches(query, doc)
+
+
+@dataclass
+class _Heads:
+    query: Dict[str, Any]
+    required_fields_no_more: Optional[Dict[str, Any]]
+    expires_at: float
+    heap: List[Tuple[SortKey, str]] = field(default_factory=list)
+    keys: Dict[str, SortKey] = field(default_factory=dict)  # valid entry of each task
+    cursor: Optional[SortKey] = None  # last sort key loaded from the database
+    complete: bool = False  # all pending candidates up to now are loaded
+
+    def accept(self, task: Mapping[str, Any]) -> bool:
+        return not self.required_fields_no_more or arg_match(
+            self.required_fields_no_more, task.get("args")
+        )
+
+    def add(self, task_id: str, key: SortKey):
+        self.keys[task_id] = key
+        heapq.heappush(self.heap, (key, task_id))
+
+    def peek(self) -> Optional[Tuple[SortKey, str]]:
+        while self.heap:
+            key, task_id = self.heap[0]
+            if self.keys.get(task_id) == key:
+                return key, task_id
+            heapq.heappop(self.heap)  # superseded entry
+        return None
+
+    def trim(self, size: int):
+        """Keep the best `size` entries. The rest is loaded again from the database later."""
+        entries = sorted((k, i) for i, k in self.keys.items())
+        if len(entries) <= size:
+            return
+        kept = entries[:size]
+        self.heap = kept
+        self.keys = {i: k for k, i in kept}
+        self.cursor = kept[-1][0]
+        self.complete = False
+
+
+class ReadyQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heads: "OrderedDict[Tuple[str, str], _Heads]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0  # bumped by clear()
+
+        self.pops = 0
+        self.loads = 0
+        self.pushes = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def size(self) -> int:
+        return get_server_config().ready_queue_size
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def pop(
+        self,
+        queue_id: str,
+        shape: str,
+        query: Dict[str, Any],
+        required_fields_no_more: Optional[Dict[str, Any]],
+        load: Callable[[Optional[SortKey], int], Iterable[Mapping[str, Any]]],
+        exclude: Set[str],
+    ) -> Optional[Dict[str, Any]]:
+        """Take the best candidate of a request shape out of the ready-queue.
+
+        Args:
+            queue_id: The queue.
+            shape: Identifier of the fetch request shape (required_fields, extra_filter).
+            query: The MongoDB query of candidates of the shape, which must be `cacheable`.
+            required_fields_no_more: The "no more" requirement on task args of the shape.
+            load: load(after, limit) returns up to `limit` candidates matching `query` that
+                come after the sort key `after` in dispatch order.
+            exclude: Ids of tasks that must not be returned (e.g. already handed out in a batch).
+
+        Returns:
+            {"_id": ..., "priority": ..., "last_modified": ..., "sort_key": ...} of the candidate,
+            or None if there is no candidate.
+        """
+        size = self.size
+        heads = None
+        while True:
+            with self._lock:
+                if heads is None or self._heads.get((queue_id, shape)) is not heads:
+                    heads = self._get_heads(
+                        queue_id, shape, query, required_fields_no_more
+                    )
+                generation = self._generation(queue_id)
+                top = heads.peek()
+                # entries after the cursor (pushed) may only be used once everything before
+                # them is loaded
+                if top is not None and (
+                    heads.complete
+                    or (heads.cursor is not None and top[0] <= heads.cursor)
+                ):
+                    key, task_id = heapq.heappop(heads.heap)
+                    del heads.keys[task_id]
+                    if task_id in exclude:
+                        continue
+                    self.pops += 1
+                    return {
+                        "_id": task_id,
+                        "priority": -key[0],
+                        "last_modified": key[2],
+                        "sort_key": key,
+                    }
+                if heads.complete:
+                    return None
+                cursor = heads.cursor
+
+            tasks = list(load(cursor, size))
+
+            with self._lock:
+                if self._heads.get((queue_id, shape)) is not heads:
+                    continue  # expired or invalidated meanwhile
+                if self._generation(queue_id) != generation:
+                    self._heads.pop((queue_id, shape), None)
+                    continue
+                self.loads += 1
+                for task in tasks:
+                    if task["_id"] not in heads.keys and heads.accept(task):
+                        heads.add(task["_id"], dispatch_sort_key(task))
+                if tasks:
+                    heads.cursor = dispatch_sort_key(tasks[-1])
+                heads.complete = len(tasks) < size
+                if len(heads.keys) > 2 * size:
+                    heads.trim(size)
+
+    def push_back(self, queue_id: str, shape: str, candidate: Mapping[str, Any]):
+        """Return a candidate taken by pop() that was not handed out."""
+        with self._lock:
+            heads = self._heads.get((queue_id, shape))
+            if heads is not None:
+                heads.add(candidate["_id"], candidate["sort_key"])
+
+    def push(self, task: Mapping[str, Any]):
+        """Add a task that entered PENDING to the matching heaps of its queue."""
+        queue_id = task["queue_id"]
+        with self._lock:
+            self.pushes += 1
+            self._evict_expired()
+            for (q, shape), heads in list(self._heads.items()):
+                if q != queue_id:
+                    continue
+                try:
+                    matched = heads.accept(task) and filter_matches(heads.query, task)
+                except UnsupportedFilter:
+                    del self._heads[(q, shape)]
+                    continue
+                if matched:
+                    heads.add(task["_id"], dispatch_sort_key(task))
+                    if len(heads.keys) > 2 * self.size:
+                        heads.trim(self.size)
+                elif task["_id"] in heads.keys:
+                    del heads.keys[task["_id"]]
+
+    def invalidate(self, queue_id: str):
+        """Drop the heaps of a queue."""
+        with self._lock:
+            self._generations[queue_id] = self._generations.get(queue_id, 0) + 1
+            self.invalidations += 1
+            for key in [k for k in self._heads if k[0] == queue_id]:
+                del self._heads[key]
+            self._evict_expired()
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._heads.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "pops": self.pops,
+                "loads": self.loads,
+                "pushes": self.pushes,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "heaps": len(self._heads),
+                "entries": sum(len(h.keys) for h in self._heads.values()),
+            }
+
+    def _generation(self, queue_id: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(queue_id, 0)
+
+    def _get_heads(
+        self,
+        queue_id: str,
+        shape: str,
+        query: Dict[str, Any],
+        required_fields_no_more: Optional[Dict[str, Any]],
+    ) -> _Heads:
+        heads = self._heads.get((queue_id, shape))
+        now = time.monotonic()
+        if heads is None or heads.expires_at <= now:
+            heads = self._heads[(queue_id, shape)] = _Heads(
+                query=query,
+                required_fields_no_more=required_fields_no_more,
+                expires_at=now + get_server_config().ready_queue_ttl,
+            )
+        self._heads.move_to_end((queue_id, shape))
+        while len(self._heads) > get_server_config().ready_queue_max_heaps:
+            self._heads.popitem(last=False)  # least recently used
+            self.evictions += 1
+        return heads
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [k for k, h in self._heads.items() if h.expires_at <= now]:
+            del self._heads[key]
+            self.evictions += 1
+
+
+# Global ready-queue
+ready_queue = ReadyQueue()
@@ -0,0 +1,246 @@
+"""Scheduling policies of fetch_task.
+
+Tasks are dispatched by priority first. Within a priority, the scheduling policy of the queue
+orders the tasks by a rank, precomputed whenever a task enters PENDING and stored in the
+`sched_rank` field, so that the dispatch order is served by an index
+(see db_utils.TASK_DISPATCH_INDEX). Ties (and unranked tasks) fall back to least recently
+modified, oldest created.
+
+The policy is configured in the queue metadata, either by name or with options:
+
+    {"scheduling_policy": "sjf"}
+    {"scheduling_policy": {"name": "fair_share", "weights": {"alice": 2}}}
+
+Built-in policies:
+    - priority (default): no rank.
+    - fifo: submission order (created_at).
+    - lpt: longest expected runtime first. Minimizes the makespan of a batch of tasks.
+    - sjf: shortest expected runtime first. Minimizes the average wait of interactive queues.
+    - fair_share: weighted fair share across the users (`metadata.user`) of a queue.
+
+Expected runtimes are the moving average of past successful runs with the same task_name.
+Tasks without history have no rank, so they are dispatched first and the history is collected.
+
+Policies are pluggable: subclass SchedulingPolicy and register it with `register_policy`.
+"""
+
+from typing import Any, Dict, Mapping, Optional, Type
+
+from pymongo.collection import Collection
+
+# Weight of the latest run in the expected runtime of a task_name
+RUNTIME_EMA_ALPHA = 0.3
+
+SCHEDULING_POLICY_KEY = "scheduling_policy"
+
+
+class SchedStats:
+    """Scheduling statistics of a queue, stored in the `sched_stats` collection.
+
+    Each statistic is one document with a deterministic id, so that concurrent writers of
+    the same statistic conflict inside their transactions.
+    """
+
+    def __init__(self, collection: Collection, queue_id: str, session=None):
+        self._collection = collection
+        self._queue_id = queue_id
+        self._session = session
+
+    def _id(self, kind: str, key: Optional[str]) -> str:
+        return f"{self._queue_id}:{kind}:{key if key is not None else ''}"
+
+    def get(self, kind: str, key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return self._collection.find_one(
+            {"_id": self._id(kind, key)}, session=self._session
+        )
+
+    def set(self, kind: str, key: Optional[str] = None, **fields):
+        self._collection.update_one(
+            {"_id": self._id(kind, key)},
+            {
+                "$set": {
+                    "queue_id": self._queue_id,
+                    "kind": kind,
+                    "key": key,
+                    **fields,
+                }
+            },
+            upsert=True,
+            session=self._session,
+        )
+
+    def delete(self, kind: str):
+        self._collection.delete_many(
+            {"queue_id": self._queue_id, "kind": kind}, session=self._session
+        )
+
+    def expected_runtime(self, task_name: Optional[str]) -> Optional[float]:
+        """Expected runtime in seconds of tasks named `task_name`, None if unknown."""
+        if task_name is None:
+            return None
+        stat = self.get("runtime", task_name)
+        return stat["value"] if stat else None
+
+    def record_runtime(self, task_name: Optional[str], runtime: float):
+        if task_name is None:
+            return
+        stat = self.get("runtime", task_name)
+        if stat:
+            value = (
+                RUNTIME_EMA_ALPHA * runtime + (1 - RUNTIME_EMA_ALPHA) * stat["value"]
+            )
+            count = stat["count"] + 1
+        else:
+            value, count = runtime, 1
+        self.set("runtime", task_name, value=value, count=count)
+
+
+class SchedulingPolicy:
+    """Base class of scheduling policies. The base policy orders by priority only."""
+
+    name = "priority"
+
+    def __init__(self, **options):
+        if options:
+            raise ValueError(
+                f"Unknown options for scheduling policy '{self.name}': {sorted(options)}"
+            )
+
+    def rank(self, task: Mapping[str, Any], stats: SchedStats) -> Optional[float]:
+        """Rank of a task entering PENDING. Lower ranks are dispatched first, None first of all."""
+        return None
+
+    def on_dispatch(self, task: Mapping[str, Any], stats: SchedStats):
+        """Called within the fetch transaction for each dispatched task with a rank."""
+
+    def reset(self, stats: SchedStats):
+        """Called before all pending tasks of the queue are ranked again in submission order."""
+
+
+class FIFOPolicy(SchedulingPolicy):
+    """Submission order. Retried tasks keep their place."""
+
+    name = "fifo"
+
+    def rank(self, task, stats):
+        return task["created_at"].timestamp()
+
+
+class LPTPolicy(SchedulingPolicy):
+    """Longest processing time first."""
+
+    name = "lpt"
+
+    def rank(self, task, stats):
+        runtime = stats.expected_runtime(task.get("task_name"))
+        return -runtime if runtime is not None else None
+
+
+class SJFPolicy(SchedulingPolicy):
+    """Shortest job first."""
+
+    name = "sjf"
+
+    def rank(self, task, stats):
+        return stats.expected_runtime(task.get("task_name"))
+
+
+class FairSharePolicy(SchedulingPolicy):
+    """Weighted fair share across users, by start-time fair queuing.
+
+    Each user has a virtual finish time that advances by 1 / weight with each of its tasks.
+    A task is ranked by the virtual start of its service: the later of its user's finish time and
+    the virtual time of the queue (the rank of the last dispatched task), so that a user coming
+    back after idling does not get the credit of the time it was idle.
+    """
+
+    name = "fair_share"
+
+    def __init__(
+        self,
+        key: str = "metadata.user",
+        weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+    ):
+        super().__init__()
+        if not isinstance(key, str) or not key:
+            raise ValueError("fair_share key must be a non-empty dot-separated path")
+        weights = dict(weights or {})
+        for weight in [*weights.values(), default_weight]:
+            if not isinstance(weight, (int, float)) or weight <= 0:
+                raise ValueError("fair_share weights must be positive numbers")
+        self.key = key
+        self.weights = weights
+        self.default_weight = default_weight
+
+    def user_of(self, task: Mapping[str, Any]) -> str:
+        value: Any = task
+        for part in self.key.split("."):
+            if not isinstance(value, Mapping):
+                return ""
+            value = value.get(part)
+        return "" if value is None else str(value)
+
+    def rank(self, task, stats):
+        user = self.user_of(task)
+        vtime = (stats.get("vtime") or {}).get("value", 0.0)
+        finish = (stats.get("finish", user) or {}).get("value", 0.0)
+        start = max(vtime, finish)
+        weight = self.weights.get(user, self.default_weight)
+        stats.set("finish", user, value=start + 1 / weight)
+        return start
+
+    def reset(self, stats):
+        stats.delete("finish")
+        stats.delete("vtime")
+
+    def on_dispatch(self, task, stats):
+        vtime = (stats.get("vtime") or {}).get("value", 0.0)
+        if task["sched_rank"] > vtime:
+            stats.set("vtime", value=task["sched_rank"])
+
+
+_POLICIES: Dict[str, Type[SchedulingPolicy]] = {}
+
+
+def register_policy(policy_cls: Type[SchedulingPolicy]) -> Type[SchedulingPolicy]:
+    """Register a scheduling policy under its name. Can be used as a class decorator."""
+    _POLICIES[policy_cls.name] = policy_cls
+    return policy_cls
+
+
+for _policy_cls in (
+    SchedulingPolicy,
+    FIFOPolicy,
+    LPTPolicy,
+    SJFPolicy,
+    FairSharePolicy,
+):
+    register_policy(_policy_cls)
+
+
+def get_policy(queue_metadata: Optional[Mapping[str, Any]]) -> SchedulingPolicy:
+    """Build the scheduling policy configured in the queue metadata.
+
+    Raises:
+        ValueError: if the configuration is invalid.
+    """
+    config = (queue_metadata or {}).get(SCHEDULING_POLICY_KEY)
+    if config is None:
+        return SchedulingPolicy()
+    if isinstance(config, str):
+        config = {"name": config}
+    if not isinstance(config, Mapping) or "name" not in config:
+        raise ValueError(
+            f"'{SCHEDULING_POLICY_KEY}' must be a policy name or a dict with a 'name' key"
+        )
+    options = dict(config)
+    name = options.pop("name")
+    if name not in _POLICIES:
+        raise ValueError(
+            f"Unknown scheduling policy '{name}'. Available: {sorted(_POLICIES)}"
+        )
+    try:
+        return _POLICIES[name](**options)
+    except TypeError as e:
+        raise ValueError(f"Invalid options for scheduling policy '{name}': {e}")
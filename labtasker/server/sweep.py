@@ -0,0 +1,85 @@
+"""Lazy parameter sweeps.
+
+A sweep stores base args and axis definitions instead of one document per point.
+Points are addressed by an integer index in [0, total) and materialized on demand.
+"""
+
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+from labtasker.utils import flatten_dict, unflatten_dict
+
+Axes = List[Tuple[str, List[Any]]]
+
+
+def sweep_size(mode: str, axes: Axes, num_samples: Optional[int] = None) -> int:
+    """Total number of points of a sweep.
+
+    Args:
+        mode: One of "grid", "zip", "random".
+        axes: Ordered list of (axis name, values).
+        num_samples: Number of samples drawn in random mode.
+
+    Raises:
+        ValueError: If the axes or num_samples are invalid for the mode.
+    """
+    if not axes:
+        raise ValueError("At least one axis must be specified.")
+
+    if mode == "grid":
+        total = 1
+        for _, values in axes:
+            total *= len(values)
+        return total
+    elif mode == "zip":
+        lengths = {len(values) for _, values in axes}
+        if len(lengths) != 1:
+            raise ValueError(
+                f"All axes must have the same length in zip mode. Got lengths {sorted(lengths)}."
+            )
+        return lengths.pop()
+    elif mode == "random":
+        if not num_samples or num_samples <= 0:
+            raise ValueError("num_samples must be a positive integer in random mode.")
+        return num_samples
+
+    raise ValueError(f"Invalid sweep mode: {mode}")
+
+
+def sweep_point(mode: str, axes: Axes, index: int, seed: int = 0) -> Dict[str, Any]:
+    """Compute the axis values of the `index`-th point of a sweep.
+
+    Grid points are enumerated like `itertools.product` (last axis varies fastest).
+    Random points only depend on (seed, index), so materialization order does not matter.
+
+    Returns:
+        A flat dict of dot-separated axis name -> value.
+    """
+    if mode == "grid":
+        point = {}
+        for name, values in reversed(axes):
+            index, i = divmod(index, len(values))
+            point[name] = values[i]
+        return dict(reversed(list(point.items())))
+    elif mode == "zip":
+        return {name: values[index] for name, values in axes}
+    elif mode == "random":
+        rng = random.Random(f"{seed}-{index}")
+        return {name: rng.choice(values) for name, values in axes}
+
+    raise ValueError(f"Invalid sweep mode: {mode}")
+
+
+def materialize_args(
+    base_args: Dict[str, Any], mode: str, axes: Axes, index: int, seed: int = 0
+) -> Dict[str, Any]:
+    """Merge base args with the `index`-th point. Axis values override base args."""
+    flat_args = flatten_dict(base_args)
+    point = sweep_point(mode, axes, index, seed)
+    # drop base args that are overridden by (or are parents/children of) an axis
+    for name in point:
+        for key in list(flat_args.keys()):
+            if key == name or key.startswith(name + ".") or name.startswith(key + "."):
+                del flat_args[key]
+    flat_args.update(point)
+    return unflatten_dict(flat_args)
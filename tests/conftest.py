@@ -149,6 +149,9 @@ def server_config(test_type, server_env_file):
 
         # Spin really fast for unit and integration testing,
         os.environ["PERIODIC_TASK_INTERVAL"] = "0.01"
+        # Write heartbeats through so that they can be read back immediately.
+        # Buffered heartbeats are covered by test_heartbeat_buffer.py
+        os.environ["HEARTBEAT_FLUSH_INTERVAL"] = "0"
 
     init_server_config(server_env_file)
 
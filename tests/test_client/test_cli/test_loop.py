@@ -169,3 +169,15 @@ def test_loop_script_path(self, setup_tasks, bash_script):
         output_text = Text.from_ansi(result.output).plain
         for i in range(TOTAL_TASKS):
             assert f"Running task {i}" in output_text, output_text
+
+    def test_loop_dry_run(self, setup_tasks, test_type):
+        result = runner.invoke(
+            app,
+            ["loop", "--dry-run", "-f", "args.arg1 > 2", "--", "echo", "%(arg1)"],
+        )
+        assert result.exit_code == 0, result.output
+        output_text = Text.from_ansi(result.output).plain
+        assert "Required fields: ['arg1']" in output_text, output_text
+        assert "Running task" not in output_text
+        if test_type != "unit":
+            assert "plan_summary" in output_text, output_text
@@ -109,6 +109,25 @@ def test_delete(self, db_fixture, cli_create_queue_from_config):
         )
         assert result.exit_code == 0, result.output
 
+    def test_delete_async(self, db_fixture, cli_create_queue_from_config):
+        queue = db_fixture._queues.find_one(
+            {"queue_name": cli_create_queue_from_config.queue.queue_name}
+        )
+        db_fixture.create_task(queue_id=queue["_id"], args={"foo": "bar"})
+
+        result = runner.invoke(app, ["queue", "delete", "-y", "--async"])
+        assert result.exit_code != 0  # requires --cascade
+
+        result = runner.invoke(app, ["queue", "delete", "-y", "--cascade", "--async"])
+        assert result.exit_code == 0, result.output
+        job_id = db_fixture._jobs.find_one({"queue_id": queue["_id"]})["_id"]
+        assert job_id in result.output
+
+        while db_fixture.run_job_chunk():
+            pass
+        assert db_fixture.get_job(job_id)["status"] == "success"
+        assert db_fixture._tasks.count_documents({"queue_id": queue["_id"]}) == 0
+
 
 @pytest.mark.dependency(depends=["TestCreate::test_create_no_metadata"])
 class TestUpdate:
@@ -191,3 +210,87 @@ def test_update_no_changes(self, db_fixture, cli_create_queue_from_config):
             queue["password"],
         )
         assert queue["metadata"] == literal_eval('{"tag": "test"}')  # TODO: hard-coded
+
+
+@pytest.mark.dependency(depends=["TestCreate::test_create_no_metadata"])
+class TestIndex:
+    def test_index_create_ls_drop(self, db_fixture, cli_create_queue_from_config):
+        result = runner.invoke(
+            app, ["queue", "index", "create", "args.dataset", "metadata.tag"]
+        )
+        assert result.exit_code == 0, result.output
+
+        queue = db_fixture._queues.find_one(
+            {"queue_name": cli_create_queue_from_config.queue.queue_name}
+        )
+        assert queue["indexes"] == ["args.dataset", "metadata.tag"]
+
+        result = runner.invoke(app, ["queue", "index", "ls"])
+        assert result.exit_code == 0, result.output
+        assert "args.dataset" in result.output
+        assert "metadata.tag" in result.output
+
+        result = runner.invoke(app, ["queue", "index", "drop", "args.dataset"])
+        assert result.exit_code == 0, result.output
+        assert (
+            "args.dataset"
+            not in db_fixture._queues.find_one({"_id": queue["_id"]})["indexes"]
+        )
+
+    def test_index_drop_non_existent(self, db_fixture, cli_create_queue_from_config):
+        result = runner.invoke(app, ["queue", "index", "drop", "args.no_exist"])
+        assert result.exit_code != 0
+        assert "Index not found" in result.output
+
+
+@pytest.mark.dependency(depends=["TestCreate::test_create_no_metadata"])
+class TestLimit:
+    def test_limit_set_ls_rm(self, db_fixture, cli_create_queue_from_config):
+        result = runner.invoke(
+            app, ["queue", "limit", "set", "task_name", "4", "--value", "render"]
+        )
+        assert result.exit_code == 0, result.output
+        result = runner.invoke(app, ["queue", "limit", "set", "metadata.license", "2"])
+        assert result.exit_code == 0, result.output
+
+        queue = db_fixture._queues.find_one(
+            {"queue_name": cli_create_queue_from_config.queue.queue_name}
+        )
+        assert queue["concurrency_limits"] == [
+            {"key": "task_name", "value": "render", "limit": 4},
+            {"key": "metadata.license", "value": None, "limit": 2},
+        ]
+
+        result = runner.invoke(app, ["queue", "limit", "ls"])
+        assert result.exit_code == 0, result.output
+        assert "task_name=render" in result.output
+        assert "metadata.license=*" in result.output
+
+        result = runner.invoke(
+            app, ["queue", "limit", "rm", "task_name", "--value", "render"]
+        )
+        assert result.exit_code == 0, result.output
+        queue = db_fixture._queues.find_one({"_id": queue["_id"]})
+        assert [entry["key"] for entry in queue["concurrency_limits"]] == [
+            "metadata.license"
+        ]
+
+    def test_limit_invalid_key(self, db_fixture, cli_create_queue_from_config):
+        result = runner.invoke(app, ["queue", "limit", "set", "args.foo", "1"])
+        assert result.exit_code != 0
+
+
+@pytest.mark.dependency(depends=["TestCreate::test_create_no_metadata"])
+class TestMigrateLayout:
+    def test_migrate_layout(self, db_fixture, cli_create_queue_from_config):
+        result = runner.invoke(app, ["queue", "migrate-layout", "partitioned"])
+        assert result.exit_code == 0, result.output
+        assert "partitioned" in result.output
+
+        queue = db_fixture._queues.find_one(
+            {"queue_name": cli_create_queue_from_config.queue.queue_name}
+        )
+        assert queue["task_layout"] == "partitioned"
+
+        result = runner.invoke(app, ["queue", "migrate-layout", "sharded"])
+        assert result.exit_code != 0
@@ -0,0 +1,78 @@
+import pytest
+from typer.testing import CliRunner
+
+from labtasker.client.cli import app
+from labtasker.client.core.api import fetch_task
+from tests.test_client.test_cli.test_queue import cli_create_queue_from_config
+
+runner = CliRunner()
+
+# Mark the entire file as e2e, integration and unit tests
+pytestmark = [
+    pytest.mark.e2e,
+    pytest.mark.integration,
+    pytest.mark.unit,
+    pytest.mark.dependency(  # depends on creating valid queue via cli
+        depends=[
+            "tests/test_client/test_cli/test_queue.py::TestCreate::test_create_no_metadata"
+        ],
+        scope="session",
+    ),
+]
+
+
+@pytest.fixture
+def setup_sweep(db_fixture, cli_create_queue_from_config):
+    result = runner.invoke(
+        app,
+        [
+            "sweep",
+            "create",
+            "--name",
+            "cli-sweep",
+            "--args",
+            '{"dataset": "mnist"}',
+            "--axes",
+            '{"lr": [0.1, 0.01], "seed": [0, 1, 2]}',
+            "--quiet",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    return result.output.strip()
+
+
+class TestCreate:
+    def test_create_sweep(self, db_fixture, setup_sweep):
+        sweep = db_fixture._sweeps.find_one({"_id": setup_sweep})
+        assert sweep is not None
+        assert sweep["total"] == 6
+        assert db_fixture._tasks.count_documents({}) == 0
+
+    def test_create_invalid_axes(self, db_fixture, cli_create_queue_from_config):
+        result = runner.invoke(app, ["sweep", "create", "--axes", "[1, 2]"])
+        assert result.exit_code != 0
+
+
+class TestLs:
+    def test_ls_sweeps(self, db_fixture, setup_sweep):
+        result = runner.invoke(app, ["sweep", "ls", "--quiet"])
+        assert result.exit_code == 0, result.output
+        assert setup_sweep in result.output
+
+    def test_task_ls_reports_virtual_pending(self, db_fixture, setup_sweep):
+        fetch_task(worker_id=None, start_heartbeat=False, eta_max="1h")
+        result = runner.invoke(app, ["task", "ls", "--no-pager"])
+        assert result.exit_code == 0, result.output
+        assert "5 more pending task(s)" in result.output
+
+
+class TestDelete:
+    def test_delete_sweep(self, db_fixture, setup_sweep):
+        result = runner.invoke(app, ["sweep", "delete", setup_sweep, "--yes"])
+        assert result.exit_code == 0, result.output
+        assert db_fixture._sweeps.count_documents({}) == 0
+
+    def test_delete_non_existent_sweep(self, db_fixture, cli_create_queue_from_config):
+        result = runner.invoke(app, ["sweep", "delete", "non-existent", "--yes"])
+        assert result.exit_code != 0
+        assert "Sweep not found" in result.output
@@ -292,6 +292,41 @@ def test_ls_tasks_empty(self, db_fixture, cli_create_queue_from_config):
         result = runner.invoke(app, ["task", "ls"])
         assert result.exit_code == 0, result.output
 
+    def test_ls_tasks_cached_and_offline(self, db_fixture, setup_tasks):
+        result = runner.invoke(app, ["task", "ls", "--offline"])
+        assert result.exit_code != 0  # nothing synced yet
+
+        result = runner.invoke(
+            app, ["task", "ls", "--cached", "-f", "metadata.sort_key_1 == 1"]
+        )
+        assert result.exit_code == 0, result.output
+        assert "task-2" in result.output and "task-3" in result.output
+        assert "task-0" not in result.output
+
+        task_id = ls_tasks(task_name="task-4").content[0].task_id
+        result = runner.invoke(app, ["task", "delete", task_id, "--yes"])
+        assert result.exit_code == 0, result.output
+
+        # offline shows the stale cache, --cached syncs the delete
+        result = runner.invoke(app, ["task", "ls", "--offline", "--quiet"])
+        assert result.exit_code == 0, result.output
+        assert task_id in result.output
+        result = runner.invoke(app, ["task", "ls", "--cached", "--quiet"])
+        assert result.exit_code == 0, result.output
+        assert task_id not in result.output
+        assert len(result.output.split()) == 4
+
+    def test_ls_tasks_explain(self, db_fixture, setup_tasks, test_type):
+        result = runner.invoke(
+            app, ["task", "ls", "-f", "args.key == 'value-1'", "--explain"]
+        )
+        assert result.exit_code == 0, result.output
+        assert "task-1" not in result.output  # tasks are not listed
+        if test_type == "unit":
+            assert "not supported" in result.stderr
+        else:
+            assert "plan_summary" in result.output
+
 
 class TestDelete:
     def test_delete_task(self, db_fixture, setup_pending_task):
@@ -604,6 +639,54 @@ def test_update_task_reset_pending(self, db_fixture, cli_create_queue_from_confi
         assert task["task_name"] == "updated-test-task"
         assert task["worker_id"] is None
 
+    def test_update_task_async(self, db_fixture, cli_create_queue_from_config):
+        queue_id = db_fixture._queues.find_one(
+            {"queue_name": cli_create_queue_from_config.queue.queue_name}
+        )["_id"]
+        for i in range(3):
+            db_fixture.create_task(
+                queue_id=queue_id, task_name="async-task", args={"i": i}
+            )
+        db_fixture.create_task(queue_id=queue_id, task_name="other", args={"i": 0})
+
+        result = runner.invoke(
+            app,
+            [
+                "task",
+                "update",
+                "--task-name",
+                "async-task",
+                "--async",
+                "--quiet",
+                "--",
+                "priority=20",
+            ],
+        )
+        assert result.exit_code == 0, result.output + result.stderr
+        assert "background job" in result.output
+        job_id = db_fixture._jobs.find_one({"queue_id": queue_id})["_id"]
+
+        while db_fixture.run_job_chunk():
+            pass
+        priorities = {
+            task["task_name"]: task["priority"]
+            for task in db_fixture._tasks.find({"queue_id": queue_id})
+        }
+        assert priorities == {"async-task": 20, "other": Priority.MEDIUM}
+
+        result = runner.invoke(app, ["job", "get", job_id, "--wait"])
+        assert result.exit_code == 0, result.output
+        assert "success" in result.output
+
+        result = runner.invoke(app, ["job", "get", "missing-job"])
+        assert result.exit_code != 0
+
+        # the editor is not available in a background job
+        result = runner.invoke(
+            app, ["task", "update", "--task-name", "async-task", "--async"]
+        )
+        assert result.exit_code != 0
+
     def test_update_task_running_to_pending(
         self, db_fixture, cli_create_queue_from_config
     ):
@@ -0,0 +1,98 @@
+import pytest
+
+from labtasker import batch, create_queue, ls_tasks, submit_task
+from labtasker.api_models import TaskUpdateRequest
+from labtasker.client.core.exceptions import LabtaskerHTTPStatusError
+from labtasker.server.event_manager import event_manager
+
+pytestmark = [pytest.mark.unit, pytest.mark.integration]
+
+
+@pytest.fixture(autouse=True)
+def setup_queue(client_config):
+    return create_queue(
+        queue_name=client_config.queue.queue_name,
+        password=client_config.queue.password.get_secret_value(),
+    )
+
+
+def test_batch():
+    task_id = submit_task(task_name="existing", args={"x": 0}).task_id
+
+    with batch() as b:
+        submitted = b.submit_task(task_name="new", args={"x": 1})
+        updated = b.update_tasks(
+            task_updates=[TaskUpdateRequest(_id=task_id, args={"x": 2})]
+        )
+        listed = b.ls_tasks(task_name="new")
+        missing = b.get_task(task_id="missing-task")
+        deleted = b.delete_task(task_id=task_id)
+        assert submitted.status_code is None  # not sent yet
+
+    assert submitted.ok and submitted.status_code == 201
+    assert updated.result["content"][0]["args"] == {"x": 2}
+    # the operations run in order
+    assert [t["task_id"] for t in listed.result["content"]] == [
+        submitted.result["task_id"]
+    ]
+    assert not missing.ok and missing.status_code == 404
+    assert deleted.status_code == 204
+
+    assert [t.task_name for t in ls_tasks().content] == ["new"]
+
+
+def test_atomic_batch(setup_queue, monkeypatch):
+    published = []
+    queue_event_manager = event_manager.get_queue_event_manager(setup_queue.queue_id)
+    original_publish = queue_event_manager.publish
+
+    def publish(event):
+        published.append(event)
+        original_publish(event)
+
+    monkeypatch.setattr(queue_event_manager, "publish", publish)
+
+    with batch(atomic=True) as b:
+        first = b.submit_task(task_name="a", args={"x": 1})
+        b.submit_task(task_name="b", args={"x": 2})
+    assert first.status_code == 201
+    assert len(published) == 2  # published once the transaction is committed
+    assert {t.task_name for t in ls_tasks().content} == {"a", "b"}
+
+    published.clear()
+    with pytest.raises(LabtaskerHTTPStatusError) as exc:
+        with batch(atomic=True) as b:
+            b.submit_task(task_name="c", args={"x": 3})
+            b.report_task_status(task_id="missing-task", status="success")
+    assert exc.value.response.status_code == 404
+    assert "Operation 1 (report_task_status)" in exc.value.response.text
+    assert published == []  # the events of the aborted transaction are dropped
+
+
+def test_invalid_batch():
+    with pytest.raises(LabtaskerHTTPStatusError) as exc:
+        with batch() as b:
+            b.submit_task(task_name="a", args={"x": 1})
+            b.add("fetch_task")
+    assert exc.value.response.status_code == 400
+    assert ls_tasks().found is False  # nothing runs
+
+    with batch() as b:
+        invalid = b.submit_task(task_name="a", args={"x": 1}, priority="high")
+        no_id = b.get_task()
+    assert invalid.status_code == 400
+    assert no_id.status_code == 400 and "task_id" in no_id.detail
+
+
+def test_compressed_batch(test_app, monkeypatch):
+    sent = []
+    monkeypatch.setattr(test_app, "event_hooks", {"request": [sent.append]})
+    args = {"data": list(range(1000))}
+
+    with batch(compress=True) as b:
+        results = [b.submit_task(task_name=f"t{i}", args=args) for i in range(10)]
+    assert all(r.status_code == 201 for r in results)
+    assert sent[0].headers["content-encoding"] == "gzip"
+    assert len(sent[0].content) < len(str(args)) * 10 / 5
+
+    assert ls_tasks(limit=100).content[0].args == args
@@ -1,12 +1,16 @@
 import threading
+from typing import Optional
 
 import pytest
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.testclient import TestClient
-from starlette.status import HTTP_204_NO_CONTENT
+from starlette.status import HTTP_204_NO_CONTENT, HTTP_429_TOO_MANY_REQUESTS
 
+from labtasker.api_models import HeartbeatRequest
+from labtasker.client.core.api import refresh_task_heartbeat
 from labtasker.client.core.exceptions import LabtaskerRuntimeError
 from labtasker.client.core.heartbeat import end_heartbeat, start_heartbeat
+from labtasker.client.core.job_runner import report_progress
 from labtasker.client.core.logging import logger
 from labtasker.client.core.paths import set_labtasker_log_dir
 from labtasker.security import get_auth_headers
@@ -35,16 +39,28 @@ def reset(self):
 
 cnt = Counter()
 app = FastAPI()
+app.state.next_interval = None  # the interval recommended by the mock server, if any
+app.state.progress = []  # progress received with the heartbeats
+app.state.busy = 0  # number of heartbeats to reject with 429
 
 
-@app.post(
-    "/api/v1/queues/me/tasks/{task_id}/heartbeat", status_code=HTTP_204_NO_CONTENT
-)
+@app.post("/api/v1/queues/me/tasks/{task_id}/heartbeat")
 def mock_refresh_task_heartbeat_endpoint(
     task_id: str,
+    heartbeat: Optional[HeartbeatRequest] = None,
 ):
+    if app.state.busy > 0:
+        app.state.busy -= 1
+        return Response(
+            status_code=HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": "0"}
+        )
     cnt.incr()
+    if heartbeat and heartbeat.progress is not None:
+        app.state.progress.append(heartbeat.progress)
     logger.debug(f"Received heartbeat for task {task_id}, cnt after incr: {cnt.get()}")
+    if app.state.next_interval is None:
+        return Response(status_code=HTTP_204_NO_CONTENT)
+    return {"next_interval": app.state.next_interval}
 
 
 @pytest.fixture
@@ -93,3 +109,49 @@ def test_heartbeat():
     # try to stop again
     with pytest.raises(LabtaskerRuntimeError):
         end_heartbeat(raise_error=True)
+
+
+def test_adaptive_heartbeat(monkeypatch):
+    cnt.reset()
+    monkeypatch.setattr(app.state, "next_interval", 100.0)  # a heavily loaded server
+    # slowed down by the server, but no more than 3 heartbeats per timeout window
+    start_heartbeat("test_task_id", heartbeat_interval=0.05, heartbeat_timeout=0.9)
+    high_precision_sleep(1.0)
+    end_heartbeat()
+    assert 3 <= cnt.get() <= 5, cnt.get()
+
+
+@pytest.mark.parametrize("progress_min_interval", [None, 0.4])
+def test_progress(client_config, monkeypatch, progress_min_interval):
+    cnt.reset()
+    monkeypatch.setattr(app.state, "progress", [])
+    monkeypatch.setattr(
+        client_config.task, "progress_min_interval", progress_min_interval
+    )
+    monkeypatch.setenv("LABTASKER_TASK_ID", "test_task_id")
+
+    report_progress({"epoch": 0})
+    start_heartbeat("test_task_id", heartbeat_interval=3.0)
+    high_precision_sleep(0.1)
+    assert app.state.progress == [{"epoch": 0}]  # sent with the first heartbeat
+
+    for epoch in range(1, 10):
+        report_progress({"epoch": epoch})
+    high_precision_sleep(0.6)
+    end_heartbeat()
+    if progress_min_interval is None:
+        # waits for the next heartbeat
+        assert app.state.progress == [{"epoch": 0}]
+        assert cnt.get() == 1
+    else:
+        # the latest progress is sent right away, within the rate limit
+        assert app.state.progress[-1] == {"epoch": 9}
+        assert 2 <= len(app.state.progress) == cnt.get() <= 3
+
+
+def test_server_busy_retry(monkeypatch):
+    cnt.reset()
+    monkeypatch.setattr(app.state, "busy", 2)
+    refresh_task_heartbeat("test_task_id")  # retried after Retry-After
+    assert app.state.busy == 0
+    assert cnt.get() == 1
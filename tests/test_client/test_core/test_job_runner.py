@@ -5,9 +5,11 @@
 from labtasker import (
     LabtaskerHTTPStatusError,
     create_queue,
+    current_worker_id,
     finish,
     get_queue,
     ls_tasks,
+    ls_workers,
     submit_task,
     task_info,
 )
@@ -155,3 +157,20 @@ def job(args):
         # all failed tasks should be rejoined into the queue
         # since the most recently failed task will join at the end
         assert task.status == "pending"
+
+
+def test_job_worker_lease(setup_tasks):
+    worker_ids = set()
+
+    @loop_run(required_fields=["arg1", "arg2"], worker_lease=True)
+    def job():
+        worker_ids.add(current_worker_id())
+        finish("success")
+
+    job()
+
+    assert {task.status for task in ls_tasks().content} == {"success"}
+    (worker_id,) = worker_ids
+    (worker,) = [w for w in ls_workers().content if w.worker_id == worker_id]
+    assert worker.lease_timeout is not None
+    assert worker.lease_expires is not None
@@ -1,6 +1,7 @@
+import httpx
 import pytest
 
-from labtasker import create_queue, submit_task
+from labtasker import LabtaskerHTTPStatusError, create_queue, fetch_task, submit_task
 from labtasker.client.core.job_runner import (
     _loop_internal_error_handler,
     loop_run,
@@ -66,3 +67,37 @@ def run_job():
 
     with pytest.raises(CustomError, match="custom"):
         run_job()
+
+
+def test_server_busy_is_not_a_failure(monkeypatch):
+    """A fetch rejected by a busy server is retried after Retry-After, without reaching the handler"""
+    real_fetch_task = fetch_task
+    rejections = []
+
+    def busy_fetch_task(*args, **kwargs):
+        if len(rejections) < 2:
+            request = httpx.Request(
+                "POST", "http://localhost/api/v1/queues/me/tasks/next"
+            )
+            response = httpx.Response(
+                429, headers={"Retry-After": "0"}, request=request
+            )
+            rejections.append(response)
+            raise LabtaskerHTTPStatusError(
+                message="429", request=request, response=response
+            )
+        return real_fetch_task(*args, **kwargs)
+
+    monkeypatch.setattr("labtasker.client.core.job_runner.fetch_task", busy_fetch_task)
+
+    submit_task(task_name="test_task", args={"arg1": 0, "arg2": 1})
+
+    runs = []
+
+    @loop_run(required_fields=["arg1", "arg2"])
+    def run_job():
+        runs.append(1)
+
+    run_job()
+    assert len(rejections) == 2
+    assert runs == [1]
@@ -0,0 +1,94 @@
+import pytest
+from starlette.testclient import TestClient
+
+from labtasker import (
+    create_queue,
+    fetch_task,
+    get_queue,
+    ls_tasks,
+    report_task_status,
+    submit_task,
+)
+from labtasker.client.core.api import NegotiatingClient
+from labtasker.client.core.exceptions import LabtaskerHTTPStatusError
+from labtasker.msgpack_codec import MSGPACK_MEDIA_TYPE
+from labtasker.server.endpoints import app
+
+pytestmark = [pytest.mark.unit, pytest.mark.integration]
+
+
+class NegotiatingTestClient(NegotiatingClient, TestClient):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def setup_queue(client_config):
+    return create_queue(
+        queue_name=client_config.queue.queue_name,
+        password=client_config.queue.password.get_secret_value(),
+    )
+
+
+@pytest.fixture
+def msgpack_client(test_app):
+    """Client negotiating MessagePack, recording the content types of its requests and responses."""
+    client = NegotiatingTestClient(app)
+    client.headers["Authorization"] = test_app.headers["Authorization"]
+    client.content_types = []
+
+    def record(response):
+        client.content_types.append(
+            (
+                response.request.headers.get("content-type"),
+                response.headers.get("content-type"),
+            )
+        )
+
+    client.event_hooks = {"response": [record]}
+    return client
+
+
+def test_parity_with_json(msgpack_client):
+    args = {"nested": {"list": [1, 2.5, None, True, {"x": "y" * 100}] * 10}}
+    task_ids = [
+        submit_task(task_name=f"t{i}", args={**args, "i": i}).task_id for i in range(5)
+    ]
+
+    assert get_queue(client=msgpack_client) == get_queue()
+    assert ls_tasks(client=msgpack_client) == ls_tasks()
+    assert ls_tasks(client=msgpack_client).content[0].args == {**args, "i": 0}
+
+    fetched = fetch_task(eta_max="1h", client=msgpack_client)
+    assert fetched.task.task_id == task_ids[0]
+    report_task_status(
+        task_id=task_ids[0],
+        status="failed",
+        summary={"error": args},
+        client=msgpack_client,
+    )
+    assert ls_tasks(client=msgpack_client) == ls_tasks()
+
+    # responses as MessagePack, then request bodies too once the server replied with it
+    assert msgpack_client.server_msgpack
+    request_types, response_types = zip(*msgpack_client.content_types)
+    assert set(response_types) == {MSGPACK_MEDIA_TYPE}
+    assert MSGPACK_MEDIA_TYPE in request_types
+
+
+def test_errors_stay_json(msgpack_client):
+    with pytest.raises(LabtaskerHTTPStatusError) as exc:
+        report_task_status(
+            task_id="missing-task", status="success", client=msgpack_client
+        )
+    assert exc.value.response.status_code == 404
+    assert exc.value.response.headers["content-type"] == "application/json"
+    assert "detail" in exc.value.response.json()
+
+
+def test_invalid_body(msgpack_client):
+    response = msgpack_client.post(
+        "/api/v1/queues/me/tasks",
+        content=b"\xc1",  # never used in MessagePack
+        headers={"Content-Type": MSGPACK_MEDIA_TYPE},
+    )
+    assert response.status_code == 400
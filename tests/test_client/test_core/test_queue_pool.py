@@ -0,0 +1,112 @@
+import pytest
+from starlette.testclient import TestClient
+
+from labtasker import (
+    LabtaskerValueError,
+    create_queue,
+    current_queue_name,
+    current_worker_id,
+    ls_tasks,
+    submit_task,
+    task_info,
+)
+from labtasker.client.core.config import QueueConfig
+from labtasker.client.core.job_runner import loop_run
+from labtasker.client.core.queue_pool import (
+    QueuePool,
+    _weighted_schedule,
+    parse_queue_spec,
+)
+from labtasker.security import get_auth_headers
+from labtasker.server.endpoints import app
+from tests.fixtures.logging import silence_logger
+
+pytestmark = [
+    pytest.mark.unit,
+    pytest.mark.integration,
+    pytest.mark.usefixtures("silence_logger"),
+]
+
+OTHER_QUEUE = QueueConfig(queue_name="other-queue", password="other-password")
+
+
+@pytest.fixture(autouse=True)
+def setup_queues(client_config, db_fixture, monkeypatch):
+    monkeypatch.setattr(client_config, "queues", [OTHER_QUEUE])
+    other_client = TestClient(app)
+    other_client.headers.update(
+        {
+            **get_auth_headers(OTHER_QUEUE.queue_name, OTHER_QUEUE.password),
+            "Content-Type": "application/json",
+        }
+    )
+    monkeypatch.setattr(
+        "labtasker.client.core.api._queue_httpx_clients",
+        {OTHER_QUEUE.queue_name: other_client},
+    )
+    monkeypatch.setenv("LABTASKER_QUEUE_NAME", "")
+
+    for queue in [client_config.queue, OTHER_QUEUE]:
+        create_queue(
+            queue_name=queue.queue_name,
+            password=queue.password.get_secret_value(),
+        )
+    return other_client
+
+
+def test_parse_queue_spec():
+    assert parse_queue_spec("a") == ("a", 1)
+    assert parse_queue_spec("a:3") == ("a", 3)
+    assert parse_queue_spec(("a", 2)) == ("a", 2)
+    for invalid in ["a:x", "a:0", ("a", 1.5)]:
+        with pytest.raises(LabtaskerValueError):
+            parse_queue_spec(invalid)
+
+
+def test_weighted_schedule():
+    assert _weighted_schedule({"a": 3, "b": 1}) == ["a", "a", "b", "a"]
+    assert _weighted_schedule({"a": 1, "b": 1}) == ["a", "b"]
+
+
+def test_invalid_pool(client_config):
+    with pytest.raises(LabtaskerValueError):
+        QueuePool(["unknown-queue"])  # no credentials
+    with pytest.raises(LabtaskerValueError):
+        QueuePool([client_config.queue.queue_name, client_config.queue.queue_name])
+    pool = QueuePool([client_config.queue.queue_name, OTHER_QUEUE.queue_name])
+    with pytest.raises(LabtaskerValueError):
+        pool.create_workers(worker_id="some-worker")
+
+
+def test_loop_weighted_round_robin(client_config, setup_queues):
+    default_queue = client_config.queue.queue_name
+    for i in range(3):
+        submit_task(task_name=f"a{i}", args={"x": i})
+    for i in range(2):
+        submit_task(task_name=f"b{i}", args={"x": i}, client=setup_queues)
+
+    claimed = []
+
+    @loop_run(
+        required_fields=["x"],
+        queues=[f"{default_queue}:3", f"{OTHER_QUEUE.queue_name}:1"],
+    )
+    def job():
+        claimed.append(
+            (current_queue_name(), task_info().task_name, current_worker_id())
+        )
+
+    job()
+
+    assert [name for _, name, _ in claimed] == ["a0", "a1", "b0", "a2", "b1"]
+    # each queue has its own worker
+    workers = {queue: worker_id for queue, _, worker_id in claimed}
+    assert len(set(workers.values())) == 2
+    assert workers[default_queue] != workers[OTHER_QUEUE.queue_name]
+
+    for client in [None, setup_queues]:
+        tasks = ls_tasks(client=client)
+        assert {task.status for task in tasks.content} == {"success"}
+
+    # the previously active queue is restored after the loop
+    assert current_queue_name() is None
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from labtasker.client.core.exceptions import LabtaskerValueError
+from labtasker.client.core.resources import (
+    ResourceLedger,
+    detect_capacity,
+    resolve_capacity,
+)
+
+pytestmark = [pytest.mark.unit]
+
+
+def test_resolve_capacity():
+    assert resolve_capacity(None) is None
+    assert resolve_capacity("auto") == detect_capacity()
+    assert detect_capacity()["cpus"] >= 1
+
+    capacity = resolve_capacity({"gpus": 2, "cpus": 4})
+    assert capacity["gpus"] == 2 and capacity["cpus"] == 4
+
+    for invalid in ["all", {"gpus": -1}, {"gpus": "2"}]:
+        with pytest.raises(LabtaskerValueError):
+            resolve_capacity(invalid)
+
+
+def test_ledger(tmp_path):
+    path = tmp_path / "resources.json"
+    capacity = {"cpus": 8, "gpus": 2}
+    ledger = ResourceLedger(capacity, path=path)
+    other = ResourceLedger(capacity, path=path)
+    other._key = str(os.getppid())  # another live process
+
+    with other.locked() as free:
+        assert free == capacity
+        other.allocate("task-1", {"cpus": 6, "gpus": 1, "mem_gb": 4})
+
+    with ledger.locked() as free:
+        assert free == {"cpus": 2, "gpus": 1}
+        ledger.allocate("task-2", {"cpus": 2})
+
+    # the own allocation of a loop does not count against itself
+    with ledger.locked() as free:
+        assert free == {"cpus": 2, "gpus": 1}
+    with other.locked() as free:
+        assert free == {"cpus": 6, "gpus": 2}
+
+    other.release()
+    with ledger.locked() as free:
+        assert free == capacity
+
+
+def test_ledger_prunes_dead_loops(tmp_path):
+    path = tmp_path / "resources.json"
+    capacity = {"cpus": 8}
+    dead = ResourceLedger(capacity, path=path)
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    dead._key = str(proc.pid)
+    with dead.locked():
+        dead.allocate("task-1", {"cpus": 8})
+
+    with ResourceLedger(capacity, path=path).locked() as free:
+        assert free == capacity
+
+
+def test_allocate_requires_lock(tmp_path):
+    ledger = ResourceLedger({"cpus": 1}, path=tmp_path / "resources.json")
+    with pytest.raises(RuntimeError):
+        ledger.allocate("task-1", {"cpus": 1})
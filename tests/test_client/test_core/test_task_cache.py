@@ -0,0 +1,76 @@
+import pytest
+
+from labtasker.api_models import TaskChangesResponse
+from labtasker.client.core import task_cache
+from labtasker.client.core.api import create_queue, delete_task, fetch_task, submit_task
+from labtasker.client.core.task_cache import TaskCache
+
+pytestmark = [pytest.mark.unit, pytest.mark.integration, pytest.mark.e2e]
+
+
+@pytest.fixture(autouse=True)
+def setup_queue(client_config, db_fixture):
+    return create_queue(
+        queue_name=client_config.queue.queue_name,
+        password=client_config.queue.password.get_secret_value(),
+    )
+
+
+@pytest.fixture
+def task_ids():
+    return [
+        submit_task(task_name=f"task-{i}", args={"i": i, "tag": i % 2}).task_id
+        for i in range(4)
+    ]
+
+
+def test_sync_and_query(task_ids):
+    cache = TaskCache()
+    assert cache.sync() == 4
+
+    tasks = cache.query(extra_filter={"args.tag": 1}, sort=[("args.i", -1)])
+    assert [t.task_name for t in tasks] == ["task-3", "task-1"]
+    assert [t.task_id for t in cache.query(task_id=task_ids[0])] == task_ids[:1]
+    assert len(cache.query(status="pending", limit=2, offset=1)) == 2
+
+
+def test_incremental_sync(task_ids):
+    TaskCache().sync()
+
+    fetched = fetch_task(worker_id=None, start_heartbeat=False, eta_max="1h")
+    delete_task(task_id=task_ids[3])
+
+    cache = TaskCache()  # loaded from disk
+    assert len(cache.tasks) == 4
+    assert cache.sync() == 2
+    assert set(cache.tasks) == set(task_ids[:3])
+    assert [t.task_id for t in cache.query(status="running")] == [fetched.task.task_id]
+
+
+def test_cache_of_recreated_queue_is_discarded(task_ids, db_fixture, client_config):
+    cache = TaskCache()
+    cache.sync()
+
+    db_fixture.erase()
+    create_queue(
+        queue_name=client_config.queue.queue_name,
+        password=client_config.queue.password.get_secret_value(),
+    )
+    submit_task(task_name="new", args={"i": 0})
+
+    assert TaskCache().sync() == 1
+    assert [t.task_name for t in TaskCache().query()] == ["new"]
+
+
+def test_sync_stops_when_token_does_not_advance(monkeypatch):
+    calls = []
+
+    def ls_task_changes(since, client=None):
+        calls.append(since)
+        return TaskChangesResponse(
+            queue_id="q", revision="5", has_more=True, tombstone_ttl=3600
+        )
+
+    monkeypatch.setattr(task_cache, "ls_task_changes", ls_task_changes)
+    TaskCache().sync()
+    assert calls == ["0", "5"]
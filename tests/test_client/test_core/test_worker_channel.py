@@ -0,0 +1,207 @@
+import threading
+import time
+
+import anyio.from_thread
+import httpx
+import pytest
+
+from labtasker import (
+    create_queue,
+    fetch_task,
+    ls_tasks,
+    refresh_task_heartbeat,
+    report_task_status,
+    submit_task,
+    worker_channel,
+)
+from labtasker.client.core.channel import CHANNEL_PATH
+from labtasker.client.core.job_runner import loop_run
+from labtasker.client.core.logging import logger
+from labtasker.server.admission import admission_controller
+from labtasker.server.endpoints import CHANNEL_OPERATIONS
+from tests.fixtures.logging import silence_logger
+
+pytestmark = [
+    pytest.mark.unit,
+    pytest.mark.integration,
+    pytest.mark.usefixtures("silence_logger"),
+]
+
+
+class AppConnection:
+    """WebSocket connection of the test client, with the interface of the websockets one."""
+
+    def __init__(self, test_app, url):
+        self._context = test_app.websocket_connect(url)
+        self._session = self._context.__enter__()
+
+    def send(self, message):
+        self._session.send_text(message)
+
+    def recv(self):
+        return self._session.receive_text()
+
+    def close(self):
+        self._context.__exit__(None, None, None)
+        # unblock a pending recv(), as closing a websockets connection does
+        self._session._send_queue.put(ConnectionError("connection closed"))
+
+
+@pytest.fixture(autouse=True)
+def setup_queue(client_config):
+    return create_queue(
+        queue_name=client_config.queue.queue_name,
+        password=client_config.queue.password.get_secret_value(),
+    )
+
+
+@pytest.fixture
+def http_requests(test_app, monkeypatch):
+    """Paths of the HTTP requests sent by the test client (except channel handshakes)."""
+    paths = []
+
+    def record(request):
+        if request.url.path != CHANNEL_PATH:
+            paths.append(request.url.path)
+
+    monkeypatch.setattr(test_app, "event_hooks", {"request": [record]})
+    return paths
+
+
+@pytest.fixture
+def ws_connect(test_app, monkeypatch):
+    monkeypatch.setattr(
+        "labtasker.client.core.channel._open_connection",
+        lambda url, headers, uds=None: AppConnection(test_app, url),
+    )
+
+
+def submit(n):
+    return [submit_task(task_name=f"t{i}", args={"x": i}).task_id for i in range(n)]
+
+
+@pytest.mark.usefixtures("ws_connect")
+def test_worker_operations(http_requests):
+    (task_id,) = submit(1)
+    http_requests.clear()
+
+    with worker_channel() as channel:
+        assert channel is not None
+        resp = fetch_task(eta_max="1h")
+        assert resp.task.task_id == task_id
+        assert refresh_task_heartbeat(task_id).next_interval > 0
+        report_task_status(task_id=task_id, status="success")
+    assert http_requests == []  # all sent over the channel
+
+    assert ls_tasks().content[0].status == "success"
+    assert http_requests == ["/api/v1/queues/me/tasks/search"]
+
+
+@pytest.mark.usefixtures("ws_connect")
+def test_errors():
+    with worker_channel():
+        with pytest.raises(Exception) as exc:
+            report_task_status(task_id="missing-task", status="success")
+        assert exc.value.response.status_code == 404
+
+
+@pytest.mark.usefixtures("ws_connect")
+def test_pushed_events():
+    events = []
+    with worker_channel(events=True, on_event=events.append):
+        (task_id,) = submit(1)
+        report_task_status(task_id=task_id, status="cancelled")
+        deadline = time.monotonic() + 5
+        while len(events) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    assert [e.event.new_state for e in events] == ["pending", "cancelled"]
+
+
+@pytest.mark.usefixtures("ws_connect")
+def test_admission_held_until_operation_done(test_app, monkeypatch):
+    started, proceed = threading.Event(), threading.Event()
+    handler, status_code = CHANNEL_OPERATIONS["fetch_task"]
+
+    def slow_fetch(params, queue, db):
+        started.set()
+        proceed.wait(timeout=10)
+        return handler(params, queue, db)
+
+    monkeypatch.setitem(CHANNEL_OPERATIONS, "fetch_task", (slow_fetch, status_code))
+    in_flight = admission_controller.in_flight
+
+    def fetch(channel):
+        try:
+            channel.request(
+                "fetch_task", {"eta_max": "1h"}, httpx.Request("POST", CHANNEL_PATH)
+            )
+        except Exception:
+            pass  # the channel is closed before the reply
+
+    # the event loop of the server keeps running after the connection is closed
+    with anyio.from_thread.start_blocking_portal() as portal:
+        monkeypatch.setattr(test_app, "portal", portal)
+        with worker_channel() as channel:
+            threading.Thread(target=fetch, args=(channel,), daemon=True).start()
+            assert started.wait(timeout=5)
+
+        # the connection is closed, the fetch is still running
+        assert admission_controller.in_flight == in_flight + 1
+        proceed.set()
+        deadline = time.monotonic() + 5
+        while (
+            admission_controller.in_flight != in_flight and time.monotonic() < deadline
+        ):
+            time.sleep(0.05)
+        assert admission_controller.in_flight == in_flight
+
+
+def test_fallback_to_http(monkeypatch, http_requests):
+    def refuse(url, headers, uds=None):
+        raise ConnectionRefusedError("no channel")
+
+    monkeypatch.setattr("labtasker.client.core.channel._open_connection", refuse)
+    (task_id,) = submit(1)
+    with worker_channel() as channel:
+        assert channel is None
+        assert fetch_task(eta_max="1h").task.task_id == task_id
+    assert "/api/v1/queues/me/tasks/next" in http_requests
+
+
+@pytest.mark.usefixtures("ws_connect")
+def test_closed_channel_falls_back_to_http(http_requests):
+    (task_id,) = submit(1)
+    with worker_channel() as channel:
+        channel.close()
+        assert fetch_task(eta_max="1h").task.task_id == task_id
+    assert "/api/v1/queues/me/tasks/next" in http_requests
+
+
+@pytest.mark.usefixtures("ws_connect")
+def test_loop_overhead_benchmark(http_requests):
+    """Per-task overhead of the task loop, over HTTP and over the worker channel."""
+    n_tasks = 20
+
+    def run_loop(use_channel):
+        submit(n_tasks)
+        http_requests.clear()
+
+        @loop_run(required_fields=["x"], worker_channel=use_channel)
+        def job():
+            pass
+
+        start = time.perf_counter()
+        job()
+        elapsed = time.perf_counter() - start
+        return elapsed / n_tasks, len(http_requests) / n_tasks
+
+    http_time, http_per_task = run_loop(use_channel=False)
+    channel_time, channel_per_task = run_loop(use_channel=True)
+    logger.info(
+        f"Per task: HTTP {http_time * 1000:.1f} ms ({http_per_task:.1f} requests), "
+        f"worker channel {channel_time * 1000:.1f} ms ({channel_per_task:.1f} requests)"
+    )
+
+    assert http_per_task >= 3  # fetch, cmd update, report (and heartbeats)
+    assert channel_per_task < 0.5  # only the setup of the loop
+    assert {t.status for t in ls_tasks(limit=1000).content} == {"success"}
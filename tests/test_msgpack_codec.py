@@ -0,0 +1,145 @@
+import enum
+import inspect
+import json
+import re
+import typing
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, SecretStr
+
+from labtasker import api_models
+from labtasker.msgpack_codec import accepts_msgpack, is_msgpack, packb, unpackb
+
+pytestmark = [pytest.mark.unit]
+
+NOW = datetime(2025, 3, 1, 12, 30, 45, 123456)
+
+NESTED = {"a": {"b": [1, 2.5, None, True, "x", {"c": []}]}, "d": "e"}
+
+# values of the fields a generic sample would not validate
+FIELD_SAMPLES = {
+    "paths": ["args.x", "metadata.tag"],
+    "sort": [("args.x", 1), ("created_at", -1)],
+}
+
+API_MODELS = [
+    model
+    for _, model in inspect.getmembers(api_models, inspect.isclass)
+    if issubclass(model, BaseModel) and model.__module__ == api_models.__name__
+]
+
+
+def sample(annotation):
+    """A sample value of a type annotation."""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if annotation is typing.Any:
+        return NESTED
+    if origin is typing.Union:
+        return sample(next(arg for arg in args if arg is not type(None)))
+    if origin is typing.Literal:
+        return args[0]
+    if origin in (list, set):
+        return [sample(args[0]), sample(args[0])] if args else [1, "x"]
+    if origin is tuple:
+        return tuple(sample(arg) for arg in args if arg is not Ellipsis)
+    if origin is dict:
+        return {"key": sample(args[1])} if args else NESTED
+    if inspect.isclass(annotation):
+        if issubclass(annotation, BaseModel):
+            return sample_model(annotation)
+        if issubclass(annotation, enum.Enum):
+            return list(annotation)[0]
+        if issubclass(annotation, bool):
+            return True
+        if issubclass(annotation, int):
+            return 3
+        if issubclass(annotation, float):
+            return 0.5
+        if issubclass(annotation, datetime):
+            return NOW
+        if issubclass(annotation, SecretStr):
+            return SecretStr("secret")
+        if issubclass(annotation, str):
+            return "abc"
+        if annotation is dict:
+            return NESTED
+        if annotation is list:
+            return [1, "x"]
+    raise NotImplementedError(f"No sample for {annotation!r}")
+
+
+def sample_field(name, field):
+    if name in FIELD_SAMPLES:
+        return FIELD_SAMPLES[name]
+    if field.default is not None and not field.is_required():
+        return field.default
+    for constraint in field.metadata:
+        # e.g. "^(pending|running)$"
+        match = re.match(r"\^\((\w+)\|", getattr(constraint, "pattern", None) or "")
+        if match:
+            return match.group(1)
+    return sample(field.annotation)
+
+
+def sample_model(model):
+    """A sample instance of a model, with all its fields set."""
+    return model.model_validate(
+        {name: sample_field(name, field) for name, field in model.model_fields.items()}
+    )
+
+
+@pytest.mark.parametrize("model", API_MODELS, ids=lambda m: m.__name__)
+def test_parity_with_json(model):
+    instance = sample_model(model)
+
+    # responses: FastAPI renders the content serialized in JSON mode
+    content = instance.model_dump(mode="json")
+    assert model.model_validate(unpackb(packb(content))) == model.model_validate(
+        json.loads(json.dumps(content))
+    )
+
+    # requests: the client sends Python dicts
+    if hasattr(instance, "to_request_dict"):
+        payload = instance.to_request_dict()
+    else:
+        payload = instance.model_dump()
+    from_msgpack = model.model_validate(unpackb(packb(payload)))
+    from_json = model.model_validate(json.loads(json.dumps(jsonable_encoder(payload))))
+    assert from_msgpack == from_json
+    assert from_msgpack == model.model_validate(payload)
+
+
+def test_datetimes():
+    aware = datetime(2025, 3, 1, 12, 30, 45, 123456, tzinfo=timezone.utc)
+    decoded = unpackb(packb({"naive": NOW, "aware": aware}))
+    assert decoded == {"naive": NOW, "aware": aware}
+    assert decoded["naive"].tzinfo is None
+    assert decoded["aware"].tzinfo is not None
+
+    # timestamps, not strings
+    assert len(packb(NOW)) < len(json.dumps(NOW.isoformat()))
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, False),
+        ("application/json", False),
+        ("application/msgpack", True),
+        ("application/msgpack, application/json", True),
+        ("application/json, Application/MsgPack; q=0.9", True),
+        ("application/msgpack;q=0", False),
+    ],
+)
+def test_accepts_msgpack(header, expected):
+    assert accepts_msgpack(header) is expected
+
+
+def test_is_msgpack():
+    assert is_msgpack("application/msgpack")
+    assert is_msgpack("application/msgpack; charset=utf-8")
+    assert not is_msgpack("application/json")
+    assert not is_msgpack(None)
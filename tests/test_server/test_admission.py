@@ -0,0 +1,108 @@
+import anyio.to_thread
+import pytest
+from starlette.status import HTTP_200_OK, HTTP_429_TOO_MANY_REQUESTS
+
+from labtasker.api_models import ServerMetricsResponse, TaskSubmitRequest
+from labtasker.server.admission import (
+    PRIORITY_CRITICAL,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    AdmissionController,
+    admission_controller,
+    priority_class,
+    size_threadpool,
+)
+from tests.fixtures.server import test_app
+
+pytestmark = [pytest.mark.unit]
+
+
+@pytest.fixture
+def max_concurrency(server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "admission_max_concurrency", 4)
+
+
+def test_priority_class():
+    assert priority_class("POST", "/api/v1/queues/me/tasks/t1/heartbeat") == (
+        PRIORITY_CRITICAL
+    )
+    assert priority_class("POST", "/api/v1/queues/me/tasks/t1/status") == (
+        PRIORITY_CRITICAL
+    )
+    assert priority_class("POST", "/api/v1/queues/me/workers/w1/lease") == (
+        PRIORITY_CRITICAL
+    )
+    assert priority_class("POST", "/api/v1/queues/me/tasks/next") == PRIORITY_NORMAL
+    assert priority_class("POST", "/api/v1/queues/me/tasks") == PRIORITY_NORMAL
+    assert priority_class("POST", "/api/v1/queues/me/tasks/search") == PRIORITY_LOW
+    assert priority_class("GET", "/api/v1/queues/me/tasks/t1") == PRIORITY_LOW
+    for path in ["/health", "/api/v1/queues/me/events", "/api/v1/metrics"]:
+        assert priority_class("GET", path) is None
+
+
+@pytest.mark.anyio
+async def test_threadpool_holds_admitted_requests(server_config, monkeypatch):
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    default = limiter.total_tokens
+    monkeypatch.setattr(server_config, "admission_max_concurrency", default + 24)
+    size_threadpool()
+    assert limiter.total_tokens == default + 24
+
+    monkeypatch.setattr(server_config, "admission_max_concurrency", 0)  # disabled
+    size_threadpool()
+    assert limiter.total_tokens == default + 24  # never shrunk
+
+
+@pytest.mark.usefixtures("max_concurrency")
+class TestAdmissionController:
+    def test_priority_shares(self):
+        controller = AdmissionController()
+        assert controller.try_acquire(PRIORITY_LOW)
+        assert controller.try_acquire(PRIORITY_LOW)
+        assert not controller.try_acquire(PRIORITY_LOW)  # 50% of the budget
+        assert controller.try_acquire(PRIORITY_NORMAL)
+        assert not controller.try_acquire(PRIORITY_NORMAL)  # 75% of the budget
+        assert controller.try_acquire(PRIORITY_CRITICAL)
+        assert not controller.try_acquire(PRIORITY_CRITICAL)
+
+        controller.release()
+        assert controller.try_acquire(PRIORITY_CRITICAL)
+        assert controller.metrics() == {
+            "in_flight": 4,
+            "admitted": {PRIORITY_CRITICAL: 2, PRIORITY_NORMAL: 1, PRIORITY_LOW: 2},
+            "rejected": {PRIORITY_CRITICAL: 1, PRIORITY_NORMAL: 1, PRIORITY_LOW: 1},
+        }
+
+    def test_disabled(self, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "admission_max_concurrency", 0)
+        controller = AdmissionController()
+        assert all(controller.try_acquire(PRIORITY_LOW) for _ in range(100))
+
+    @pytest.mark.integration
+    def test_busy_server(
+        self, test_app, queue_create_request, auth_headers, monkeypatch
+    ):
+        test_app.post("/api/v1/queues", json=queue_create_request.to_request_dict())
+        task_id = test_app.post(
+            "/api/v1/queues/me/tasks",
+            json=TaskSubmitRequest(args={"a": 1}).model_dump(),
+            headers=auth_headers,
+        ).json()["task_id"]
+
+        # 3 requests being handled, out of 4
+        monkeypatch.setattr(admission_controller, "in_flight", 3)
+        response = test_app.get("/api/v1/queues/me", headers=auth_headers)
+        assert response.status_code == HTTP_429_TOO_MANY_REQUESTS
+        assert response.headers["Retry-After"] == "1"
+        response = test_app.post("/api/v1/queues/me/tasks/next", headers=auth_headers)
+        assert response.status_code == HTTP_429_TOO_MANY_REQUESTS
+
+        # heartbeats are still admitted
+        response = test_app.post(
+            f"/api/v1/queues/me/tasks/{task_id}/heartbeat", headers=auth_headers
+        )
+        assert response.status_code == HTTP_200_OK
+        assert admission_controller.in_flight == 3
+
+        metrics = ServerMetricsResponse(**test_app.get("/api/v1/metrics").json())
+        assert metrics.admission.rejected[PRIORITY_LOW] >= 1
@@ -0,0 +1,203 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+from starlette.status import (
+    HTTP_201_CREATED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+)
+
+from labtasker.api_models import TaskLsRequest, TaskSubmitRequest
+from labtasker.content_encoding import (
+    GZIP,
+    ZSTD,
+    StreamCompressor,
+    compress,
+    decompress,
+    negotiate_encoding,
+)
+from labtasker.server.compression import CompressionMiddleware
+from tests.fixtures.server import test_app
+
+pytestmark = [pytest.mark.unit]
+
+LARGE_ARGS = {"nested": {"values": list(range(200)), "text": "x" * 2000}}
+
+
+@pytest.fixture
+def queue(test_app, queue_create_request, auth_headers):
+    test_app.post("/api/v1/queues", json=queue_create_request.to_request_dict())
+    for i in range(5):
+        test_app.post(
+            "/api/v1/queues/me/tasks",
+            json=TaskSubmitRequest(args={**LARGE_ARGS, "i": i}).model_dump(),
+            headers=auth_headers,
+        )
+
+
+def search(test_app, auth_headers, accept_encoding, limit=100):
+    return test_app.post(
+        "/api/v1/queues/me/tasks/search",
+        json=TaskLsRequest(limit=limit).model_dump(),
+        headers={**auth_headers, "Accept-Encoding": accept_encoding},
+    )
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, deflate") == GZIP
+    assert negotiate_encoding("gzip;q=0, deflate") is None
+    assert negotiate_encoding("*") in (GZIP, ZSTD)
+
+
+def test_stream_compressor_flushes_each_chunk():
+    compressor = StreamCompressor(GZIP)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in [b"data: 1\n\n", b"data: 2\n\n"]:
+        # each chunk can be decompressed as soon as it is received
+        assert decompressor.decompress(compressor.compress(chunk)) == chunk
+    decompressor.decompress(compressor.finish())
+    assert decompressor.eof
+
+
+@pytest.mark.integration
+@pytest.mark.usefixtures("queue")
+class TestResponses:
+    def test_compressed(self, test_app, auth_headers):
+        response = search(test_app, auth_headers, "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < len(response.content) / 5
+        assert len(response.json()["content"]) == 5
+
+    def test_identity(self, test_app, auth_headers):
+        response = search(test_app, auth_headers, "identity")
+        assert "content-encoding" not in response.headers
+        assert len(response.json()["content"]) == 5
+
+    def test_below_threshold(self, test_app, auth_headers):
+        response = test_app.get(
+            "/api/v1/queues/me", headers={**auth_headers, "Accept-Encoding": "gzip"}
+        )
+        assert "content-encoding" not in response.headers
+
+    def test_threshold(self, test_app, auth_headers, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "compression_min_size", 10**9)
+        assert "content-encoding" not in search(test_app, auth_headers, "gzip").headers
+        monkeypatch.setattr(server_config, "compression_min_size", -1)  # disabled
+        assert "content-encoding" not in search(test_app, auth_headers, "gzip").headers
+
+    def test_level(self, test_app, auth_headers, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "compression_level", 1)
+        fast = int(search(test_app, auth_headers, "gzip").headers["content-length"])
+        monkeypatch.setattr(server_config, "compression_level", 9)
+        best = int(search(test_app, auth_headers, "gzip").headers["content-length"])
+        assert best < fast
+
+    def test_zstd(self, test_app, auth_headers):
+        pytest.importorskip("zstandard")
+        response = search(test_app, auth_headers, "gzip, zstd")
+        assert response.headers["content-encoding"] == "zstd"
+        assert len(response.json()["content"]) == 5
+
+
+def test_streamed_response(server_config):
+    async def stream(request):
+        async def chunks():
+            for i in range(3):
+                yield f"{i}\n".encode()
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    app = CompressionMiddleware(Starlette(routes=[Route("/stream", stream)]))
+    messages = []
+
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()  # no disconnect
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/stream",
+        "headers": [(b"accept-encoding", b"gzip")],
+        "query_string": b"",
+    }
+    asyncio.run(app(scope, receive, send))
+
+    start, *bodies = messages
+    assert (b"content-encoding", b"gzip") in start["headers"]
+    # streamed responses are compressed whatever their size, chunk by chunk
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = [decompressor.decompress(m["body"]) for m in bodies]
+    assert received[:3] == [b"0\n", b"1\n", b"2\n"]
+    assert decompressor.eof
+
+
+@pytest.mark.integration
+class TestRequests:
+    def submit(self, test_app, auth_headers, body, content_encoding):
+        return test_app.post(
+            "/api/v1/queues/me/tasks",
+            content=body,
+            headers={
+                **auth_headers,
+                "Content-Type": "application/json",
+                "Content-Encoding": content_encoding,
+            },
+        )
+
+    @pytest.fixture(autouse=True)
+    def setup_queue(self, test_app, queue_create_request):
+        test_app.post("/api/v1/queues", json=queue_create_request.to_request_dict())
+
+    def test_compressed_body(self, test_app, auth_headers):
+        body = TaskSubmitRequest(args=LARGE_ARGS).model_dump_json().encode()
+        response = self.submit(test_app, auth_headers, gzip.compress(body), "gzip")
+        assert response.status_code == HTTP_201_CREATED
+
+        task_id = response.json()["task_id"]
+        task = test_app.get(f"/api/v1/queues/me/tasks/{task_id}", headers=auth_headers)
+        assert task.json()["args"] == LARGE_ARGS
+
+    def test_zstd_body(self, test_app, auth_headers):
+        pytest.importorskip("zstandard")
+        body = TaskSubmitRequest(args=LARGE_ARGS).model_dump_json().encode()
+        response = self.submit(test_app, auth_headers, compress(body, ZSTD), "zstd")
+        assert response.status_code == HTTP_201_CREATED
+
+    def test_invalid_body(self, test_app, auth_headers):
+        response = self.submit(test_app, auth_headers, b"not gzip", "gzip")
+        assert response.status_code == HTTP_400_BAD_REQUEST
+
+    def test_unsupported_encoding(self, test_app, auth_headers):
+        response = self.submit(test_app, auth_headers, b"{}", "br")
+        assert response.status_code == HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        assert "gzip" in response.headers["accept-encoding"]
+
+    def test_too_large(self, test_app, auth_headers, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "max_decompressed_body_size", 100)
+        body = TaskSubmitRequest(args=LARGE_ARGS).model_dump_json().encode()
+        response = self.submit(test_app, auth_headers, gzip.compress(body), "gzip")
+        assert response.status_code == HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+def test_decompress_roundtrip():
+    data = b"labtasker" * 1000
+    assert decompress(compress(data, GZIP), GZIP) == data
+    assert decompress(compress(data, GZIP), "GZIP ") == data
+    with pytest.raises(ValueError):
+        decompress(compress(data, GZIP)[:-10], GZIP)  # truncated
@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from freezegun import freeze_time
+
+
+@pytest.fixture(params=[256, 0], ids=["ready_queue", "no_ready_queue"])
+def ready_queue_size(request, server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "ready_queue_size", request.param)
+
+
+@pytest.fixture
+def queue_id(db_fixture, queue_args):
+    return db_fixture.create_queue(**queue_args)
+
+
+def submit(db, queue_id, dataset, **kwargs):
+    return db.create_task(queue_id=queue_id, args={"dataset": dataset}, **kwargs)
+
+
+def fetch_dataset(db, queue_id, **kwargs):
+    task = db.fetch_task(queue_id=queue_id, **kwargs)
+    return task["args"]["dataset"] if task else None
+
+
+WARM_B = {"args.dataset": ["b"]}
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+@pytest.mark.usefixtures("ready_queue_size")
+class TestAffinityFetch:
+    def test_prefers_matching_task(self, db_fixture, queue_id):
+        for dataset in ["a", "b", "a", "b"]:
+            submit(db_fixture, queue_id, dataset)
+
+        assert fetch_dataset(db_fixture, queue_id, affinity=WARM_B) == "b"
+        assert fetch_dataset(db_fixture, queue_id, affinity=WARM_B) == "b"
+        # nothing warm left: normal order
+        assert fetch_dataset(db_fixture, queue_id, affinity=WARM_B) == "a"
+        assert fetch_dataset(db_fixture, queue_id) == "a"
+        assert fetch_dataset(db_fixture, queue_id, affinity=WARM_B) is None
+
+    def test_priority_first(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "b", priority=0)
+        submit(db_fixture, queue_id, "a", priority=20)
+        assert fetch_dataset(db_fixture, queue_id, affinity=WARM_B) == "a"
+
+    def test_wait_bound(self, db_fixture, queue_id, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "affinity_max_wait", 60)
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            submit(db_fixture, queue_id, "a")
+            frozen_time.tick(timedelta(seconds=1))
+            submit(db_fixture, queue_id, "b")
+            submit(db_fixture, queue_id, "b")
+
+            assert fetch_dataset(db_fixture, queue_id, affinity=WARM_B) == "b"
+
+            # "a" has been passed over for too long
+            frozen_time.tick(timedelta(seconds=60))
+            assert fetch_dataset(db_fixture, queue_id, affinity=WARM_B) == "a"
+
+    def test_required_fields(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "a")
+        db_fixture.create_task(queue_id=queue_id, args={"dataset": "b", "extra": 1})
+        assert (
+            fetch_dataset(
+                db_fixture, queue_id, required_fields=["dataset"], affinity=WARM_B
+            )
+            == "a"
+        )
+
+    def test_batch(self, db_fixture, queue_id):
+        for dataset in ["a", "b", "c"]:
+            submit(db_fixture, queue_id, dataset)
+        results = db_fixture.fetch_tasks_batch(
+            queue_id=queue_id,
+            requests=[
+                {"affinity": {"args.dataset": ["c"]}},
+                {"affinity": {"args.dataset": ["c", "b"]}},
+                {},
+            ],
+        )
+        assert [r["args"]["dataset"] for r in results] == ["c", "b", "a"]
+
+    def test_invalid_path(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "a")
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.fetch_task(queue_id=queue_id, affinity={"status": ["pending"]})
+        assert exc.value.status_code == 400
+
+    def test_metrics(self, db_fixture, queue_id):
+        before = db_fixture.affinity_metrics()
+        for dataset in ["a", "b"]:
+            submit(db_fixture, queue_id, dataset)
+        fetch_dataset(db_fixture, queue_id, affinity=WARM_B)  # hit
+        fetch_dataset(db_fixture, queue_id, affinity=WARM_B)  # miss
+        fetch_dataset(db_fixture, queue_id, affinity=WARM_B)  # no task
+        fetch_dataset(db_fixture, queue_id)
+
+        after = db_fixture.affinity_metrics()
+        assert after["requests"] - before["requests"] == 2
+        assert after["hits"] - before["hits"] == 1
@@ -0,0 +1,184 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from freezegun import freeze_time
+
+
+@pytest.fixture(params=[256, 0], ids=["ready_queue", "no_ready_queue"])
+def ready_queue_size(request, server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "ready_queue_size", request.param)
+
+
+@pytest.fixture
+def queue_id(db_fixture, queue_args):
+    return db_fixture.create_queue(**queue_args)
+
+
+def submit(db, queue_id, name, **kwargs):
+    return db.create_task(queue_id=queue_id, task_name=name, args={"n": 1}, **kwargs)
+
+
+def fetch_name(db, queue_id, **kwargs):
+    task = db.fetch_task(queue_id=queue_id, **kwargs)
+    return task["task_name"] if task else None
+
+
+def running(db, queue_id):
+    return {
+        (usage["key"], usage["value"]): usage["running"]
+        for usage in db.ls_concurrency_limits(queue_id=queue_id)["running"]
+    }
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+@pytest.mark.usefixtures("ready_queue_size")
+class TestConcurrencyLimits:
+    def test_task_name_limit(self, db_fixture, queue_id):
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="task_name", value="render", limit=2
+        )
+        for _ in range(3):
+            submit(db_fixture, queue_id, "render", priority=20)
+        submit(db_fixture, queue_id, "other")
+
+        names = [fetch_name(db_fixture, queue_id) for _ in range(4)]
+        assert names == ["render", "render", "other", None]
+        assert running(db_fixture, queue_id) == {("task_name", "render"): 2}
+
+    def test_released_on_terminal_transition(self, db_fixture, queue_id):
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="task_name", value="render", limit=1
+        )
+        for _ in range(3):
+            submit(db_fixture, queue_id, "render", max_retries=2)
+
+        task = db_fixture.fetch_task(queue_id=queue_id)
+        assert fetch_name(db_fixture, queue_id) is None
+
+        # failed and retried: back to pending
+        db_fixture.report_task_status(
+            queue_id=queue_id, task_id=task["_id"], report_status="failed"
+        )
+        task = db_fixture.fetch_task(queue_id=queue_id)
+        db_fixture.report_task_status(
+            queue_id=queue_id, task_id=task["_id"], report_status="success"
+        )
+        task = db_fixture.fetch_task(queue_id=queue_id)
+        db_fixture.update_task(
+            queue_id=queue_id,
+            task_id=task["_id"],
+            task_setting_update={"status": "cancelled"},
+        )
+        task = db_fixture.fetch_task(queue_id=queue_id)
+        assert task is not None
+        db_fixture.delete_task(queue_id=queue_id, task_id=task["_id"])
+        assert running(db_fixture, queue_id) == {("task_name", "render"): 0}
+        submit(db_fixture, queue_id, "render")
+        assert fetch_name(db_fixture, queue_id) == "render"
+
+    def test_released_on_raw_status_update(self, db_fixture, queue_id):
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="task_name", value="render", limit=1
+        )
+        submit(db_fixture, queue_id, "render")
+        submit(db_fixture, queue_id, "render")
+        task = db_fixture.fetch_task(queue_id=queue_id)
+
+        db_fixture.update_collection(
+            queue_id=queue_id,
+            collection_name="tasks",
+            query={"_id": task["_id"]},
+            update={"$set": {"status": "failed"}},
+        )
+        assert running(db_fixture, queue_id) == {("task_name", "render"): 0}
+        assert (
+            db_fixture._tasks.find_one({"_id": task["_id"]})["concurrency_slots"] == []
+        )
+        assert fetch_name(db_fixture, queue_id) == "render"
+
+    def test_released_on_timeout(self, db_fixture, queue_id):
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="task_name", value="render", limit=1
+        )
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            submit(db_fixture, queue_id, "render", heartbeat_timeout=60)
+            submit(db_fixture, queue_id, "render", heartbeat_timeout=60)
+            assert fetch_name(db_fixture, queue_id) == "render"
+            assert fetch_name(db_fixture, queue_id) is None
+
+            frozen_time.tick(timedelta(seconds=61))
+            assert db_fixture.handle_timeouts()
+            assert fetch_name(db_fixture, queue_id) == "render"
+
+    def test_limit_per_metadata_value(self, db_fixture, queue_id):
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="metadata.license", limit=1
+        )
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="metadata.license", value="matlab", limit=2
+        )
+        for license in ["ansys", "ansys", "matlab", "matlab", "matlab"]:
+            submit(db_fixture, queue_id, license, metadata={"license": license})
+
+        names = [fetch_name(db_fixture, queue_id) for _ in range(4)]
+        assert names == ["ansys", "matlab", "matlab", None]
+        assert running(db_fixture, queue_id) == {
+            ("metadata.license", "ansys"): 1,
+            ("metadata.license", "matlab"): 2,
+        }
+
+    def test_batch(self, db_fixture, queue_id):
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="task_name", value="render", limit=1
+        )
+        submit(db_fixture, queue_id, "render")
+        submit(db_fixture, queue_id, "render")
+        submit(db_fixture, queue_id, "other")
+        results = db_fixture.fetch_tasks_batch(queue_id=queue_id, requests=[{}] * 3)
+        assert [r["task_name"] if r else None for r in results] == [
+            "render",
+            "other",
+            None,
+        ]
+
+    def test_sweep(self, db_fixture, queue_id):
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="task_name", value="point", limit=1
+        )
+        db_fixture.create_sweep(
+            queue_id=queue_id, axes={"i": [0, 1, 2]}, task_name="point"
+        )
+        assert fetch_name(db_fixture, queue_id) == "point"
+        assert fetch_name(db_fixture, queue_id) is None
+
+    def test_set_limit_counts_running_tasks(self, db_fixture, queue_id):
+        for _ in range(3):
+            submit(db_fixture, queue_id, "render")
+        tasks = [db_fixture.fetch_task(queue_id=queue_id) for _ in range(2)]
+
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="task_name", value="render", limit=2
+        )
+        assert running(db_fixture, queue_id) == {("task_name", "render"): 2}
+        assert fetch_name(db_fixture, queue_id) is None
+
+        db_fixture.report_task_status(
+            queue_id=queue_id, task_id=tasks[0]["_id"], report_status="success"
+        )
+        assert fetch_name(db_fixture, queue_id) == "render"
+
+        # removing the limit drops the counters
+        db_fixture.set_concurrency_limit(
+            queue_id=queue_id, key="task_name", value="render", limit=None
+        )
+        assert running(db_fixture, queue_id) == {}
+
+    def test_invalid(self, db_fixture, queue_id):
+        for key, limit in [("args.foo", 1), ("status", 1), ("task_name", 0)]:
+            with pytest.raises(HTTPException) as exc:
+                db_fixture.set_concurrency_limit(
+                    queue_id=queue_id, key=key, limit=limit
+                )
+            assert exc.value.status_code == 400
@@ -710,7 +710,7 @@ def test_update_queue_name(db_fixture, queue_args):
 
     # Update the queue name
     new_name = "updated_queue_name"
-    db_fixture.update_queue(queue_id=queue_id, new_queue_name=new_name)
+    assert db_fixture.update_queue(queue_id=queue_id, new_queue_name=new_name) == 1
 
     # Verify the update
     queue = db_fixture._queues.find_one({"_id": queue_id})
@@ -875,3 +875,40 @@ def test_update_collection(db_fixture, queue_args):
     assert updated_task is not None
     assert updated_task["task_name"] == "updated_task_name"
     assert updated_task["priority"] == Priority.HIGH
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+def test_query_collection_id_alias(db_fixture, queue_args):
+    queue_id = db_fixture.create_queue(**queue_args)
+    task_ids = [
+        db_fixture.create_task(queue_id=queue_id, args={"i": i}) for i in range(3)
+    ]
+
+    # filter on alias
+    result = db_fixture.query_collection(
+        queue_id=queue_id,
+        collection_name="tasks",
+        query={"$or": [{"task_id": task_ids[0]}, {"task_id": task_ids[2]}]},
+        sort=[("task_id", -1)],
+    )
+    assert [t["task_id"] for t in result] == sorted(
+        [task_ids[0], task_ids[2]], reverse=True
+    )
+    assert all("_id" not in t for t in result)
+
+    # alias is still available to $expr
+    result = db_fixture.query_collection(
+        queue_id=queue_id,
+        collection_name="tasks",
+        query={"$expr": {"$eq": ["$task_id", task_ids[1]]}},
+    )
+    assert [t["task_id"] for t in result] == [task_ids[1]]
+
+    # queues are matched by their _id through the queue_id alias
+    result = db_fixture.query_collection(
+        queue_id=queue_id, collection_name="queues", query={}
+    )
+    assert len(result) == 1
+    assert result[0]["queue_id"] == queue_id
+    assert "password" not in result[0]
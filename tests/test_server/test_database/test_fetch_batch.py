@@ -0,0 +1,82 @@
+import pytest
+from fastapi import HTTPException
+
+from labtasker.server.fsm import TaskState
+
+
+@pytest.fixture
+def queue_id(db_fixture, queue_args):
+    return db_fixture.create_queue(**queue_args)
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestFetchTasksBatch:
+    def test_distinct_tasks_in_request_order(self, db_fixture, queue_id):
+        task_ids = [
+            db_fixture.create_task(queue_id=queue_id, args={"i": i}, priority=i)
+            for i in range(3)
+        ]
+        results = db_fixture.fetch_tasks_batch(queue_id=queue_id, requests=[{}] * 4)
+
+        # highest priority first, in request order
+        assert [r["_id"] for r in results[:3]] == task_ids[::-1]
+        assert results[3] is None
+        for r in results[:3]:
+            assert r["status"] == TaskState.RUNNING
+            assert r["task_id"] == r["_id"]
+
+        # claimed in one revision
+        assert len({r["revision"] for r in results[:3]}) == 1
+
+    def test_shapes(self, db_fixture, queue_id):
+        a = db_fixture.create_task(queue_id=queue_id, args={"a": 1}, priority=2)
+        b = db_fixture.create_task(queue_id=queue_id, args={"b": 1}, priority=1)
+        c = db_fixture.create_task(queue_id=queue_id, args={"a": 2}, priority=0)
+
+        results = db_fixture.fetch_tasks_batch(
+            queue_id=queue_id,
+            requests=[
+                {"required_fields": ["b"]},
+                {"extra_filter": {"args.a": {"$exists": True}}},
+                {},  # any shape, must not be handed out an already claimed task
+                {"required_fields": ["b"]},
+            ],
+        )
+        assert results[0]["_id"] == b
+        assert results[1]["_id"] == a
+        assert results[2]["_id"] == c
+        assert results[3] is None
+
+    def test_errors_are_per_request(self, db_fixture, queue_id):
+        task_id = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        worker_id = db_fixture.create_worker(queue_id=queue_id)
+
+        results = db_fixture.fetch_tasks_batch(
+            queue_id=queue_id,
+            requests=[
+                {"worker_id": "nonexistent"},
+                {"start_heartbeat": False},  # eta_max missing
+                {"worker_id": worker_id, "eta_max": "1h", "start_heartbeat": False},
+            ],
+        )
+        assert isinstance(results[0], HTTPException)
+        assert results[0].status_code == 404
+        assert isinstance(results[1], HTTPException)
+        assert results[1].status_code == 400
+
+        assert results[2]["_id"] == task_id
+        assert results[2]["worker_id"] == worker_id
+        assert results[2]["task_timeout"] == 3600
+        assert results[2]["last_heartbeat"] is None
+
+    def test_fetch_task_raises(self, db_fixture, queue_id):
+        db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.fetch_task(queue_id=queue_id, worker_id="nonexistent")
+        assert exc.value.status_code == 404
+
+    def test_invalid_requests(self, db_fixture, queue_id):
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.fetch_tasks_batch(queue_id=queue_id, requests=["not a dict"])
+        assert exc.value.status_code == 400
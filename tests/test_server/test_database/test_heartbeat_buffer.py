@@ -0,0 +1,173 @@
+from datetime import timedelta
+
+import pytest
+from freezegun import freeze_time
+
+from labtasker.server.fsm import TaskState
+
+
+@pytest.fixture
+def buffered(server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "heartbeat_flush_interval", 5.0)
+
+
+@pytest.fixture
+def queue_id(db_fixture, queue_args):
+    return db_fixture.create_queue(**queue_args)
+
+
+@pytest.fixture
+def write_ops(db_fixture, monkeypatch):
+    """Count write calls to the tasks collection."""
+    counter = {"update_one": 0, "find_one_and_update": 0, "bulk_write": 0}
+    for name in counter:
+        method = getattr(db_fixture._tasks, name)
+
+        def counted(*args, _name=name, _method=method, **kwargs):
+            counter[_name] += 1
+            return _method(*args, **kwargs)
+
+        monkeypatch.setattr(db_fixture._tasks, name, counted)
+    return counter
+
+
+def last_heartbeat(db, task_id):
+    return db._tasks.find_one({"_id": task_id})["last_heartbeat"]
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+@pytest.mark.usefixtures("buffered")
+class TestHeartbeatBuffer:
+    def test_buffered_until_flush(self, db_fixture, queue_id, get_task_args):
+        task_id = db_fixture.create_task(**get_task_args(queue_id))
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            db_fixture.fetch_task(queue_id=queue_id)
+            fetched_at = last_heartbeat(db_fixture, task_id)
+
+            for _ in range(3):
+                frozen_time.tick(timedelta(seconds=10))
+                assert db_fixture.refresh_task_heartbeat(queue_id, task_id)
+            assert last_heartbeat(db_fixture, task_id) == fetched_at
+
+            assert db_fixture.flush_heartbeats() == 1  # coalesced
+            assert last_heartbeat(db_fixture, task_id) == fetched_at + timedelta(
+                seconds=30
+            )
+            assert db_fixture.flush_heartbeats() == 0
+
+        metrics = db_fixture.heartbeat_metrics()
+        assert metrics["received"] == 3
+        assert metrics["written"] == 1
+        assert metrics["pending"] == 0
+
+    def test_missing_task(self, db_fixture, queue_id):
+        assert not db_fixture.refresh_task_heartbeat(queue_id, "nonexistent")
+        assert db_fixture.heartbeat_metrics()["pending"] == 0
+
+    def test_flush_never_goes_backwards(self, db_fixture, queue_id, get_task_args):
+        task_id = db_fixture.create_task(**get_task_args(queue_id))
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            db_fixture.fetch_task(queue_id=queue_id)
+            db_fixture.refresh_task_heartbeat(queue_id, task_id)
+            stale = db_fixture._heartbeat_buffer.drain()
+
+            # a newer heartbeat is flushed by another server process
+            frozen_time.tick(timedelta(seconds=10))
+            db_fixture.refresh_task_heartbeat(queue_id, task_id)
+            db_fixture.flush_heartbeats()
+            newer = last_heartbeat(db_fixture, task_id)
+
+            db_fixture._heartbeat_buffer.restore(stale)
+            db_fixture.flush_heartbeats()
+            assert last_heartbeat(db_fixture, task_id) == newer
+
+    def test_timeout_sweep_flushes_first(self, db_fixture, queue_id, get_task_args):
+        task_id = db_fixture.create_task(
+            **get_task_args(queue_id, override_fields={"heartbeat_timeout": 60})
+        )
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            db_fixture.fetch_task(queue_id=queue_id)
+            frozen_time.tick(timedelta(seconds=50))
+            db_fixture.refresh_task_heartbeat(queue_id, task_id)
+
+            # 70s since fetch, but only 20s since the buffered heartbeat
+            frozen_time.tick(timedelta(seconds=20))
+            assert task_id not in db_fixture.handle_timeouts()
+            assert db_fixture.heartbeat_metrics()["pending"] == 0
+
+            # within the flush interval grace of other server processes
+            frozen_time.tick(timedelta(seconds=43))
+            assert task_id not in db_fixture.handle_timeouts()
+
+            frozen_time.tick(timedelta(seconds=3))
+            assert task_id in db_fixture.handle_timeouts()
+        assert db_fixture._tasks.find_one({"_id": task_id})["status"] in (
+            TaskState.PENDING,
+            TaskState.FAILED,
+        )
+
+    @pytest.mark.parametrize("flush_interval", [5.0, 0])
+    def test_progress(
+        self,
+        db_fixture,
+        queue_id,
+        get_task_args,
+        write_ops,
+        server_config,
+        monkeypatch,
+        flush_interval,
+    ):
+        monkeypatch.setattr(server_config, "heartbeat_flush_interval", flush_interval)
+        task_id = db_fixture.create_task(**get_task_args(queue_id))
+        revision = db_fixture.fetch_task(queue_id=queue_id)["revision"]
+
+        write_ops.update(dict.fromkeys(write_ops, 0))
+        db_fixture.refresh_task_heartbeat(queue_id, task_id, progress={"epoch": 1})
+        db_fixture.refresh_task_heartbeat(queue_id, task_id, progress={"epoch": 2})
+        db_fixture.refresh_task_heartbeat(queue_id, task_id)  # no new progress
+        db_fixture.flush_heartbeats()
+
+        task = db_fixture._tasks.find_one({"_id": task_id})
+        assert task["summary"]["progress"] == {"epoch": 2}
+        # written after the heartbeats, in one transaction per queue (a conditional write per new
+        # progress when not buffered)
+        assert sum(write_ops.values()) == (2 if flush_interval else 5)
+        # a change of the task, listed by the change feed
+        assert task["revision"] > revision
+
+        # the same progress again is not a change
+        db_fixture.refresh_task_heartbeat(queue_id, task_id, progress={"epoch": 2})
+        db_fixture.flush_heartbeats()
+        assert db_fixture._tasks.find_one({"_id": task_id})["revision"] == (
+            task["revision"]
+        )
+
+    def test_write_ops_benchmark(
+        self, db_fixture, queue_id, get_task_args, write_ops, server_config, monkeypatch
+    ):
+        """N tasks sending M heartbeats each between two flushes."""
+        n_tasks, n_heartbeats = 20, 10
+        task_ids = [
+            db_fixture.create_task(**get_task_args(queue_id)) for _ in range(n_tasks)
+        ]
+        for _ in range(n_tasks):
+            db_fixture.fetch_task(queue_id=queue_id)
+
+        def send_heartbeats():
+            write_ops.update(dict.fromkeys(write_ops, 0))
+            for _ in range(n_heartbeats):
+                for task_id in task_ids:
+                    assert db_fixture.refresh_task_heartbeat(queue_id, task_id)
+            db_fixture.flush_heartbeats()
+            return sum(write_ops.values())
+
+        # write-through
+        monkeypatch.setattr(server_config, "heartbeat_flush_interval", 0)
+        write_through_ops = send_heartbeats()
+
+        monkeypatch.setattr(server_config, "heartbeat_flush_interval", 5.0)
+        buffered_ops = send_heartbeats()
+
+        assert write_through_ops == n_tasks * n_heartbeats
+        assert buffered_ops == 1
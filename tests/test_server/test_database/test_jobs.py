@@ -0,0 +1,150 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from freezegun import freeze_time
+
+from labtasker.server.database import _task_partition_name
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "job_chunk_size", 2)
+
+
+@pytest.fixture
+def queue_id(db_fixture, queue_args):
+    return db_fixture.create_queue(**queue_args)
+
+
+def submit(db, queue_id, name, **kwargs):
+    return db.create_task(queue_id=queue_id, task_name=name, args={"n": 1}, **kwargs)
+
+
+def run_jobs(db):
+    chunks = 0
+    while db.run_job_chunk():
+        chunks += 1
+    return chunks
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestJobs:
+    def test_delete_queue(self, db_fixture, queue_id, queue_args):
+        for i in range(5):
+            submit(db_fixture, queue_id, str(i))
+        db_fixture.create_worker(queue_id=queue_id)
+        db_fixture.create_queue_indexes(queue_id=queue_id, paths=["args.n"])
+        other_queue = db_fixture.create_queue(
+            queue_name="other-queue", password=queue_args["password"]
+        )
+        submit(db_fixture, other_queue, "kept")
+
+        job_id = db_fixture.submit_job(queue_id=queue_id, kind="delete_queue")
+        # the queue is gone right away
+        assert db_fixture._queues.find_one({"_id": queue_id}) is None
+        assert db_fixture.get_job(job_id)["status"] == "pending"
+
+        assert run_jobs(db_fixture) > 3  # in chunks
+        job = db_fixture.get_job(job_id)
+        assert job["status"] == "success"
+        # queue, tasks, worker, revision counter
+        assert job["progress"]["done"] == 1 + 5 + 1 + 1
+        assert db_fixture._tasks.count_documents({"queue_id": queue_id}) == 0
+        assert db_fixture._revisions.count_documents({"queue_id": queue_id}) == 0
+        assert db_fixture._workers.count_documents({"queue_id": queue_id}) == 0
+        assert f"q_{queue_id}_args.n" not in db_fixture._tasks.index_information()
+        assert db_fixture._tasks.count_documents({"queue_id": other_queue}) == 1
+
+    def test_delete_partitioned_queue(
+        self, db_fixture, queue_args, server_config, monkeypatch
+    ):
+        monkeypatch.setattr(server_config, "task_layout", "partitioned")
+        queue_id = db_fixture.create_queue(**queue_args)
+        for i in range(3):
+            submit(db_fixture, queue_id, str(i))
+
+        job_id = db_fixture.submit_job(queue_id=queue_id, kind="delete_queue")
+        run_jobs(db_fixture)
+        assert db_fixture.get_job(job_id)["status"] == "success"
+        assert _task_partition_name(queue_id) not in (
+            db_fixture._db.list_collection_names()
+        )
+
+    def test_update_tasks(self, db_fixture, queue_id):
+        task_ids = [submit(db_fixture, queue_id, "a", max_retries=1) for _ in range(5)]
+        submit(db_fixture, queue_id, "b", max_retries=1)
+        for _ in range(6):
+            task = db_fixture.fetch_task(queue_id=queue_id)
+            db_fixture.report_task_status(
+                queue_id=queue_id, task_id=task["_id"], report_status="failed"
+            )
+
+        # requeue the failed tasks named "a"
+        job_id = db_fixture.submit_job(
+            queue_id=queue_id,
+            kind="update_tasks",
+            params={
+                "query": {"task_name": "a", "status": "failed"},
+                "update": {"metadata.requeued": True},
+                "reset_pending": True,
+            },
+        )
+        assert run_jobs(db_fixture) == 3
+        job = db_fixture.get_job(job_id)
+        assert job["status"] == "success"
+        assert job["progress"]["done"] == 5
+
+        for task in db_fixture._tasks.find({"queue_id": queue_id}):
+            if task["_id"] in task_ids:
+                assert task["status"] == "pending"
+                assert task["retries"] == 0
+                assert task["metadata"]["requeued"] is True
+            else:
+                assert task["status"] == "failed"
+        assert db_fixture.fetch_task(queue_id=queue_id)["_id"] in task_ids
+
+    def test_failed_job(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "a")
+        job_id = db_fixture.submit_job(
+            queue_id=queue_id,
+            kind="update_tasks",
+            params={"query": {}, "update": {"resources": {"cpus": -1}}},
+        )
+        run_jobs(db_fixture)
+        job = db_fixture.get_job(job_id)
+        assert job["status"] == "failed"
+        assert "resources" in job["error"]
+
+    def test_resume_after_lease_expired(self, db_fixture, queue_id, server_config):
+        for i in range(3):
+            submit(db_fixture, queue_id, str(i))
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            job_id = db_fixture.submit_job(queue_id=queue_id, kind="delete_queue")
+            # a server process claimed the job and stopped before finishing its chunk
+            db_fixture._jobs.update_one(
+                {"_id": job_id},
+                {
+                    "$set": {
+                        "status": "running",
+                        "lease_expires": frozen_time()
+                        + timedelta(seconds=server_config.job_lease),
+                    }
+                },
+            )
+            assert not db_fixture.run_job_chunk()
+
+            frozen_time.tick(timedelta(seconds=server_config.job_lease + 1))
+            run_jobs(db_fixture)
+        assert db_fixture.get_job(job_id)["status"] == "success"
+        assert db_fixture._tasks.count_documents({"queue_id": queue_id}) == 0
+
+    def test_invalid(self, db_fixture, queue_id):
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.submit_job(queue_id=queue_id, kind="archive")
+        assert exc.value.status_code == 400
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.submit_job(queue_id="missing-queue", kind="delete_queue")
+        assert exc.value.status_code == 404
+        assert db_fixture.get_job("missing-job") is None
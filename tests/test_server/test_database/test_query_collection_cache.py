@@ -0,0 +1,85 @@
+import pytest
+
+from labtasker.server.fsm import TaskState
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestQueryCollectionCache:
+    @pytest.fixture(autouse=True)
+    def enable_cache(self, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "query_cache_max_mb", 64.0)
+
+    @pytest.fixture
+    def queue_id(self, db_fixture, queue_args):
+        return db_fixture.create_queue(**queue_args)
+
+    @staticmethod
+    def ls_pending(db, queue_id):
+        return [
+            t["task_id"]
+            for t in db.query_collection(
+                queue_id=queue_id,
+                collection_name="tasks",
+                query={"status": TaskState.PENDING},
+            )
+        ]
+
+    def test_invalidated_by_fsm_events(self, db_fixture, queue_id):
+        task_id = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        assert self.ls_pending(db_fixture, queue_id) == [task_id]
+
+        db_fixture.fetch_task(queue_id=queue_id)
+        assert self.ls_pending(db_fixture, queue_id) == []
+
+    def test_invalidated_by_update_collection(self, db_fixture, queue_id):
+        task_id = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        assert self.ls_pending(db_fixture, queue_id) == [task_id]
+
+        db_fixture.update_collection(
+            queue_id=queue_id,
+            collection_name="tasks",
+            query={"_id": task_id},
+            update={"$set": {"args.a": 2}},
+        )
+        tasks = db_fixture.query_collection(
+            queue_id=queue_id,
+            collection_name="tasks",
+            query={"status": TaskState.PENDING},
+        )
+        assert tasks[0]["args"] == {"a": 2}
+
+    @pytest.mark.parametrize("flush_interval", [5.0, 0])
+    def test_invalidated_by_progress(
+        self, db_fixture, queue_id, server_config, monkeypatch, flush_interval
+    ):
+        monkeypatch.setattr(server_config, "heartbeat_flush_interval", flush_interval)
+        task_id = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        db_fixture.fetch_task(queue_id=queue_id)
+
+        def progress():
+            return db_fixture.query_collection(
+                queue_id=queue_id, collection_name="tasks", query={"_id": task_id}
+            )[0]["summary"].get("progress")
+
+        assert progress() is None
+        db_fixture.refresh_task_heartbeat(queue_id, task_id, progress={"epoch": 1})
+        db_fixture.flush_heartbeats()
+        assert progress() == {"epoch": 1}
+
+    def test_invalidated_by_update_without_transition(self, db_fixture, queue_id):
+        task_id = db_fixture.create_task(
+            queue_id=queue_id, task_name="a", args={"a": 1}
+        )
+        assert self.ls_pending(db_fixture, queue_id) == [task_id]
+
+        db_fixture.update_task(
+            queue_id=queue_id,
+            task_id=task_id,
+            task_setting_update={"task_name": "b"},
+            reset_pending=False,
+        )
+        tasks = db_fixture.query_collection(
+            queue_id=queue_id, collection_name="tasks", query={}
+        )
+        assert tasks[0]["task_name"] == "b"
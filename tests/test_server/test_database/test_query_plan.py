@@ -0,0 +1,110 @@
+"""Check the query plans produced by query_collection rewrites.
+
+`explain` is not supported by the embedded database, hence these are integration tests only.
+"""
+
+import pytest
+
+from labtasker.server.db_utils import (
+    TASK_QUEUE_STATUS_INDEX,
+    build_query_pipeline,
+    sanitize_query,
+)
+
+DEFAULT_SORT = [("priority", -1), ("last_modified", 1), ("created_at", 1)]
+
+
+def _winning_plan_stages(explain_result):
+    """Collect (stage, indexName) of all winning plan nodes in an explain result."""
+    stages = []
+
+    def collect(node, in_winning_plan=False):
+        if isinstance(node, dict):
+            if in_winning_plan and "stage" in node:
+                stages.append((node["stage"], node.get("indexName")))
+            for k, v in node.items():
+                if k == "rejectedPlans":
+                    continue
+                collect(v, in_winning_plan or k == "winningPlan")
+        elif isinstance(node, list):
+            for v in node:
+                collect(v, in_winning_plan)
+
+    collect(explain_result)
+    return stages
+
+
+def explain(db, collection_name, query, sort=None):
+    pipeline, hint = build_query_pipeline(
+        collection_name,
+        query,
+        sort=sort or DEFAULT_SORT,
+        limit=100,
+        offset=0,
+    )
+    cmd = {"aggregate": collection_name, "pipeline": pipeline, "cursor": {}}
+    if hint:
+        cmd["hint"] = hint
+    return _winning_plan_stages(
+        db._db.command("explain", cmd, verbosity="queryPlanner")
+    )
+
+
+@pytest.mark.integration
+class TestQueryPlan:
+    @pytest.fixture
+    def queue_id(self, db_fixture, queue_args):
+        queue_id = db_fixture.create_queue(**queue_args)
+        for i in range(20):
+            db_fixture.create_task(
+                queue_id=queue_id, args={"dataset": f"d{i % 4}", "i": i}
+            )
+        return queue_id
+
+    def test_task_id_uses_id_index(self, db_fixture, queue_id):
+        task_id = db_fixture._tasks.find_one({})["_id"]
+        stages = explain(
+            db_fixture, "tasks", sanitize_query(queue_id, {"task_id": task_id})
+        )
+        names = {s for s, _ in stages}
+        assert "COLLSCAN" not in names, stages
+        assert names & {"IDHACK", "IXSCAN", "EXPRESS_IXSCAN", "EXPRESS_IDHACK"}
+
+    def test_queue_alias_uses_id_index(self, db_fixture, queue_id):
+        stages = explain(db_fixture, "queues", sanitize_query(queue_id, {}))
+        assert "COLLSCAN" not in {s for s, _ in stages}, stages
+
+    def test_status_shape_uses_hinted_index(self, db_fixture, queue_id):
+        stages = explain(
+            db_fixture, "tasks", sanitize_query(queue_id, {"status": "pending"})
+        )
+        assert (("IXSCAN", TASK_QUEUE_STATUS_INDEX)) in stages, stages
+        assert "SORT" not in {s for s, _ in stages}, stages  # sort served by index
+
+    def test_user_declared_index(self, db_fixture, queue_id):
+        db_fixture.create_queue_indexes(queue_id=queue_id, paths=["args.dataset"])
+        stages = explain(
+            db_fixture, "tasks", sanitize_query(queue_id, {"args.dataset": "d1"})
+        )
+        assert ("IXSCAN", f"q_{queue_id}_args.dataset") in stages, stages
+
+    def test_expr_fallback_scans(self, db_fixture, queue_id):
+        # computed alias must be materialized before matching
+        stages = explain(
+            db_fixture,
+            "tasks",
+            sanitize_query(queue_id, {"$expr": {"$eq": ["$task_id", "x"]}}),
+        )
+        assert stages  # plan is produced; alias is still usable in $expr
+
+    def test_explain_query(self, db_fixture, queue_id):
+        explained = db_fixture.explain_query(
+            queue_id=queue_id,
+            collection_name="tasks",
+            query={"status": "pending", "args.dataset": "d1"},
+            required_fields=["dataset"],
+        )
+        assert explained["collection"] == "tasks"
+        assert explained["plan_summary"]
+        assert explained["query_shape"] == {"status": "?", "args.dataset": "?"}
+        assert explained["docs_examined"] is not None
@@ -0,0 +1,75 @@
+import pytest
+from fastapi import HTTPException
+
+from labtasker.server.database import DBService
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestQueueIndexes:
+    @pytest.fixture
+    def queue_id(self, db_fixture, queue_args):
+        return db_fixture.create_queue(**queue_args)
+
+    @staticmethod
+    def get_queue_index_names(db):
+        return {name for name in db._tasks.index_information() if name.startswith("q_")}
+
+    def test_create_and_ls(self, db_fixture, queue_id):
+        declared = db_fixture.create_queue_indexes(
+            queue_id=queue_id, paths=["args.dataset", "metadata.tag", "args.dataset"]
+        )
+        assert declared == ["args.dataset", "metadata.tag"]
+
+        index_info = db_fixture._tasks.index_information()
+        index = index_info[f"q_{queue_id}_args.dataset"]
+        assert index["key"] == [("queue_id", 1), ("args.dataset", 1)]
+        assert index["partialFilterExpression"] == {"queue_id": queue_id}
+
+        indexes = db_fixture.ls_queue_indexes(queue_id=queue_id)
+        assert [index["path"] for index in indexes] == ["args.dataset", "metadata.tag"]
+
+        # creating again is idempotent
+        db_fixture.create_queue_indexes(queue_id=queue_id, paths=["args.dataset"])
+        assert len(db_fixture.ls_queue_indexes(queue_id=queue_id)) == 2
+
+    @pytest.mark.parametrize("path", ["status", "args", "args.$where", "summary.a"])
+    def test_invalid_path(self, db_fixture, queue_id, path):
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.create_queue_indexes(queue_id=queue_id, paths=[path])
+        assert exc.value.status_code == 400
+
+    def test_cap(self, db_fixture, queue_id, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "max_queue_indexes", 2)
+        db_fixture.create_queue_indexes(queue_id=queue_id, paths=["args.a", "args.b"])
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.create_queue_indexes(queue_id=queue_id, paths=["args.c"])
+        assert exc.value.status_code == 400
+        assert len(db_fixture.ls_queue_indexes(queue_id=queue_id)) == 2
+
+    def test_drop(self, db_fixture, queue_id):
+        db_fixture.create_queue_indexes(queue_id=queue_id, paths=["args.a", "args.b"])
+        assert (
+            db_fixture.drop_queue_indexes(queue_id=queue_id, paths=["args.a", "args.x"])
+            == 1
+        )
+        assert self.get_queue_index_names(db_fixture) == {f"q_{queue_id}_args.b"}
+        assert [i["path"] for i in db_fixture.ls_queue_indexes(queue_id=queue_id)] == [
+            "args.b"
+        ]
+
+    def test_delete_queue_drops_indexes(self, db_fixture, queue_id):
+        db_fixture.create_queue_indexes(queue_id=queue_id, paths=["args.a"])
+        db_fixture.delete_queue(queue_id=queue_id)
+        assert self.get_queue_index_names(db_fixture) == set()
+
+    def test_reconcile_at_startup(self, db_fixture, queue_id):
+        db_fixture.create_queue_indexes(queue_id=queue_id, paths=["args.a"])
+        # simulate a lost index and a stale one
+        db_fixture._tasks.drop_index(f"q_{queue_id}_args.a")
+        db_fixture._tasks.create_index(
+            [("queue_id", 1), ("args.b", 1)], name="q_deleted-queue_args.b"
+        )
+
+        db = DBService(client=db_fixture._client, db_name=db_fixture._db.name)
+        assert self.get_queue_index_names(db) == {f"q_{queue_id}_args.a"}
@@ -0,0 +1,187 @@
+from datetime import timedelta
+
+import pytest
+from freezegun import freeze_time
+
+from labtasker.server.fsm import TaskState
+from labtasker.server.ready_queue import (
+    UnsupportedFilter,
+    cacheable,
+    filter_matches,
+    ready_queue,
+)
+
+
+@pytest.fixture
+def queue_id(db_fixture, queue_args):
+    return db_fixture.create_queue(**queue_args)
+
+
+@pytest.fixture
+def small_ready_queue(server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "ready_queue_size", 2)
+
+
+def fetch_id(db, queue_id, **kwargs):
+    task = db.fetch_task(queue_id=queue_id, **kwargs)
+    return task["_id"] if task else None
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+@pytest.mark.usefixtures("small_ready_queue")
+class TestReadyQueueFetch:
+    def test_candidates_are_picked_in_memory(self, db_fixture, queue_id):
+        task_ids = [
+            db_fixture.create_task(queue_id=queue_id, args={"i": i}) for i in range(6)
+        ]
+        loads = ready_queue.metrics()["loads"]
+
+        fetched = [fetch_id(db_fixture, queue_id) for _ in range(7)]
+        assert fetched == task_ids + [None]
+        assert ready_queue.metrics()["loads"] - loads == 4  # chunks of 2
+
+    def test_submit_and_reset_are_pushed(self, db_fixture, queue_id):
+        low = [
+            db_fixture.create_task(queue_id=queue_id, args={"i": i}, priority=0)
+            for i in range(3)
+        ]
+        assert fetch_id(db_fixture, queue_id) == low[0]  # heads loaded
+
+        high = db_fixture.create_task(queue_id=queue_id, args={"h": 1}, priority=20)
+        assert fetch_id(db_fixture, queue_id) == high
+
+        db_fixture.update_task(
+            queue_id=queue_id,
+            task_id=low[0],
+            task_setting_update={"priority": 20},
+            reset_pending=True,
+        )
+        assert fetch_id(db_fixture, queue_id) == low[0]
+        assert fetch_id(db_fixture, queue_id) == low[1]
+
+    def test_timeout_requeue_is_pushed(self, db_fixture, queue_id):
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            first = db_fixture.create_task(
+                queue_id=queue_id, args={"a": 1}, heartbeat_timeout=60, priority=20
+            )
+            second = db_fixture.create_task(queue_id=queue_id, args={"a": 2})
+            assert fetch_id(db_fixture, queue_id) == first
+
+            frozen_time.tick(timedelta(seconds=61))
+            assert first in db_fixture.handle_timeouts()
+            assert fetch_id(db_fixture, queue_id) == first
+            assert fetch_id(db_fixture, queue_id) == second
+
+    def test_settings_update_invalidates(self, db_fixture, queue_id):
+        a = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        b = db_fixture.create_task(queue_id=queue_id, args={"b": 1})
+        c = db_fixture.create_task(queue_id=queue_id, args={"c": 1})
+        assert fetch_id(db_fixture, queue_id) == a
+
+        db_fixture.update_task(
+            queue_id=queue_id, task_id=c, task_setting_update={"priority": 20}
+        )
+        assert fetch_id(db_fixture, queue_id) == c
+        assert fetch_id(db_fixture, queue_id) == b
+
+    def test_stale_candidate_is_skipped(self, db_fixture, queue_id):
+        a = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        b = db_fixture.create_task(queue_id=queue_id, args={"b": 1})
+        assert fetch_id(db_fixture, queue_id, extra_filter={"args.b": 1}) == b
+        c = db_fixture.create_task(queue_id=queue_id, args={"c": 1})
+        assert fetch_id(db_fixture, queue_id) == a  # heads loaded: a, c
+
+        # claimed behind the back of the ready-queue, e.g. by another server process
+        db_fixture._tasks.update_one(
+            {"_id": c}, {"$set": {"status": TaskState.RUNNING}}
+        )
+        assert fetch_id(db_fixture, queue_id) is None
+
+    def test_shapes_are_separate(self, db_fixture, queue_id):
+        a = db_fixture.create_task(queue_id=queue_id, args={"a": 1}, priority=20)
+        b = db_fixture.create_task(queue_id=queue_id, args={"b": 1})
+        assert fetch_id(db_fixture, queue_id, required_fields=["b"]) == b
+        assert fetch_id(db_fixture, queue_id, required_fields=["b"]) is None
+        assert fetch_id(db_fixture, queue_id) == a
+
+    def test_disabled(self, db_fixture, queue_id, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "ready_queue_size", 0)
+        task_ids = [
+            db_fixture.create_task(queue_id=queue_id, args={"i": i}) for i in range(3)
+        ]
+        pops = ready_queue.metrics()["pops"]
+        assert [fetch_id(db_fixture, queue_id) for _ in range(3)] == task_ids
+        assert ready_queue.metrics()["pops"] == pops
+
+    def test_unsupported_shape_not_cached(self, db_fixture, queue_id):
+        a = db_fixture.create_task(queue_id=queue_id, args={"n": 1})
+        b = db_fixture.create_task(queue_id=queue_id, args={"n": 2})
+        pops = ready_queue.metrics()["pops"]
+        assert fetch_id(db_fixture, queue_id, extra_filter={"args.n": {"$gt": 1}}) == b
+        assert (
+            fetch_id(db_fixture, queue_id, extra_filter={"args.n": {"$gt": 1}}) is None
+        )
+        assert ready_queue.metrics()["pops"] == pops
+        assert fetch_id(db_fixture, queue_id) == a
+
+
+PARITY_DOCS = [
+    {},
+    {"a": None},
+    {"a": 1},
+    {"a": 1.0},
+    {"a": 2},
+    {"a": True},
+    {"a": False},
+    {"a": 0},
+    {"a": "1"},
+    {"a": ""},
+    {"a": {"b": 1}},
+    {"a": {"b": None}},
+    {"a": {"b": "x"}},
+    {"a": {}},
+    {"a": [1, 2]},
+    {"a": [{"b": 1}]},
+    {"b": 1},
+]
+
+PARITY_QUERIES = [
+    {"args.a": 1},
+    {"args.a": 1.0},
+    {"args.a": True},
+    {"args.a": False},
+    {"args.a": 0},
+    {"args.a": "1"},
+    {"args.a": None},
+    {"args.a": {"$eq": None}},
+    {"args.a": {"$eq": 2}},
+    {"args.a": {"$exists": True}},
+    {"args.a": {"$exists": False}},
+    {"args.a.b": 1},
+    {"args.a.b": None},
+    {"args.a.b": {"$exists": True}},
+    {"$and": [{"args.a": {"$exists": True}}, {"args.b": None}]},
+]
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+@pytest.mark.parametrize("query", PARITY_QUERIES)
+def test_filter_matches_parity(db_fixture, query):
+    """The in-memory matcher agrees with the database on the documents it evaluates."""
+    collection = db_fixture._db["ready_queue_parity"]
+    collection.insert_many(
+        [{"_id": str(i), "args": args} for i, args in enumerate(PARITY_DOCS)]
+    )
+    assert cacheable(query)
+    expected = {doc["_id"] for doc in collection.find(query, {"_id": 1})}
+    evaluated = 0
+    for doc in collection.find():
+        try:
+            matched = filter_matches(query, doc)
+        except UnsupportedFilter:
+            continue  # the heaps are dropped instead
+        evaluated += 1
+        assert matched == (doc["_id"] in expected), doc
+    assert evaluated
@@ -0,0 +1,119 @@
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.fixture(params=[256, 0], ids=["ready_queue", "no_ready_queue"])
+def ready_queue_size(request, server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "ready_queue_size", request.param)
+
+
+@pytest.fixture
+def queue_id(db_fixture, queue_args):
+    return db_fixture.create_queue(**queue_args)
+
+
+def submit(db, queue_id, name, resources=None, **kwargs):
+    return db.create_task(
+        queue_id=queue_id,
+        task_name=name,
+        args={"n": name},
+        resources=resources,
+        **kwargs,
+    )
+
+
+def fetch_name(db, queue_id, **kwargs):
+    task = db.fetch_task(queue_id=queue_id, **kwargs)
+    return task["task_name"] if task else None
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+@pytest.mark.usefixtures("ready_queue_size")
+class TestResourceFetch:
+    def test_only_fitting_tasks(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "big", {"cpus": 16, "mem_gb": 64})
+        submit(db_fixture, queue_id, "gpu", {"cpus": 1, "gpus": 1})
+        submit(db_fixture, queue_id, "small", {"cpus": 2})
+
+        capacity = {"cpus": 8, "mem_gb": 32}
+        # unreported resources (gpus) count as 0
+        assert fetch_name(db_fixture, queue_id, capacity=capacity) == "small"
+        assert fetch_name(db_fixture, queue_id, capacity=capacity) is None
+        # without capacity, tasks are handed out regardless of their requests
+        assert fetch_name(db_fixture, queue_id) == "big"
+
+    def test_best_fit(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "none")
+        submit(db_fixture, queue_id, "quarter", {"cpus": 2, "mem_gb": 8})
+        submit(db_fixture, queue_id, "half", {"cpus": 4, "mem_gb": 16})
+        submit(db_fixture, queue_id, "too_big", {"cpus": 16})
+
+        capacity = {"cpus": 8, "mem_gb": 32}
+        names = [fetch_name(db_fixture, queue_id, capacity=capacity) for _ in range(4)]
+        assert names == ["half", "quarter", "none", None]
+
+    def test_first_fit(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "too_big", {"cpus": 16})
+        submit(db_fixture, queue_id, "quarter", {"cpus": 2})
+        submit(db_fixture, queue_id, "half", {"cpus": 4})
+
+        capacity = {"cpus": 8}
+        assert fetch_name(db_fixture, queue_id, capacity=capacity, fit="first") == (
+            "quarter"
+        )
+
+    def test_priority_before_fit(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "tight", {"cpus": 8}, priority=0)
+        submit(db_fixture, queue_id, "loose", {"cpus": 1}, priority=20)
+        assert fetch_name(db_fixture, queue_id, capacity={"cpus": 8}) == "loose"
+
+    def test_sweep(self, db_fixture, queue_id):
+        db_fixture.create_sweep(
+            queue_id=queue_id, axes={"i": [0, 1]}, resources={"gpus": 2}
+        )
+        assert fetch_name(db_fixture, queue_id, capacity={"gpus": 1}) is None
+        task = db_fixture.fetch_task(queue_id=queue_id, capacity={"gpus": 2})
+        assert task["resources"] == {"gpus": 2}
+
+    def test_batch(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "a", {"cpus": 4})
+        submit(db_fixture, queue_id, "b", {"cpus": 4})
+        submit(db_fixture, queue_id, "c", {"cpus": 1})
+        results = db_fixture.fetch_tasks_batch(
+            queue_id=queue_id,
+            requests=[{"capacity": {"cpus": 4}}, {"capacity": {"cpus": 4}}, {}],
+        )
+        assert [r["task_name"] for r in results] == ["a", "b", "c"]
+
+    def test_with_affinity(self, db_fixture, queue_id):
+        submit(db_fixture, queue_id, "a", {"cpus": 1})
+        submit(db_fixture, queue_id, "b", {"cpus": 16})
+        submit(db_fixture, queue_id, "b", {"cpus": 1})
+        task = db_fixture.fetch_task(
+            queue_id=queue_id,
+            capacity={"cpus": 4},
+            fit="first",
+            affinity={"args.n": ["b"]},
+        )
+        assert task["task_name"] == "b"
+        assert task["resources"] == {"cpus": 1}
+
+    @pytest.mark.parametrize("resources", [{"cpus": -1}, {"bad.name": 1}])
+    def test_invalid_resources(self, db_fixture, queue_id, resources):
+        with pytest.raises(HTTPException) as exc:
+            submit(db_fixture, queue_id, "a", resources)
+        assert exc.value.status_code == 400
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.fetch_task(queue_id=queue_id, capacity=resources)
+        assert exc.value.status_code == 400
+
+    def test_invalid_fit(self, db_fixture, queue_id):
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.fetch_task(queue_id=queue_id, capacity={"cpus": 1}, fit="worst")
+        assert exc.value.status_code == 400
+
+    def test_resources_index(self, db_fixture, queue_id):
+        assert db_fixture.create_queue_indexes(
+            queue_id=queue_id, paths=["resources.cpus"]
+        ) == ["resources.cpus"]
@@ -0,0 +1,201 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from freezegun import freeze_time
+
+from labtasker.server.scheduling import FairSharePolicy, get_policy
+
+
+@pytest.fixture(params=[256, 0], ids=["ready_queue", "no_ready_queue"])
+def ready_queue_size(request, server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "ready_queue_size", request.param)
+
+
+def make_queue(db, policy=None):
+    metadata = {"scheduling_policy": policy} if policy is not None else {}
+    return db.create_queue(queue_name="test_queue", password="p", metadata=metadata)
+
+
+def submit(db, queue_id, name, **kwargs):
+    return db.create_task(queue_id=queue_id, task_name=name, args={"n": name}, **kwargs)
+
+
+def fetch_names(db, queue_id, n):
+    names = []
+    for _ in range(n):
+        task = db.fetch_task(queue_id=queue_id)
+        names.append(task["task_name"] if task else None)
+    return names
+
+
+def run(db, queue_id, frozen_time, seconds):
+    """Fetch a task and report success after `seconds`."""
+    task = db.fetch_task(queue_id=queue_id)
+    frozen_time.tick(timedelta(seconds=seconds))
+    db.report_task_status(
+        queue_id=queue_id, task_id=task["_id"], report_status="success"
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "config, name",
+    [
+        (None, "priority"),
+        ("fifo", "fifo"),
+        ({"name": "sjf"}, "sjf"),
+        ({"name": "fair_share", "weights": {"a": 2}}, "fair_share"),
+    ],
+)
+def test_get_policy(config, name):
+    metadata = {} if config is None else {"scheduling_policy": config}
+    assert get_policy(metadata).name == name
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "config",
+    [
+        "unknown",
+        {"weights": {}},
+        {"name": "fifo", "extra": 1},
+        {"name": "fair_share", "weights": {"a": 0}},
+        {"name": "fair_share", "bogus": 1},
+        42,
+    ],
+)
+def test_get_policy_invalid(config):
+    with pytest.raises(ValueError):
+        get_policy({"scheduling_policy": config})
+
+
+@pytest.mark.unit
+def test_fair_share_user_key():
+    policy = FairSharePolicy(key="args.owner")
+    assert policy.user_of({"args": {"owner": "a"}}) == "a"
+    assert policy.user_of({"args": {}}) == ""
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+@pytest.mark.usefixtures("ready_queue_size")
+class TestSchedulingPolicies:
+    def test_default_is_priority_order(self, db_fixture):
+        queue_id = make_queue(db_fixture)
+        submit(db_fixture, queue_id, "low", priority=0)
+        submit(db_fixture, queue_id, "old")
+        submit(db_fixture, queue_id, "new")
+        assert db_fixture._tasks.find_one({})["sched_rank"] is None
+        assert fetch_names(db_fixture, queue_id, 4) == ["old", "new", "low", None]
+
+    def test_fifo_keeps_place_of_retried_tasks(self, db_fixture):
+        queue_id = make_queue(db_fixture, "fifo")
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            for name in ["a", "b", "c"]:
+                submit(db_fixture, queue_id, name)
+                frozen_time.tick(timedelta(seconds=1))
+
+            task = db_fixture.fetch_task(queue_id=queue_id)
+            db_fixture.report_task_status(
+                queue_id=queue_id, task_id=task["_id"], report_status="failed"
+            )
+            assert fetch_names(db_fixture, queue_id, 3) == ["a", "b", "c"]
+
+    @pytest.mark.parametrize(
+        "policy, expected",
+        [
+            ("sjf", ["unknown", "short", "long"]),
+            ("lpt", ["unknown", "long", "short"]),
+        ],
+    )
+    def test_runtime_policies(self, db_fixture, policy, expected):
+        queue_id = make_queue(db_fixture, policy)
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            # runtime history
+            submit(db_fixture, queue_id, "long")
+            run(db_fixture, queue_id, frozen_time, 100)
+            submit(db_fixture, queue_id, "short")
+            run(db_fixture, queue_id, frozen_time, 10)
+
+            for name in ["long", "short", "unknown"]:
+                submit(db_fixture, queue_id, name)
+            assert fetch_names(db_fixture, queue_id, 3) == expected
+
+    def test_priority_before_rank(self, db_fixture):
+        queue_id = make_queue(db_fixture, "sjf")
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            submit(db_fixture, queue_id, "long")
+            run(db_fixture, queue_id, frozen_time, 100)
+            submit(db_fixture, queue_id, "short")
+            run(db_fixture, queue_id, frozen_time, 10)
+
+            submit(db_fixture, queue_id, "short")
+            submit(db_fixture, queue_id, "long", priority=20)
+            assert fetch_names(db_fixture, queue_id, 2) == ["long", "short"]
+
+    def test_fair_share(self, db_fixture):
+        queue_id = make_queue(
+            db_fixture, {"name": "fair_share", "weights": {"carol": 2}}
+        )
+        for i in range(4):
+            submit(db_fixture, queue_id, f"alice{i}", metadata={"user": "alice"})
+        for i in range(2):
+            submit(db_fixture, queue_id, f"bob{i}", metadata={"user": "bob"})
+        assert fetch_names(db_fixture, queue_id, 4) == [
+            "alice0",
+            "bob0",
+            "alice1",
+            "bob1",
+        ]
+
+        # a user arriving late does not get credit for the time it was idle
+        for i in range(3):
+            submit(db_fixture, queue_id, f"carol{i}", metadata={"user": "carol"})
+        assert fetch_names(db_fixture, queue_id, 6) == [
+            "carol0",
+            "carol1",
+            "alice2",
+            "carol2",
+            "alice3",
+            None,
+        ]
+
+    def test_update_policy_reranks_pending_tasks(self, db_fixture):
+        queue_id = make_queue(db_fixture)
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            submit(db_fixture, queue_id, "long")
+            run(db_fixture, queue_id, frozen_time, 100)
+            submit(db_fixture, queue_id, "short")
+            run(db_fixture, queue_id, frozen_time, 10)
+
+            for name in ["long", "long", "short"]:
+                submit(db_fixture, queue_id, name)
+                frozen_time.tick(timedelta(seconds=1))
+            assert db_fixture.fetch_task(queue_id=queue_id)["task_name"] == "long"
+
+            db_fixture.update_queue(
+                queue_id=queue_id, metadata_update={"scheduling_policy": "sjf"}
+            )
+            assert fetch_names(db_fixture, queue_id, 2) == ["short", "long"]
+
+    def test_invalid_policy(self, db_fixture):
+        with pytest.raises(HTTPException) as exc:
+            make_queue(db_fixture, "unknown")
+        assert exc.value.status_code == 400
+
+        queue_id = make_queue(db_fixture)
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.update_queue(
+                queue_id=queue_id,
+                metadata_update={"scheduling_policy": {"name": "lpt", "x": 1}},
+            )
+        assert exc.value.status_code == 400
+        assert "scheduling_policy" not in db_fixture.get_queue(queue_id)["metadata"]
+
+    def test_delete_queue_deletes_stats(self, db_fixture):
+        queue_id = make_queue(db_fixture, "fair_share")
+        submit(db_fixture, queue_id, "a", metadata={"user": "alice"})
+        assert db_fixture._sched_stats.count_documents({"queue_id": queue_id})
+        db_fixture.delete_queue(queue_id=queue_id)
+        assert not db_fixture._sched_stats.count_documents({"queue_id": queue_id})
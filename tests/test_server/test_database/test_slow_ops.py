@@ -0,0 +1,90 @@
+import pytest
+
+from labtasker.server.database import DBService
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestSlowOps:
+    @pytest.fixture
+    def queue_id(self, db_fixture, queue_args):
+        return db_fixture.create_queue(**queue_args)
+
+    def test_slow_ops_recorded_without_values(
+        self, db_fixture, queue_id, server_config, monkeypatch
+    ):
+        monkeypatch.setattr(server_config, "slow_op_threshold_ms", 0)
+        db_fixture.query_collection(
+            queue_id=queue_id,
+            collection_name="tasks",
+            query={"args.secret": "hunter2", "priority": {"$gt": 5}},
+        )
+
+        entry = db_fixture._slow_ops.find_one({"op": "query_collection"})
+        assert entry is not None
+        assert entry["collection"] == "tasks"
+        assert entry["queue_id"] == queue_id
+        assert entry["duration_ms"] >= 0
+        assert entry["query_shape"] == {"args.secret": "?", "priority": {"$gt": "?"}}
+        assert "hunter2" not in str(entry)
+
+    def test_disabled_by_negative_threshold(
+        self, db_fixture, queue_id, server_config, monkeypatch
+    ):
+        monkeypatch.setattr(server_config, "slow_op_threshold_ms", -1)
+        db_fixture._slow_ops.delete_many({})  # e.g. a slow create_queue of the fixture
+        db_fixture.fetch_task(queue_id=queue_id)
+        assert db_fixture._slow_ops.count_documents({}) == 0
+
+    def test_log_size_bounded(self, db_fixture, queue_id, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "slow_op_threshold_ms", 0)
+        monkeypatch.setattr(server_config, "slow_op_log_size", 3)
+        # recreate the service, so that the capped collection picks up the new size
+        db_fixture._db.drop_collection("slow_ops")
+        db = DBService(client=db_fixture._client, db_name=db_fixture._db.name)
+
+        for _ in range(5):
+            db.get_queue(queue_id=queue_id)
+        assert db._slow_ops.count_documents({}) == 3
+
+    def test_failed_op_still_recorded(
+        self, db_fixture, queue_id, server_config, monkeypatch
+    ):
+        monkeypatch.setattr(server_config, "slow_op_threshold_ms", 0)
+        with pytest.raises(Exception):
+            db_fixture.query_collection(
+                queue_id=queue_id, collection_name="invalid", query={}
+            )
+        assert db_fixture._slow_ops.count_documents({"op": "query_collection"}) == 1
+
+    def test_plan_explained_without_running_query(
+        self, db_fixture, queue_id, server_config, monkeypatch
+    ):
+        monkeypatch.setattr(server_config, "slow_op_threshold_ms", 0)
+        verbosities = []
+
+        def explain(command, cmd, verbosity):
+            verbosities.append(verbosity)
+            return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+        monkeypatch.setattr(db_fixture._db, "command", explain)
+        db_fixture.query_collection(
+            queue_id=queue_id, collection_name="tasks", query={"priority": 1}
+        )
+
+        # the slow query is not run again to collect execution statistics
+        assert verbosities == ["queryPlanner"]
+        entry = db_fixture._slow_ops.find_one({"op": "query_collection"})
+        assert entry["plan_summary"] == "COLLSCAN"
+        assert entry["docs_examined"] is None
+
+    def test_timeout_sweep_recorded_once_per_op(
+        self, db_fixture, queue_id, server_config, monkeypatch
+    ):
+        monkeypatch.setattr(server_config, "slow_op_threshold_ms", 0)
+        db_fixture._slow_ops.delete_many({})
+        db_fixture.handle_timeouts()
+
+        # the sweep flushes buffered heartbeats first
+        assert db_fixture._slow_ops.count_documents({"op": "flush_heartbeats"}) == 1
+        assert db_fixture._slow_ops.count_documents({"op": "handle_timeouts"}) == 1
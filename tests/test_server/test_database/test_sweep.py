@@ -0,0 +1,160 @@
+import itertools
+
+import pytest
+from fastapi import HTTPException
+
+from labtasker.constants import Priority
+from labtasker.server.fsm import TaskState
+from labtasker.server.sweep import materialize_args, sweep_point, sweep_size
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestSweepPoints:
+    def test_grid_order(self):
+        axes = [("a", [1, 2]), ("b.c", ["x", "y", "z"])]
+        assert sweep_size("grid", axes) == 6
+        points = [sweep_point("grid", axes, i) for i in range(6)]
+        expected = [
+            {"a": a, "b.c": c} for a, c in itertools.product([1, 2], ["x", "y", "z"])
+        ]
+        assert points == expected
+
+    def test_zip(self):
+        axes = [("a", [1, 2]), ("b", [3, 4])]
+        assert sweep_size("zip", axes) == 2
+        assert sweep_point("zip", axes, 1) == {"a": 2, "b": 4}
+
+        with pytest.raises(ValueError):
+            sweep_size("zip", [("a", [1, 2]), ("b", [3])])
+
+    def test_random_is_deterministic(self):
+        axes = [("a", list(range(100)))]
+        assert sweep_size("random", axes, num_samples=5) == 5
+        assert sweep_point("random", axes, 3, seed=1) == sweep_point(
+            "random", axes, 3, seed=1
+        )
+
+        with pytest.raises(ValueError):
+            sweep_size("random", axes)
+
+    def test_materialize_args(self):
+        args = materialize_args(
+            {"model": {"depth": 1, "width": 8}, "lr": 0.1},
+            "grid",
+            [("model.depth", [2, 4])],
+            1,
+        )
+        assert args == {"model": {"depth": 4, "width": 8}, "lr": 0.1}
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestSweepDB:
+    @pytest.fixture
+    def queue_id(self, db_fixture, queue_args):
+        return db_fixture.create_queue(**queue_args)
+
+    def test_create_sweep_is_lazy(self, db_fixture, queue_id):
+        sweep_id, total = db_fixture.create_sweep(
+            queue_id=queue_id,
+            args={"dataset": "mnist"},
+            axes={"lr": [0.1, 0.01], "seed": [0, 1, 2]},
+        )
+        assert total == 6
+        assert db_fixture._tasks.count_documents({}) == 0
+
+        stats = db_fixture.get_queue_stats(queue_id=queue_id)
+        assert stats["virtual_pending"] == 6
+        assert stats["active_sweeps"] == 1
+
+        sweeps = db_fixture.ls_sweeps(queue_id=queue_id)
+        assert len(sweeps) == 1
+        assert sweeps[0]["_id"] == sweep_id
+
+    def test_create_invalid_sweep(self, db_fixture, queue_id):
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.create_sweep(
+                queue_id=queue_id, axes={"a": [1, 2], "b": [1]}, mode="zip"
+            )
+        assert exc.value.status_code == 400
+
+    def test_fetch_materializes_in_order(self, db_fixture, queue_id):
+        sweep_id, total = db_fixture.create_sweep(
+            queue_id=queue_id,
+            task_name="grid",
+            args={"dataset": "mnist"},
+            axes={"lr": [0.1, 0.01], "seed": [0, 1]},
+        )
+
+        fetched = []
+        while task := db_fixture.fetch_task(queue_id=queue_id):
+            fetched.append(task)
+
+        assert [t["sweep_index"] for t in fetched] == list(range(total))
+        assert all(t["sweep_id"] == sweep_id for t in fetched)
+        assert all(t["status"] == TaskState.RUNNING for t in fetched)
+        assert fetched[1]["args"] == {"dataset": "mnist", "lr": 0.1, "seed": 1}
+        assert fetched[0]["task_name"] == "grid"
+
+        stats = db_fixture.get_queue_stats(queue_id=queue_id)
+        assert stats["virtual_pending"] == 0
+        assert stats["task_counts"] == {TaskState.RUNNING: total}
+
+    def test_priority_between_sweeps_and_tasks(
+        self, db_fixture, queue_id, get_task_args
+    ):
+        db_fixture.create_task(
+            **get_task_args(queue_id, override_fields={"priority": Priority.MEDIUM})
+        )
+        db_fixture.create_sweep(
+            queue_id=queue_id, axes={"arg1": ["low"]}, priority=Priority.LOW
+        )
+        db_fixture.create_sweep(
+            queue_id=queue_id, axes={"arg1": ["high"]}, priority=Priority.HIGH
+        )
+
+        order = []
+        while task := db_fixture.fetch_task(queue_id=queue_id):
+            order.append(task["args"]["arg1"])
+        assert order == ["high", "value1", "low"]
+
+    def test_required_fields(self, db_fixture, queue_id):
+        db_fixture.create_sweep(queue_id=queue_id, args={"a": 1}, axes={"b": [1, 2]})
+
+        # "no less": required field missing from sweep args
+        assert db_fixture.fetch_task(queue_id=queue_id, required_fields=["c"]) is None
+        # "no more": sweep args contain fields not required
+        assert db_fixture.fetch_task(queue_id=queue_id, required_fields=["a"]) is None
+        assert db_fixture._tasks.count_documents({}) == 0
+
+        task = db_fixture.fetch_task(queue_id=queue_id, required_fields=["a", "b"])
+        assert task["args"] == {"a": 1, "b": 1}
+
+    def test_extra_filter_mismatch_not_materialized(self, db_fixture, queue_id):
+        sweep_id, _ = db_fixture.create_sweep(
+            queue_id=queue_id, axes={"a": [1, 2]}, metadata={"tag": "x"}
+        )
+        for _ in range(3):
+            task = db_fixture.fetch_task(
+                queue_id=queue_id, extra_filter={"metadata.tag": "y"}
+            )
+            assert task is None
+        assert db_fixture._tasks.count_documents({}) == 0
+        assert db_fixture._sweeps.find_one({"_id": sweep_id})["cursor"] == 0
+
+        task = db_fixture.fetch_task(queue_id=queue_id)
+        assert task["args"] == {"a": 1}
+
+    def test_delete_sweep(self, db_fixture, queue_id):
+        sweep_id, _ = db_fixture.create_sweep(queue_id=queue_id, axes={"a": [1, 2]})
+        db_fixture.fetch_task(queue_id=queue_id)
+
+        assert db_fixture.delete_sweep(queue_id=queue_id, sweep_id=sweep_id) == 1
+        assert db_fixture.fetch_task(queue_id=queue_id) is None
+        assert db_fixture._tasks.count_documents({}) == 1  # materialized task kept
+
+    def test_delete_queue_cascade(self, db_fixture, queue_id):
+        db_fixture.create_sweep(queue_id=queue_id, axes={"a": [1, 2]})
+        db_fixture.delete_queue(queue_id=queue_id, cascade_delete=True)
+        assert db_fixture._sweeps.count_documents({}) == 0
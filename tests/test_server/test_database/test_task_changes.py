@@ -0,0 +1,151 @@
+import pytest
+from fastapi import HTTPException
+
+from labtasker.server.database import DBService
+from labtasker.server.fsm import TaskState
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestTaskChanges:
+    @pytest.fixture
+    def queue_id(self, db_fixture, queue_args):
+        return db_fixture.create_queue(**queue_args)
+
+    def test_incremental_changes(self, db_fixture, queue_id):
+        task_ids = [
+            db_fixture.create_task(queue_id=queue_id, args={"i": i}) for i in range(3)
+        ]
+        changes = db_fixture.ls_task_changes(queue_id=queue_id)
+        assert [t["_id"] for t in changes["changed"]] == task_ids
+        assert not changes["has_more"]
+        token = changes["revision"]
+
+        # nothing changed
+        changes = db_fixture.ls_task_changes(queue_id=queue_id, since=token)
+        assert changes["changed"] == [] and changes["deleted"] == []
+        assert changes["revision"] == token
+
+        fetched = db_fixture.fetch_task(queue_id=queue_id)
+        db_fixture.delete_task(queue_id=queue_id, task_id=task_ids[2])
+
+        changes = db_fixture.ls_task_changes(queue_id=queue_id, since=token)
+        assert [t["_id"] for t in changes["changed"]] == [fetched["_id"]]
+        assert changes["changed"][0]["status"] == TaskState.RUNNING
+        assert changes["deleted"] == [task_ids[2]]
+        assert changes["revision"] != token
+
+    def test_revision_is_stamped_on_writes(self, db_fixture, queue_id):
+        task_id = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+
+        def revision():
+            return db_fixture._tasks.find_one({"_id": task_id})["revision"]
+
+        revisions = [revision()]
+        db_fixture.fetch_task(queue_id=queue_id)
+        revisions.append(revision())
+        db_fixture.report_task_status(
+            queue_id=queue_id, task_id=task_id, report_status="success"
+        )
+        revisions.append(revision())
+        db_fixture.update_task(
+            queue_id=queue_id, task_id=task_id, task_setting_update={"args.a": 2}
+        )
+        revisions.append(revision())
+        db_fixture.update_collection(
+            queue_id=queue_id,
+            collection_name="tasks",
+            query={"_id": task_id},
+            update={"$set": {"metadata.tag": "x"}},
+        )
+        revisions.append(revision())
+        assert revisions == sorted(set(revisions))
+
+    def test_revision_cannot_be_updated(self, db_fixture, queue_id):
+        task_id = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        with pytest.raises(HTTPException):
+            db_fixture.update_collection(
+                queue_id=queue_id,
+                collection_name="tasks",
+                query={"_id": task_id},
+                update={"$set": {"revision": 10**9}},
+            )
+
+    def test_pages_split_a_revision(self, db_fixture, queue_id):
+        for i in range(5):
+            db_fixture.create_task(queue_id=queue_id, args={"i": i})
+        token = db_fixture.ls_task_changes(queue_id=queue_id)["revision"]
+
+        # one update_collection call stamps a single revision on all tasks
+        db_fixture.update_collection(
+            queue_id=queue_id,
+            collection_name="tasks",
+            query={},
+            update={"$set": {"metadata.tag": "x"}},
+        )
+        db_fixture.create_task(queue_id=queue_id, args={"i": 5})
+
+        seen = []
+        while True:
+            changes = db_fixture.ls_task_changes(
+                queue_id=queue_id, since=token, limit=2
+            )
+            assert len(changes["changed"]) <= 2
+            seen += [t["args"]["i"] for t in changes["changed"]]
+            token = changes["revision"]
+            if not changes["has_more"]:
+                break
+        assert sorted(seen[:5]) == [0, 1, 2, 3, 4]
+        assert seen[5:] == [5]
+
+    def test_full_listing_of_tasks_without_revision(self, db_fixture, queue_id):
+        task_ids = {
+            db_fixture.create_task(queue_id=queue_id, args={"i": i}) for i in range(5)
+        }
+        db_fixture._tasks.update_many({}, {"$unset": {"revision": ""}})
+        # tasks written before the change feed are stamped with revision 0 on startup
+        db = DBService(client=db_fixture._client, db_name=db_fixture._db.name)
+
+        seen, token = [], "0"
+        for _ in range(10):
+            changes = db.ls_task_changes(queue_id=queue_id, since=token, limit=2)
+            seen += [t["_id"] for t in changes["changed"]]
+            token = changes["revision"]
+            if not changes["has_more"]:
+                break
+        assert sorted(seen) == sorted(task_ids)
+
+    def test_revisions_counted_per_queue(self, db_fixture, queue_id, queue_args):
+        other_queue_id = db_fixture.create_queue(
+            **{**queue_args, "queue_name": "other_queue"}
+        )
+        for i in range(3):
+            db_fixture.create_task(queue_id=queue_id, args={"i": i})
+            db_fixture.create_task(queue_id=other_queue_id, args={"i": i})
+
+        revisions = [
+            t["revision"] for t in db_fixture._tasks.find({"queue_id": queue_id})
+        ]
+        assert revisions == [1, 2, 3]
+
+    def test_counter_continues_after_stamped_revisions(self, db_fixture, queue_id):
+        task_id = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        db_fixture._tasks.update_one({"_id": task_id}, {"$set": {"revision": 100}})
+        db_fixture._revisions.delete_many({})
+
+        db = DBService(client=db_fixture._client, db_name=db_fixture._db.name)
+        task_id = db.create_task(queue_id=queue_id, args={"a": 2})
+        assert db._tasks.find_one({"_id": task_id})["revision"] == 101
+
+    def test_invalid_token(self, db_fixture, queue_id):
+        with pytest.raises(HTTPException):
+            db_fixture.ls_task_changes(queue_id=queue_id, since="abc")
+
+    def test_delete_queue_removes_tombstones(self, db_fixture, queue_id):
+        task_id = db_fixture.create_task(queue_id=queue_id, args={"a": 1})
+        db_fixture.delete_task(queue_id=queue_id, task_id=task_id)
+        assert db_fixture._tombstones.count_documents({}) == 1
+
+        db_fixture.delete_queue(queue_id=queue_id, cascade_delete=True)
+        assert db_fixture._tombstones.count_documents({}) == 0
+        assert db_fixture._revisions.count_documents({}) == 0
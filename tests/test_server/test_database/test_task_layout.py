@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from freezegun import freeze_time
+
+from labtasker.server.database import DBService, _task_partition_name
+
+
+@pytest.fixture
+def partitioned(server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "task_layout", "partitioned")
+
+
+@pytest.fixture
+def queue_id(db_fixture, queue_args):
+    return db_fixture.create_queue(**queue_args)
+
+
+def partition(db, queue_id):
+    return db._db[_task_partition_name(queue_id)]
+
+
+def submit(db, queue_id, name, **kwargs):
+    return db.create_task(queue_id=queue_id, task_name=name, args={"n": 1}, **kwargs)
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestTaskLayout:
+    @pytest.mark.usefixtures("partitioned")
+    def test_partitioned_queue(self, db_fixture, queue_id):
+        assert db_fixture.get_queue(queue_id=queue_id)["task_layout"] == "partitioned"
+        task_id = submit(db_fixture, queue_id, "a")
+        assert db_fixture._tasks.count_documents({}) == 0
+        assert partition(db_fixture, queue_id).count_documents({"_id": task_id}) == 1
+
+        task = db_fixture.fetch_task(queue_id=queue_id)
+        assert task["_id"] == task_id
+        db_fixture.report_task_status(
+            queue_id=queue_id, task_id=task_id, report_status="success"
+        )
+        assert db_fixture.get_task(queue_id=queue_id, task_id=task_id)["status"] == (
+            "success"
+        )
+        assert [
+            t["task_id"]
+            for t in db_fixture.query_collection(
+                queue_id=queue_id, query={}, collection_name="tasks"
+            )
+        ] == [task_id]
+
+    @pytest.mark.usefixtures("partitioned")
+    def test_timeouts_and_heartbeats(
+        self, db_fixture, queue_id, server_config, monkeypatch
+    ):
+        monkeypatch.setattr(server_config, "heartbeat_flush_interval", 5.0)
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            kept = submit(db_fixture, queue_id, "kept", heartbeat_timeout=60)
+            lost = submit(db_fixture, queue_id, "lost", heartbeat_timeout=60)
+            db_fixture.fetch_task(queue_id=queue_id)
+            db_fixture.fetch_task(queue_id=queue_id)
+
+            frozen_time.tick(timedelta(seconds=50))
+            assert db_fixture.refresh_task_heartbeat(queue_id, kept)
+            assert db_fixture.flush_heartbeats() == 1
+
+            frozen_time.tick(timedelta(seconds=20))
+            assert db_fixture.handle_timeouts() == [lost]
+
+    def test_cascade_delete_drops_partition(
+        self, db_fixture, queue_args, server_config, monkeypatch
+    ):
+        shared_queue = db_fixture.create_queue(**queue_args)
+        submit(db_fixture, shared_queue, "a")
+        monkeypatch.setattr(server_config, "task_layout", "partitioned")
+        queue_id = db_fixture.create_queue(
+            queue_name="other-queue", password=queue_args["password"]
+        )
+        submit(db_fixture, queue_id, "b")
+        submit(db_fixture, queue_id, "c")
+        assert partition(db_fixture, queue_id).name in (
+            db_fixture._db.list_collection_names()
+        )
+
+        assert db_fixture.delete_queue(queue_id=queue_id, cascade_delete=True) == 3
+        assert partition(db_fixture, queue_id).name not in (
+            db_fixture._db.list_collection_names()
+        )
+        assert db_fixture._tasks.count_documents({"queue_id": shared_queue}) == 1
+
+    def test_migrate(self, db_fixture, queue_id):
+        task_ids = [submit(db_fixture, queue_id, str(i)) for i in range(3)]
+        db_fixture.create_queue_indexes(queue_id=queue_id, paths=["args.n"])
+        index_name = f"q_{queue_id}_args.n"
+
+        assert db_fixture.migrate_task_layout(queue_id, "partitioned") == 3
+        assert db_fixture.migrate_task_layout(queue_id, "partitioned") == 0
+        assert db_fixture._tasks.count_documents({"queue_id": queue_id}) == 0
+        assert index_name not in db_fixture._tasks.index_information()
+        assert index_name in partition(db_fixture, queue_id).index_information()
+        assert {
+            t["_id"]
+            for t in db_fixture.fetch_tasks_batch(queue_id=queue_id, requests=[{}] * 2)
+        } <= set(task_ids)
+
+        assert db_fixture.migrate_task_layout(queue_id, "shared") == 3
+        assert partition(db_fixture, queue_id).name not in (
+            db_fixture._db.list_collection_names()
+        )
+        assert index_name in db_fixture._tasks.index_information()
+        assert db_fixture.fetch_task(queue_id=queue_id)["_id"] in task_ids
+        assert db_fixture.get_queue(queue_id=queue_id)["task_layout"] == "shared"
+
+    def test_migrate_invalid(self, db_fixture, queue_id):
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.migrate_task_layout(queue_id, "sharded")
+        assert exc.value.status_code == 400
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.migrate_task_layout("missing-queue", "partitioned")
+        assert exc.value.status_code == 404
+
+    def test_migration_seen_by_other_processes(self, db_fixture, queue_id):
+        # another server process, using the queue before and after the migration
+        other = DBService(client=db_fixture._client, db_name=db_fixture._db.name)
+        task_id = submit(other, queue_id, "a")
+        revision = db_fixture._revisions.find_one({"_id": queue_id})["revision"]
+
+        assert db_fixture.migrate_task_layout(queue_id, "partitioned") == 1
+        # inserts of the queue conflict with the migration on its revision counter
+        assert db_fixture._revisions.find_one({"_id": queue_id})["revision"] > revision
+
+        assert other.get_task(queue_id=queue_id, task_id=task_id)["_id"] == task_id
+        submit(other, queue_id, "b")
+        assert partition(db_fixture, queue_id).count_documents({}) == 2
+        assert db_fixture._tasks.count_documents({"queue_id": queue_id}) == 0
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from freezegun import freeze_time
+
+from labtasker.server.fsm import TaskState
+
+
+@pytest.fixture
+def queue_id(db_fixture, queue_args):
+    return db_fixture.create_queue(**queue_args)
+
+
+def submit(db, queue_id, **kwargs):
+    return db.create_task(
+        queue_id=queue_id, args={"n": 1}, heartbeat_timeout=60, max_retries=1, **kwargs
+    )
+
+
+def status(db, task_id):
+    return db._tasks.find_one({"_id": task_id})["status"]
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+class TestWorkerLease:
+    def test_lease_covers_task_heartbeats(self, db_fixture, queue_id):
+        worker_id = db_fixture.create_worker(queue_id=queue_id)
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            task_ids = [submit(db_fixture, queue_id) for _ in range(3)]
+            for _ in task_ids:
+                db_fixture.fetch_task(queue_id=queue_id, worker_id=worker_id)
+
+            # no task heartbeats, only lease renewals
+            for _ in range(4):
+                db_fixture.renew_worker_lease(queue_id, worker_id, lease_timeout=90)
+                frozen_time.tick(timedelta(seconds=50))
+                assert db_fixture.handle_timeouts() == []
+
+            # the lease lapses: all the running tasks of the worker fail at once
+            frozen_time.tick(timedelta(seconds=50))
+            assert sorted(db_fixture.handle_timeouts()) == sorted(task_ids)
+            for task_id in task_ids:
+                task = db_fixture._tasks.find_one({"_id": task_id})
+                assert task["status"] == TaskState.FAILED
+                assert task["summary"]["labtasker_error"] == "Worker lease expired"
+
+            # a lapsed lease is released, and counts as one failure of the worker
+            worker = db_fixture.get_worker(queue_id, worker_id)
+            assert worker["lease_expires"] is None
+            assert worker["lease_timeout"] == 90
+            assert worker["retries"] == 1
+            assert worker["status"] == "active"
+
+    def test_other_workers_keep_task_heartbeats(self, db_fixture, queue_id):
+        leased_worker = db_fixture.create_worker(queue_id=queue_id)
+        other_worker = db_fixture.create_worker(queue_id=queue_id)
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            submit(db_fixture, queue_id)
+            submit(db_fixture, queue_id)
+            leased_task = db_fixture.fetch_task(
+                queue_id=queue_id, worker_id=leased_worker
+            )
+            other_task = db_fixture.fetch_task(
+                queue_id=queue_id, worker_id=other_worker
+            )
+            db_fixture.renew_worker_lease(queue_id, leased_worker, lease_timeout=300)
+
+            frozen_time.tick(timedelta(seconds=120))
+            assert db_fixture.handle_timeouts() == [other_task["_id"]]
+            assert status(db_fixture, leased_task["_id"]) == TaskState.RUNNING
+
+    def test_task_timeout_still_applies(self, db_fixture, queue_id):
+        worker_id = db_fixture.create_worker(queue_id=queue_id)
+        with freeze_time("2025-01-01 12:00:00") as frozen_time:
+            task_id = submit(db_fixture, queue_id, task_timeout=100)
+            db_fixture.fetch_task(queue_id=queue_id, worker_id=worker_id)
+            db_fixture.renew_worker_lease(queue_id, worker_id, lease_timeout=300)
+
+            frozen_time.tick(timedelta(seconds=101))
+            assert db_fixture.handle_timeouts() == [task_id]
+
+    def test_invalid(self, db_fixture, queue_id):
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.renew_worker_lease(queue_id, "missing-worker", lease_timeout=60)
+        assert exc.value.status_code == 404
+        worker_id = db_fixture.create_worker(queue_id=queue_id)
+        with pytest.raises(HTTPException) as exc:
+            db_fixture.renew_worker_lease(queue_id, worker_id, lease_timeout=0)
+        assert exc.value.status_code == 400
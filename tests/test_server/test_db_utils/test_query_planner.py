@@ -0,0 +1,162 @@
+import pytest
+
+from labtasker.server.db_utils import (
+    TASK_DISPATCH_INDEX,
+    TASK_QUEUE_STATUS_INDEX,
+    build_query_pipeline,
+    choose_index_hint,
+    parse_explain,
+    query_shape,
+    rewrite_alias,
+    sanitize_query,
+)
+
+DEFAULT_SORT = [("priority", -1), ("last_modified", 1), ("created_at", 1)]
+
+
+@pytest.mark.unit
+def test_rewrite_alias_nested():
+    query = {
+        "$and": [
+            {"queue_id": "q"},
+            {"$or": [{"task_id": "a"}, {"$nor": [{"task_id": {"$in": ["b"]}}]}]},
+        ]
+    }
+    assert rewrite_alias(query, "task_id") == {
+        "$and": [
+            {"queue_id": "q"},
+            {"$or": [{"_id": "a"}, {"$nor": [{"_id": {"$in": ["b"]}}]}]},
+        ]
+    }
+
+
+@pytest.mark.unit
+def test_rewrite_alias_collision():
+    query = {"task_id": "a", "_id": {"$ne": "b"}}
+    assert rewrite_alias(query, "task_id") == {
+        "$and": [{"_id": {"$ne": "b"}}, {"_id": "a"}]
+    }
+
+
+@pytest.mark.unit
+def test_pipeline_match_and_sort_first():
+    query = sanitize_query("q", {"task_id": "a"})
+    pipeline, _ = build_query_pipeline(
+        "tasks", query, sort=[("task_id", 1)], limit=10, offset=5
+    )
+    assert pipeline == [
+        {"$match": {"$and": [{"queue_id": "q"}, {"_id": "a"}]}},
+        {"$sort": {"_id": 1}},
+        {"$skip": 5},
+        {"$limit": 10},
+        {"$project": {"password": 0}},
+        {"$addFields": {"task_id": "$_id"}},
+        {"$project": {"_id": 0}},
+    ]
+
+
+@pytest.mark.unit
+def test_pipeline_queue_alias():
+    # queues have no stored queue_id field, the enforced queue filter must hit _id
+    pipeline, _ = build_query_pipeline(
+        "queues", sanitize_query("q", {}), sort=DEFAULT_SORT, limit=1, offset=0
+    )
+    assert pipeline[0] == {"$match": {"$and": [{"_id": "q"}, {}]}}
+    assert pipeline[-2] == {"$addFields": {"queue_id": "$_id"}}
+
+
+@pytest.mark.unit
+def test_pipeline_expr_fallback():
+    query = sanitize_query("q", {"$expr": {"$eq": ["$task_id", "a"]}})
+    pipeline, hint = build_query_pipeline(
+        "tasks", query, sort=DEFAULT_SORT, limit=10, offset=0, hide_id=False
+    )
+    assert pipeline[0] == {"$addFields": {"task_id": "$_id"}}
+    assert pipeline[1] == {"$match": query}
+    assert hint is None
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "query, sort, expected",
+    [
+        (sanitize_query("q", {"status": "pending"}), DEFAULT_SORT, True),
+        (sanitize_query("q", {"status": "pending"}), DEFAULT_SORT[:1], True),
+        (
+            sanitize_query("q", {"status": {"$eq": "pending"}}),
+            [(f, -d) for f, d in DEFAULT_SORT],
+            True,
+        ),
+        (sanitize_query("q", {"status": "pending"}), [("created_at", 1)], False),
+        (sanitize_query("q", {"status": {"$in": ["pending"]}}), DEFAULT_SORT, False),
+        (sanitize_query("q", {}), DEFAULT_SORT, False),
+        (
+            sanitize_query("q", {"status": "pending", "args.a": 1}),
+            DEFAULT_SORT,
+            False,
+        ),
+        (
+            sanitize_query("q", {"$or": [{"status": "pending"}]}),
+            DEFAULT_SORT,
+            False,
+        ),
+    ],
+)
+def test_choose_index_hint(query, sort, expected):
+    hint = choose_index_hint("tasks", query, sort)
+    assert hint == (TASK_QUEUE_STATUS_INDEX if expected else None)
+    assert choose_index_hint("workers", query, sort) is None
+
+
+@pytest.mark.unit
+def test_choose_dispatch_index_hint():
+    dispatch_sort = [
+        ("priority", -1),
+        ("sched_rank", 1),
+        ("last_modified", 1),
+        ("created_at", 1),
+        ("_id", 1),
+    ]
+    query = sanitize_query("q", {"status": "pending"})
+    assert choose_index_hint("tasks", query, dispatch_sort) == TASK_DISPATCH_INDEX
+    assert choose_index_hint("tasks", query, dispatch_sort[1:]) is None
+
+
+@pytest.mark.unit
+def test_query_shape():
+    query = {
+        "queue_id": "q",
+        "$or": [{"args.a": {"$in": [1, 2]}}, {"metadata.tag": "x"}],
+        "$expr": {"$gt": ["$priority", 5]},
+    }
+    assert query_shape(query) == {
+        "queue_id": "?",
+        "$or": [{"args.a": {"$in": "?"}}, {"metadata.tag": "?"}],
+        "$expr": {"$gt": "?"},
+    }
+
+
+@pytest.mark.unit
+def test_parse_explain():
+    explain_result = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "FETCH",
+                "inputStage": {
+                    "stage": "IXSCAN",
+                    "indexName": TASK_QUEUE_STATUS_INDEX,
+                },
+            }
+        },
+        "executionStats": {
+            "nReturned": 2,
+            "executionTimeMillis": 1,
+            "totalKeysExamined": 2,
+            "totalDocsExamined": 2,
+        },
+    }
+    parsed = parse_explain(explain_result)
+    assert parsed["plan_summary"] == f"IXSCAN({TASK_QUEUE_STATUS_INDEX}) -> FETCH"
+    assert parsed["docs_examined"] == 2
+    assert parsed["keys_examined"] == 2
+    assert parsed["n_returned"] == 2
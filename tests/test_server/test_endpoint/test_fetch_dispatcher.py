@@ -0,0 +1,151 @@
+import asyncio
+import threading
+
+import pytest
+from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_404_NOT_FOUND
+
+from labtasker.api_models import (
+    QueueCreateResponse,
+    ServerMetricsResponse,
+    TaskFetchRequest,
+    TaskFetchResponse,
+    TaskSubmitRequest,
+)
+from labtasker.server.fetch_dispatcher import FetchDispatcher
+from tests.fixtures.server import async_test_app
+
+
+@pytest.fixture
+async def setup_queue(async_test_app, queue_create_request):
+    response = await async_test_app.post(
+        "/api/v1/queues", json=queue_create_request.to_request_dict()
+    )
+    assert response.status_code == HTTP_201_CREATED
+    return QueueCreateResponse(**response.json())
+
+
+@pytest.fixture
+def batch_window(server_config, monkeypatch):
+    # wide enough to collect the concurrent requests on a slow machine
+    monkeypatch.setattr(server_config, "fetch_batch_window_ms", 200.0)
+
+
+async def submit_tasks(client, auth_headers, n, **kwargs):
+    for i in range(n):
+        response = await client.post(
+            "/api/v1/queues/me/tasks",
+            headers=auth_headers,
+            json=TaskSubmitRequest(args={"i": i}, **kwargs).model_dump(),
+        )
+        assert response.status_code == HTTP_201_CREATED
+
+
+async def fetch(client, auth_headers, **kwargs):
+    return await client.post(
+        "/api/v1/queues/me/tasks/next",
+        headers=auth_headers,
+        json=TaskFetchRequest(**kwargs).model_dump(),
+    )
+
+
+async def get_metrics(client):
+    response = await client.get("/api/v1/metrics")
+    assert response.status_code == HTTP_200_OK
+    return ServerMetricsResponse(**response.json()).fetch_dispatcher
+
+
+@pytest.mark.integration
+@pytest.mark.unit
+@pytest.mark.anyio
+@pytest.mark.usefixtures("batch_window")
+class TestFetchDispatcher:
+    async def test_concurrent_fetches_are_batched(
+        self, async_test_app, setup_queue, auth_headers
+    ):
+        n_tasks, n_workers = 10, 15
+        await submit_tasks(async_test_app, auth_headers, n_tasks)
+        before = await get_metrics(async_test_app)
+
+        responses = await asyncio.gather(
+            *[fetch(async_test_app, auth_headers) for _ in range(n_workers)]
+        )
+        assert all(r.status_code == HTTP_200_OK for r in responses)
+        results = [TaskFetchResponse(**r.json()) for r in responses]
+
+        fetched = [r.task.task_id for r in results if r.found]
+        assert len(fetched) == n_tasks
+        assert len(set(fetched)) == n_tasks  # each task handed out once
+
+        after = await get_metrics(async_test_app)
+        assert after.requests - before.requests == n_workers
+        assert after.batches - before.batches < n_workers
+
+    async def test_errors_are_per_request(
+        self, async_test_app, setup_queue, auth_headers
+    ):
+        await submit_tasks(async_test_app, auth_headers, 1)
+        bad, good = await asyncio.gather(
+            fetch(async_test_app, auth_headers, worker_id="nonexistent"),
+            fetch(async_test_app, auth_headers),
+        )
+        assert bad.status_code == HTTP_404_NOT_FOUND
+        assert good.status_code == HTTP_200_OK
+        assert TaskFetchResponse(**good.json()).found
+
+    async def test_priority_order(self, async_test_app, setup_queue, auth_headers):
+        for priority in [0, 20, 10]:
+            await submit_tasks(async_test_app, auth_headers, 1, priority=priority)
+
+        responses = await asyncio.gather(
+            *[fetch(async_test_app, auth_headers) for _ in range(3)]
+        )
+        priorities = sorted(
+            TaskFetchResponse(**r.json()).task.priority for r in responses
+        )
+        assert priorities == [0, 10, 20]
+
+    async def test_disabled(
+        self, async_test_app, setup_queue, auth_headers, server_config, monkeypatch
+    ):
+        monkeypatch.setattr(server_config, "fetch_batch_window_ms", 0)
+        await submit_tasks(async_test_app, auth_headers, 2)
+        before = await get_metrics(async_test_app)
+
+        responses = await asyncio.gather(
+            *[fetch(async_test_app, auth_headers) for _ in range(3)]
+        )
+        results = [TaskFetchResponse(**r.json()) for r in responses]
+        assert sum(r.found for r in results) == 2
+
+        after = await get_metrics(async_test_app)
+        assert after.requests == before.requests
+
+
+@pytest.mark.unit
+def test_failed_batch_raises_an_error_per_request(server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "fetch_batch_window_ms", 200.0)
+
+    class FailingDB:
+        def fetch_tasks_batch(self, queue_id, requests):
+            raise RuntimeError("database unavailable")
+
+    db, dispatcher = FailingDB(), FetchDispatcher()
+    errors = []
+
+    def fetch():
+        try:
+            dispatcher.fetch(db, "queue")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=fetch) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert dispatcher.metrics()["batches"] == 1
+    assert [str(e) for e in errors] == ["database unavailable"] * 3
+    assert (
+        len({id(e) for e in errors}) == 3
+    )  # not one instance raised in several threads
@@ -6,6 +6,7 @@
 from starlette.status import (
     HTTP_200_OK,
     HTTP_201_CREATED,
+    HTTP_202_ACCEPTED,
     HTTP_204_NO_CONTENT,
     HTTP_400_BAD_REQUEST,
     HTTP_401_UNAUTHORIZED,
@@ -13,16 +14,31 @@
     HTTP_404_NOT_FOUND,
     HTTP_409_CONFLICT,
     HTTP_422_UNPROCESSABLE_ENTITY,
+    HTTP_501_NOT_IMPLEMENTED,
 )
 
 from labtasker.api_models import (
+    HeartbeatRequest,
+    HeartbeatResponse,
+    Job,
+    JobSubmitResponse,
+    QueryExplainResponse,
     QueueCreateResponse,
     QueueGetResponse,
+    QueueIndexLsResponse,
+    QueueStatsResponse,
+    ServerMetricsResponse,
+    SweepCreateRequest,
+    SweepCreateResponse,
+    SweepLsResponse,
     Task,
+    TaskChangesResponse,
+    TaskExplainRequest,
     TaskFetchRequest,
     TaskFetchResponse,
     TaskLsRequest,
     TaskLsResponse,
+    TaskProgressEvent,
     TaskStatusUpdateRequest,
     TaskSubmitRequest,
     TaskSubmitResponse,
@@ -58,6 +74,23 @@ def test_health(test_app):
     assert response.status_code == HTTP_200_OK
 
 
+def test_metrics(test_app, setup_queue, auth_headers, server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "query_cache_max_mb", 64.0)
+    for _ in range(2):
+        response = test_app.post(
+            "/api/v1/queues/me/tasks/search",
+            json=TaskLsRequest(status="pending").model_dump(),
+            headers=auth_headers,
+        )
+        assert response.status_code == HTTP_200_OK
+
+    response = test_app.get("/api/v1/metrics")
+    assert response.status_code == HTTP_200_OK
+    metrics = ServerMetricsResponse(**response.json())
+    assert metrics.query_cache.hits >= 1
+    assert 0 < metrics.query_cache.hit_rate <= 1
+
+
 class TestQueueEndpoints:
     """
     Queue CRUD
@@ -367,7 +400,9 @@ def test_refresh_task_heartbeat(self, test_app, setup_queue, auth_headers):
                 f"/api/v1/queues/me/tasks/{response.json()['task']['task_id']}/heartbeat",
                 headers=auth_headers,
             )
-            assert response.status_code == HTTP_204_NO_CONTENT, f"{response.json()}"
+            assert response.status_code == HTTP_200_OK, f"{response.json()}"
+            # three heartbeats per timeout window at least
+            assert HeartbeatResponse(**response.json()).next_interval == 20
 
             # 4. Check heartbeat timestamp via ls
             response = test_app.post(
@@ -388,6 +423,46 @@ def test_refresh_task_heartbeat(self, test_app, setup_queue, auth_headers):
                 <= tolerance.total_seconds()
             )
 
+    def test_refresh_task_heartbeat_with_progress(
+        self,
+        test_app,
+        setup_queue,
+        auth_headers,
+        task_submit_request,
+        server_config,
+        monkeypatch,
+    ):
+        monkeypatch.setattr(server_config, "heartbeat_flush_interval", 0)
+        events = []
+        monkeypatch.setattr(
+            "labtasker.server.endpoints.event_manager.publish_event",
+            lambda queue_id, event: events.append(event),
+        )
+        response = test_app.post(
+            "/api/v1/queues/me/tasks",
+            json=task_submit_request.model_dump(),
+            headers=auth_headers,
+        )
+        task_id = response.json()["task_id"]
+
+        response = test_app.post(
+            f"/api/v1/queues/me/tasks/{task_id}/heartbeat",
+            headers=auth_headers,
+            json=HeartbeatRequest(progress={"epoch": 3, "loss": 0.5}).model_dump(),
+        )
+        assert response.status_code == HTTP_200_OK, f"{response.json()}"
+
+        task = Task(
+            **test_app.get(
+                f"/api/v1/queues/me/tasks/{task_id}", headers=auth_headers
+            ).json()
+        )
+        assert task.summary["progress"] == {"epoch": 3, "loss": 0.5}
+        assert task.last_heartbeat is not None
+        (event,) = [e for e in events if isinstance(e, TaskProgressEvent)]
+        assert event.task_id == task_id
+        assert event.progress == {"epoch": 3, "loss": 0.5}
+
     def test_delete_task(
         self, test_app, setup_queue, auth_headers, task_submit_request
     ):
@@ -448,6 +523,160 @@ def test_get_non_existent_task(self, test_app, setup_queue, auth_headers):
         assert "Task not found" in response.json()["detail"]
 
 
+class TestQueueIndexEndpoints:
+    def test_index_lifecycle(self, test_app, setup_queue, auth_headers):
+        response = test_app.post(
+            "/api/v1/queues/me/indexes",
+            json={"paths": ["args.dataset", "metadata.tag"]},
+            headers=auth_headers,
+        )
+        assert response.status_code == HTTP_201_CREATED, response.json()
+        indexes = QueueIndexLsResponse(**response.json())
+        assert [index.path for index in indexes.content] == [
+            "args.dataset",
+            "metadata.tag",
+        ]
+
+        response = test_app.delete(
+            "/api/v1/queues/me/indexes/args.dataset", headers=auth_headers
+        )
+        assert response.status_code == HTTP_204_NO_CONTENT
+
+        response = test_app.get("/api/v1/queues/me/indexes", headers=auth_headers)
+        assert response.status_code == HTTP_200_OK
+        indexes = QueueIndexLsResponse(**response.json())
+        assert [index.path for index in indexes.content] == ["metadata.tag"]
+
+        response = test_app.delete(
+            "/api/v1/queues/me/indexes/args.dataset", headers=auth_headers
+        )
+        assert response.status_code == HTTP_404_NOT_FOUND
+
+    def test_invalid_index_path(self, test_app, setup_queue, auth_headers):
+        response = test_app.post(
+            "/api/v1/queues/me/indexes",
+            json={"paths": ["status"]},
+            headers=auth_headers,
+        )
+        assert response.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestJobEndpoints:
+    def test_get_job(self, test_app, setup_queue, auth_headers, queue_create_request):
+        response = test_app.post(
+            "/api/v1/queues/me/jobs/update_tasks",
+            json={"update": {"priority": 20}},
+            headers=auth_headers,
+        )
+        assert response.status_code == HTTP_202_ACCEPTED, response.json()
+        job_id = JobSubmitResponse(**response.json()).job_id
+
+        response = test_app.get(
+            f"/api/v1/queues/me/jobs/{job_id}", headers=auth_headers
+        )
+        assert response.status_code == HTTP_200_OK
+        job = Job(**response.json())
+        assert job.job_id == job_id
+        assert job.kind == "update_tasks"
+
+        response = test_app.get(f"/api/v1/queues/me/jobs/{job_id}")
+        assert response.status_code == HTTP_401_UNAUTHORIZED
+
+        # the jobs of other queues are not found
+        response = test_app.post(
+            "/api/v1/queues",
+            json={
+                **queue_create_request.to_request_dict(),
+                "queue_name": "other-queue",
+            },
+        )
+        assert response.status_code == HTTP_201_CREATED
+        response = test_app.get(
+            f"/api/v1/queues/me/jobs/{job_id}",
+            headers=get_auth_headers("other-queue", queue_create_request.password),
+        )
+        assert response.status_code == HTTP_404_NOT_FOUND
+
+
+class TestSweepEndpoints:
+    def test_sweep_lifecycle(self, test_app, setup_queue, auth_headers):
+        response = test_app.post(
+            "/api/v1/queues/me/sweeps",
+            json=SweepCreateRequest(
+                task_name="sweep",
+                args={"dataset": "mnist"},
+                axes={"lr": [0.1, 0.01], "seed": [0, 1]},
+            ).model_dump(),
+            headers=auth_headers,
+        )
+        assert response.status_code == HTTP_201_CREATED, response.json()
+        created = SweepCreateResponse(**response.json())
+        assert created.total == 4
+
+        response = test_app.get("/api/v1/queues/me/stats", headers=auth_headers)
+        assert response.status_code == HTTP_200_OK
+        stats = QueueStatsResponse(**response.json())
+        assert stats.virtual_pending == 4
+        assert stats.task_counts == {}
+
+        # reported with task listings that include pending tasks
+        response = test_app.post(
+            "/api/v1/queues/me/tasks/search", json={}, headers=auth_headers
+        )
+        assert response.status_code == HTTP_200_OK
+        listing = TaskLsResponse(**response.json())
+        assert not listing.found
+        assert (listing.virtual_pending, listing.active_sweeps) == (4, 1)
+        response = test_app.post(
+            "/api/v1/queues/me/tasks/search",
+            json={"status": "running"},
+            headers=auth_headers,
+        )
+        assert TaskLsResponse(**response.json()).virtual_pending == 0
+
+        response = test_app.post(
+            "/api/v1/queues/me/tasks/next",
+            headers=auth_headers,
+            json=TaskFetchRequest(start_heartbeat=True).model_dump(),
+        )
+        assert response.status_code == HTTP_200_OK
+        task = TaskFetchResponse(**response.json()).task
+        assert task.sweep_id == created.sweep_id
+        assert task.sweep_index == 0
+        assert task.args == {"dataset": "mnist", "lr": 0.1, "seed": 0}
+
+        response = test_app.get("/api/v1/queues/me/sweeps", headers=auth_headers)
+        assert response.status_code == HTTP_200_OK
+        sweeps = SweepLsResponse(**response.json())
+        assert sweeps.found
+        assert sweeps.content[0].cursor == 1
+
+        response = test_app.delete(
+            f"/api/v1/queues/me/sweeps/{created.sweep_id}", headers=auth_headers
+        )
+        assert response.status_code == HTTP_204_NO_CONTENT
+
+        response = test_app.delete(
+            f"/api/v1/queues/me/sweeps/{created.sweep_id}", headers=auth_headers
+        )
+        assert response.status_code == HTTP_404_NOT_FOUND
+
+    def test_create_invalid_sweep(self, test_app, setup_queue, auth_headers):
+        response = test_app.post(
+            "/api/v1/queues/me/sweeps",
+            json={"axes": {"a": [1, 2]}, "mode": "random"},  # missing num_samples
+            headers=auth_headers,
+        )
+        assert response.status_code == HTTP_400_BAD_REQUEST
+
+        response = test_app.post(
+            "/api/v1/queues/me/sweeps",
+            json={"axes": {"a": []}},
+            headers=auth_headers,
+        )
+        assert response.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+
 class TestWorkerEndpoints:
     def test_create_worker(self, test_app, setup_queue, auth_headers):
         response = test_app.post(
@@ -721,3 +950,64 @@ def test_update_tasks_invalid_name(
             json=update_request,
         )
         assert response.status_code == HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestExplainEndpoint:
+    def test_explain_tasks(self, test_app, setup_queue, auth_headers, test_type):
+        response = test_app.post(
+            "/api/v1/queues/me/tasks/explain",
+            json=TaskExplainRequest(
+                status="pending",
+                extra_filter={"args.arg1": "value1"},
+                required_fields=["arg1"],
+            ).model_dump(),
+            headers=auth_headers,
+        )
+        if test_type == "unit":
+            # explain is not supported by the embedded database
+            assert response.status_code == HTTP_501_NOT_IMPLEMENTED
+            return
+
+        assert response.status_code == HTTP_200_OK, response.json()
+        explained = QueryExplainResponse(**response.json())
+        assert explained.collection == "tasks"
+        assert explained.plan_summary
+        assert explained.query_shape["status"] == "?"
+
+
+class TestTaskChangesEndpoint:
+    def test_task_changes(self, test_app, setup_queue, auth_headers):
+        response = test_app.post(
+            "/api/v1/queues/me/tasks",
+            headers=auth_headers,
+            json=TaskSubmitRequest(task_name="t", args={"a": 1}).model_dump(),
+        )
+        assert response.status_code == HTTP_201_CREATED
+        task_id = response.json()["task_id"]
+
+        response = test_app.get("/api/v1/queues/me/tasks/changes", headers=auth_headers)
+        assert response.status_code == HTTP_200_OK, response.json()
+        changes = TaskChangesResponse(**response.json())
+        assert [t.task_id for t in changes.changed] == [task_id]
+
+        response = test_app.delete(
+            f"/api/v1/queues/me/tasks/{task_id}", headers=auth_headers
+        )
+        assert response.status_code == HTTP_204_NO_CONTENT
+
+        response = test_app.get(
+            "/api/v1/queues/me/tasks/changes",
+            params={"since": changes.revision},
+            headers=auth_headers,
+        )
+        changes = TaskChangesResponse(**response.json())
+        assert changes.changed == []
+        assert changes.deleted == [task_id]
+
+    def test_invalid_since(self, test_app, setup_queue, auth_headers):
+        response = test_app.get(
+            "/api/v1/queues/me/tasks/changes",
+            params={"since": -1},
+            headers=auth_headers,
+        )
+        assert response.status_code == HTTP_422_UNPROCESSABLE_ENTITY
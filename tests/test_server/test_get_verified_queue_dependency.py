@@ -71,3 +71,29 @@ def test_verified_queue_dependency_with_queue_id(test_app, setup_queue):
     data = response.json()
     assert data["queue_id"] == queue_id
     assert data["queue_name"] == queue_data.queue_name
+
+
+class TestUdsTrust:
+    @pytest.fixture(autouse=True)
+    def trust(self, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "api_uds", "/tmp/labtasker.sock")
+        monkeypatch.setattr(server_config, "api_uds_trust", True)
+
+    def test_wrong_password_over_uds(self, setup_queue):
+        queue_id, queue_data = setup_queue
+        uds_app = TestClient(app, client=None)  # no client address, as over a socket
+        auth_headers = get_auth_headers(queue_data.queue_name, SecretStr("wrong"))
+        response = uds_app.get("/test-queue", headers=auth_headers)
+        assert response.status_code == HTTP_200_OK
+        assert response.json()["queue_id"] == queue_id
+
+        # the queue must still exist
+        auth_headers = get_auth_headers("invalid_queue", SecretStr("wrong"))
+        response = uds_app.get("/test-queue", headers=auth_headers)
+        assert response.status_code == HTTP_401_UNAUTHORIZED
+
+    def test_wrong_password_over_tcp(self, test_app, setup_queue):
+        _, queue_data = setup_queue
+        auth_headers = get_auth_headers(queue_data.queue_name, SecretStr("wrong"))
+        response = test_app.get("/test-queue", headers=auth_headers)
+        assert response.status_code == HTTP_401_UNAUTHORIZED
@@ -0,0 +1,43 @@
+import pytest
+
+from labtasker.server.load_monitor import LoadMonitor
+
+
+@pytest.fixture
+def monitor(server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "heartbeat_interval", 30.0)
+    monkeypatch.setattr(server_config, "heartbeat_interval_max", 300.0)
+    monkeypatch.setattr(server_config, "heartbeat_load_target_rate", 10.0)
+    monkeypatch.setattr(server_config, "heartbeat_load_target_latency_ms", 50.0)
+    return LoadMonitor(window=10)
+
+
+@pytest.mark.unit
+class TestLoadMonitor:
+    def test_load_over_window(self, monitor):
+        for i in range(100):
+            monitor.record(0.01, now=1000 + i / 10)  # 10 requests per second
+        load = monitor.load(now=1009.5)
+        assert load["request_rate"] == pytest.approx(10.0)
+        assert load["latency"] == pytest.approx(0.01)
+        # old requests leave the window
+        assert monitor.load(now=1015)["request_rate"] == pytest.approx(4.0)
+        assert monitor.load(now=1100)["request_rate"] == 0
+
+    def test_heartbeat_interval(self, monitor):
+        # idle server
+        assert monitor.heartbeat_interval(now=1000) == 30.0
+        # short heartbeat timeout: at least 3 heartbeats per timeout window
+        assert monitor.heartbeat_interval(heartbeat_timeout=15, now=1000) == 5.0
+
+        # 4 times the target request rate: slowed down
+        for i in range(400):
+            monitor.record(0.001, now=1000 + i / 40)
+        assert monitor.heartbeat_interval(now=1009) == pytest.approx(120.0)
+        assert monitor.heartbeat_interval(heartbeat_timeout=300, now=1009) == (
+            pytest.approx(100.0)
+        )
+
+    def test_latency(self, monitor):
+        monitor.record(1.0, now=1000)  # 20 times the target latency
+        assert monitor.heartbeat_interval(now=1000) == 300.0  # capped
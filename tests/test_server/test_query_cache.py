@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from labtasker.server.query_cache import QueryCache, make_cache_key
+
+
+@pytest.fixture
+def cache(server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "query_cache_max_mb", 64.0)
+    return QueryCache()
+
+
+@pytest.mark.unit
+class TestQueryCache:
+    def test_make_cache_key_normalizes_dict_order(self):
+        assert make_cache_key({"a": 1, "b": 2}, [("x", 1)]) == make_cache_key(
+            {"b": 2, "a": 1}, [("x", 1)]
+        )
+        assert make_cache_key({}, [("x", 1), ("y", 1)]) != make_cache_key(
+            {}, [("y", 1), ("x", 1)]
+        )
+
+    def test_hit_and_invalidate(self, cache):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return [{"a": 1}]
+
+        assert cache.get_or_compute("q1", "k", compute) == [{"a": 1}]
+        result = cache.get_or_compute("q1", "k", compute)
+        assert len(calls) == 1
+
+        result[0]["a"] = 2  # returned results are copies
+        assert cache.get_or_compute("q1", "k", compute) == [{"a": 1}]
+
+        cache.invalidate("q2")  # other queue
+        cache.get_or_compute("q1", "k", compute)
+        assert len(calls) == 1
+
+        cache.invalidate("q1")
+        cache.get_or_compute("q1", "k", compute)
+        assert len(calls) == 2
+
+        metrics = cache.metrics()
+        assert metrics["hits"] == 3
+        assert metrics["misses"] == 2
+        assert metrics["hit_rate"] == pytest.approx(3 / 5)
+
+    def test_single_flight(self, cache):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(timeout=5)
+            return [{"a": 1}]
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("q", "k", compute))
+        )
+        leader.start()
+        started.wait(timeout=5)
+
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(cache.get_or_compute("q", "k", compute))
+            )
+            for _ in range(3)
+        ]
+        for t in followers:
+            t.start()
+        while cache.metrics()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        for t in [leader, *followers]:
+            t.join(timeout=5)
+
+        assert len(calls) == 1
+        assert results == [[{"a": 1}]] * 4
+
+    def test_invalidated_while_computing_is_not_stored(self, cache):
+        def compute():
+            cache.invalidate("q")  # a write happens concurrently
+            return [{"a": 1}]
+
+        cache.get_or_compute("q", "k", compute)
+        assert cache.metrics()["entries"] == 0
+
+    def test_flight_started_before_invalidation_not_joined(self, cache):
+        started = threading.Event()
+        release = threading.Event()
+
+        def stale_compute():
+            started.set()
+            release.wait(timeout=5)
+            return [{"a": "stale"}]
+
+        stale = threading.Thread(
+            target=lambda: cache.get_or_compute("q", "k", stale_compute)
+        )
+        stale.start()
+        started.wait(timeout=5)
+
+        cache.invalidate("q")  # e.g. the write of the next request's client
+        try:
+            result = cache.get_or_compute("q", "k", lambda: [{"a": "fresh"}])
+        finally:
+            release.set()
+            stale.join(timeout=5)
+
+        assert result == [{"a": "fresh"}]
+        assert cache.metrics()["coalesced"] == 0
+        assert cache.get_or_compute("q", "k", stale_compute) == [{"a": "fresh"}]
+
+    def test_memory_budget(self, cache, server_config, monkeypatch):
+        doc = {"a": "x" * 1000}
+        monkeypatch.setattr(server_config, "query_cache_max_mb", 3000 / 1024 / 1024)
+        for i in range(5):
+            cache.get_or_compute("q", i, lambda: [doc])
+
+        metrics = cache.metrics()
+        assert metrics["size_bytes"] <= metrics["max_bytes"]
+        assert metrics["entries"] == 2
+        assert metrics["evictions"] == 3
+
+    def test_disabled(self, cache, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "query_cache_max_mb", 0)
+        calls = []
+        for _ in range(2):
+            cache.get_or_compute("q", "k", lambda: calls.append(1) or [])
+        assert len(calls) == 2
@@ -0,0 +1,231 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from labtasker.server.ready_queue import (
+    ReadyQueue,
+    UnsupportedFilter,
+    cacheable,
+    dispatch_sort_key,
+    filter_matches,
+)
+
+T0 = datetime(2025, 1, 1)
+
+
+def make_task(task_id, priority=10, minutes=0, args=None):
+    return {
+        "_id": task_id,
+        "queue_id": "q",
+        "status": "pending",
+        "priority": priority,
+        "last_modified": T0 + timedelta(minutes=minutes),
+        "created_at": T0,
+        "args": args or {"a": 1},
+    }
+
+
+class FakeCollection:
+    """Pending tasks, loaded in dispatch order after a sort key."""
+
+    def __init__(self, tasks):
+        self.tasks = {t["_id"]: t for t in tasks}
+        self.loads = []
+
+    def load(self, after, limit):
+        self.loads.append(after)
+        tasks = sorted(self.tasks.values(), key=dispatch_sort_key)
+        if after is not None:
+            tasks = [t for t in tasks if dispatch_sort_key(t) > after]
+        return tasks[:limit]
+
+
+@pytest.fixture
+def rq(server_config, monkeypatch):
+    monkeypatch.setattr(server_config, "ready_queue_size", 2)
+    return ReadyQueue()
+
+
+QUERY = {"queue_id": "q", "status": "pending"}
+
+
+def pop(rq, db, exclude=None, no_more=None, query=QUERY):
+    candidate = rq.pop("q", "shape", query, no_more, db.load, exclude or set())
+    if candidate is not None:
+        db.tasks.pop(candidate["_id"], None)  # claimed
+    return candidate
+
+
+@pytest.mark.unit
+class TestReadyQueue:
+    def test_chunked_dispatch_order(self, rq):
+        db = FakeCollection(
+            [
+                make_task("low", priority=0),
+                make_task("high", priority=20),
+                make_task("old", minutes=0),
+                make_task("new", minutes=1),
+                make_task("newest", minutes=2),
+            ]
+        )
+        order = []
+        while (candidate := pop(rq, db)) is not None:
+            order.append(candidate["_id"])
+        assert order == ["high", "old", "new", "newest", "low"]
+        assert len(db.loads) == 3  # chunks of 2, the last one is not full
+        assert rq.metrics()["pops"] == 5
+
+    def test_exclude(self, rq):
+        db = FakeCollection([make_task("a", priority=20), make_task("b")])
+        assert pop(rq, db, exclude={"a"})["_id"] == "b"
+
+    def test_push_keeps_order(self, rq):
+        db = FakeCollection([make_task(str(i), minutes=i) for i in range(4)])
+        assert pop(rq, db)["_id"] == "0"  # loads "0", "1"
+
+        # a task that entered pending, better than everything
+        urgent = make_task("urgent", priority=20)
+        db.tasks["urgent"] = urgent
+        rq.push(urgent)
+        assert pop(rq, db)["_id"] == "urgent"
+
+        # pushed after the loaded chunk: "2" and "3" are loaded before it is used
+        late = make_task("late", minutes=10)
+        db.tasks["late"] = late
+        rq.push(late)
+        assert [pop(rq, db)["_id"] for _ in range(4)] == ["1", "2", "3", "late"]
+        assert pop(rq, db) is None
+
+    def test_push_filtered(self, rq):
+        db = FakeCollection([])
+        assert pop(rq, db, no_more={"a": None}) is None
+        rq.push(make_task("x", args={"a": 1, "b": 2}))  # "no more" violated
+        rq.push({**make_task("y"), "queue_id": "other"})
+        assert pop(rq, db, no_more={"a": None}) is None
+
+        rq.push(make_task("z", args={"a": 1}))
+        assert pop(rq, db, no_more={"a": None})["_id"] == "z"
+
+    def test_push_back(self, rq):
+        db = FakeCollection([make_task("a")])
+        candidate = pop(rq, db)
+        rq.push_back("q", "shape", candidate)
+        assert pop(rq, db)["_id"] == "a"
+
+    def test_invalidate(self, rq):
+        db = FakeCollection([make_task("a"), make_task("b", minutes=1)])
+        pop(rq, db)
+        rq.invalidate("q")
+        assert rq.metrics()["heaps"] == 0
+
+        db.tasks["a"] = make_task("a", minutes=5)  # order changed behind its back
+        assert pop(rq, db)["_id"] == "b"
+
+    def test_ttl(self, rq, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "ready_queue_ttl", 0)
+        db = FakeCollection([make_task("a"), make_task("b", minutes=1)])
+        pop(rq, db)
+        pop(rq, db)
+        assert len(db.loads) == 2  # reloaded after expiry
+
+    def test_scheduling_rank_order(self, rq):
+        db = FakeCollection(
+            [
+                {**make_task("ranked_2"), "sched_rank": 2.0},
+                make_task("unranked", minutes=5),
+                {**make_task("ranked_1", minutes=1), "sched_rank": 1.0},
+                {**make_task("low", priority=0), "sched_rank": 0.0},
+            ]
+        )
+        order = [pop(rq, db)["_id"] for _ in range(4)]
+        assert order == ["unranked", "ranked_1", "ranked_2", "low"]
+
+    def test_heaps_bounded(self, rq, server_config, monkeypatch):
+        monkeypatch.setattr(server_config, "ready_queue_max_heaps", 2)
+        db = FakeCollection([make_task("a")])
+        for shape in ["s1", "s2", "s1", "s3"]:
+            rq.pop("q", shape, QUERY, None, db.load, set())
+        assert set(rq._heads) == {("q", "s1"), ("q", "s3")}  # s2 least recently used
+        assert rq.metrics()["evictions"] == 1
+
+    def test_expired_heaps_dropped_on_push(self, rq, server_config, monkeypatch):
+        db = FakeCollection([make_task("a")])
+        rq.pop("q", "shape", QUERY, None, db.load, set())
+
+        monkeypatch.setattr(server_config, "ready_queue_ttl", 0)
+        rq.pop("other", "shape", QUERY, None, db.load, set())
+        rq.push(make_task("b"))
+        assert rq.metrics()["heaps"] == 1  # the expired heap of "other" is dropped
+
+    def test_push_unsupported_document_drops_heap(self, rq):
+        query = {**QUERY, "args.a": 1}
+        db = FakeCollection([])
+        rq.pop("q", "shape", query, None, db.load, set())
+        rq.push(make_task("x", args={"a": [1, 2]}))  # arrays are not matched in memory
+        assert rq.metrics()["heaps"] == 0
+
+
+@pytest.mark.unit
+class TestFilterMatches:
+    @pytest.mark.parametrize(
+        "query",
+        [
+            QUERY,
+            {"$and": [{"queue_id": "q"}, {"args.a": {"$exists": True}}]},
+            {"args.a": {"$eq": 1}, "args.b": None, "args.c": "x", "args.d": False},
+        ],
+    )
+    def test_cacheable(self, query):
+        assert cacheable(query)
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            {"args.a": {"$gt": 1}},
+            {"args.a": {"$in": [1, 2]}},
+            {"args.a": {"$exists": True, "$ne": 1}},
+            {"args.a": [1, 2]},
+            {"args": {"a": 1}},
+            {"args.a": float("nan")},
+            {"args.a": T0},
+            {"$or": [{"args.a": 1}]},
+            {"$and": []},
+        ],
+    )
+    def test_not_cacheable(self, query):
+        assert not cacheable(query)
+        with pytest.raises(UnsupportedFilter):
+            filter_matches(query, make_task("x"))
+
+    @pytest.mark.parametrize(
+        "query, args, matched",
+        [
+            ({"args.a": 1}, {"a": 1.0}, True),
+            ({"args.a": "1"}, {"a": 1}, False),
+            ({"args.a": None}, {"b": 1}, True),
+            ({"args.a": None}, {"a": None}, True),
+            ({"args.a": None}, {"a": 0}, False),
+            ({"args.a": {"$exists": True}}, {"a": None}, True),
+            ({"args.a": {"$exists": False}}, {"b": 1}, True),
+            ({"args.a.b": 1}, {"a": {"b": 1}}, True),
+            ({"args.a": 1}, {"a": {"b": 1}}, False),
+            ({"$and": [{"args.a": 1}, {"args.b": 2}]}, {"a": 1, "b": 3}, False),
+        ],
+    )
+    def test_mongodb_semantics(self, query, args, matched):
+        assert filter_matches(query, make_task("x", args=args)) is matched
+
+    @pytest.mark.parametrize(
+        "query, args",
+        [
+            ({"args.a": 1}, {"a": [1]}),
+            ({"args.a.b": 1}, {"a": [{"b": 1}]}),
+            ({"args.a.b": None}, {"a": 1}),
+            ({"args.a": 1}, {"a": True}),
+            ({"args.a": False}, {"a": 0}),
+            ({"args.a": 1}, {"a": T0}),
+        ],
+    )
+    def test_unsupported_documents(self, query, args):
+        with pytest.raises(UnsupportedFilter):
+            filter_matches(query, make_task("x", args=args))
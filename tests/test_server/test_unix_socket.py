@@ -0,0 +1,98 @@
+import os
+import stat
+import threading
+import time
+
+import httpx
+import pytest
+import typer
+import uvicorn
+
+from labtasker.client.core.api import NegotiatingClient, httpx_client_args
+from labtasker.client.core.config import EndpointConfig, unix_socket_path
+from labtasker.security import get_auth_headers
+from labtasker.server.cli import _bind_unix_socket
+from labtasker.server.endpoints import app
+
+pytestmark = [pytest.mark.unit]
+
+
+@pytest.fixture
+def socket_path():
+    # AF_UNIX paths are limited to ~100 bytes, tmp_path may be longer
+    path = os.path.join("/tmp", f"labtasker-test-{os.getpid()}.sock")
+    yield path
+    if os.path.lexists(path):
+        os.unlink(path)
+
+
+def test_unix_socket_url():
+    endpoint = EndpointConfig(api_base_url="unix:///run/labtasker/api.sock")
+    assert unix_socket_path(endpoint.api_base_url) == "/run/labtasker/api.sock"
+    assert unix_socket_path("unix:///tmp/with%20space.sock") == "/tmp/with space.sock"
+    assert unix_socket_path("http://localhost:9321") is None
+
+    assert httpx_client_args("http://localhost:9321") == {
+        "base_url": "http://localhost:9321"
+    }
+    args = httpx_client_args(endpoint.api_base_url)
+    assert isinstance(args["transport"], httpx.HTTPTransport)
+
+
+class TestBindUnixSocket:
+    def test_mode(self, socket_path):
+        sock = _bind_unix_socket(socket_path, 0o660)
+        try:
+            assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o660
+        finally:
+            sock.close()
+
+    def test_stale_socket_replaced(self, socket_path):
+        _bind_unix_socket(socket_path, 0o600).close()  # not unlinked
+        _bind_unix_socket(socket_path, 0o600).close()
+
+    def test_listening_socket(self, socket_path):
+        sock = _bind_unix_socket(socket_path, 0o600)
+        sock.listen()
+        try:
+            with pytest.raises(typer.BadParameter, match="already listening"):
+                _bind_unix_socket(socket_path, 0o600)
+        finally:
+            sock.close()
+
+    def test_not_a_socket(self, socket_path):
+        open(socket_path, "w").close()
+        with pytest.raises(typer.BadParameter, match="not a socket"):
+            _bind_unix_socket(socket_path, 0o600)
+        assert os.path.isfile(socket_path)  # left as is
+
+
+@pytest.mark.integration
+def test_serve_over_unix_socket(db_fixture, socket_path, queue_create_request):
+    sock = _bind_unix_socket(socket_path, 0o600)
+    server = uvicorn.Server(
+        uvicorn.Config(app, fd=sock.fileno(), lifespan="off", log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            time.sleep(0.01)
+
+        with NegotiatingClient(**httpx_client_args(f"unix://{socket_path}")) as client:
+            assert client.get("/health").status_code == 200
+            response = client.post(
+                "/api/v1/queues", json=queue_create_request.to_request_dict()
+            )
+            assert response.status_code == 201
+            response = client.get(
+                "/api/v1/queues/me",
+                headers=get_auth_headers(
+                    queue_create_request.queue_name, queue_create_request.password
+                ),
+            )
+            assert response.status_code == 200
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        sock.close()